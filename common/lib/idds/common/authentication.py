@@ -10,6 +10,7 @@
 
 import datetime
 import base64
+import functools
 import json
 import os
 import re
@@ -32,6 +33,7 @@ except ImportError:
 
 from idds.common import exceptions
 from idds.common.constants import HTTP_STATUS_CODE
+from idds.common.utils import LRUCache
 
 
 def decode_value(val):
@@ -68,12 +70,19 @@ class Singleton(object):
 
 class BaseAuthentication(Singleton):
     def __init__(self, timeout=None):
+        # The instance is shared (Singleton). Only reload the configuration
+        # periodically instead of on every instantiation, and keep the cache.
         self.timeout = timeout
+        if getattr(self, '_initialized', False) and self.config_loaded_at + self.config_reload_time > time.time():
+            return
+
         self.config = self.load_auth_server_config()
+        self.config_loaded_at = time.time()
+        self.config_reload_time = 600
         self.max_expires_in = 60
 
-        self.cache = {}
         self.cache_time = 3600 * 6
+        self.cache_size = 10000
 
         if self.config and self.config.has_section('common'):
             if self.config.has_option('common', 'max_expires_in'):
@@ -82,18 +91,23 @@ class BaseAuthentication(Singleton):
         if self.config and self.config.has_section('common'):
             if self.config.has_option('common', 'cache_time'):
                 self.cache_time = self.config.getint('common', 'cache_time')
+            if self.config.has_option('common', 'cache_size'):
+                self.cache_size = self.config.getint('common', 'cache_size')
+            if self.config.has_option('common', 'config_reload_time'):
+                self.config_reload_time = self.config.getint('common', 'config_reload_time')
+
+        if not getattr(self, '_initialized', False):
+            self.cache = LRUCache(max_size=self.cache_size, ttl=self.cache_time)
+        else:
+            self.cache.max_size = self.cache_size
+            self.cache.ttl = self.cache_time
+        self._initialized = True
 
     def get_cache_value(self, key):
-        if key in self.cache and self.cache[key]['time'] + self.cache_time > time.time():
-            return self.cache[key]['value']
-        return None
+        return self.cache.get(key)
 
-    def set_cache_value(self, key, value):
-        cache_keys = list(self.cache.keys())
-        for k in cache_keys:
-            if self.cache[k]['time'] + self.cache_time <= time.time():
-                del self.cache[k]
-        self.cache[key] = {'time': time.time(), 'value': value}
+    def set_cache_value(self, key, value, expire_at=None):
+        self.cache.set(key, value, expire_at=expire_at)
 
     def load_auth_server_config(self):
         config = ConfigParser.ConfigParser()
@@ -496,6 +510,7 @@ def get_user_name_from_dn2(dn):
         return dn
 
 
+@functools.lru_cache(maxsize=4096)
 def get_user_name_from_dn(dn):
     dn = get_user_name_from_dn1(dn)
     dn = get_user_name_from_dn2(dn)
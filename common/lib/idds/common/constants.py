@@ -35,6 +35,8 @@ class Sections:
     Archiver = 'archiver'
     Coordinator = 'coordinator'
     Rest = 'rest'
+    Metrics = 'metrics'
+    Profiler = 'profiler'
 
 
 class HTTP_STATUS_CODE:
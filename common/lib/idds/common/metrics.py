@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+In-process metrics (counters, gauges and histograms) with Prometheus text exposition.
+
+Metrics are only collected when they are enabled in the configuration:
+
+    [metrics]
+    enable = True
+    # seconds between two metrics summaries in the agent logs
+    log_period = 600
+    # port to serve the metrics of the agents (the rest service serves them on /metrics)
+    agent_port = 8081
+"""
+
+import bisect
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from idds.common.constants import Sections
+from idds.common.config import config_has_section, config_has_option, config_get_bool, config_get_int
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_METRICS = {}
+_LOCK = threading.Lock()
+
+
+def is_metrics_enabled():
+    if config_has_section(Sections.Metrics) and config_has_option(Sections.Metrics, 'enable'):
+        return config_get_bool(Sections.Metrics, 'enable')
+    return False
+
+
+def get_metrics_log_period():
+    if config_has_section(Sections.Metrics) and config_has_option(Sections.Metrics, 'log_period'):
+        return config_get_int(Sections.Metrics, 'log_period')
+    return 600
+
+
+def get_agent_metrics_port():
+    if config_has_section(Sections.Metrics) and config_has_option(Sections.Metrics, 'agent_port'):
+        return config_get_int(Sections.Metrics, 'agent_port')
+    return None
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(label_names, label_values, extra=None):
+    items = [(n, v) for n, v in zip(label_names, label_values)]
+    if extra:
+        items.append(extra)
+    if not items:
+        return ''
+    return '{' + ','.join('%s="%s"' % (n, escape_label_value(v)) for n, v in items) + '}'
+
+
+class Metric(object):
+    metric_type = 'untyped'
+
+    def __init__(self, name, description='', label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get_key(self, labels):
+        if not labels:
+            return tuple()
+        return tuple(labels.get(n, '') for n in self.label_names)
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def get_values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def generate_text(self):
+        lines = ['# HELP %s %s' % (self.name, self.description),
+                 '# TYPE %s %s' % (self.name, self.metric_type)]
+        for key, value in sorted(self.get_values().items()):
+            lines.append('%s%s %s' % (self.name, format_labels(self.label_names, key), value))
+        return lines
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def inc(self, value=1, labels=None):
+        key = self.get_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    metric_type = 'gauge'
+
+    def set(self, value, labels=None):
+        key = self.get_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, value=1, labels=None):
+        key = self.get_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def dec(self, value=1, labels=None):
+        self.inc(-value, labels=labels)
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, description='', label_names=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, description=description, label_names=label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=None):
+        key = self.get_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(key, None)
+            if item is None:
+                # [bucket counts (not cumulative), +Inf count, sum, count]
+                item = [[0] * len(self.buckets), 0, 0.0, 0]
+                self._values[key] = item
+            if index < len(self.buckets):
+                item[0][index] += 1
+            else:
+                item[1] += 1
+            item[2] += value
+            item[3] += 1
+
+    def get_values(self):
+        with self._lock:
+            return {k: [list(v[0]), v[1], v[2], v[3]] for k, v in self._values.items()}
+
+    def get_summary(self):
+        """
+        :returns: {labels: {'count': , 'sum': , 'avg': , 'p50': , 'p95': , 'p99': }}
+        """
+        rets = {}
+        for key, (bucket_counts, inf_count, total, count) in self.get_values().items():
+            ret = {'count': count, 'sum': total, 'avg': total / count if count else 0}
+            for quantile in [50, 95, 99]:
+                ret['p%s' % quantile] = self.get_quantile(bucket_counts, inf_count, count, quantile / 100.0)
+            rets[key] = ret
+        return rets
+
+    def get_quantile(self, bucket_counts, inf_count, count, quantile):
+        """ Upper bound of the bucket containing the quantile. """
+        if not count:
+            return 0
+        target = quantile * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+    def generate_text(self):
+        lines = ['# HELP %s %s' % (self.name, self.description),
+                 '# TYPE %s %s' % (self.name, self.metric_type)]
+        for key, (bucket_counts, inf_count, total, count) in sorted(self.get_values().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket%s %s' % (self.name, format_labels(self.label_names, key, ('le', bound)), cumulative))
+            lines.append('%s_bucket%s %s' % (self.name, format_labels(self.label_names, key, ('le', '+Inf')), count))
+            lines.append('%s_sum%s %s' % (self.name, format_labels(self.label_names, key), total))
+            lines.append('%s_count%s %s' % (self.name, format_labels(self.label_names, key), count))
+        return lines
+
+
+def get_metric(metric_cls, name, description='', label_names=(), **kwargs):
+    with _LOCK:
+        if name not in _METRICS:
+            _METRICS[name] = metric_cls(name, description=description, label_names=label_names, **kwargs)
+        return _METRICS[name]
+
+
+def get_counter(name, description='', label_names=()):
+    return get_metric(Counter, name, description=description, label_names=label_names)
+
+
+def get_gauge(name, description='', label_names=()):
+    return get_metric(Gauge, name, description=description, label_names=label_names)
+
+
+def get_histogram(name, description='', label_names=(), buckets=DEFAULT_BUCKETS):
+    return get_metric(Histogram, name, description=description, label_names=label_names, buckets=buckets)
+
+
+def get_metrics():
+    with _LOCK:
+        return dict(_METRICS)
+
+
+def reset_metrics():
+    for metric in get_metrics().values():
+        metric.reset()
+
+
+def generate_text():
+    """
+    Generate the Prometheus text exposition of all metrics in this process.
+    """
+    lines = []
+    for name, metric in sorted(get_metrics().items()):
+        lines.extend(metric.generate_text())
+    return '\n'.join(lines) + '\n'
+
+
+def get_summary(prefix=None, top=20):
+    """
+    Get a short summary of the metrics, for logging.
+    Histograms are sorted by total time, only the top entries are reported.
+    """
+    rets = []
+    for name, metric in sorted(get_metrics().items()):
+        if prefix and not name.startswith(prefix):
+            continue
+        if isinstance(metric, Histogram):
+            summary = metric.get_summary()
+            items = sorted(summary.items(), key=lambda x: x[1]['sum'], reverse=True)[:top]
+            for key, value in items:
+                labels = format_labels(metric.label_names, key)
+                rets.append('%s%s count=%s sum=%.3f avg=%.4f p95<=%s' % (name, labels, value['count'], value['sum'],
+                                                                         value['avg'], value['p95']))
+        else:
+            items = sorted(metric.get_values().items(), key=lambda x: x[1], reverse=True)[:top]
+            for key, value in items:
+                rets.append('%s%s %s' % (name, format_labels(metric.label_names, key), value))
+    return rets
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ['/', '/metrics']:
+            self.send_error(404)
+            return
+        data = generate_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='0.0.0.0'):
+    """
+    Serve the metrics of this process in a daemon thread.
+
+    :returns: the http server.
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='MetricsHTTPServer', daemon=True)
+    thread.start()
+    return server
@@ -10,6 +10,7 @@
 # - Lino Oscar Gerlach, <lino.oscar.gerlach@cern.ch>, 2024
 
 import base64
+import collections
 import concurrent.futures
 import contextlib
 import errno
@@ -980,6 +981,69 @@ class SecureString(object):
         return '****'
 
 
+class LRUCache(object):
+    """
+    Bounded, thread safe LRU cache with per entry expiration.
+
+    All operations are O(1): expired entries are dropped lazily when they are read,
+    and the least recently used entry is evicted when the cache is full.
+
+    :param max_size: maximum number of entries to keep.
+    :param ttl: default time to live in seconds for an entry.
+    """
+
+    def __init__(self, max_size=10000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, None)
+            if item is None:
+                return default
+            value, expire_at = item
+            if expire_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, expire_at=None):
+        """
+        Set a value. expire_at (epoch seconds) has precedence over ttl.
+        """
+        if expire_at is None:
+            expire_at = time.time() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (value, expire_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def get_expire_at(self, key):
+        with self._lock:
+            item = self._data.get(key, None)
+            if item is None:
+                return None
+            return item[1]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, None) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+
 def is_panda_client_verbose():
     verbose = os.environ.get("PANDA_CLIENT_VERBOSE", None)
     if verbose:
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+"""
+On-disk index of a dependency map file.
+
+A dependency map file is a json list of jobs, which can be several GB. The index is a sqlite
+file next to it with one row per job (in the order of the map), so the jobs can be read in
+windows or by name without loading the whole map into memory.
+"""
+
+import json
+import os
+import sqlite3
+import uuid
+
+
+class DependencyMapIndex(object):
+    def __init__(self, map_file, index_file=None):
+        self.map_file = map_file
+        self.index_file = index_file if index_file else map_file + '.index.sqlite'
+
+    def is_valid(self):
+        if not os.path.exists(self.index_file):
+            return False
+        if os.path.exists(self.map_file) and os.path.getmtime(self.index_file) < os.path.getmtime(self.map_file):
+            return False
+        return True
+
+    def build(self, jobs):
+        """
+        Build the index from the jobs of the dependency map.
+        The index is written to a temporary file and renamed, so readers never see a partial index.
+
+        :param jobs: list of jobs of the dependency map.
+        """
+        tmp_file = '%s.%s.tmp' % (self.index_file, uuid.uuid4().hex[:8])
+        conn = sqlite3.connect(tmp_file)
+        try:
+            conn.execute("CREATE TABLE jobs (seq INTEGER PRIMARY KEY, name TEXT, job TEXT)")
+            conn.executemany("INSERT INTO jobs (seq, name, job) VALUES (?, ?, ?)",
+                             ((seq, job['name'], json.dumps(job)) for seq, job in enumerate(jobs)))
+            conn.execute("CREATE INDEX jobs_name_idx ON jobs (name)")
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_file, self.index_file)
+
+    def connect(self):
+        return sqlite3.connect('file:%s?mode=ro' % self.index_file, uri=True)
+
+    def count(self):
+        conn = self.connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        finally:
+            conn.close()
+
+    def iter_jobs(self, start=0, limit=None, chunk_size=10000):
+        """
+        Iterate the jobs in the order of the dependency map.
+
+        :param start: position of the first job.
+        :param limit: max number of jobs, None for all jobs.
+        """
+        conn = self.connect()
+        try:
+            sql = "SELECT job FROM jobs WHERE seq >= ? ORDER BY seq"
+            params = [start]
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit)
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield json.loads(row[0])
+        finally:
+            conn.close()
+
+    def get_jobs(self, names, chunk_size=500):
+        """
+        :param names: names of the jobs.
+        :returns: {name: job} of the found jobs.
+        """
+        names = list(names)
+        ret = {}
+        conn = self.connect()
+        try:
+            for i in range(0, len(names), chunk_size):
+                chunk = names[i:i + chunk_size]
+                sql = "SELECT name, job FROM jobs WHERE name IN (%s)" % ','.join(['?'] * len(chunk))
+                for name, job in conn.execute(sql, chunk):
+                    ret[name] = json.loads(job)
+        finally:
+            conn.close()
+        return ret
@@ -17,6 +17,8 @@ except ImportError:
 
 import concurrent.futures
 import datetime
+import hashlib
+import itertools
 import json
 import os
 import time
@@ -26,10 +28,47 @@ from idds.common import exceptions
 from idds.common.constants import (TransformType, CollectionStatus, CollectionType,
                                    ContentStatus, ContentType,
                                    ProcessingStatus, WorkStatus)
-from idds.common.utils import get_list_chunks, split_chunks_not_continous
+from idds.common.utils import str_to_date
 from idds.workflowv2.work import Work, Processing
 from idds.workflowv2.workflow import Condition
 
+from .dependencymapindex import DependencyMapIndex
+from .esfilesindex import ESFilesIndex
+
+
+# PanDA job status -> category of the job status
+PANDA_JOB_STATUS_CATEGORIES = {'finished': 'finished', 'merging': 'finished',
+                               'failed': 'failed', 'closed': 'failed', 'cancelled': 'failed',
+                               'lost': 'failed', 'broken': 'failed', 'missing': 'failed',
+                               'activated': 'activated',
+                               'sent': 'processing', 'starting': 'processing', 'running': 'processing',
+                               'holding': 'processing', 'transfering': 'processing'}
+
+
+def build_content_status_table():
+    """
+    Build the table of the content status of a job.
+
+    :returns: {(is_es, category, is_fg_done, is_final_attempt): content_status}
+    """
+    table = {}
+    for is_es, is_fg_done, is_final in itertools.product([False, True], repeat=3):
+        if not is_es or is_fg_done:
+            finished_status = ContentStatus.Available
+        else:
+            finished_status = ContentStatus.FinalSubAvailable if is_final else ContentStatus.SubAvailable
+        category_status = {'finished': finished_status,
+                           'failed': ContentStatus.FinalFailed if is_final else ContentStatus.Failed,
+                           'activated': ContentStatus.Activated,
+                           'processing': ContentStatus.Processing,
+                           'other': ContentStatus.PreProcessing}
+        for category in category_status:
+            table[(is_es, category, is_fg_done, is_final)] = category_status[category]
+    return table
+
+
+PANDA_CONTENT_STATUS_TABLE = build_content_status_table()
+
 
 class DomaCondition(Condition):
     def __init__(self, cond=None, current_work=None, true_work=None, false_work=None):
@@ -130,6 +169,12 @@ class DomaPanDAWork(Work):
         self.num_retries = num_retries
 
         self.poll_panda_jobs_chunk_size = 2000
+        # max number of jobs mapped in one round, 0 to map all jobs. map_cursor is the position
+        # in the dependency map before which all jobs are mapped.
+        self.max_new_maps_per_round = 50000
+        self.map_cursor = 0
+        # seconds after which the jobs of an unchanged task are polled again, 0 to always poll the jobs
+        self.task_fingerprint_max_age = 3600
 
         self.load_panda_urls()
 
@@ -139,6 +184,7 @@ class DomaPanDAWork(Work):
         self.es_label = es_label
         self.max_events_per_job = max_events_per_job
         self.es_files = {}
+        self.es_files_index = None
         self.enable_job_name_map = enable_job_name_map
 
         self.dependency_map = dependency_map
@@ -226,8 +272,18 @@ class DomaPanDAWork(Work):
             self.logger.warn(f"Failed to count dependencies: {ex}")
         return num_inputs, num_dependencies
 
-    @property
-    def dependency_map(self):
+    def to_dict(self):
+        # the decoded dependency map and the event service files index are only caches
+        caches = {}
+        for key in ['_dependency_map_cache', '_es_files_index_cache']:
+            if key in self.__dict__:
+                caches[key] = self.__dict__.pop(key)
+        try:
+            return super(DomaPanDAWork, self).to_dict()
+        finally:
+            self.__dict__.update(caches)
+
+    def get_raw_dependency_map(self):
         if self.should_unzip('_dependency_map'):
             self.logger.debug("unzipping _dependency_map")
             data = self.unzip_data(self._dependency_map)
@@ -236,17 +292,87 @@ class DomaPanDAWork(Work):
 
         if data is None:
             data = {}
+        return data
+
+    def get_dependency_map_file(self):
+        data = self._dependency_map
+        if data and isinstance(data, dict) and 'idds_dependency_map_file' in data and data['idds_dependency_map_file']:
+            return data['idds_dependency_map_file']
+        return None
+
+    def load_dependency_map_file(self, dependency_map_file):
+        with open(dependency_map_file, 'r') as fd:
+            data = json.load(fd)
+            data = self.unzip_data(data)
+        return data
+
+    def has_dependency_map(self):
+        """
+        Whether the dependency map is set, without loading or decoding it.
+        """
+        return getattr(self, '_dependency_map', None) is not None
+
+    def get_cached_dependency_map(self):
+        # the cache is valid as long as _dependency_map is not replaced
+        cache = getattr(self, '_dependency_map_cache', None)
+        if cache is not None and cache[0] is self._dependency_map:
+            return cache[1]
+        return None
+
+    @property
+    def dependency_map(self):
+        data = self.get_cached_dependency_map()
+        if data is not None:
+            return data
 
+        data = self.get_raw_dependency_map()
         if data and 'idds_dependency_map_file' in data and data['idds_dependency_map_file']:
-            with open(data['idds_dependency_map_file'], 'r') as fd:
-                data = json.load(fd)
-                data = self.unzip_data(data)
+            data = self.load_dependency_map_file(data['idds_dependency_map_file'])
 
         num_inputs, num_dependencies = self.count_dependencies(data)
         self.num_inputs = num_inputs
         self.num_dependencies = num_dependencies
+        self._dependency_map_cache = (self._dependency_map, data)
         return data
 
+    def get_dependency_map_index(self):
+        """
+        Get the on-disk index of a file-backed dependency map. The index is built on the first use.
+
+        :returns: DependencyMapIndex, or None if the dependency map is not file-backed or the index cannot be built.
+        """
+        dependency_map_file = self.get_dependency_map_file()
+        if not dependency_map_file:
+            return None
+
+        index = DependencyMapIndex(dependency_map_file)
+        if not index.is_valid():
+            try:
+                self.logger.info(f"{self.get_work_name()} building the index of the dependency map file {dependency_map_file}")
+                index.build(self.load_dependency_map_file(dependency_map_file))
+            except Exception as ex:
+                self.logger.warn(f"Failed to build the index of the dependency map file {dependency_map_file}: {ex}")
+                return None
+        return index
+
+    def iter_dependency_map(self, start=0):
+        """
+        Iterate the jobs of the dependency map.
+        A file-backed dependency map is read from its on-disk index instead of being loaded into memory.
+
+        :param start: position of the first job.
+        """
+        data = self.get_cached_dependency_map()
+        index = self.get_dependency_map_index() if data is None else None
+        if index is None:
+            if data is None:
+                data = self.dependency_map
+            for job in itertools.islice(data, start, None):
+                yield job
+        else:
+            for job in index.iter_jobs(start=start):
+                yield job
+
     def convert_data_to_additional_data_storage(self, storage, storage_name=None, replace_storage_name=False):
         if not replace_storage_name:
             dependency_map_file = os.path.join(storage, self.get_work_name())
@@ -262,6 +388,7 @@ class DomaPanDAWork(Work):
                 json.dump(self._dependency_map, fd)
                 new_dependency_map = {'idds_dependency_map_file': dependency_map_file_name}
                 self._dependency_map = new_dependency_map
+                self._dependency_map_cache = None
 
             if '_dependency_map' in self.zip_items:
                 self.zip_items.remove('_dependency_map')
@@ -273,6 +400,7 @@ class DomaPanDAWork(Work):
                 new_dependency_map_file_name = dependency_map_file_name.replace(storage_name, storage)
                 new_dependency_map['idds_dependency_map_file'] = new_dependency_map_file_name
                 self._dependency_map = new_dependency_map
+                self._dependency_map_cache = None
             return self.get_work_name(), new_dependency_map, None, None
 
     @dependency_map.setter
@@ -306,6 +434,7 @@ class DomaPanDAWork(Work):
                         raise exceptions.IDDSException("duplicated input dependency for item %s: %s" % (item_name, inputs_dependency))
 
         self._dependency_map = value
+        self._dependency_map_cache = None
 
         self.num_inputs = num_inputs
         self.num_dependencies = num_dependencies
@@ -326,82 +455,63 @@ class DomaPanDAWork(Work):
             self.construct_es_files()
 
     def construct_es_files(self):
-        # job's order id must not be skipped/duplicated
-        order_id_map = {}
-        local_order_id = False
-        for job in self._dependency_map:
-            if job.get("order_id", None) is None:
-                local_order_id = True
-                self.logger.warn("order_id is not set, user local order id")
-                break
-            order_id = job.get("order_id", None)
-            if order_id in order_id_map:
-                local_order_id = True
-                self.logger.warn("order_id has duplications, user local order id")
-                break
-            order_id_map[order_id] = job
+        # the index of the event service files is built from the new dependency map on the first use
+        self.es_files = {}
+        self.es_files_index = None
 
-        if local_order_id:
-            self.logger.warn("order_id is not set correctly. With EventService, it will not be able to mapping jobs to events correctly. Disable EventService.")
-            self.es = False
-            return
+    def get_es_files_index(self):
+        """
+        Get the index of the event service files. It's built on the first use and stored with the work.
 
-        order_id_map = {}
-        order_id_group_map = {}
-        if local_order_id:
-            order_id = 0
-            for job in self._dependency_map:
-                groups = job.get("groups", "es_default")
-                if groups not in order_id_group_map:
-                    order_id_group_map[groups] = {}
-                order_id_group_map[groups][order_id] = job
-                order_id_map[order_id] = job
-                order_id += 1
+        :returns: ESFilesIndex, or None if the order ids are not set correctly, which disables the event service.
+        """
+        data = getattr(self, 'es_files_index', None)
+        cache = getattr(self, '_es_files_index_cache', None)
+        if cache is not None and cache[0] is data:
+            return cache[1]
+
+        if data:
+            index = ESFilesIndex.from_dict(data)
+        elif self.es_files:
+            index = ESFilesIndex.from_es_files(self.es_label, self.es_files)
         else:
-            for job in self._dependency_map:
-                groups = job.get("groups", "es_default")
-                if groups not in order_id_group_map:
-                    order_id_group_map[groups] = {}
-                order_id = int(job.get("order_id"))
-                order_id_group_map[groups][order_id] = job
-                order_id_map[order_id] = job
-
-        final_chunks = []
-        for groups in order_id_group_map:
-            order_id_list = sorted(list(order_id_group_map[groups].keys()))
-            order_id_list_chunks = split_chunks_not_continous(order_id_list)
-            for chunk in order_id_list_chunks:
-                sub_chunks = get_list_chunks(chunk, bulk_size=self.max_events_per_job)
-            final_chunks = final_chunks + sub_chunks
-
-        for map_id, chunk in enumerate(final_chunks):
-            order_id_start = chunk[0]
-            order_id_end = chunk[-1]
-            num_events = order_id_end - order_id_start + 1
-            eventservice_file_name = "%s:eventservice_%s^%s" % (self.es_label, order_id_start, num_events)
-
-            has_dependencies = False
-            # sub_maps = {}
-            for order_id in chunk:
-                job = order_id_map[order_id]
-                # output_name = job['name']
-                inputs_dependency = job["dependencies"]
-                if inputs_dependency:
-                    has_dependencies = True
-                sub_map_id = order_id - order_id_start
-                # sub_maps[sub_map_id] = {'order_id': order_id,
-                #                         'sub_map_id': sub_map_id,
-                #                         'job': job}
-
-                # set the job information
-                # order_id should be already there
-                # job["order_id"] = order_id
-                job["map_id"] = map_id
-                job["sub_map_id"] = sub_map_id
-                job["es_name"] = eventservice_file_name
+            index = ESFilesIndex.build(self.iter_dependency_map(), self.es_label, self.max_events_per_job)
+            if index is None:
+                self.logger.warn("order_id is not set correctly. With EventService, it will not be able to mapping jobs to events correctly. Disable EventService.")
+                self.es = False
+                return None
+        if not data:
+            self.es_files_index = index.to_dict()
+        self._es_files_index_cache = (self.es_files_index, index)
+        return index
+
+    def get_unmapped_es_jobs(self, es_files_index, mapped_input_output_maps={}, max_events=0):
+        """
+        Get the jobs of the event service files which are not mapped, in one scan of the dependency map.
 
-            # self.es_files[eventservice_file_name] = {'has_dependencies': has_dependencies, 'sub_maps': sub_maps}
-            self.es_files[eventservice_file_name] = {'has_dependencies': has_dependencies, 'map_id': map_id, 'order_ids': chunk}
+        :param max_events: max number of events of the returned files, 0 for all files.
+        :returns: {map_id: {order_id: job}} and whether there are more unmapped files.
+        """
+        map_ids, num_events, has_more = set(), 0, False
+        for map_id in range(len(es_files_index)):
+            if map_id in mapped_input_output_maps:
+                continue
+            if max_events and num_events >= max_events:
+                has_more = True
+                break
+            map_ids.add(map_id)
+            num_events += es_files_index.counts[map_id]
+
+        unmapped_jobs = {}
+        if map_ids:
+            for job in self.iter_dependency_map():
+                order_id = int(job["order_id"])
+                map_id, sub_map_id = es_files_index.lookup(order_id)
+                if map_id in map_ids:
+                    if map_id not in unmapped_jobs:
+                        unmapped_jobs[map_id] = {}
+                    unmapped_jobs[map_id][order_id] = job
+        return unmapped_jobs, has_more
 
     def load_panda_config(self):
         panda_config = ConfigParser.ConfigParser()
@@ -469,6 +579,10 @@ class DomaPanDAWork(Work):
             self.num_retries = int(self.agent_attributes['num_retries'])
         if 'poll_panda_jobs_chunk_size' in self.agent_attributes and self.agent_attributes['poll_panda_jobs_chunk_size']:
             self.poll_panda_jobs_chunk_size = int(self.agent_attributes['poll_panda_jobs_chunk_size'])
+        if 'max_new_maps_per_round' in self.agent_attributes and self.agent_attributes['max_new_maps_per_round'] is not None:
+            self.max_new_maps_per_round = int(self.agent_attributes['max_new_maps_per_round'])
+        if 'task_fingerprint_max_age' in self.agent_attributes and self.agent_attributes['task_fingerprint_max_age'] is not None:
+            self.task_fingerprint_max_age = int(self.agent_attributes['task_fingerprint_max_age'])
         if 'additional_task_parameters' in self.agent_attributes and self.agent_attributes['additional_task_parameters']:
             if not self.additional_task_parameters:
                 self.additional_task_parameters = {}
@@ -669,26 +783,51 @@ class DomaPanDAWork(Work):
 
     def get_unmapped_jobs(self, mapped_input_output_maps={}):
         mapped_outputs = self.get_mapped_outputs(mapped_input_output_maps)
-        mapped_outputs_name = [ip['name'] for ip in mapped_outputs]
+        mapped_outputs_name = set([ip['name'] for ip in mapped_outputs])
         unmapped_jobs = []
-        for job in self.dependency_map:
+        for job in self.iter_dependency_map():
             output_name = job['name']
             if output_name not in mapped_outputs_name:
                 unmapped_jobs.append(job)
         return unmapped_jobs
 
+    def get_unmapped_jobs_window(self, mapped_input_output_maps={}, max_jobs=1000):
+        """
+        Get a window of unmapped jobs, scanning the dependency map from map_cursor.
+
+        :param max_jobs: max number of jobs in the window.
+        :returns: unmapped jobs, their positions in the dependency map and the position after the scanned jobs.
+        """
+        mapped_outputs = self.get_mapped_outputs(mapped_input_output_maps)
+        mapped_outputs_name = set([ip['name'] for ip in mapped_outputs])
+
+        start = getattr(self, 'map_cursor', 0) or 0
+        for scan_start in ([start, 0] if start else [0]):
+            unmapped_jobs, positions = [], []
+            scan_end = scan_start
+            for pos, job in enumerate(self.iter_dependency_map(start=scan_start), scan_start):
+                scan_end = pos + 1
+                if job['name'] not in mapped_outputs_name:
+                    unmapped_jobs.append(job)
+                    positions.append(pos)
+                    if len(unmapped_jobs) >= max_jobs:
+                        break
+            if unmapped_jobs:
+                break
+            # nothing after the cursor, rescan from the beginning in case the cursor is ahead
+        return unmapped_jobs, positions, scan_end
+
     def has_dependency(self):
-        if self.dependency_map:
-            for job in self.dependency_map:
-                if "dependencies" in job and job["dependencies"]:
-                    return True
+        for job in self.iter_dependency_map():
+            if "dependencies" in job and job["dependencies"]:
+                return True
         return False
 
     def get_parent_work_names(self):
         if self.dependency_tasks:
             return self.dependency_tasks
         parent_work_names = []
-        for job in self.dependency_map:
+        for job in self.iter_dependency_map():
             if "dependencies" in job and job["dependencies"]:
                 inputs_dependency = job["dependencies"]
                 for input_d in inputs_dependency:
@@ -724,26 +863,36 @@ class DomaPanDAWork(Work):
             self.set_has_new_inputs(True)
             return new_input_output_maps
 
-        unmapped_jobs = self.get_unmapped_jobs(mapped_input_output_maps)
+        max_new_maps = getattr(self, 'max_new_maps_per_round', 0)
+        es_files_index = self.get_es_files_index() if self.es else None
+        # with eventservice, the windows are whole event service files which are not mapped
+        windowed = bool(max_new_maps) and es_files_index is None
+        has_left_inputs = False
+        if es_files_index is not None:
+            unmapped_jobs, has_left_inputs = self.get_unmapped_es_jobs(es_files_index, mapped_input_output_maps, max_events=max_new_maps)
+        elif windowed:
+            unmapped_jobs, unmapped_positions, scan_end = self.get_unmapped_jobs_window(mapped_input_output_maps, max_jobs=max_new_maps)
+        else:
+            unmapped_jobs = self.get_unmapped_jobs(mapped_input_output_maps)
         if not unmapped_jobs:
             self.set_has_new_inputs(False)
             return new_input_output_maps
 
-        has_left_inputs = False
+        first_left_position = None
         if unmapped_jobs:
             input_coll = self.get_input_collections()[0]
             input_coll_id = input_coll.coll_id
             output_coll = self.get_output_collections()[0]
             output_coll_id = output_coll.coll_id
 
-            if not self.es:
+            if es_files_index is None:
                 mapped_keys = mapped_input_output_maps.keys()
                 if mapped_keys:
                     next_key = max(mapped_keys) + 1
                 else:
                     next_key = 1
 
-                for job in unmapped_jobs:
+                for job_index, job in enumerate(unmapped_jobs):
                     output_name = job['name']
                     inputs_dependency = job["dependencies"]
 
@@ -774,29 +923,22 @@ class DomaPanDAWork(Work):
                         next_key += 1
                     else:
                         has_left_inputs = True
+                        if windowed and first_left_position is None:
+                            first_left_position = unmapped_positions[job_index]
                         # not all inputs for this job can be parsed.
                         # self.dependency_map.append(job)
                         pass
-            else:
-                order_id_map = {}
-                for job in unmapped_jobs:
-                    order_id = job["order_id"]
-                    order_id_map[order_id] = job
-                for es_name in self.es_files:
-                    order_ids = self.es_files[es_name]["order_ids"]
-                    not_filled = False
-                    for order_id in order_ids:
-                        if order_id in order_id_map:
-                            not_filled = True
-
-                    if not not_filled:
-                        continue
 
-                    # order_id_start = order_ids[0]
-                    # order_id_end = order_ids[-1]
-                    # num_events = order_id_end - order_id_start + 1
-                    # eventservice_file_name = es_name
-                    next_key = self.es_files[es_name]["map_id"]
+                if windowed:
+                    # the next round continues from the first job which is not mapped
+                    self.map_cursor = first_left_position if first_left_position is not None else scan_end
+                    if len(unmapped_jobs) >= max_new_maps:
+                        has_left_inputs = True
+            else:
+                for map_id, es_name, order_ids, _ in es_files_index.iter_es_files(map_ids=sorted(unmapped_jobs.keys())):
+                    order_id_map = unmapped_jobs[map_id]
+                    order_ids = [order_id for order_id in order_ids if order_id in order_id_map]
+                    next_key = map_id
 
                     all_inputs_dependency = []
                     for order_id in order_ids:
@@ -812,7 +954,7 @@ class DomaPanDAWork(Work):
                             job = order_id_map[order_id]
                             output_name = job['name']
                             inputs_dependency = job["dependencies"]
-                            sub_map_id = job["sub_map_id"]
+                            sub_map_id = order_id - es_files_index.starts[map_id]
                             input_content = self.map_file_to_content(input_coll_id, input_coll.scope, output_name,
                                                                      order_id=order_id, sub_map_id=sub_map_id, es_name=es_name)
                             output_content = self.map_file_to_content(output_coll_id, output_coll.scope, output_name,
@@ -883,17 +1025,18 @@ class DomaPanDAWork(Work):
 
         in_files = []
         has_dependencies = False
-        if self.dependency_map is None:
+        if not self.has_dependency_map():
             self.dependency_map = {}
-        if not self.es:
-            for job in self.dependency_map:
+        es_files_index = self.get_es_files_index() if self.es else None
+        if es_files_index is None:
+            for job in self.iter_dependency_map():
                 in_files.append(job['name'])
                 if not has_dependencies and "dependencies" in job and job['dependencies']:
                     has_dependencies = True
         else:
-            for es_file in self.es_files:
-                has_dependencies = self.es_files[es_file]['has_dependencies']
-                in_files.append(es_file)
+            for map_id, es_name, order_ids, es_has_dependencies in es_files_index.iter_es_files():
+                in_files.append(es_name)
+            has_dependencies = es_files_index.has_any_dependencies()
 
         task_param_map = {}
         task_param_map['vo'] = self.vo
@@ -1278,60 +1421,16 @@ class DomaPanDAWork(Work):
         if job_info is None:
             return ContentStatus.Processing
 
-        jobstatus = job_info.jobStatus
-        if not job_info.eventService or job_info.eventService in ['NULL', 'None']:
-            if jobstatus in ['finished', 'merging']:
-                return ContentStatus.Available
-            elif jobstatus in ['failed', 'closed', 'cancelled', 'lost', 'broken', 'missing']:
-                attempt_nr = int(job_info.attemptNr) if job_info.attemptNr else 0
-                max_attempt = int(job_info.maxAttempt) if job_info.maxAttempt else 0
-                self_maxAttempt = int(self.maxAttempt) if self.maxAttempt else 0
-                if (attempt_nr >= max_attempt) and (attempt_nr >= self_maxAttempt):
-                    return ContentStatus.FinalFailed
-                else:
-                    return ContentStatus.Failed
-            elif jobstatus in ['activated']:
-                return ContentStatus.Activated
-            elif jobstatus in ['sent', 'starting', 'running', 'holding', 'transfering', 'merging']:
-                return ContentStatus.Processing
-            else:
-                return ContentStatus.PreProcessing
-        else:
-            # job_info.eventService is 6
-            jobsubstatus = job_info.jobSubStatus
-            if jobstatus in ['finished', 'merging']:
-                if jobsubstatus in ['fg_done']:
-                    return ContentStatus.Available
-                elif jobsubstatus in ['fg_partial']:
-                    attempt_nr = int(job_info.attemptNr) if job_info.attemptNr else 0
-                    max_attempt = int(job_info.maxAttempt) if job_info.maxAttempt else 0
-                    self_maxAttempt = int(self.maxAttempt) if self.maxAttempt else 0
-                    if (attempt_nr >= max_attempt) and (attempt_nr >= self_maxAttempt):
-                        return ContentStatus.FinalSubAvailable
-                    else:
-                        return ContentStatus.SubAvailable
-                else:
-                    attempt_nr = int(job_info.attemptNr) if job_info.attemptNr else 0
-                    max_attempt = int(job_info.maxAttempt) if job_info.maxAttempt else 0
-                    self_maxAttempt = int(self.maxAttempt) if self.maxAttempt else 0
-                    if (attempt_nr >= max_attempt) and (attempt_nr >= self_maxAttempt):
-                        return ContentStatus.FinalSubAvailable
-                    else:
-                        return ContentStatus.SubAvailable
-            elif jobstatus in ['failed', 'closed', 'cancelled', 'lost', 'broken', 'missing']:
-                attempt_nr = int(job_info.attemptNr) if job_info.attemptNr else 0
-                max_attempt = int(job_info.maxAttempt) if job_info.maxAttempt else 0
-                self_maxAttempt = int(self.maxAttempt) if self.maxAttempt else 0
-                if (attempt_nr >= max_attempt) and (attempt_nr >= self_maxAttempt):
-                    return ContentStatus.FinalFailed
-                else:
-                    return ContentStatus.Failed
-            elif jobstatus in ['activated']:
-                return ContentStatus.Activated
-            elif jobstatus in ['sent', 'starting', 'running', 'holding', 'transfering', 'merging']:
-                return ContentStatus.Processing
-            else:
-                return ContentStatus.PreProcessing
+        is_es = bool(job_info.eventService) and job_info.eventService not in ['NULL', 'None']
+        category = PANDA_JOB_STATUS_CATEGORIES.get(job_info.jobStatus, 'other')
+        is_fg_done = is_es and job_info.jobSubStatus in ['fg_done']
+        is_final = False
+        if category in ['finished', 'failed']:
+            attempt_nr = int(job_info.attemptNr) if job_info.attemptNr else 0
+            max_attempt = int(job_info.maxAttempt) if job_info.maxAttempt else 0
+            self_maxAttempt = int(self.maxAttempt) if self.maxAttempt else 0
+            is_final = (attempt_nr >= max_attempt) and (attempt_nr >= self_maxAttempt)
+        return PANDA_CONTENT_STATUS_TABLE[(is_es, category, is_fg_done, is_final)]
 
     def get_job_status_from_contents(self, contents, contents_ext_dict):
         all_finished, all_terminated, has_finished, panda_id = True, True, False, None
@@ -1370,33 +1469,20 @@ class DomaPanDAWork(Work):
         return all_finished, all_terminated, has_finished, panda_id
 
     def get_unterminated_jobs(self, all_jobs_ids, input_output_maps, contents_ext):
-        finished_jobs, sub_finished_jobs, failed_jobs = [], [], []
+        terminated_jobs = set()
 
         contents_ext_dict = {content['content_id']: content for content in contents_ext}
 
         for map_id in input_output_maps:
             outputs = input_output_maps[map_id]['outputs']
             all_finished, all_terminated, has_finished, panda_id = self.get_job_status_from_contents(outputs, contents_ext_dict)
-            if all_finished:
-                if panda_id not in finished_jobs:
-                    finished_jobs.append(panda_id)
-            else:
-                if all_terminated:
-                    if has_finished:
-                        if panda_id not in sub_finished_jobs:
-                            sub_finished_jobs.append(panda_id)
-                    else:
-                        if panda_id not in failed_jobs:
-                            failed_jobs.append(panda_id)
+            if all_finished or all_terminated:
+                terminated_jobs.add(panda_id)
 
-        all_jobs_ids = set(all_jobs_ids)
-        terminated_jobs = finished_jobs + failed_jobs + sub_finished_jobs
-        terminated_jobs_final = []
+        terminated_jobs_final = set()
         for job_id in terminated_jobs:
-            job_ids = [int(i) for i in str(job_id).split(",")]
-            terminated_jobs_final.extend(job_ids)
-        terminated_jobs_final = set(terminated_jobs_final)
-        unterminated_jobs = all_jobs_ids - terminated_jobs_final
+            terminated_jobs_final.update([int(i) for i in str(job_id).split(",")])
+        unterminated_jobs = set(all_jobs_ids) - terminated_jobs_final
         return list(unterminated_jobs)
 
     def get_panda_job_status(self, jobids, log_prefix=''):
@@ -1599,48 +1685,43 @@ class DomaPanDAWork(Work):
             self.logger.debug("job_status_info: %s" % (job_status_info))
         return job_status_info
 
-    def get_event_job(self, sub_map_id, panda_jobs, job_set_events):
-        ret_event, ret_job = {}, None
-        sub_map_id_jobs = {}
-        for panda_job in panda_jobs:
-            events = panda_job.get('events', {})
+    def get_events_index(self, panda_jobs, job_set_events):
+        """
+        Index the events of the jobs of an input file by the event index, which is the sub_map_id
+        of the output contents.
+
+        :returns: {event_index: {event_status: [{'status': , 'error_code': , 'error_diag': , 'job': }]}}
+        """
+        events_index = {}
+        all_events = [(panda_job.get('events', {}), panda_job) for panda_job in panda_jobs]
+        all_events.append((job_set_events, None))
+        for events, panda_job in all_events:
             for event_id in events:
                 event_index = int(event_id.split('-')[3]) - 1
-                if event_index == sub_map_id:
-                    event_result = events[event_id]
-                    if type(event_result) in [dict]:
-                        # new version of panda result
-                        event_status = event_result.get('status', None)
-                        event_error = event_result.get('error', None)
-                        event_diag = event_result.get('dialog', None)
-                    else:
-                        event_status = event_result
-                        event_error, event_diag = None, None
-                    if event_status not in sub_map_id_jobs:
-                        sub_map_id_jobs[event_status] = []
-                    # todo: get the event error code and error diag
-                    item = {'status': event_status, 'error_code': event_error, 'error_diag': event_diag, 'job': panda_job}
-                    sub_map_id_jobs[event_status].append(item)
-
-        if not ret_event:
-            for event_id in job_set_events:
-                event_index = int(event_id.split('-')[3]) - 1
-                if event_index == sub_map_id:
-                    event_result = job_set_events[event_id]
-                    if type(event_result) in [dict]:
-                        # new version of panda result
-                        event_status = event_result.get('status', None)
-                        event_error = event_result.get('error', None)
-                        event_diag = event_result.get('dialog', None)
-                    else:
-                        event_status = event_result
-                        event_error, event_diag = None, None
-                    if event_status not in sub_map_id_jobs:
-                        sub_map_id_jobs[event_status] = []
-                    # todo: get the event error code and error diag
-                    item = {'status': event_status, 'error_code': event_error, 'error_diag': event_diag}
-                    sub_map_id_jobs[event_status].append(item)
+                event_result = events[event_id]
+                if type(event_result) in [dict]:
+                    # new version of panda result
+                    event_status = event_result.get('status', None)
+                    event_error = event_result.get('error', None)
+                    event_diag = event_result.get('dialog', None)
+                else:
+                    event_status = event_result
+                    event_error, event_diag = None, None
+                sub_map_id_jobs = events_index.setdefault(event_index, {})
+                if event_status not in sub_map_id_jobs:
+                    sub_map_id_jobs[event_status] = []
+                item = {'status': event_status, 'error_code': event_error, 'error_diag': event_diag}
+                if panda_job is not None:
+                    item['job'] = panda_job
+                sub_map_id_jobs[event_status].append(item)
+        return events_index
+
+    def get_event_job(self, sub_map_id, panda_jobs, job_set_events, events_index=None):
+        if events_index is None:
+            events_index = self.get_events_index(panda_jobs, job_set_events)
+        sub_map_id_jobs = events_index.get(sub_map_id, {})
 
+        ret_event, ret_job = {}, None
         final_event_status = None
         for event_status in sub_map_id_jobs:
             if event_status in ['finished', 'done', 'merged']:
@@ -1660,7 +1741,89 @@ class DomaPanDAWork(Work):
             ret_job = item.get('job', None)
         return ret_event, ret_job
 
+    def get_job_info_items(self, job_info, job_info_maps, job_info_items_cache):
+        """
+        Get the items of job_info_maps from a job info, once per job info.
+
+        :param job_info_items_cache: {id(job_info): items} of the current round.
+        """
+        key = id(job_info)
+        if key not in job_info_items_cache:
+            items = {}
+            for job_info_item in job_info_maps:
+                value = getattr(job_info, job_info_maps[job_info_item])
+                if value == 'NULL':
+                    value = None
+                if value is not None:
+                    items[job_info_item] = value
+            job_info_items_cache[key] = items
+        return job_info_items_cache[key]
+
+    def set_content_panda_id(self, content, panda_id, update_content):
+        content_metadata = content['content_metadata']
+        if 'panda_id' in content_metadata and content_metadata['panda_id']:
+            if str(content_metadata['panda_id']) < str(panda_id):
+                # new panda id is the bigger one.
+                if 'old_panda_id' not in content_metadata:
+                    content_metadata['old_panda_id'] = []
+                if content_metadata['panda_id'] not in content_metadata['old_panda_id']:
+                    content_metadata['old_panda_id'].append(content_metadata['panda_id'])
+                content_metadata['panda_id'] = str(panda_id)
+                update_content['content_metadata'] = content_metadata
+            elif str(content_metadata['panda_id']) > str(panda_id):
+                if 'old_panda_id' not in content_metadata:
+                    content_metadata['old_panda_id'] = []
+                if panda_id not in content_metadata['old_panda_id']:
+                    content_metadata['old_panda_id'].append(panda_id)
+                update_content['content_metadata'] = content_metadata
+        else:
+            content_metadata['panda_id'] = str(panda_id)
+            update_content['content_metadata'] = content_metadata
+
+    def add_content_update(self, updates, content, status, substatus, panda_id, job_info, job_info_maps, contents_ext_dict,
+                           with_ext=True, error_code=None, error_diag=None):
+        """
+        Add the update of an output content and of its contents_ext row to the updates of the round.
+
+        :param updates: {'update_contents': [], 'update_contents_full': [], 'new_contents_ext': [],
+                         'update_contents_ext': [], 'job_info_items': {}}
+        """
+        content['status'] = substatus
+        content['substatus'] = substatus
+        updates['update_contents_full'].append(content)
+        update_content = {'content_id': content['content_id'],
+                          'request_id': content['request_id'],
+                          'status': status,
+                          'substatus': substatus}
+        self.set_content_panda_id(content, panda_id, update_content)
+        updates['update_contents'].append(update_content)
+
+        if not with_ext:
+            return
+
+        if content['content_id'] not in contents_ext_dict:
+            content_ext = {'content_id': content['content_id'],
+                           'request_id': content['request_id'],
+                           'transform_id': content['transform_id'],
+                           'workload_id': content['workload_id'],
+                           'coll_id': content['coll_id'],
+                           'map_id': content['map_id'],
+                           'status': substatus}
+            updates['new_contents_ext'].append(content_ext)
+        else:
+            content_ext = {'content_id': content['content_id'],
+                           'request_id': content['request_id'],
+                           'status': substatus}
+            updates['update_contents_ext'].append(content_ext)
+        content_ext.update(self.get_job_info_items(job_info, job_info_maps, updates['job_info_items']))
+        if error_code is not None:
+            content_ext['trans_exit_code'] = error_code
+            content_ext['exe_error_code'] = error_code
+        if error_diag is not None:
+            content_ext['exe_error_diag'] = error_diag
+
     def get_update_contents(self, unterminated_jobs_status, input_output_maps, contents_ext, job_info_maps, abort=False, terminated_status=False, log_prefix=''):
+        # the indexes are built once per round: input name -> output contents, content_id -> contents_ext
         inputname_to_map_id_outputs = {}
         for map_id in input_output_maps:
             inputs = input_output_maps[map_id]['inputs']
@@ -1682,326 +1845,79 @@ class DomaPanDAWork(Work):
 
         contents_ext_dict = {content['content_id']: content for content in contents_ext}
 
-        update_contents, update_contents_full = [], []
-        new_contents_ext, update_contents_ext = [], []
-        update_contents_dict, new_contents_ext_dict = {}, {}
-
-        if not self.es:
-            for input_file in unterminated_jobs_status:
-                # job_set_id = unterminated_jobs_status[input_file]['job_set_id']
-                panda_jobs = unterminated_jobs_status[input_file]['jobs']
-                if 'status' not in unterminated_jobs_status[input_file]:
-                    continue
-                panda_status = unterminated_jobs_status[input_file]['status']
-                panda_ids = unterminated_jobs_status[input_file]['panda_id']
-                panda_id = ",".join([str(i) for i in panda_ids])
-                job_info = unterminated_jobs_status[input_file]['job_info']
-
-                if input_file not in inputname_to_map_id_outputs:
-                    continue
-
-                # output_contents = inputname_to_map_id_outputs[input_file]['outputs']
-                map_id_outputs = inputname_to_map_id_outputs[input_file]
-                for map_id_output in map_id_outputs:
-                    # map_id = map_id_output['map_id']
-                    output_contents = map_id_output['outputs']
-
-                    for content in output_contents:
-                        content['status'] = panda_status
-                        content['substatus'] = panda_status
-                        update_contents_full.append(content)
-                        update_content = {'content_id': content['content_id'],
-                                          'request_id': content['request_id'],
-                                          'status': panda_status,
-                                          'substatus': panda_status}
-
-                        if 'panda_id' in content['content_metadata'] and content['content_metadata']['panda_id']:
-                            if str(content['content_metadata']['panda_id']) < str(panda_id):
-                                # new panda id is the bigger one.
-                                if 'old_panda_id' not in content['content_metadata']:
-                                    content['content_metadata']['old_panda_id'] = []
-                                if content['content_metadata']['panda_id'] not in content['content_metadata']['old_panda_id']:
-                                    content['content_metadata']['old_panda_id'].append(content['content_metadata']['panda_id'])
-                                content['content_metadata']['panda_id'] = str(panda_id)
-                                update_content['content_metadata'] = content['content_metadata']
-                            elif str(content['content_metadata']['panda_id']) > str(panda_id):
-                                if 'old_panda_id' not in content['content_metadata']:
-                                    content['content_metadata']['old_panda_id'] = []
-                                if panda_id not in content['content_metadata']['old_panda_id']:
-                                    content['content_metadata']['old_panda_id'].append(panda_id)
-                                # content['content_metadata']['panda_id'] = content['content_metadata']['panda_id']
-                                # content['substatus'] = panda_status
-                                update_content['content_metadata'] = content['content_metadata']
-                            else:
-                                pass
-                        else:
-                            content['content_metadata']['panda_id'] = str(panda_id)
-                            update_content['content_metadata'] = content['content_metadata']
-
-                        update_contents.append(update_content)
-                        update_contents_dict[update_content['content_id']] = update_content
-
-                        if panda_status in [ContentStatus.Available, ContentStatus.Failed, ContentStatus.FinalFailed,
-                                            ContentStatus.Lost, ContentStatus.Deleted, ContentStatus.Missing]:
-                            if content['content_id'] not in contents_ext_dict:
-                                new_content_ext = {'content_id': content['content_id'],
-                                                   'request_id': content['request_id'],
-                                                   'transform_id': content['transform_id'],
-                                                   'workload_id': content['workload_id'],
-                                                   'coll_id': content['coll_id'],
-                                                   'map_id': content['map_id'],
-                                                   'status': panda_status}
-                                for job_info_item in job_info_maps:
-                                    new_content_ext[job_info_item] = getattr(job_info, job_info_maps[job_info_item])
-                                    if new_content_ext[job_info_item] == 'NULL':
-                                        new_content_ext[job_info_item] = None
-                                    if new_content_ext[job_info_item] is None:
-                                        del new_content_ext[job_info_item]
-                                new_contents_ext.append(new_content_ext)
-                                new_contents_ext_dict[new_content_ext['content_id']] = new_content_ext
-                            else:
-                                update_content_ext = {'content_id': content['content_id'],
-                                                      'request_id': content['request_id'],
-                                                      'status': panda_status}
-                                for job_info_item in job_info_maps:
-                                    update_content_ext[job_info_item] = getattr(job_info, job_info_maps[job_info_item])
-                                    if update_content_ext[job_info_item] == 'NULL':
-                                        update_content_ext[job_info_item] = None
-                                    if update_content_ext[job_info_item] is None:
-                                        del update_content_ext[job_info_item]
-                                update_contents_ext.append(update_content_ext)
-        else:
-            # ES jobs
-            for input_file in unterminated_jobs_status:
-                # job_set_id = unterminated_jobs_status[input_file]['job_set_id']
-                panda_jobs = unterminated_jobs_status[input_file]['jobs']
-                job_set_events = unterminated_jobs_status[input_file]['job_set_events']
-                if 'status' not in unterminated_jobs_status[input_file]:
-                    continue
-
-                panda_status = unterminated_jobs_status[input_file]['status']
-                panda_ids = unterminated_jobs_status[input_file]['panda_id']
-                panda_id = ",".join([str(i) for i in panda_ids])
-                job_info = unterminated_jobs_status[input_file]['job_info']
-
-                if input_file not in inputname_to_map_id_outputs:
-                    continue
-
-                if panda_status in [ContentStatus.Available, ContentStatus.Lost, ContentStatus.Deleted, ContentStatus.Missing]:
-                    # output_contents = inputname_to_map_id_outputs[input_file]['outputs']
-                    map_id_outputs = inputname_to_map_id_outputs[input_file]
-                    for map_id_output in map_id_outputs:
-                        # map_id = map_id_output['map_id']
-                        output_contents = map_id_output['outputs']
-
-                        for content in output_contents:
-                            content['status'] = panda_status
-                            content['substatus'] = panda_status
-                            update_contents_full.append(content)
-                            update_content = {'content_id': content['content_id'],
-                                              'request_id': content['request_id'],
-                                              'status': panda_status,
-                                              'substatus': panda_status}
-
-                            if 'panda_id' in content['content_metadata'] and content['content_metadata']['panda_id']:
-                                if str(content['content_metadata']['panda_id']) < str(panda_id):
-                                    # new panda id is the bigger one.
-                                    if 'old_panda_id' not in content['content_metadata']:
-                                        content['content_metadata']['old_panda_id'] = []
-                                    if content['content_metadata']['panda_id'] not in content['content_metadata']['old_panda_id']:
-                                        content['content_metadata']['old_panda_id'].append(content['content_metadata']['panda_id'])
-                                    content['content_metadata']['panda_id'] = str(panda_id)
-                                    update_content['content_metadata'] = content['content_metadata']
-                                elif str(content['content_metadata']['panda_id']) > str(panda_id):
-                                    if 'old_panda_id' not in content['content_metadata']:
-                                        content['content_metadata']['old_panda_id'] = []
-                                    if panda_id not in content['content_metadata']['old_panda_id']:
-                                        content['content_metadata']['old_panda_id'].append(panda_id)
-                                    # content['content_metadata']['panda_id'] = content['content_metadata']['panda_id']
-                                    # content['substatus'] = panda_status
-                                    update_content['content_metadata'] = content['content_metadata']
-                                else:
-                                    pass
-                            else:
-                                content['content_metadata']['panda_id'] = str(panda_id)
-                                update_content['content_metadata'] = content['content_metadata']
+        updates = {'update_contents': [], 'update_contents_full': [], 'new_contents_ext': [], 'update_contents_ext': [],
+                   'job_info_items': {}}
 
-                            update_contents.append(update_content)
-                            update_contents_dict[update_content['content_id']] = update_content
-
-                            if content['content_id'] not in contents_ext_dict:
-                                new_content_ext = {'content_id': content['content_id'],
-                                                   'request_id': content['request_id'],
-                                                   'transform_id': content['transform_id'],
-                                                   'workload_id': content['workload_id'],
-                                                   'coll_id': content['coll_id'],
-                                                   'map_id': content['map_id'],
-                                                   'status': panda_status}
-                                for job_info_item in job_info_maps:
-                                    new_content_ext[job_info_item] = getattr(job_info, job_info_maps[job_info_item])
-                                    if new_content_ext[job_info_item] == 'NULL':
-                                        new_content_ext[job_info_item] = None
-                                    if new_content_ext[job_info_item] is None:
-                                        del new_content_ext[job_info_item]
-                                new_contents_ext.append(new_content_ext)
-                                new_contents_ext_dict[new_content_ext['content_id']] = new_content_ext
-                            else:
-                                update_content_ext = {'content_id': content['content_id'],
-                                                      'request_id': content['request_id'],
-                                                      'status': panda_status}
-                                for job_info_item in job_info_maps:
-                                    update_content_ext[job_info_item] = getattr(job_info, job_info_maps[job_info_item])
-                                    if update_content_ext[job_info_item] == 'NULL':
-                                        update_content_ext[job_info_item] = None
-                                    if update_content_ext[job_info_item] is None:
-                                        del update_content_ext[job_info_item]
-                                update_contents_ext.append(update_content_ext)
-                elif panda_status in [ContentStatus.FinalSubAvailable, ContentStatus.FinalFailed]:
-                    # partly finished or all failed, needs to check the event status
-                    # output_contents = inputname_to_map_id_outputs[input_file]['outputs']
-                    map_id_outputs = inputname_to_map_id_outputs[input_file]
-                    for map_id_output in map_id_outputs:
-                        # map_id = map_id_output['map_id']
-                        output_contents = map_id_output['outputs']
-
-                        for content in output_contents:
-                            sub_map_id = content['sub_map_id']
-                            # min_id = content['min_id']  # min_id should be the same as sub_map_id here
-                            event, event_panda_job = self.get_event_job(sub_map_id, panda_jobs, job_set_events)
-                            self.logger.debug("sub_map_id: %s, panda_jobs: %s, job_set_events: %s, event: %s, event_panda_job: %s" % (sub_map_id, panda_jobs, job_set_events, event, event_panda_job))
-                            if event:
-                                event_status = event['status']
-                                # 'ready', 'sent', 'running', 'finished', 'cancelled', 'discarded', 'done', 'failed',
-                                # 'fatal', 'merged', 'corrupted', 'reserved_fail', 'reserved_get'
-                                if event_status in ['finished', 'done', 'merged']:
-                                    event_status = ContentStatus.Available
-                                    event_error_code = event['error_code']
-                                    event_error_diag = event['error_diag']
-                                    if event_panda_job:
-                                        panda_id = event_panda_job['panda_id']
-                                        job_info = event_panda_job['job_info']
-                                    else:
-                                        panda_ids = unterminated_jobs_status[input_file]['panda_id']
-                                        panda_id = ",".join([str(i) for i in panda_ids])
-                                        job_info = unterminated_jobs_status[input_file]['job_info']
-                                elif event_status in ['failed', 'fatal', 'cancelled', 'discarded', 'corrupted']:
-                                    event_status = ContentStatus.FinalFailed
-                                    event_error_code = event['error_code']
-                                    event_error_diag = event['error_diag']
-                                    if event_panda_job:
-                                        panda_id = event_panda_job['panda_id']
-                                        job_info = event_panda_job['job_info']
-                                    else:
-                                        panda_ids = unterminated_jobs_status[input_file]['panda_id']
-                                        panda_id = ",".join([str(i) for i in panda_ids])
-                                        job_info = unterminated_jobs_status[input_file]['job_info']
-                                else:
-                                    if panda_status in [ContentStatus.FinalSubAvailable]:
-                                        event_status = ContentStatus.FinalFailed
-                                    else:
-                                        event_status = panda_status
-                                    event_error_code = None
-                                    event_error_diag = None
-                                    panda_ids = unterminated_jobs_status[input_file]['panda_id']
-                                    panda_id = ",".join([str(i) for i in panda_ids])
-                                    job_info = unterminated_jobs_status[input_file]['job_info']
-                            else:
-                                if panda_status in [ContentStatus.FinalSubAvailable]:
-                                    event_status = ContentStatus.FinalFailed
-                                else:
-                                    event_status = panda_status
-                                event_error_code = None
-                                event_error_diag = None
+        for input_file in unterminated_jobs_status:
+            if 'status' not in unterminated_jobs_status[input_file]:
+                continue
+            if input_file not in inputname_to_map_id_outputs:
+                continue
 
-                                panda_ids = unterminated_jobs_status[input_file]['panda_id']
-                                panda_id = ",".join([str(i) for i in panda_ids])
-                                job_info = unterminated_jobs_status[input_file]['job_info']
+            panda_status = unterminated_jobs_status[input_file]['status']
+            panda_ids = unterminated_jobs_status[input_file]['panda_id']
+            panda_id = ",".join([str(i) for i in panda_ids])
+            job_info = unterminated_jobs_status[input_file]['job_info']
+            output_contents = [content for map_id_output in inputname_to_map_id_outputs[input_file] for content in map_id_output['outputs']]
 
-                            content['status'] = event_status
-                            content['substatus'] = event_status
-                            update_contents_full.append(content)
-                            update_content = {'content_id': content['content_id'],
-                                              'request_id': content['request_id'],
-                                              'status': panda_status,
-                                              'substatus': event_status}
-
-                            if 'panda_id' in content['content_metadata'] and content['content_metadata']['panda_id']:
-                                if str(content['content_metadata']['panda_id']) < str(panda_id):
-                                    # new panda id is the bigger one.
-                                    if 'old_panda_id' not in content['content_metadata']:
-                                        content['content_metadata']['old_panda_id'] = []
-                                    if content['content_metadata']['panda_id'] not in content['content_metadata']['old_panda_id']:
-                                        content['content_metadata']['old_panda_id'].append(content['content_metadata']['panda_id'])
-                                    content['content_metadata']['panda_id'] = str(panda_id)
-                                    update_content['content_metadata'] = content['content_metadata']
-                                elif str(content['content_metadata']['panda_id']) > str(panda_id):
-                                    if 'old_panda_id' not in content['content_metadata']:
-                                        content['content_metadata']['old_panda_id'] = []
-                                    if panda_id not in content['content_metadata']['old_panda_id']:
-                                        content['content_metadata']['old_panda_id'].append(panda_id)
-                                    # content['content_metadata']['panda_id'] = content['content_metadata']['panda_id']
-                                    # content['substatus'] = panda_status
-                                    update_content['content_metadata'] = content['content_metadata']
-                                else:
-                                    pass
-                            else:
-                                content['content_metadata']['panda_id'] = str(panda_id)
-                                update_content['content_metadata'] = content['content_metadata']
+            if not self.es:
+                with_ext = panda_status in [ContentStatus.Available, ContentStatus.Failed, ContentStatus.FinalFailed,
+                                            ContentStatus.Lost, ContentStatus.Deleted, ContentStatus.Missing]
+                for content in output_contents:
+                    self.add_content_update(updates, content, panda_status, panda_status, panda_id, job_info, job_info_maps,
+                                            contents_ext_dict, with_ext=with_ext)
+            elif panda_status in [ContentStatus.Available, ContentStatus.Lost, ContentStatus.Deleted, ContentStatus.Missing]:
+                for content in output_contents:
+                    self.add_content_update(updates, content, panda_status, panda_status, panda_id, job_info, job_info_maps,
+                                            contents_ext_dict)
+            elif panda_status in [ContentStatus.FinalSubAvailable, ContentStatus.FinalFailed]:
+                # partly finished or all failed, needs to check the event status
+                panda_jobs = unterminated_jobs_status[input_file]['jobs']
+                job_set_events = unterminated_jobs_status[input_file]['job_set_events']
+                events_index = self.get_events_index(panda_jobs, job_set_events)
+                for content in output_contents:
+                    # min_id = content['min_id']  # min_id should be the same as sub_map_id here
+                    event, event_panda_job = self.get_event_job(content['sub_map_id'], panda_jobs, job_set_events, events_index=events_index)
+                    event_status = event['status'] if event else None
+                    content_panda_id, content_job_info = panda_id, job_info
+                    event_error_code, event_error_diag = None, None
+                    # 'ready', 'sent', 'running', 'finished', 'cancelled', 'discarded', 'done', 'failed',
+                    # 'fatal', 'merged', 'corrupted', 'reserved_fail', 'reserved_get'
+                    if event_status in ['finished', 'done', 'merged', 'failed', 'fatal', 'cancelled', 'discarded', 'corrupted']:
+                        if event_status in ['finished', 'done', 'merged']:
+                            content_status = ContentStatus.Available
+                        else:
+                            content_status = ContentStatus.FinalFailed
+                        event_error_code = event['error_code']
+                        event_error_diag = event['error_diag']
+                        if event_panda_job:
+                            content_panda_id = event_panda_job['panda_id']
+                            content_job_info = event_panda_job['job_info']
+                    elif panda_status in [ContentStatus.FinalSubAvailable]:
+                        content_status = ContentStatus.FinalFailed
+                    else:
+                        content_status = panda_status
+                    self.add_content_update(updates, content, panda_status, content_status, content_panda_id, content_job_info,
+                                            job_info_maps, contents_ext_dict, error_code=event_error_code, error_diag=event_error_diag)
 
-                            update_contents.append(update_content)
-                            update_contents_dict[update_content['content_id']] = update_content
-
-                            if content['content_id'] not in contents_ext_dict:
-                                new_content_ext = {'content_id': content['content_id'],
-                                                   'request_id': content['request_id'],
-                                                   'transform_id': content['transform_id'],
-                                                   'workload_id': content['workload_id'],
-                                                   'coll_id': content['coll_id'],
-                                                   'map_id': content['map_id'],
-                                                   'status': event_status}
-                                for job_info_item in job_info_maps:
-                                    new_content_ext[job_info_item] = getattr(job_info, job_info_maps[job_info_item])
-                                    if new_content_ext[job_info_item] == 'NULL':
-                                        new_content_ext[job_info_item] = None
-                                    if new_content_ext[job_info_item] is None:
-                                        del new_content_ext[job_info_item]
-                                if event_error_code is not None:
-                                    new_content_ext['trans_exit_code'] = event_error_code
-                                    new_content_ext['exe_error_code'] = event_error_code
-                                if event_error_diag is not None:
-                                    new_content_ext['exe_error_diag'] = event_error_diag
-                                new_contents_ext.append(new_content_ext)
-                                new_contents_ext_dict[new_content_ext['content_id']] = new_content_ext
-                            else:
-                                update_content_ext = {'content_id': content['content_id'],
-                                                      'request_id': content['request_id'],
-                                                      'status': event_status}
-                                for job_info_item in job_info_maps:
-                                    update_content_ext[job_info_item] = getattr(job_info, job_info_maps[job_info_item])
-                                    if update_content_ext[job_info_item] == 'NULL':
-                                        update_content_ext[job_info_item] = None
-                                    if update_content_ext[job_info_item] is None:
-                                        del update_content_ext[job_info_item]
-                                if event_error_code is not None:
-                                    update_content_ext['trans_exit_code'] = event_error_code
-                                    update_content_ext['exe_error_code'] = event_error_code
-                                if event_error_diag is not None:
-                                    update_content_ext['exe_error_diag'] = event_error_diag
-                                update_contents_ext.append(update_content_ext)
+        update_contents, update_contents_full = updates['update_contents'], updates['update_contents_full']
+        new_contents_ext, update_contents_ext = updates['new_contents_ext'], updates['update_contents_ext']
 
         if abort or terminated_status:
+            update_contents_ids = set([content['content_id'] for content in update_contents])
+            new_contents_ext_ids = set([content['content_id'] for content in new_contents_ext])
             for map_id in input_output_maps:
                 outputs = input_output_maps[map_id]['outputs']
                 for content in outputs:
                     if content['substatus'] not in [ContentStatus.Available, ContentStatus.Failed, ContentStatus.FinalFailed,
                                                     ContentStatus.Lost, ContentStatus.Deleted, ContentStatus.Missing]:
-                        if content['content_id'] not in update_contents_dict:
+                        if content['content_id'] not in update_contents_ids:
                             update_content = {'content_id': content['content_id'],
                                               'request_id': content['request_id'],
                                               'status': ContentStatus.Missing,
                                               'substatus': ContentStatus.Missing}
                             update_contents.append(update_content)
-                        if content['content_id'] not in contents_ext_dict and content['content_id'] not in new_contents_ext_dict:
+                        if content['content_id'] not in contents_ext_dict and content['content_id'] not in new_contents_ext_ids:
                             new_content_ext = {'content_id': content['content_id'],
                                                'request_id': content['request_id'],
                                                'transform_id': content['transform_id'],
@@ -2018,6 +1934,42 @@ class DomaPanDAWork(Work):
 
         return update_contents, update_contents_full, new_contents_ext, update_contents_ext
 
+    def get_panda_task_fingerprint(self, task_info, input_output_maps, unterminated_jobs):
+        """
+        Fingerprint of the PanDA task and of the local contents. If it's not changed, polling
+        the jobs of the task will not find new updates.
+
+        :param task_info: task details from Client.getJediTaskDetails.
+        :param unterminated_jobs: PanDA ids of the jobs which are not terminated in the local contents.
+        """
+        all_jobs_ids = task_info.get('PandaID', None) or []
+        items = [task_info.get('status', None),
+                 str(task_info.get('modificationTime', None)),
+                 str(task_info.get('statistics', None)),
+                 len(all_jobs_ids),
+                 max(all_jobs_ids) if all_jobs_ids else None,
+                 len(input_output_maps) if input_output_maps else 0,
+                 len(unterminated_jobs)]
+        return hashlib.md5(json.dumps(items).encode('utf-8')).hexdigest()
+
+    def is_panda_task_unchanged(self, proc, processing_status, task_fingerprint):
+        """
+        Whether the task is not changed since the last poll of its jobs.
+        The jobs of terminated tasks and of tasks not polled for task_fingerprint_max_age are always polled.
+        """
+        max_age = getattr(self, 'task_fingerprint_max_age', 0)
+        if not max_age or processing_status not in [ProcessingStatus.Submitting, ProcessingStatus.Submitted, ProcessingStatus.Running]:
+            return False
+        last_fingerprint = proc.task_fingerprint
+        if not last_fingerprint or last_fingerprint.get('fingerprint', None) != task_fingerprint:
+            return False
+        polled_at = last_fingerprint.get('polled_at', None)
+        if polled_at and type(polled_at) in [str]:
+            polled_at = str_to_date(polled_at)
+        if not polled_at or (datetime.datetime.utcnow() - polled_at).total_seconds() > max_age:
+            return False
+        return True
+
     def poll_panda_task(self, processing=None, input_output_maps=None, contents_ext=None, job_info_maps={}, executors=None, log_prefix=''):
         task_id = None
         try:
@@ -2059,6 +2011,12 @@ class DomaPanDAWork(Work):
                     unterminated_jobs = self.get_unterminated_jobs(all_jobs_ids, input_output_maps, contents_ext)
                     self.logger.debug(log_prefix + "poll_panda_task, task_id: %s, all jobs: %s, unterminated_jobs: %s" % (str(task_id), len(all_jobs_ids), len(unterminated_jobs)))
 
+                    proc = processing['processing_metadata']['processing']
+                    task_fingerprint = self.get_panda_task_fingerprint(task_info, input_output_maps, unterminated_jobs)
+                    if self.is_panda_task_unchanged(proc, processing_status, task_fingerprint):
+                        self.logger.info(log_prefix + "poll_panda_task, task_id: %s, task is not changed since the last poll, skip polling jobs" % str(task_id))
+                        return processing_status, [], [], [], []
+
                     unterminated_jobs_status = self.poll_panda_jobs(unterminated_jobs, executors=executors, log_prefix=log_prefix)
                     # self.logger.debug(log_prefix + "unterminated_jobs_status: %s" % str(unterminated_jobs_status))
                     self.logger.debug(log_prefix + f"unterminated_jobs_status[:3]: {dict(list(unterminated_jobs_status.items())[:3])}")
@@ -2073,6 +2031,7 @@ class DomaPanDAWork(Work):
                                                             abort=abort_status, terminated_status=terminated_status, log_prefix=log_prefix)
                     updated_contents, update_contents_full, new_contents_ext, update_contents_ext = ret_contents
 
+                    proc.task_fingerprint = {'fingerprint': task_fingerprint, 'polled_at': datetime.datetime.utcnow()}
                     return processing_status, updated_contents, update_contents_full, new_contents_ext, update_contents_ext
                 else:
                     self.logger.error("poll_panda_task, task_id (%s) cannot be found" % task_id)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+"""
+Index of the event service files of a work.
+
+Every event service file is a continuous range of order ids of one group. The index keeps, per
+event service file, the first order id, the number of events and whether any of its jobs has
+dependencies, in three arrays. The map_id of an event service file is its position in the arrays
+and the sub_map_id of a job is its order id minus the first order id of its file.
+"""
+
+import bisect
+from array import array
+
+
+class ESFilesIndex(object):
+    def __init__(self, es_label=None, starts=None, counts=None, has_dependencies=None):
+        self.es_label = es_label
+        self.starts = array('q', starts or [])
+        self.counts = array('q', counts or [])
+        self.has_dependencies = array('b', has_dependencies or [])
+        self._sorted_starts = None
+        self._sorted_map_ids = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def to_dict(self):
+        return {'es_label': self.es_label,
+                'starts': self.starts.tolist(),
+                'counts': self.counts.tolist(),
+                'has_dependencies': self.has_dependencies.tolist()}
+
+    @staticmethod
+    def from_dict(data):
+        return ESFilesIndex(es_label=data['es_label'], starts=data['starts'], counts=data['counts'],
+                            has_dependencies=data['has_dependencies'])
+
+    @staticmethod
+    def from_es_files(es_label, es_files):
+        """
+        Convert the es_files of the works built before the index.
+
+        :param es_files: {es_name: {'has_dependencies': , 'map_id': , 'order_ids': []}}
+        """
+        index = ESFilesIndex(es_label=es_label)
+        for es_name in sorted(es_files, key=lambda name: es_files[name]['map_id']):
+            es_file = es_files[es_name]
+            index.append(es_file['order_ids'][0], len(es_file['order_ids']), es_file['has_dependencies'])
+        return index
+
+    @staticmethod
+    def build(jobs, es_label, max_events_per_job):
+        """
+        Build the index from the jobs of the dependency map.
+        Only the order ids are kept in memory while building the index, in arrays per group.
+
+        :param jobs: iterator of the jobs.
+        :returns: the index, or None if the order ids are not set or duplicated.
+        """
+        group_order_ids, group_dependency_order_ids = {}, {}
+        for job in jobs:
+            order_id = job.get("order_id", None)
+            if order_id is None:
+                return None
+            groups = job.get("groups", "es_default")
+            if groups not in group_order_ids:
+                group_order_ids[groups] = array('q')
+                group_dependency_order_ids[groups] = array('q')
+            group_order_ids[groups].append(int(order_id))
+            if job["dependencies"]:
+                group_dependency_order_ids[groups].append(int(order_id))
+
+        all_order_ids = array('q')
+        for groups in group_order_ids:
+            group_order_ids[groups] = array('q', sorted(group_order_ids[groups]))
+            group_dependency_order_ids[groups] = array('q', sorted(group_dependency_order_ids[groups]))
+            all_order_ids.extend(group_order_ids[groups])
+        all_order_ids = sorted(all_order_ids)
+        for i in range(1, len(all_order_ids)):
+            if all_order_ids[i] == all_order_ids[i - 1]:
+                return None
+        del all_order_ids
+
+        index = ESFilesIndex(es_label=es_label)
+        for groups in group_order_ids:
+            order_ids = group_order_ids[groups]
+            dependency_order_ids = group_dependency_order_ids[groups]
+            pos = 0
+            while pos < len(order_ids):
+                # a continuous range of order ids with at most max_events_per_job events
+                end = pos + 1
+                while end < len(order_ids) and end - pos < max_events_per_job and order_ids[end] == order_ids[end - 1] + 1:
+                    end += 1
+                start, count = order_ids[pos], end - pos
+                dep_pos = bisect.bisect_left(dependency_order_ids, start)
+                has_dependencies = dep_pos < len(dependency_order_ids) and dependency_order_ids[dep_pos] < start + count
+                index.append(start, count, has_dependencies)
+                pos = end
+        return index
+
+    def append(self, start, count, has_dependencies):
+        self.starts.append(start)
+        self.counts.append(count)
+        self.has_dependencies.append(1 if has_dependencies else 0)
+        self._sorted_starts = None
+
+    def get_es_name(self, map_id):
+        return "%s:eventservice_%s^%s" % (self.es_label, self.starts[map_id], self.counts[map_id])
+
+    def get_order_ids(self, map_id):
+        return range(self.starts[map_id], self.starts[map_id] + self.counts[map_id])
+
+    def has_any_dependencies(self):
+        return any(self.has_dependencies)
+
+    def iter_es_files(self, map_ids=None):
+        """
+        Iterate the event service files.
+
+        :param map_ids: map ids of the files, None for all files.
+        :returns: iterator of (map_id, es_name, order_ids, has_dependencies).
+        """
+        if map_ids is None:
+            map_ids = range(len(self))
+        for map_id in map_ids:
+            yield map_id, self.get_es_name(map_id), self.get_order_ids(map_id), bool(self.has_dependencies[map_id])
+
+    def lookup(self, order_id):
+        """
+        :returns: (map_id, sub_map_id) of an order id, or (None, None) if it's not in any file.
+        """
+        if self._sorted_starts is None:
+            self._sorted_map_ids = sorted(range(len(self)), key=lambda map_id: self.starts[map_id])
+            self._sorted_starts = array('q', [self.starts[map_id] for map_id in self._sorted_map_ids])
+        pos = bisect.bisect_right(self._sorted_starts, order_id) - 1
+        if pos >= 0:
+            map_id = self._sorted_map_ids[pos]
+            if order_id < self.starts[map_id] + self.counts[map_id]:
+                return map_id, order_id - self.starts[map_id]
+        return None, None
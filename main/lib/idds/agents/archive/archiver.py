@@ -8,13 +8,18 @@
 # Authors:
 # - Wen Guan, <wen.guan@cern.ch>, 2019 - 2023
 
+import time
 import traceback
 
 from idds.common.constants import Sections, RequestStatus
 from idds.common.utils import setup_logging
 from idds.core import (requests as core_requests,
-                       messages as core_messages)
+                       messages as core_messages,
+                       archives as core_archives,
+                       meta as core_meta)
+from idds.orm.base.partitions import PARTITION_BY_REQUEST_ID, PARTITIONED_TABLES
 from idds.agents.common.baseagent import BaseAgent
+from idds.agents.archive.exporter import ArchiveExporter
 
 
 setup_logging(__name__)
@@ -25,7 +30,11 @@ class Archiver(BaseAgent):
     Archiver works to archive data
     """
 
-    def __init__(self, num_threads=1, poll_period=7, older_than=30, **kwargs):
+    def __init__(self, num_threads=1, poll_period=7, older_than=30, archive_mode=None,
+                 archive_dir=None, archive_file_format='jsonl', archive_poll_period=3600,
+                 archive_batch_size=1000, archive_max_rows_per_second=2000,
+                 archive_max_time_per_round=3600, archive_delete_only_tables='contents_update',
+                 archive_partition_action='drop', partition_poll_period=3600, **kwargs):
         self.set_max_workers()
         num_threads = self.max_number_workers
         super(Archiver, self).__init__(num_threads=num_threads, name='Archive', **kwargs)
@@ -37,6 +46,28 @@ class Archiver(BaseAgent):
         self.older_than = int(older_than)      # days
         self.config_section = Sections.Archiver
 
+        # archive_mode: None (only clean messages), 'table' (move rows to <table>_archive) or 'file'
+        self.archive_mode = archive_mode
+        self.archive_dir = archive_dir
+        self.archive_file_format = archive_file_format
+        self.archive_poll_period = int(archive_poll_period)
+        self.archive_batch_size = int(archive_batch_size)
+        self.archive_max_rows_per_second = int(archive_max_rows_per_second)
+        self.archive_max_time_per_round = int(archive_max_time_per_round)
+        if isinstance(archive_delete_only_tables, str):
+            archive_delete_only_tables = [t.strip() for t in archive_delete_only_tables.split(',') if t.strip()]
+        self.archive_delete_only_tables = archive_delete_only_tables or []
+        # the archived partitions of the partitioned tables are dropped or detached (kept as tables)
+        self.archive_partition_action = archive_partition_action
+        self.partition_poll_period = int(partition_poll_period)
+
+        self.archive_marker_name = 'archiver_marker'
+        self.archive_exporter = None
+        self.archive_future = None
+        self.archive_status = [RequestStatus.Finished, RequestStatus.SubFinished,
+                               RequestStatus.Failed, RequestStatus.Cancelled,
+                               RequestStatus.Suspended, RequestStatus.Expired]
+
     def clean_messages(self):
         try:
             status = [RequestStatus.Finished, RequestStatus.SubFinished,
@@ -50,6 +81,209 @@ class Archiver(BaseAgent):
             self.logger.error(ex)
             self.logger.error(traceback.format_exc())
 
+    def get_archive_marker(self):
+        """
+        The resume marker is the last request_id which is completely archived.
+        """
+        item = core_meta.get_meta_item(name=self.archive_marker_name)
+        if item and item['meta_info']:
+            return item['meta_info'].get('last_request_id', None)
+        return None
+
+    def set_archive_marker(self, last_request_id, num_rows=0):
+        meta_info = {'last_request_id': last_request_id, 'num_rows': num_rows,
+                     'updated_at': time.time()}
+        core_meta.add_meta_item(name=self.archive_marker_name, meta_info=meta_info,
+                                description='archiver resume marker')
+
+    def check_archive_tables(self):
+        missing = []
+        for table_name in core_archives.ARCHIVE_TABLES:
+            if table_name in self.archive_delete_only_tables:
+                continue
+            if not core_archives.has_archive_table(table_name):
+                missing.append(table_name)
+        if missing:
+            self.logger.error("archive tables are missing for %s, archiving is disabled" % str(missing))
+            return False
+        return True
+
+    def throttle(self, num_rows, start_time, total_rows):
+        """
+        Rate limit the archiving so that it doesn't compete with the foreground agents.
+        """
+        if self.archive_max_rows_per_second <= 0 or not num_rows:
+            return
+        expected_time = total_rows * 1.0 / self.archive_max_rows_per_second
+        time_used = time.time() - start_time
+        if expected_time > time_used:
+            self.graceful_stop.wait(expected_time - time_used)
+
+    def is_archive_round_timeout(self, start_time):
+        return self.graceful_stop.is_set() or time.time() - start_time > self.archive_max_time_per_round
+
+    def archive_table_rows(self, table_name, request_id, start_time, total_rows):
+        """
+        Archive rows of one table for a request, in bounded batches.
+        Every batch is committed by itself, so the work is not lost when it's interrupted.
+        The rows are deleted after archiving, so a restart continues with the remaining rows.
+
+        :returns: (number of archived rows, whether the table is completely archived)
+        """
+        to_file = self.archive_mode == 'file'
+        to_archive_table = self.archive_mode == 'table' and table_name not in self.archive_delete_only_tables
+        num_rows = 0
+
+        pk_name = core_archives.get_primary_key(table_name)
+        if pk_name is None:
+            rows = None
+            if to_file:
+                rows = core_archives.get_request_rows(table_name, request_id)
+                self.archive_exporter.export(table_name, request_id, rows)
+            num_rows += core_archives.archive_request_rows(table_name, request_id, to_archive_table=to_archive_table)
+            self.throttle(num_rows, start_time, total_rows + num_rows)
+            return num_rows, True
+
+        while True:
+            if self.is_archive_round_timeout(start_time):
+                return num_rows, False
+
+            pks, rows = core_archives.get_archive_batch(table_name, request_id, batch_size=self.archive_batch_size,
+                                                        with_rows=to_file)
+            if not pks:
+                return num_rows, True
+
+            if to_file:
+                self.archive_exporter.export(table_name, request_id, rows, first_id=pks[0], last_id=pks[-1])
+            num_rows += core_archives.archive_batch(table_name, pks, to_archive_table=to_archive_table)
+            self.throttle(len(pks), start_time, total_rows + num_rows)
+
+    def export_partition(self, table_name, index, start_time, total_rows):
+        """
+        Export the rows of a partition to files, in bounded batches per request.
+
+        :returns: (number of exported rows, whether the partition is completely exported)
+        """
+        num_rows = 0
+        for request_id in core_archives.get_partition_request_ids(table_name, index):
+            last_id = None
+            while True:
+                if self.is_archive_round_timeout(start_time):
+                    return num_rows, False
+                pks, rows = core_archives.get_archive_batch(table_name, request_id, batch_size=self.archive_batch_size,
+                                                            with_rows=True, after_id=last_id)
+                if not pks:
+                    break
+                self.archive_exporter.export(table_name, request_id, rows, first_id=pks[0], last_id=pks[-1])
+                last_id = pks[-1]
+                num_rows += len(pks)
+                self.throttle(len(pks), start_time, total_rows + num_rows)
+        return num_rows, True
+
+    def archive_partitions(self, start_time, total_rows=0):
+        """
+        Archive the partitions whose requests can all be archived, by dropping or detaching the partitions
+        instead of deleting the rows one by one. It's a fast path of the per request archiving, which
+        archives the rows of the requests in the other partitions.
+
+        :returns: number of archived rows.
+        """
+        num_rows = 0
+        detach = self.archive_partition_action == 'detach'
+        for table_name in core_archives.ARCHIVE_TABLES:
+            if table_name not in PARTITIONED_TABLES:
+                continue
+            to_archive_table = self.archive_mode == 'table' and table_name not in self.archive_delete_only_tables
+            indexes = core_archives.get_archivable_partitions(table_name, status=self.archive_status, older_than=self.older_than)
+            for index in indexes:
+                if self.is_archive_round_timeout(start_time):
+                    return num_rows
+                if self.archive_mode == 'file':
+                    ret_rows, finished = self.export_partition(table_name, index, start_time, total_rows + num_rows)
+                    num_rows += ret_rows
+                    if not finished:
+                        return num_rows
+                core_archives.archive_partition(table_name, index, to_archive_table=to_archive_table, detach=detach)
+                self.logger.info("archived partition %s of %s (%s action)" % (index, table_name, self.archive_partition_action))
+        return num_rows
+
+    def archive_request(self, request_id, start_time, total_rows=0):
+        """
+        :returns: (number of archived rows, whether the request is completely archived)
+        """
+        num_rows = 0
+        for table_name in core_archives.ARCHIVE_TABLES:
+            ret_rows, finished = self.archive_table_rows(table_name, request_id, start_time, total_rows + num_rows)
+            num_rows += ret_rows
+            if not finished:
+                return num_rows, False
+        return num_rows, True
+
+    def archive_requests_round(self):
+        try:
+            start_time = time.time()
+            if self.archive_mode == 'table' and not self.check_archive_tables():
+                return
+            if self.archive_mode == 'file' and self.archive_exporter is None:
+                self.archive_exporter = ArchiveExporter(archive_dir=self.archive_dir,
+                                                        file_format=self.archive_file_format,
+                                                        logger=self.logger)
+
+            last_request_id = self.get_archive_marker()
+            self.logger.info("archiving requests older than %s days after request_id %s" % (self.older_than, last_request_id))
+
+            total_rows = 0
+            if PARTITION_BY_REQUEST_ID:
+                total_rows = self.archive_partitions(start_time)
+
+            while not self.is_archive_round_timeout(start_time):
+                request_ids = core_archives.get_requests_to_archive(status=self.archive_status,
+                                                                    older_than=self.older_than,
+                                                                    min_request_id=last_request_id,
+                                                                    bulk_size=100)
+                if not request_ids:
+                    # all archived. Next round starts from the beginning again,
+                    # to catch requests which were terminated after the marker passed them.
+                    self.set_archive_marker(None, total_rows)
+                    break
+
+                for request_id in request_ids:
+                    num_rows, finished = self.archive_request(request_id, start_time, total_rows)
+                    total_rows += num_rows
+                    if not finished:
+                        break
+                    self.logger.info("archived request %s (%s rows)" % (request_id, num_rows))
+                    last_request_id = request_id
+                    self.set_archive_marker(last_request_id, total_rows)
+
+            self.logger.info("archived %s rows in %s seconds, marker: %s" % (total_rows, time.time() - start_time, last_request_id))
+        except Exception as ex:
+            self.logger.error(ex)
+            self.logger.error(traceback.format_exc())
+
+    def create_partitions(self):
+        """
+        Create the partitions ahead of the new requests.
+        """
+        try:
+            ret = core_archives.create_partitions()
+            for table_name in ret:
+                if ret[table_name]:
+                    self.logger.info("created partitions %s of %s" % (ret[table_name], table_name))
+        except Exception as ex:
+            self.logger.error(ex)
+            self.logger.error(traceback.format_exc())
+
+    def archive_requests(self):
+        """
+        Start an archive round in the worker pool, if the previous one has finished.
+        The timer thread is not blocked by the long running archiving.
+        """
+        if self.archive_future is not None and not self.archive_future.done():
+            self.logger.info("previous archive round is still running")
+            return
+        self.archive_future = self.submit(self.archive_requests_round)
+
     def run(self):
         """
         Main run function.
@@ -67,6 +301,17 @@ class Archiver(BaseAgent):
                                     task_args=tuple(), task_kwargs={}, delay_time=self.poll_period, priority=1)
             self.add_task(task)
 
+            if PARTITION_BY_REQUEST_ID:
+                task = self.create_task(task_func=self.create_partitions, task_output_queue=None,
+                                        task_args=tuple(), task_kwargs={}, delay_time=self.partition_poll_period, priority=1)
+                self.add_task(task)
+
+            if self.archive_mode:
+                self.logger.info("archive mode: %s, archive poll period: %s seconds" % (self.archive_mode, self.archive_poll_period))
+                task = self.create_task(task_func=self.archive_requests, task_output_queue=None,
+                                        task_args=tuple(), task_kwargs={}, delay_time=self.archive_poll_period, priority=1)
+                self.add_task(task)
+
             self.execute()
         except KeyboardInterrupt:
             self.stop()
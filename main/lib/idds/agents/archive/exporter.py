@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+import datetime
+import gzip
+import json
+import os
+
+from enum import Enum
+
+from idds.common import exceptions
+from idds.common.utils import json_dumps
+
+
+class ArchiveExporter(object):
+    """
+    Export archived rows to compressed files, one file per (table, request, batch).
+
+    Files are named by the first and last primary key of the batch, so exporting
+    the same batch again (e.g. after a crash before the rows were deleted) overwrites
+    the same file instead of duplicating the rows.
+
+    Supported formats:
+        jsonl: gzip compressed JSON lines.
+        parquet: parquet with gzip compression (requires pyarrow).
+    """
+
+    def __init__(self, archive_dir, file_format='jsonl', logger=None):
+        if not archive_dir:
+            raise exceptions.AgentException("archive_dir is required to export archived rows to files")
+        if file_format not in ['jsonl', 'parquet']:
+            raise exceptions.AgentException("Archive file format %s is not supported" % file_format)
+        if file_format == 'parquet':
+            try:
+                import pyarrow            # noqa F401
+            except ImportError:
+                raise exceptions.AgentException("pyarrow is required to export archived rows to parquet files")
+
+        self.archive_dir = archive_dir
+        self.file_format = file_format
+        self.logger = logger
+
+    def get_file_path(self, table_name, request_id, first_id, last_id):
+        request_dir = os.path.join(self.archive_dir, table_name, str(request_id // 10000), str(request_id))
+        if not os.path.exists(request_dir):
+            os.makedirs(request_dir, exist_ok=True)
+        if self.file_format == 'parquet':
+            suffix = 'parquet'
+        else:
+            suffix = 'jsonl.gz'
+        filename = '%s_%s_%s_%s.%s' % (table_name, request_id, first_id, last_id, suffix)
+        return os.path.join(request_dir, filename)
+
+    def convert_value(self, value):
+        if isinstance(value, Enum):
+            return value.value
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if self.file_format == 'parquet' and isinstance(value, (dict, list)):
+            return json_dumps(value)
+        return value
+
+    def convert_row(self, row):
+        return {k: self.convert_value(v) for k, v in row.items()}
+
+    def write_jsonl(self, path, rows):
+        with gzip.open(path, 'wt') as f:
+            for row in rows:
+                f.write(json.dumps(self.convert_row(row), default=str))
+                f.write('\n')
+            f.flush()
+
+    def write_parquet(self, path, rows):
+        import pyarrow
+        import pyarrow.parquet
+
+        data = [self.convert_row(row) for row in rows]
+        table = pyarrow.Table.from_pylist(data)
+        pyarrow.parquet.write_table(table, path, compression='gzip')
+
+    def export(self, table_name, request_id, rows, first_id=None, last_id=None):
+        """
+        Export rows to a file. The file is written to a temporary name and renamed
+        when it's complete, so a partial file is never left with the final name.
+
+        :returns: path of the file.
+        """
+        if not rows:
+            return None
+        if first_id is None:
+            first_id = 0
+        if last_id is None:
+            last_id = len(rows)
+
+        path = self.get_file_path(table_name, request_id, first_id, last_id)
+        tmp_path = path + '.tmp'
+        if self.file_format == 'parquet':
+            self.write_parquet(tmp_path, rows)
+        else:
+            self.write_jsonl(tmp_path, rows)
+        os.replace(tmp_path, path)
+        return path
@@ -62,6 +62,12 @@ class Finisher(Poller):
         if hasattr(self, 'finisher_max_number_workers'):
             self.max_number_workers = int(self.finisher_max_number_workers)
 
+        # the collection statistics are updated incrementally, and recounted in this period
+        if hasattr(self, 'collection_stats_reconcile_period'):
+            self.collection_stats_reconcile_period = int(self.collection_stats_reconcile_period)
+        else:
+            self.collection_stats_reconcile_period = 600
+
         self.show_queue_size_time = None
 
     def show_queue_size(self):
@@ -88,7 +94,9 @@ class Finisher(Poller):
             processings = core_processings.get_processings_by_status(status=processing_status,
                                                                      locking=True, update_poll=True,
                                                                      min_request_id=BaseAgent.min_request_id,
-                                                                     bulk_size=self.retrieve_bulk_size)
+                                                                     bulk_size=self.retrieve_bulk_size,
+                                                                     shard=self.get_shard(),
+                                                                     scheduler=self.get_scheduler('get_finishing_processings'))
 
             # self.logger.debug("Main thread get %s [submitting + submitted + running] processings to process" % (len(processings)))
             if processings:
@@ -115,7 +123,9 @@ class Finisher(Poller):
         process terminated processing
         """
         try:
-            processing, update_collections, messages = sync_processing(processing, self.agent_attributes, logger=self.logger, log_prefix=log_prefix)
+            processing, update_collections, messages = sync_processing(processing, self.agent_attributes,
+                                                                       full_sync_period=self.collection_stats_reconcile_period,
+                                                                       logger=self.logger, log_prefix=log_prefix)
 
             update_processing = {'processing_id': processing['processing_id'],
                                  'parameters': {'status': processing['status'],
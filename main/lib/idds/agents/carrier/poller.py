@@ -26,7 +26,8 @@ from idds.agents.common.eventbus.event import (EventType,
                                                SyncProcessingEvent,
                                                TerminatedProcessingEvent)
 
-from .utils import handle_update_processing, is_process_terminated, is_process_finished
+from .utils import (handle_update_processing, is_process_terminated, is_process_finished,
+                    get_adaptive_poll_period)
 from .iutils import handle_update_iprocessing
 
 setup_logging(__name__)
@@ -89,6 +90,28 @@ class Poller(BaseAgent):
         else:
             self.max_update_poll_period = 3600 * 6
 
+        # adapt the update poll period of every processing to the number of changes found in every poll
+        if hasattr(self, 'adaptive_poll_period') and self.adaptive_poll_period:
+            self.adaptive_poll_period = str(self.adaptive_poll_period).lower() in ['true', '1', 'yes']
+        else:
+            self.adaptive_poll_period = False
+        if hasattr(self, 'min_update_poll_period') and self.min_update_poll_period:
+            self.min_update_poll_period = int(self.min_update_poll_period)
+        else:
+            self.min_update_poll_period = 10
+        if hasattr(self, 'max_adaptive_update_poll_period') and self.max_adaptive_update_poll_period:
+            self.max_adaptive_update_poll_period = int(self.max_adaptive_update_poll_period)
+        else:
+            self.max_adaptive_update_poll_period = 1800
+        if hasattr(self, 'active_poll_changes') and self.active_poll_changes:
+            self.active_poll_changes = int(self.active_poll_changes)
+        else:
+            self.active_poll_changes = 100
+        if hasattr(self, 'poll_period_decrease_rate') and self.poll_period_decrease_rate:
+            self.poll_period_decrease_rate = float(self.poll_period_decrease_rate)
+        else:
+            self.poll_period_decrease_rate = 2
+
         self.number_workers = 0
         if not hasattr(self, 'max_number_workers') or not self.max_number_workers:
             self.max_number_workers = 3
@@ -110,6 +133,9 @@ class Poller(BaseAgent):
         self.show_queue_size_time = None
 
         self.extra_executors = None
+        if self.enable_executors:
+            # declared before the database pool is created, to be included in the pool size
+            self.declare_db_concurrency(self.executor_name + "_Extra", self.num_threads)
 
         self._running_processing_status = None
 
@@ -176,7 +202,9 @@ class Poller(BaseAgent):
             processings = core_processings.get_processings_by_status(status=processing_status,
                                                                      locking=True, update_poll=True,
                                                                      min_request_id=BaseAgent.min_request_id,
-                                                                     bulk_size=self.get_bulk_size())
+                                                                     bulk_size=self.get_bulk_size(),
+                                                                     shard=self.get_shard(),
+                                                                     scheduler=self.get_scheduler('get_running_processings'))
 
             # self.logger.debug("Main thread get %s [submitting + submitted + running] processings to process" % (len(processings)))
             if processings:
@@ -222,7 +250,22 @@ class Poller(BaseAgent):
                 work_tag_attribute_value = int(getattr(self, work_tag_attribute))
         return work_tag_attribute_value
 
-    def load_poll_period(self, processing, parameters, new=False):
+    def get_adaptive_update_poll_period(self, processing, base_period, num_changes):
+        current_period = processing['update_poll_period']
+        if current_period is not None and isinstance(current_period, datetime.timedelta):
+            current_period = current_period.total_seconds()
+        return get_adaptive_poll_period(current_period, base_period, num_changes,
+                                        min_period=self.min_update_poll_period,
+                                        max_period=min(self.max_adaptive_update_poll_period, self.max_update_poll_period),
+                                        active_changes=self.active_poll_changes,
+                                        increase_rate=self.poll_period_increase_rate,
+                                        decrease_rate=self.poll_period_decrease_rate)
+
+    def load_poll_period(self, processing, parameters, new=False, num_changes=None):
+        """
+        :param num_changes: number of changes found in this poll. If adaptive_poll_period is enabled,
+                            the update poll period is adapted to it, starting from the configured one.
+        """
         if 'processing' in processing['processing_metadata']:
             proc = processing['processing_metadata']['processing']
             work = proc.work
@@ -245,7 +288,10 @@ class Poller(BaseAgent):
                 parameters['update_poll_period'] = self.update_poll_period_for_new_task
         else:
             work_tag_update_poll_period = self.get_work_tag_attribute(work_tag, "update_poll_period")
-            if work_tag_update_poll_period:
+            if self.adaptive_poll_period and num_changes is not None:
+                base_period = work_tag_update_poll_period if work_tag_update_poll_period else self.update_poll_period
+                parameters['update_poll_period'] = self.get_adaptive_update_poll_period(processing, base_period, num_changes)
+            elif work_tag_update_poll_period:
                 parameters['update_poll_period'] = work_tag_update_poll_period
             elif self.update_poll_period and processing['update_poll_period'] != self.update_poll_period:
                 parameters['update_poll_period'] = self.update_poll_period
@@ -352,6 +398,9 @@ class Poller(BaseAgent):
             process_status, new_contents, new_input_dependency_contents, ret_msgs, update_contents, parameters, new_contents_ext, update_contents_ext = ret_handle_update_processing
 
             coll_metadata = parameters.pop("coll_metadata", None)
+            num_changes = parameters.pop("num_changes", None)
+            if num_changes is not None and process_status != processing['substatus']:
+                num_changes += 1
 
             proc = processing['processing_metadata']['processing']
             work = proc.work
@@ -426,7 +475,8 @@ class Poller(BaseAgent):
             if coll_metadata and 'error' in coll_metadata:
                 update_processing['parameters']['errors'] = coll_metadata['error']
 
-            update_processing['parameters'] = self.load_poll_period(processing, update_processing['parameters'])
+            update_processing['parameters'] = self.load_poll_period(processing, update_processing['parameters'],
+                                                                    num_changes=num_changes)
 
             if proc.submitted_at:
                 if not processing['submitted_at'] or processing['submitted_at'] < proc.submitted_at:
@@ -450,7 +500,8 @@ class Poller(BaseAgent):
                    'messages': ret_msgs,
                    'new_contents_ext': new_contents_ext,
                    'update_contents_ext': update_contents_ext,
-                   'processing_status': new_process_status}
+                   'processing_status': new_process_status,
+                   'num_changes': num_changes}
 
         except exceptions.ProcessFormatNotSupported as ex:
             self.logger.error(ex)
@@ -648,6 +699,9 @@ class Poller(BaseAgent):
                     event_content = {}
                     if (('update_contents' in ret and ret['update_contents']) or ('new_contents' in ret and ret['new_contents'])):
                         event_content['has_updates'] = True
+                    if ret.get('num_changes', None):
+                        # the contents are updated in handle_update_processing, to prioritize the trigger
+                        event_content['has_updates'] = True
                     if is_process_terminated(pr['substatus']):
                         event_content['Terminated'] = True
                         event_content['is_terminating'] = True
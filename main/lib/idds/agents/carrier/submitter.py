@@ -64,7 +64,9 @@ class Submitter(Poller):
             processings = core_processings.get_processings_by_status(status=processing_status, locking=True,
                                                                      new_poll=True,
                                                                      min_request_id=BaseAgent.min_request_id,
-                                                                     bulk_size=self.get_bulk_size())
+                                                                     bulk_size=self.get_bulk_size(),
+                                                                     shard=self.get_shard(),
+                                                                     scheduler=self.get_scheduler('get_new_processings'))
 
             # self.logger.debug("Main thread get %s [new] processings to process" % len(processings))
             if processings:
@@ -102,7 +104,9 @@ class Submitter(Poller):
             processings = core_processings.get_processings_by_status(status=processing_status, locking=True,
                                                                      new_poll=True,
                                                                      min_request_id=BaseAgent.min_request_id,
-                                                                     bulk_size=self.get_bulk_size())
+                                                                     bulk_size=self.get_bulk_size(),
+                                                                     shard=self.get_shard(),
+                                                                     scheduler=self.get_scheduler('get_prepared_processings'))
 
             # self.logger.debug("Main thread get %s [new] processings to process" % len(processings))
             if processings:
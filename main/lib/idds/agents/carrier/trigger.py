@@ -76,7 +76,9 @@ class Trigger(Poller):
             processings = core_processings.get_processings_by_status(status=processing_status,
                                                                      locking=True, update_poll=True,
                                                                      min_request_id=BaseAgent.min_request_id,
-                                                                     bulk_size=self.retrieve_bulk_size)
+                                                                     bulk_size=self.retrieve_bulk_size,
+                                                                     shard=self.get_shard(),
+                                                                     scheduler=self.get_scheduler('get_trigger_processings'))
             if processings:
                 processing_ids = [pr['processing_id'] for pr in processings]
                 self.logger.info("Main thread get [ToTrigger, Triggering] processings to process: %s" % (str(processing_ids)))
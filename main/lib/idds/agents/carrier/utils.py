@@ -9,6 +9,8 @@
 # - Wen Guan, <wen.guan@cern.ch>, 2022 - 2025
 
 import concurrent.futures
+import datetime
+import hashlib
 import json
 import logging
 import time
@@ -25,11 +27,13 @@ from idds.common.constants import (CommandType,
                                    TransformType2MessageTypeMap,
                                    MessageType, MessageTypeStr,
                                    MessageStatus, MessageSource,
-                                   MessageDestination,
+                                   MessageDestination, Sections,
                                    get_work_status_from_transform_processing_status)
-from idds.common.utils import setup_logging, get_list_chunks
+from idds.common.config import config_has_option, config_get, config_get_bool
+from idds.common.utils import setup_logging, get_list_chunks, json_dumps
 from idds.core import (transforms as core_transforms,
                        processings as core_processings,
+                       messages as core_messages,
                        catalog as core_catalog)
 from idds.agents.common.cache.redis import get_redis_cache
 
@@ -199,7 +203,7 @@ def get_collection_ids(collections):
     return coll_ids
 
 
-def get_input_output_maps(transform_id, work, with_deps=True):
+def get_input_output_maps(transform_id, work, with_deps=True, request_id=None):
     # link collections
     input_collections = work.get_input_collections()
     output_collections = work.get_output_collections()
@@ -218,7 +222,8 @@ def get_input_output_maps(transform_id, work, with_deps=True):
                                                                                output_coll_ids=output_coll_ids,
                                                                                log_coll_ids=log_coll_ids,
                                                                                with_sub_map_id=work.with_sub_map_id(),
-                                                                               with_deps=with_deps)
+                                                                               with_deps=with_deps,
+                                                                               request_id=request_id)
 
     # work_name_to_coll_map = core_transforms.get_work_name_to_coll_map(request_id=transform['request_id'])
     # work.set_work_name_to_coll_map(work_name_to_coll_map)
@@ -227,8 +232,8 @@ def get_input_output_maps(transform_id, work, with_deps=True):
     return mapped_input_output_maps
 
 
-def get_ext_contents(transform_id, work):
-    contents_ids = core_catalog.get_contents_ext_ids(transform_id=transform_id)
+def get_ext_contents(transform_id, work, request_id=None):
+    contents_ids = core_catalog.get_contents_ext_ids(request_id=request_id, transform_id=transform_id)
     return contents_ids
 
 
@@ -249,6 +254,9 @@ def get_output_content_name_to_content_id_map(request_id=None, coll_ids=[]):
 
 def get_new_contents(request_id, transform_id, workload_id, new_input_output_maps, max_updates_per_round=2000,
                      input_dependency_coll_ids=[], logger=None, log_prefix=''):
+    """
+    Generate the new contents of the new input output maps, in chunks of about max_updates_per_round contents.
+    """
     logger = get_logger(logger)
 
     logger.debug(log_prefix + "get_new_contents")
@@ -260,7 +268,6 @@ def get_new_contents(request_id, transform_id, workload_id, new_input_output_map
     new_input_contents, new_output_contents, new_log_contents = [], [], []
     new_input_dependency_contents = []
     new_input_dep_coll_ids = []
-    chunks = []
     for map_id in new_input_output_maps:
         if "sub_maps" not in new_input_output_maps[map_id] or not new_input_output_maps[map_id]["sub_maps"]:
             inputs = new_input_output_maps[map_id]['inputs'] if 'inputs' in new_input_output_maps[map_id] else []
@@ -287,8 +294,7 @@ def get_new_contents(request_id, transform_id, workload_id, new_input_output_map
 
             total_num_updates = len(new_input_contents) + len(new_output_contents) + len(new_log_contents) + len(new_input_dependency_contents)
             if total_num_updates > max_updates_per_round:
-                chunk = new_input_contents, new_output_contents, new_log_contents, new_input_dependency_contents
-                chunks.append(chunk)
+                yield new_input_contents, new_output_contents, new_log_contents, new_input_dependency_contents
 
                 new_input_contents, new_output_contents, new_log_contents = [], [], []
                 new_input_dependency_contents = []
@@ -328,19 +334,14 @@ def get_new_contents(request_id, transform_id, workload_id, new_input_output_map
 
             total_num_updates = len(new_input_contents) + len(new_output_contents) + len(new_log_contents) + len(new_input_dependency_contents)
             if total_num_updates > max_updates_per_round:
-                chunk = new_input_contents, new_output_contents, new_log_contents, new_input_dependency_contents
-                chunks.append(chunk)
+                yield new_input_contents, new_output_contents, new_log_contents, new_input_dependency_contents
 
                 new_input_contents, new_output_contents, new_log_contents = [], [], []
                 new_input_dependency_contents = []
 
     total_num_updates = len(new_input_contents) + len(new_output_contents) + len(new_log_contents) + len(new_input_dependency_contents)
     if total_num_updates > 0:
-        chunk = new_input_contents, new_output_contents, new_log_contents, new_input_dependency_contents
-        chunks.append(chunk)
-
-    # return new_input_contents, new_output_contents, new_log_contents, new_input_dependency_contents
-    return chunks
+        yield new_input_contents, new_output_contents, new_log_contents, new_input_dependency_contents
 
 
 def get_update_content(content):
@@ -503,7 +504,112 @@ def generate_work_messages(request_id, transform_id, workload_id, work, relation
     return i_msg_type, msg_content, num_msg_content
 
 
-def generate_messages(request_id, transform_id, workload_id, work, msg_type='file', files=[], relation_type='input', input_output_maps=None):
+def get_message_compaction_config():
+    """
+    [carrier] message_compaction (default False), message_max_payload_size (bytes of the
+    files of one message, default 1000000), message_max_files (default 1000) and
+    message_dedup_window (seconds, default 3600).
+    """
+    compaction, max_payload_size, max_files, dedup_window = False, 1000000, 1000, 3600
+    if config_has_option(Sections.Carrier, 'message_compaction'):
+        compaction = config_get_bool(Sections.Carrier, 'message_compaction')
+    if config_has_option(Sections.Carrier, 'message_max_payload_size'):
+        max_payload_size = int(config_get(Sections.Carrier, 'message_max_payload_size'))
+    if config_has_option(Sections.Carrier, 'message_max_files'):
+        max_files = int(config_get(Sections.Carrier, 'message_max_files'))
+    if config_has_option(Sections.Carrier, 'message_dedup_window'):
+        dedup_window = int(config_get(Sections.Carrier, 'message_dedup_window'))
+    return compaction, max_payload_size, max_files, dedup_window
+
+
+def get_message_round_id(processing):
+    """
+    Id of the current round of a processing. The processing is updated at the end of every round,
+    so a retried round gets the same id and the next round gets a new one.
+    """
+    return '%s_%s' % (processing['processing_id'], processing.get('updated_at', None))
+
+
+def get_message_file_key(file):
+    if file.get('content_id', None) is not None:
+        return file['content_id']
+    return (file.get('scope', None), file.get('name', None), file.get('path', None))
+
+
+def get_message_batch_id(round_id, msg, files):
+    """
+    internal_id of a batch message, from the round and the files in it.
+    """
+    data = [round_id, str(msg['msg_type']), str(msg['destination']), msg['msg_content']['relation_type'],
+            sorted([str(get_message_file_key(f)) for f in files])]
+    return hashlib.sha1(json_dumps(data).encode('utf-8')).hexdigest()[:20]
+
+
+def compact_file_messages(msg, round_id=None, max_payload_size=1000000, max_files=1000):
+    """
+    Split a file message into batch messages with at most max_files files and max_payload_size
+    bytes of files. If a file appears several times, only its last update is kept.
+    If round_id is set, every batch gets an internal_id to recognize it when the round is retried.
+    """
+    files = {}
+    for file in msg['msg_content']['files']:
+        file_key = get_message_file_key(file)
+        # keep the last update of a file, at the position of its last update
+        files.pop(file_key, None)
+        files[file_key] = file
+
+    batches, batch, batch_size = [], [], 0
+    for file in files.values():
+        file_size = len(json_dumps(file)) + 2
+        if batch and (len(batch) >= max_files or batch_size + file_size > max_payload_size):
+            batches.append(batch)
+            batch, batch_size = [], 0
+        batch.append(file)
+        batch_size += file_size
+    if batch:
+        batches.append(batch)
+
+    msgs = []
+    for batch in batches:
+        new_msg = dict(msg)
+        new_msg['msg_content'] = dict(msg['msg_content'])
+        new_msg['msg_content']['files'] = batch
+        new_msg['num_contents'] = len(batch)
+        if round_id is not None:
+            new_msg['internal_id'] = get_message_batch_id(round_id, msg, batch)
+        msgs.append(new_msg)
+    return msgs
+
+
+def filter_stored_messages(msgs, transform_id, dedup_window=3600):
+    """
+    Drop the batch messages of a retried round which are already stored in dedup_window seconds.
+    """
+    msgs_with_id = [m for m in msgs if m.get('internal_id', None)]
+    if not msgs_with_id:
+        return msgs
+
+    created_after = datetime.datetime.utcnow() - datetime.timedelta(seconds=dedup_window)
+    existing_ids = core_messages.get_message_internal_ids([m['internal_id'] for m in msgs_with_id],
+                                                          transform_id=transform_id,
+                                                          created_after=created_after)
+    return [m for m in msgs if m.get('internal_id', None) not in existing_ids]
+
+
+def compact_messages(msg, round_id=None):
+    """
+    Compact a file message if [carrier] message_compaction is enabled.
+    """
+    compaction, max_payload_size, max_files, dedup_window = get_message_compaction_config()
+    if not compaction:
+        return [msg]
+
+    msgs = compact_file_messages(msg, round_id=round_id, max_payload_size=max_payload_size, max_files=max_files)
+    return filter_stored_messages(msgs, msg['transform_id'], dedup_window=dedup_window)
+
+
+def generate_messages(request_id, transform_id, workload_id, work, msg_type='file', files=[], relation_type='input', input_output_maps=None,
+                      round_id=None):
     if msg_type == 'file':
         i_msg_type, msg_content, num_msg_content = generate_file_messages(request_id, transform_id, workload_id, work, files=files, relation_type=relation_type)
         msg = {'msg_type': i_msg_type,
@@ -515,7 +621,7 @@ def generate_messages(request_id, transform_id, workload_id, work, msg_type='fil
                'transform_id': transform_id,
                'num_contents': num_msg_content,
                'msg_content': msg_content}
-        return [msg]
+        return compact_messages(msg, round_id=round_id)
     elif msg_type == 'content_ext':
         i_msg_type, msg_content, num_msg_content = generate_content_ext_messages(request_id, transform_id, workload_id, work, files=files,
                                                                                  relation_type=relation_type,
@@ -529,7 +635,7 @@ def generate_messages(request_id, transform_id, workload_id, work, msg_type='fil
                'transform_id': transform_id,
                'num_contents': num_msg_content,
                'msg_content': msg_content}
-        return [msg]
+        return compact_messages(msg, round_id=round_id)
     elif msg_type == 'collection':
         msg_type_contents = []
         for coll in files:
@@ -621,6 +727,20 @@ def wait_futures_finish(ret_futures, func_name, logger, log_prefix, timeout=180)
         raise ex
 
 
+def get_new_input_output_maps(processing, work, input_output_maps):
+    """
+    Get the new input output maps of a work. A work which maps its jobs in windows keeps
+    its position (map_cursor) in the processing metadata, to continue from it in the next round.
+    """
+    proc = processing['processing_metadata']['processing']
+    if hasattr(work, 'map_cursor'):
+        work.map_cursor = proc.map_cursor
+    new_input_output_maps = work.get_new_input_output_maps(input_output_maps)
+    if hasattr(work, 'map_cursor'):
+        proc.map_cursor = work.map_cursor
+    return new_input_output_maps
+
+
 def handle_new_processing(processing, agent_attributes, func_site_to_cloud=None, max_updates_per_round=2000, executors=None, logger=None, log_prefix=''):
     logger = get_logger(logger)
 
@@ -634,8 +754,8 @@ def handle_new_processing(processing, agent_attributes, func_site_to_cloud=None,
     new_input_dependency_contents = []
     update_collections = []
 
-    input_output_maps = get_input_output_maps(transform_id, work, with_deps=False)
-    new_input_output_maps = work.get_new_input_output_maps(input_output_maps)
+    input_output_maps = get_input_output_maps(transform_id, work, with_deps=False, request_id=processing['request_id'])
+    new_input_output_maps = get_new_input_output_maps(processing, work, input_output_maps)
     if hasattr(work, 'input_dependency_coll_ids'):
         input_dependency_coll_ids = work.input_dependency_coll_ids
     else:
@@ -648,7 +768,7 @@ def handle_new_processing(processing, agent_attributes, func_site_to_cloud=None,
                                                max_updates_per_round=max_updates_per_round,
                                                input_dependency_coll_ids=input_dependency_coll_ids,
                                                logger=logger, log_prefix=log_prefix)
-    if not ret_new_contents_chunks:
+    if not new_input_output_maps:
         logger.debug(log_prefix + "handle_new_processing: no new contnets")
 
     if executors is None:
@@ -673,7 +793,7 @@ def handle_new_processing(processing, agent_attributes, func_site_to_cloud=None,
                                                         # new_input_dependency_contents=new_input_dependency_contents,
                                                         messages=ret_msgs)
     else:
-        if ret_new_contents_chunks:
+        if new_input_output_maps:
             ret_futures = set()
             for ret_new_contents in ret_new_contents_chunks:
                 new_input_contents, new_output_contents, new_log_contents, new_input_dependency_contents = ret_new_contents
@@ -970,52 +1090,54 @@ def get_input_dependency_map_by_request(request_id, transform_id, workload_id, w
         content_output_name2id = {}
         content_input_deps = []
 
-        contents = core_catalog.get_contents_by_request_transform(request_id=request_id)
+        # streamed with only the needed columns, the contents of all transforms of the request can be large
+        contents = core_catalog.iter_contents_by_request_transform(request_id=request_id,
+                                                                   columns=['content_id', 'transform_id', 'coll_id', 'map_id',
+                                                                            'name', 'substatus', 'content_relation_type'])
         # logger.debug("contents: ", contents)
         for content in contents:
-            if content['transform_id'] not in request_dependcy_map:
-                request_dependcy_map.append(content['transform_id'])
-            if content['coll_id'] not in collection_dependcy_map:
-                collection_dependcy_map.append(content['coll_id'])
+            if content.transform_id not in request_dependcy_map:
+                request_dependcy_map.append(content.transform_id)
+            if content.coll_id not in collection_dependcy_map:
+                collection_dependcy_map.append(content.coll_id)
 
-            content_status_map[str(content['content_id'])] = content['substatus'].value
+            content_status_map[str(content.content_id)] = content.substatus.value
 
-            str_tf_id = str(content['transform_id'])
-            str_map_id = str(content['map_id'])
+            str_tf_id = str(content.transform_id)
+            str_map_id = str(content.map_id)
             if str_tf_id not in transform_dependcy_maps:
                 transform_dependcy_maps[str_tf_id] = get_transform_dependency_map(str_tf_id, logger=logger, log_prefix=log_prefix)
             if str_map_id not in transform_dependcy_maps[str_tf_id]:
                 transform_dependcy_maps[str_tf_id][str_map_id] = {'inputs': [], 'outputs': [], 'input_deps': []}
 
-            if content['content_relation_type'] == ContentRelationType.Output:
-                if content['coll_id'] not in content_output_name2id:
-                    content_output_name2id[content['coll_id']] = {}
-                    collection_dependcy_map.append(content['coll_id'])
-                content_output_name2id[content['coll_id']][content['name']] = content
+            if content.content_relation_type == ContentRelationType.Output:
+                if content.coll_id not in content_output_name2id:
+                    content_output_name2id[content.coll_id] = {}
+                    collection_dependcy_map.append(content.coll_id)
+                content_output_name2id[content.coll_id][content.name] = content.content_id
                 # content_id, status
-                transform_dependcy_maps[str_tf_id][str_map_id]['outputs'].append(content['content_id'])
-            elif content['content_relation_type'] == ContentRelationType.InputDependency:
-                content_input_deps.append(content)
+                transform_dependcy_maps[str_tf_id][str_map_id]['outputs'].append(content.content_id)
+            elif content.content_relation_type == ContentRelationType.InputDependency:
+                content_input_deps.append((content.content_id, content.transform_id, content.map_id, content.coll_id, content.name))
                 # content_id, status
-                transform_dependcy_maps[str_tf_id][str_map_id]['input_deps'].append(content['content_id'])
-            elif content['content_relation_type'] == ContentRelationType.Input:
+                transform_dependcy_maps[str_tf_id][str_map_id]['input_deps'].append(content.content_id)
+            elif content.content_relation_type == ContentRelationType.Input:
                 # content_id, status
-                transform_dependcy_maps[str_tf_id][str_map_id]['inputs'].append(content['content_id'])
+                transform_dependcy_maps[str_tf_id][str_map_id]['inputs'].append(content.content_id)
         # logger.debug("content_output_name2id: ", content_output_name2id)
 
-        for content in content_input_deps:
-            dep_coll_id = content['coll_id']
+        for content_id, tf_id, map_id, dep_coll_id, dep_name in content_input_deps:
             if dep_coll_id not in content_output_name2id:
                 logger.warn(log_prefix + "dep_coll_id: %s contents are not added yet" % dep_coll_id)
             else:
-                dep_content = content_output_name2id[dep_coll_id].get(content['name'], None)
-                if dep_content:
-                    dep_content_id = str(dep_content['content_id'])
+                dep_content_id = content_output_name2id[dep_coll_id].get(dep_name, None)
+                if dep_content_id:
+                    dep_content_id = str(dep_content_id)
                     if dep_content_id not in content_dependcy_map:
                         content_dependcy_map[dep_content_id] = []
-                    content_dependcy_map[dep_content_id].append((content['content_id'], content['transform_id'], content['map_id']))
+                    content_dependcy_map[dep_content_id].append((content_id, tf_id, map_id))
                 else:
-                    logger.error(log_prefix + "Failed to find input dependcy for content_id: %s" % content['content_id'])
+                    logger.error(log_prefix + "Failed to find input dependcy for content_id: %s" % content_id)
 
         set_content_dependcy_map(request_id, content_dependcy_map, request_dependcy_map,
                                  collection_dependcy_map, logger=logger, log_prefix=log_prefix)
@@ -1237,6 +1359,29 @@ def get_update_external_content_ids(input_output_maps, external_content_ids, es=
     return update_contents
 
 
+def get_adaptive_poll_period(current_period, base_period, num_changes, min_period, max_period,
+                             active_changes=100, increase_rate=2, decrease_rate=2):
+    """
+    Adapt the poll period of a processing to the number of changes found in the last poll.
+
+    :param current_period: current poll period in seconds, None to start from base_period.
+    :param base_period: configured poll period in seconds.
+    :param num_changes: number of content changes (and status changes) found in the last poll.
+    :returns: poll period in seconds. It's shrunk by decrease_rate (down to min_period) if there
+              are at least active_changes changes, it's reset to the base_period if there are a few
+              changes, and it's increased by increase_rate (up to max_period) if there are no changes.
+    """
+    if not current_period:
+        current_period = base_period
+    if num_changes >= active_changes:
+        period = current_period / decrease_rate
+    elif num_changes > 0:
+        period = min(current_period, base_period)
+    else:
+        period = max(current_period, base_period) * increase_rate
+    return int(min(max(period, min_period), max(max_period, min_period)))
+
+
 def handle_update_processing(processing, agent_attributes, max_updates_per_round=2000, use_bulk_update_mappings=True, executors=None, logger=None, log_prefix=''):
     logger = get_logger(logger)
 
@@ -1256,9 +1401,11 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
     if processing['command'] in [CommandType.ResumeProcessing]:
         handle_resume_processing(processing, agent_attributes=agent_attributes, logger=logger, log_prefix=log_prefix)
 
-    input_output_maps = get_input_output_maps(transform_id, work, with_deps=False)
+    input_output_maps = get_input_output_maps(transform_id, work, with_deps=False, request_id=request_id)
     logger.debug(log_prefix + "get_input_output_maps: len: %s" % len(input_output_maps))
     logger.debug(log_prefix + "get_input_output_maps.keys[:3]: %s" % str(list(input_output_maps.keys())[:3]))
+    # to update the collection statistics incrementally with the content updates
+    contents_index = get_contents_index(input_output_maps)
 
     if work.has_external_content_id() and not has_external_content_id(input_output_maps):
         external_content_ids = work.get_external_content_ids(processing, log_prefix=log_prefix)
@@ -1270,7 +1417,7 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
         num_inputs = work.num_inputs
     num_input_output_maps = len(input_output_maps)
     if processing["num_unmapped"] > 0 or work.has_new_inputs or (num_inputs is not None and num_inputs > num_input_output_maps):
-        new_input_output_maps = work.get_new_input_output_maps(input_output_maps)
+        new_input_output_maps = get_new_input_output_maps(processing, work, input_output_maps)
         logger.debug(log_prefix + "get_new_input_output_maps: len: %s" % len(new_input_output_maps))
         logger.debug(log_prefix + "get_new_input_output_maps.keys[:3]: %s" % str(list(new_input_output_maps.keys())[:3]))
     if num_inputs:
@@ -1278,7 +1425,7 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
 
     contents_ext = []
     if work.require_ext_contents():
-        contents_ext = get_ext_contents(transform_id, work)
+        contents_ext = get_ext_contents(transform_id, work, request_id=request_id)
         job_info_maps = core_catalog.get_contents_ext_maps()
         ret_poll_processing = work.poll_processing_updates(processing, input_output_maps, contents_ext=contents_ext,
                                                            job_info_maps=job_info_maps, executors=executors, log_prefix=log_prefix)
@@ -1302,11 +1449,13 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
     else:
         input_dependency_coll_ids = []
 
+    num_changes = len(content_updates)
     ret_new_contents_chunks = get_new_contents(request_id, transform_id, workload_id, new_input_output_maps,
                                                input_dependency_coll_ids=input_dependency_coll_ids,
                                                max_updates_per_round=max_updates_per_round)
     for ret_new_contents in ret_new_contents_chunks:
         new_input_contents, new_output_contents, new_log_contents, new_input_dependency_contents = ret_new_contents
+        num_changes += len(new_input_contents)
 
         ret_msgs = []
         # not generate messages for new contents
@@ -1322,6 +1471,7 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
         # for new_input_dependency_contents, already converted name to content_dep_id, don't need to separate it
         # new_contents = new_input_contents + new_output_contents + new_log_contents
         new_contents = new_input_contents + new_output_contents + new_log_contents + new_input_dependency_contents
+        collection_deltas = get_collection_deltas(contents_index, new_contents=new_contents)
 
         if executors is None:
             logger.debug(log_prefix + "handle_update_processing: add %s new contents" % (len(new_contents)))
@@ -1331,7 +1481,8 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
                                                         request_id=request_id,
                                                         # transform_id=transform_id,
                                                         use_bulk_update_mappings=use_bulk_update_mappings,
-                                                        messages=ret_msgs)
+                                                        messages=ret_msgs,
+                                                        collection_deltas=collection_deltas)
         else:
             log_msg = "handle_update_processing thread: add %s new contents" % (len(new_contents))
             kwargs = {'update_processing': None,
@@ -1339,7 +1490,8 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
                       'new_contents': new_contents,
                       # 'new_input_dependency_contents': new_input_dependency_contents,
                       'use_bulk_update_mappings': use_bulk_update_mappings,
-                      'messages': ret_msgs}
+                      'messages': ret_msgs,
+                      'collection_deltas': collection_deltas}
             f = executors.submit(update_processing_contents_thread, logger, log_prefix, log_msg, kwargs)
             ret_futures.add(f)
 
@@ -1347,10 +1499,13 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
     content_updates_missing_chunks = poll_missing_outputs(input_output_maps, contents_ext=contents_ext, max_updates_per_round=max_updates_per_round)
     for content_updates_missing_chunk in content_updates_missing_chunks:
         content_updates_missing, updated_contents_full_missing = content_updates_missing_chunk
+        num_changes += len(content_updates_missing)
         msgs = []
         if updated_contents_full_missing:
             msgs = generate_messages(request_id, transform_id, workload_id, work, msg_type='file',
-                                     files=updated_contents_full, relation_type='output')
+                                     files=updated_contents_full, relation_type='output',
+                                     round_id=get_message_round_id(processing))
+        collection_deltas = get_collection_deltas(contents_index, content_updates=content_updates_missing)
         if executors is None:
             logger.debug(log_prefix + "handle_update_processing: update %s missing contents" % (len(content_updates_missing)))
             core_processings.update_processing_contents(update_processing=None,
@@ -1359,14 +1514,16 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
                                                         # transform_id=transform_id,
                                                         # use_bulk_update_mappings=use_bulk_update_mappings,
                                                         use_bulk_update_mappings=False,
-                                                        messages=msgs)
+                                                        messages=msgs,
+                                                        collection_deltas=collection_deltas)
         else:
             log_msg = "handle_update_processing thread: update %s missing contents" % (len(content_updates_missing))
             kwargs = {'update_processing': None,
                       'request_id': request_id,
                       'update_contents': content_updates_missing,
                       'use_bulk_update_mappings': False,
-                      'messages': msgs}
+                      'messages': msgs,
+                      'collection_deltas': collection_deltas}
             f = executors.submit(update_processing_contents_thread, logger, log_prefix, log_msg, kwargs)
             ret_futures.add(f)
 
@@ -1374,7 +1531,8 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
         updated_contents_full_chunks = get_list_chunks(updated_contents_full, bulk_size=max_updates_per_round)
         for updated_contents_full_chunk in updated_contents_full_chunks:
             msgs = generate_messages(request_id, transform_id, workload_id, work, msg_type='file',
-                                     files=updated_contents_full_chunk, relation_type='output')
+                                     files=updated_contents_full_chunk, relation_type='output',
+                                     round_id=get_message_round_id(processing))
             if executors is None:
                 log_msg = "handle_update_processing: update %s messages" % (len(msgs))
                 logger.debug(log_prefix + log_msg)
@@ -1426,6 +1584,7 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
     if content_updates:
         content_updates_chunks = get_list_chunks(content_updates, bulk_size=max_updates_per_round)
         for content_updates_chunk in content_updates_chunks:
+            collection_deltas = get_collection_deltas(contents_index, content_updates=content_updates_chunk)
             if executors is None:
                 log_msg = "handle_update_processing: update %s contents" % (len(content_updates_chunk))
                 logger.debug(log_prefix + log_msg)
@@ -1433,13 +1592,15 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
                                                             request_id=request_id,
                                                             # transform_id=transform_id,
                                                             use_bulk_update_mappings=use_bulk_update_mappings,
-                                                            update_contents=content_updates_chunk)
+                                                            update_contents=content_updates_chunk,
+                                                            collection_deltas=collection_deltas)
             else:
                 log_msg = "handle_update_processing thread: update %s contents" % (len(content_updates_chunk))
                 kwargs = {'update_processing': None,
                           'request_id': request_id,
                           'use_bulk_update_mappings': use_bulk_update_mappings,
-                          'update_contents': content_updates_chunk}
+                          'update_contents': content_updates_chunk,
+                          'collection_deltas': collection_deltas}
                 f = executors.submit(update_processing_contents_thread, logger, log_prefix, log_msg, kwargs)
                 ret_futures.add(f)
 
@@ -1449,6 +1610,8 @@ def handle_update_processing(processing, agent_attributes, max_updates_per_round
     if not parameters:
         parameters = {}
     parameters["num_unmapped"] = processing["num_unmapped"]
+    # to adapt the poll period to the activity of the processing, not a processing column
+    parameters["num_changes"] = num_changes
 
     # return process_status, new_contents, new_input_dependency_contents, ret_msgs, content_updates + content_updates_missing, parameters, new_contents_ext, update_contents_ext
     return process_status, [], [], ret_msgs, [], parameters, [], []
@@ -1545,43 +1708,20 @@ def handle_trigger_processing(processing, agent_attributes, trigger_new_updates=
             pass
 
         logger.debug(log_prefix + "sync contents_update to contents")
-        core_catalog.set_fetching_contents_update(request_id=request_id, transform_id=transform_id, fetch=True)
-        contents_update_list = core_catalog.get_contents_update(request_id=request_id, transform_id=transform_id, fetch=True)
-        new_contents_update_list = []
-        # contents_id_list = []
-        for con in contents_update_list:
-            has_updates = True
-            if not work.es or con['substatus'] in [ContentStatus.Available]:
-                con_dict = {'content_id': con['content_id'],
-                            'request_id': con['request_id'],
-                            'substatus': con['substatus'],
-                            'status': con['substatus']}
-                if 'content_metadata' in con and con['content_metadata']:
-                    con_dict['content_metadata'] = con['content_metadata']
-                new_contents_update_list.append(con_dict)
-                # contents_id_list.append(con['content_id'])
-        new_contents_update_list_chunks = [new_contents_update_list[i:i + max_updates_per_round] for i in range(0, len(new_contents_update_list), max_updates_per_round)]
-        ret_futures = set()
-        for chunk in new_contents_update_list_chunks:
+        # for es, only the available contents are updated, the other staged updates are dropped.
+        # Every round applies at most max_updates_per_round staged updates in its own transaction.
+        substatus = [ContentStatus.Available] if work.es else None
+        num_staged, num_updated = 0, 0
+        while True:
+            ret_staged, ret_updated = core_catalog.apply_contents_update(request_id=request_id, transform_id=transform_id,
+                                                                         substatus=substatus, limit=max_updates_per_round)
+            num_staged += ret_staged
+            num_updated += ret_updated
+            if not max_updates_per_round or ret_staged < max_updates_per_round:
+                break
+        if num_staged:
             has_updates = True
-            if executors is None:
-                logger.debug(log_prefix + "new_contents_update chunk[:3](total: %s): %s" % (len(chunk), str(chunk[:3])))
-                # core_catalog.update_contents(chunk, request_id=request_id, transform_id=transform_id, use_bulk_update_mappings=False)
-                core_catalog.update_contents(chunk, request_id=request_id, transform_id=transform_id, use_bulk_update_mappings=True)
-            else:
-                log_msg = "new_contents_update thread chunk[:3](total: %s): %s" % (len(chunk), str(chunk[:3]))
-                kwargs = {'parameters': chunk,
-                          'request_id': request_id,
-                          'transform_id': transform_id,
-                          'use_bulk_update_mappings': True}
-                f = executors.submit(update_contents_thread, logger, log_prefix, log_msg, kwargs)
-                ret_futures.add(f)
-        if len(ret_futures) > 0:
-            wait_futures_finish(ret_futures, "new_contents_update", logger, log_prefix)
-
-        # core_catalog.delete_contents_update(contents=contents_id_list)
-        core_catalog.delete_contents_update(request_id=request_id, transform_id=transform_id, fetch=True)
-        logger.debug(log_prefix + "sync contents_update to contents done")
+        logger.debug(log_prefix + "sync contents_update to contents done: %s staged updates, %s contents updated" % (num_staged, num_updated))
 
         """
         logger.debug(log_prefix + "update_contents_from_others_by_dep_id")
@@ -1634,8 +1774,9 @@ def handle_trigger_processing(processing, agent_attributes, trigger_new_updates=
         logger.debug(log_prefix + "update_input_contents_by_dependency_pages done")
 
         with_deps = False
-        input_output_maps = get_input_output_maps(transform_id, work, with_deps=with_deps)
+        input_output_maps = get_input_output_maps(transform_id, work, with_deps=with_deps, request_id=request_id)
         logger.debug(log_prefix + "input_output_maps.keys[:2]: %s" % str(list(input_output_maps.keys())[:2]))
+        contents_index = get_contents_index(input_output_maps)
 
         updated_contents_ret_chunks = get_updated_contents_by_input_output_maps(input_output_maps=input_output_maps,
                                                                                 terminated=terminated_processing,
@@ -1652,12 +1793,14 @@ def handle_trigger_processing(processing, agent_attributes, trigger_new_updates=
             if updated_contents_full_input:
                 # if the content is updated by receiver, here is the place to broadcast the messages
                 msgs = generate_messages(request_id, transform_id, workload_id, work, msg_type='file',
-                                         files=updated_contents_full_input, relation_type='input')
+                                         files=updated_contents_full_input, relation_type='input',
+                                         round_id=get_message_round_id(processing))
                 ret_msgs = ret_msgs + msgs
             if updated_contents_full_output:
                 # if the content is updated by receiver, here is the place to broadcast the messages
                 msgs = generate_messages(request_id, transform_id, workload_id, work, msg_type='file',
-                                         files=updated_contents_full_output, relation_type='output')
+                                         files=updated_contents_full_output, relation_type='output',
+                                         round_id=get_message_round_id(processing))
                 ret_msgs = ret_msgs + msgs
 
             # content_updates = content_updates + updated_contents
@@ -1665,6 +1808,7 @@ def handle_trigger_processing(processing, agent_attributes, trigger_new_updates=
             if updated_contents or new_update_contents:
                 has_updates = True
 
+            collection_deltas = get_collection_deltas(contents_index, content_updates=updated_contents)
             if executors is None:
                 logger.debug(log_prefix + "handle_trigger_processing: updated_contents[:3] (total: %s): %s" % (len(updated_contents), updated_contents[:3]))
                 core_processings.update_processing_contents(update_processing=None,
@@ -1673,14 +1817,16 @@ def handle_trigger_processing(processing, agent_attributes, trigger_new_updates=
                                                             messages=ret_msgs,
                                                             request_id=request_id,
                                                             # transform_id=transform_id,
-                                                            use_bulk_update_mappings=False)
+                                                            use_bulk_update_mappings=False,
+                                                            collection_deltas=collection_deltas)
             else:
                 log_msg = "handle_trigger_processing thread: updated_contents[:3] (total: %s): %s" % (len(updated_contents), updated_contents[:3])
                 kwargs = {'update_processing': None,
                           'request_id': request_id,
                           'update_contents': updated_contents,
                           'messages': ret_msgs,
-                          'use_bulk_update_mappings': False}
+                          'use_bulk_update_mappings': False,
+                          'collection_deltas': collection_deltas}
                 f = executors.submit(update_processing_contents_thread, logger, log_prefix, log_msg, kwargs)
                 ret_futures.add(f)
 
@@ -1837,17 +1983,18 @@ def get_input_name_content_id_map(request_id, workload_id, transform_id):
     if not input_name_content_id_map:
         content_id_lock.acquire()
 
-        contents = core_catalog.get_contents_by_request_transform(request_id=request_id, transform_id=transform_id)
+        contents = core_catalog.iter_contents_by_request_transform(request_id=request_id, transform_id=transform_id,
+                                                                   columns=['content_id', 'name', 'path', 'content_relation_type'])
         input_name_content_id_map = {}
         for content in contents:
-            if content['content_relation_type'] == ContentRelationType.Output:
-                if content['name'] not in input_name_content_id_map:
-                    input_name_content_id_map[content['name']] = []
-                input_name_content_id_map[content['name']].append(content['content_id'])
-                if content['path']:
-                    if content['path'] not in input_name_content_id_map:
-                        input_name_content_id_map[content['path']] = []
-                    input_name_content_id_map[content['path']].append(content['content_id'])
+            if content.content_relation_type == ContentRelationType.Output:
+                if content.name not in input_name_content_id_map:
+                    input_name_content_id_map[content.name] = []
+                input_name_content_id_map[content.name].append(content.content_id)
+                if content.path:
+                    if content.path not in input_name_content_id_map:
+                        input_name_content_id_map[content.path] = []
+                    input_name_content_id_map[content.path].append(content.content_id)
 
         cache.set(input_name_content_id_map_key, input_name_content_id_map)
 
@@ -2049,19 +2196,174 @@ def handle_messages_processing(messages, logger=None, log_prefix='', update_proc
     return update_processings, update_processings_by_job, terminated_processings, update_contents, []
 
 
+# transform_id -> time of the last full recount of the collection statistics.
+# The entries older than the full sync period are pruned, a missing entry means the recount is due.
+_COLLECTION_FULL_SYNC_TIMES = {}
+_COLLECTION_FULL_SYNC_PRUNED_AT = 0
+collection_full_sync_lock = threading.Lock()
+
+
+def get_collection_stat_name(status):
+    """
+    Name of the collection statistics item counting the contents with this status.
+    """
+    if isinstance(status, int):
+        status = ContentStatus(status)
+    if status in [ContentStatus.Available, ContentStatus.Mapped, ContentStatus.FakeAvailable]:
+        return 'processed_files'
+    elif status in [ContentStatus.New]:
+        return 'new_files'
+    elif status in [ContentStatus.Failed, ContentStatus.FinalFailed,
+                    ContentStatus.SubAvailable, ContentStatus.FinalSubAvailable]:
+        return 'failed_files'
+    elif status in [ContentStatus.Lost, ContentStatus.Deleted, ContentStatus.Missing]:
+        return 'missing_files'
+    elif status in [ContentStatus.Processing]:
+        return 'processing_files'
+    elif status in [ContentStatus.Activated]:
+        return 'activated_files'
+    return 'preprocessing_files'
+
+
+def get_contents_index(input_output_maps):
+    """
+    :returns: {content_id: [coll_id, status, bytes]} of all contents in input_output_maps.
+    """
+    contents_index = {}
+    for map_id in input_output_maps:
+        for key in ['inputs', 'outputs', 'logs']:
+            for content in input_output_maps[map_id].get(key, []):
+                contents_index[content['content_id']] = [content['coll_id'], content['status'], content['bytes']]
+    return contents_index
+
+
+def get_collection_deltas(contents_index, content_updates=None, new_contents=None):
+    """
+    Get the changes of the collection statistics from the (old status, new status) pairs
+    of the content updates. contents_index is updated with the new status, so that the
+    updates of the same content in the next chunks are counted from the right status.
+
+    :param contents_index: {content_id: [coll_id, status, bytes]}, from get_contents_index.
+    :param content_updates: list of content updates with content_id and status.
+    :param new_contents: list of new contents.
+    :returns: {coll_id: {statistics item: delta}}
+    """
+    deltas = {}
+    for update in content_updates or []:
+        if 'status' not in update or update['content_id'] not in contents_index:
+            continue
+        item = contents_index[update['content_id']]
+        coll_id, old_status, old_bytes = item
+        old_name, new_name = get_collection_stat_name(old_status), get_collection_stat_name(update['status'])
+        item[1] = update['status']
+        if old_name == new_name:
+            continue
+        delta = deltas.setdefault(coll_id, {})
+        delta[old_name] = delta.get(old_name, 0) - 1
+        delta[new_name] = delta.get(new_name, 0) + 1
+        if old_name == 'processed_files':
+            delta['bytes'] = delta.get('bytes', 0) - (old_bytes or 0)
+        if new_name == 'processed_files':
+            delta['bytes'] = delta.get('bytes', 0) + (update.get('bytes', old_bytes) or 0)
+    for content in new_contents or []:
+        if 'coll_id' not in content:
+            continue
+        name = get_collection_stat_name(content.get('status', ContentStatus.New))
+        delta = deltas.setdefault(content['coll_id'], {})
+        delta['total_files'] = delta.get('total_files', 0) + 1
+        delta[name] = delta.get(name, 0) + 1
+        if name == 'processed_files':
+            delta['bytes'] = delta.get('bytes', 0) + (content.get('bytes', 0) or 0)
+    return deltas
+
+
+def get_collection_status_from_db(transform_id, work):
+    """
+    Get the collection statistics maintained incrementally in the database.
+
+    :returns: {coll_id: statistics}, or None if a collection is complete (or the statistics
+              are not initialized) and the statistics have to be recounted.
+    """
+    names = ['total_files', 'processed_files', 'processing_files', 'bytes', 'new_files', 'activated_files',
+             'failed_files', 'missing_files', 'ext_files', 'processed_ext_files', 'failed_ext_files',
+             'preprocessing_files', 'missing_ext_files']
+    collections = core_catalog.get_collections(transform_id=transform_id)
+    coll_status = {}
+    for coll in collections:
+        coll_status[coll['coll_id']] = {name: coll[name] or 0 for name in names}
+
+    for coll in work.get_input_collections() + work.get_output_collections() + work.get_log_collections():
+        if coll.coll_id not in coll_status:
+            return None
+        stats = coll_status[coll.coll_id]
+        total_files = stats['total_files']
+        if 'total_files' in coll.coll_metadata and coll.coll_metadata['total_files']:
+            total_files = coll.coll_metadata['total_files']
+        # decisions to close the collections are only taken after a full recount
+        if not total_files or total_files <= stats['processed_files'] + stats['failed_files'] + stats['missing_files']:
+            return None
+    return coll_status
+
+
+def set_collection_full_sync_time(transform_id):
+    with collection_full_sync_lock:
+        _COLLECTION_FULL_SYNC_TIMES[transform_id] = time.time()
+
+
+def remove_collection_full_sync_time(transform_id):
+    with collection_full_sync_lock:
+        _COLLECTION_FULL_SYNC_TIMES.pop(transform_id, None)
+
+
+def prune_collection_full_sync_times(period):
+    """
+    Remove the entries of the transforms which were not synced within the period,
+    for example the transforms which finished without a final sync on this agent.
+    """
+    global _COLLECTION_FULL_SYNC_PRUNED_AT
+    now = time.time()
+    with collection_full_sync_lock:
+        if _COLLECTION_FULL_SYNC_PRUNED_AT + period > now:
+            return
+        _COLLECTION_FULL_SYNC_PRUNED_AT = now
+        for transform_id in [t_id for t_id, last_time in _COLLECTION_FULL_SYNC_TIMES.items() if last_time + period < now]:
+            del _COLLECTION_FULL_SYNC_TIMES[transform_id]
+
+
+def is_collection_full_sync_due(transform_id, period):
+    prune_collection_full_sync_times(period)
+    last_time = _COLLECTION_FULL_SYNC_TIMES.get(transform_id, None)
+    return last_time is None or last_time + period < time.time()
+
+
 def sync_collection_status(request_id, transform_id, workload_id, work, input_output_maps=None, log_prefix='',
-                           close_collection=False, force_close_collection=False, abort=False, terminate=False):
+                           close_collection=False, force_close_collection=False, abort=False, terminate=False,
+                           full_sync=True):
+    """
+    Sync the collection statistics and status.
+
+    :param full_sync: If False, the statistics maintained incrementally in the collections are used,
+                      unless a collection looks complete. If True, the statistics are recounted from the contents.
+    """
     logger = get_logger()
 
     logger.info(log_prefix + "sync_collection_status")
 
-    if input_output_maps is None:
-        input_output_maps = get_input_output_maps(transform_id, work, with_deps=False)
+    coll_status = None
+    if not full_sync and not abort and not terminate and not force_close_collection:
+        coll_status = get_collection_status_from_db(transform_id, work)
+    full_sync = coll_status is None
+    logger.info(log_prefix + "sync_collection_status full_sync: %s" % full_sync)
 
-    all_updates_flushed = True
-    coll_status = {}
+    if full_sync and input_output_maps is None:
+        input_output_maps = get_input_output_maps(transform_id, work, with_deps=False, request_id=request_id)
+
+    all_updates_flushed = full_sync
+    if full_sync:
+        coll_status = {}
+        set_collection_full_sync_time(transform_id)
     messages = []
-    for map_id in input_output_maps:
+    for map_id in (input_output_maps if full_sync else []):
         inputs = input_output_maps[map_id]['inputs'] if 'inputs' in input_output_maps[map_id] else []
         # inputs_dependency = input_output_maps[map_id]['inputs_dependency'] if 'inputs_dependency' in input_output_maps[map_id] else []
         outputs = input_output_maps[map_id]['outputs'] if 'outputs' in input_output_maps[map_id] else []
@@ -2075,45 +2377,31 @@ def sync_collection_status(request_id, transform_id, workload_id, work, input_ou
                                                    'preprocessing_files': 0, 'missing_ext_files': 0}
             coll_status[content['coll_id']]['total_files'] += 1
 
-            if content['status'] in [ContentStatus.Available, ContentStatus.Mapped,
-                                     ContentStatus.Available.value, ContentStatus.Mapped.value,
-                                     ContentStatus.FakeAvailable, ContentStatus.FakeAvailable.value]:
-                coll_status[content['coll_id']]['processed_files'] += 1
+            stat_name = get_collection_stat_name(content['status'])
+            coll_status[content['coll_id']][stat_name] += 1
+            if stat_name == 'processed_files':
                 coll_status[content['coll_id']]['bytes'] += content['bytes']
-            elif content['status'] in [ContentStatus.New]:
-                coll_status[content['coll_id']]['new_files'] += 1
-            elif content['status'] in [ContentStatus.Failed, ContentStatus.FinalFailed,
-                                       ContentStatus.SubAvailable, ContentStatus.FinalSubAvailable]:
-                coll_status[content['coll_id']]['failed_files'] += 1
-            elif content['status'] in [ContentStatus.Lost, ContentStatus.Deleted, ContentStatus.Missing]:
-                coll_status[content['coll_id']]['missing_files'] += 1
-            elif content['status'] in [ContentStatus.Processing]:
-                coll_status[content['coll_id']]['processing_files'] += 1
-            elif content['status'] in [ContentStatus.Activated]:
-                coll_status[content['coll_id']]['activated_files'] += 1
-            else:
-                coll_status[content['coll_id']]['preprocessing_files'] += 1
 
             if content['status'] != content['substatus']:
                 all_updates_flushed = False
 
     all_ext_updated = True
-    if work.require_ext_contents():
+    if work.require_ext_contents() and full_sync:
         all_ext_updated = False
-        contents_ext = core_catalog.get_contents_ext(request_id=request_id, transform_id=transform_id)
+        contents_ext = core_catalog.iter_contents_ext(request_id=request_id, transform_id=transform_id, columns=['coll_id', 'status'])
         for content in contents_ext:
-            coll_status[content['coll_id']]['ext_files'] += 1
-
-            if content['status'] in [ContentStatus.Available, ContentStatus.Mapped,
-                                     ContentStatus.Available.value, ContentStatus.Mapped.value,
-                                     ContentStatus.FakeAvailable, ContentStatus.FakeAvailable.value]:
-                coll_status[content['coll_id']]['processed_ext_files'] += 1
-            # elif content['status'] in [ContentStatus.Failed, ContentStatus.FinalFailed]:
-            elif content['status'] in [ContentStatus.Failed, ContentStatus.FinalFailed,
-                                       ContentStatus.SubAvailable, ContentStatus.FinalSubAvailable]:
-                coll_status[content['coll_id']]['failed_ext_files'] += 1
-            elif content['status'] in [ContentStatus.Lost, ContentStatus.Deleted, ContentStatus.Missing]:
-                coll_status[content['coll_id']]['missing_ext_files'] += 1
+            coll_status[content.coll_id]['ext_files'] += 1
+
+            if content.status in [ContentStatus.Available, ContentStatus.Mapped,
+                                  ContentStatus.Available.value, ContentStatus.Mapped.value,
+                                  ContentStatus.FakeAvailable, ContentStatus.FakeAvailable.value]:
+                coll_status[content.coll_id]['processed_ext_files'] += 1
+            # elif content.status in [ContentStatus.Failed, ContentStatus.FinalFailed]:
+            elif content.status in [ContentStatus.Failed, ContentStatus.FinalFailed,
+                                    ContentStatus.SubAvailable, ContentStatus.FinalSubAvailable]:
+                coll_status[content.coll_id]['failed_ext_files'] += 1
+            elif content.status in [ContentStatus.Lost, ContentStatus.Deleted, ContentStatus.Missing]:
+                coll_status[content.coll_id]['missing_ext_files'] += 1
 
     logger.info(log_prefix + f"sync_collection_status, coll_status: {coll_status}")
 
@@ -2220,6 +2508,11 @@ def sync_collection_status(request_id, transform_id, workload_id, work, input_ou
                 coll.status = CollectionStatus.Closed
                 coll.substatus = CollectionStatus.Closed
 
+        if not full_sync:
+            # the statistics are maintained incrementally, do not overwrite them
+            u_coll = {k: u_coll[k] for k in ['coll_id', 'status', 'substatus'] if k in u_coll}
+            if len(u_coll) == 1:
+                continue
         update_collections.append(u_coll)
 
     logger.info(log_prefix + f"sync_collection_status, update_collections: {update_collections}")
@@ -2271,7 +2564,7 @@ def sync_work_status(request_id, transform_id, workload_id, work, substatus=None
     logger.debug(log_prefix + "work status: %s, substatus: %s" % (str(work.status), substatus))
 
 
-def sync_processing(processing, agent_attributes, terminate=False, abort=False, logger=None, log_prefix=""):
+def sync_processing(processing, agent_attributes, terminate=False, abort=False, full_sync_period=600, logger=None, log_prefix=""):
     logger = get_logger()
 
     terminated_status = [ProcessingStatus.Finished, ProcessingStatus.Failed, ProcessingStatus.SubFinished,
@@ -2286,12 +2579,17 @@ def sync_processing(processing, agent_attributes, terminate=False, abort=False,
     work.set_agent_attributes(agent_attributes, processing)
 
     messages = []
-    input_output_maps = get_input_output_maps(transform_id, work, with_deps=False)
     if processing['substatus'] in terminated_status or processing['substatus'] in terminated_status:
         terminate = True
+    # recount the collection statistics periodically, to correct the drift of the incremental updates
+    full_sync = terminate or abort or is_collection_full_sync_due(transform_id, full_sync_period)
+    input_output_maps = None
+    if full_sync:
+        input_output_maps = get_input_output_maps(transform_id, work, with_deps=False, request_id=request_id)
     update_collections, all_updates_flushed, msgs = sync_collection_status(request_id, transform_id, workload_id, work,
                                                                            input_output_maps=input_output_maps, log_prefix=log_prefix,
-                                                                           close_collection=True, abort=abort, terminate=terminate)
+                                                                           close_collection=True, abort=abort, terminate=terminate,
+                                                                           full_sync=full_sync)
 
     messages += msgs
 
@@ -2314,12 +2612,16 @@ def sync_processing(processing, agent_attributes, terminate=False, abort=False,
         if work.dispatch_ext_content:
             logger.info(f"{log_prefix} generating messages for ext contents")
             contents_ext = core_catalog.get_contents_ext(request_id=request_id, transform_id=transform_id)
+            if input_output_maps is None:
+                input_output_maps = get_input_output_maps(transform_id, work, with_deps=False, request_id=request_id)
             msgs = generate_messages(request_id, transform_id, workload_id, work, msg_type='content_ext', files=contents_ext,
-                                     relation_type='output', input_output_maps=input_output_maps)
+                                     relation_type='output', input_output_maps=input_output_maps,
+                                     round_id=get_message_round_id(processing))
             messages += msgs
 
         if processing['status'] == ProcessingStatus.Terminating and is_process_terminated(processing['substatus']):
             processing['status'] = processing['substatus']
+        remove_collection_full_sync_time(transform_id)
 
     return processing, update_collections, messages
 
@@ -2362,13 +2664,14 @@ def handle_abort_processing(processing, agent_attributes, logger=None, sync=True
 
 def reactive_contents(request_id, transform_id, workload_id, work, input_output_maps):
     updated_contents = []
-    contents = core_catalog.get_contents_by_request_transform(request_id=request_id, transform_id=transform_id)
+    contents = core_catalog.iter_contents_by_request_transform(request_id=request_id, transform_id=transform_id,
+                                                               columns=['content_id', 'request_id', 'status'])
     for content in contents:
-        if content['status'] not in [ContentStatus.Available, ContentStatus.Mapped,
-                                     ContentStatus.Available.value, ContentStatus.Mapped.value,
-                                     ContentStatus.FakeAvailable, ContentStatus.FakeAvailable.value]:
-            u_content = {'content_id': content['content_id'],
-                         'request_id': content['request_id'],
+        if content.status not in [ContentStatus.Available, ContentStatus.Mapped,
+                                  ContentStatus.Available.value, ContentStatus.Mapped.value,
+                                  ContentStatus.FakeAvailable, ContentStatus.FakeAvailable.value]:
+            u_content = {'content_id': content.content_id,
+                         'request_id': content.request_id,
                          'substatus': ContentStatus.New,
                          'status': ContentStatus.New}
             updated_contents.append(u_content)
@@ -2401,7 +2704,7 @@ def handle_resume_processing(processing, agent_attributes, logger=None, log_pref
                         'substatus': CollectionStatus.Open}
         update_collections.append(u_collection)
 
-    input_output_maps = get_input_output_maps(transform_id, work, with_deps=False)
+    input_output_maps = get_input_output_maps(transform_id, work, with_deps=False, request_id=request_id)
     update_contents = reactive_contents(request_id, transform_id, workload_id, work, input_output_maps)
 
     processing['status'] = ProcessingStatus.Running
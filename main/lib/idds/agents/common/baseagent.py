@@ -11,11 +11,12 @@
 import logging
 import math
 import os
+import time
 import traceback
 import threading
 import uuid
 
-from idds.common import exceptions
+from idds.common import exceptions, metrics
 from idds.common.constants import Sections
 from idds.common.constants import (MessageType, MessageTypeStr,
                                    MessageStatus, MessageSource)
@@ -23,10 +24,16 @@ from idds.common.plugin.plugin_base import PluginBase
 from idds.common.plugin.plugin_utils import load_plugins, load_plugin_sequence
 from idds.common.utils import get_process_thread_info
 from idds.common.utils import setup_logging, pid_exists, json_dumps, json_loads
-from idds.core import health as core_health, messages as core_messages, requests as core_requests
+from idds.orm.base.session import declare_pool_concurrency
+from idds.core import (health as core_health, messages as core_messages, requests as core_requests,
+                       counters as core_counters)
 from idds.agents.common.timerscheduler import TimerScheduler
+from idds.agents.common.profiler import run_event_handler
 from idds.agents.common.eventbus.eventbus import EventBus
 from idds.agents.common.cache.redis import get_redis_cache
+from idds.agents.common.cache.counters import Counters, is_throttler_counters_enabled
+from idds.agents.common.sharding import get_member_id, get_shard_buckets
+from idds.agents.common.fairshare import get_scheduling_policy
 
 
 setup_logging(__name__)
@@ -95,6 +102,8 @@ class BaseAgent(TimerScheduler, PluginBase):
     poll_new_min_request_id_times = 0
     poll_running_min_request_id_times = 0
 
+    eventbus_health_keys = ['queue_depth', 'latency_avg', 'latency_p95', 'handler_avg', 'handler_p95', 'merge_rate']
+
     def __init__(self, num_threads=1, name="BaseAgent", logger=None, use_process_pool=False, **kwargs):
         super(BaseAgent, self).__init__(num_threads, name=name, use_process_pool=use_process_pool)
         self.name = self.__class__.__name__
@@ -132,6 +141,23 @@ class BaseAgent(TimerScheduler, PluginBase):
             self.max_worker_exec_time = int(self.max_worker_exec_time)
         self.num_hang_workers, self.num_active_workers = 0, 0
 
+        # only poll the requests in the shard of this instance
+        if not hasattr(self, 'enable_sharding'):
+            self.enable_sharding = False
+        elif isinstance(self.enable_sharding, str):
+            self.enable_sharding = self.enable_sharding.lower() in ['true', '1']
+        if not hasattr(self, 'num_shard_buckets'):
+            self.num_shard_buckets = 64
+        else:
+            self.num_shard_buckets = int(self.num_shard_buckets)
+        self.shard_buckets = None
+
+        # policy to select the polled items: fifo (default), fair_share or the full name of a policy class.
+        # The fair_share_* attributes are the parameters of the policy.
+        if not hasattr(self, 'scheduling_policy'):
+            self.scheduling_policy = None
+        self.schedulers = {}
+
         self.plugins = {}
         self.plugin_sequence = []
 
@@ -145,6 +171,13 @@ class BaseAgent(TimerScheduler, PluginBase):
 
         self.cache = get_redis_cache()
 
+        # the core functions of the agents maintain the throttler counters, if enabled
+        if is_throttler_counters_enabled() and not core_counters.is_recording():
+            core_counters.set_counters_recorder(Counters(incremental=True))
+
+        # the agent thread and the executor threads use the database pool of this process
+        self.declare_db_concurrency(self.executor_name, self.num_threads + 1)
+
     def set_max_workers(self):
         self.number_workers = 0
         if not hasattr(self, 'max_number_workers') or not self.max_number_workers:
@@ -152,6 +185,21 @@ class BaseAgent(TimerScheduler, PluginBase):
         else:
             self.max_number_workers = int(self.max_number_workers)
 
+    def declare_db_concurrency(self, name, num_threads):
+        """
+        Declare the threads which may use the database at the same time, to size the database pool
+        and to warn when the pool is too small. The process pools have their own database pools.
+        """
+        if self.use_process_pool and name != self.executor_name:
+            return True
+        if self.use_process_pool:
+            num_threads = 1
+        return declare_pool_concurrency(name, num_threads)
+
+    def create_executors(self, name, max_workers=1):
+        self.declare_db_concurrency(name, max_workers)
+        return super(BaseAgent, self).create_executors(name, max_workers=max_workers)
+
     def get_event_bus(self):
         self.event_bus
 
@@ -226,6 +274,9 @@ class BaseAgent(TimerScheduler, PluginBase):
     def get_event_function_map(self):
         return self.event_func_map
 
+    def get_event_type_name(self, event_type):
+        return getattr(event_type, 'name', str(event_type))
+
     def execute_event_schedule(self):
         event_funcs = self.get_event_function_map()
         for event_type in event_funcs:
@@ -234,7 +285,23 @@ class BaseAgent(TimerScheduler, PluginBase):
             if bulk_size > 0:
                 events = self.event_bus.get(event_type, num_events=bulk_size, wait=2, callback=None)
                 for event in events:
-                    self.submit(exec_func, event)
+                    self.submit(self.handle_event, event_type, exec_func, event)
+
+    def handle_event(self, event_type, exec_func, event):
+        """
+        Run the event handler and report its duration to the event bus.
+        """
+        start_time, status = time.time(), 'ok'
+        try:
+            return run_event_handler(self.get_event_type_name(event_type), exec_func, event)
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            try:
+                self.event_bus.send_report(event, status, start_time, time.time(), self.get_name(), None)
+            except Exception as ex:
+                self.logger.warning("Failed to send report for event %s: %s" % (event._id, ex))
 
     def execute_schedules(self):
         # self.execute_timer_schedule()
@@ -300,7 +367,12 @@ class BaseAgent(TimerScheduler, PluginBase):
 
     def get_health_payload(self):
         num_hang_workers, num_active_workers = self.get_num_hang_active_workers()
-        return {'num_hang_workers': num_hang_workers, 'num_active_workers': num_active_workers}
+        payload = {'num_hang_workers': num_hang_workers, 'num_active_workers': num_active_workers}
+        event_types = list(self.get_event_function_map().keys())
+        if event_types:
+            # the payload column is limited, only report the event types handled by this agent
+            payload['eventbus'] = self.event_bus.get_metrics_summary(event_types=event_types, keys=self.eventbus_health_keys)
+        return payload
 
     def is_ready(self):
         return True
@@ -331,6 +403,55 @@ class BaseAgent(TimerScheduler, PluginBase):
             if pid_not_exists:
                 core_health.clean_health(hostname=hostname, pids=pid_not_exists, older_than=None)
 
+            if self.enable_sharding:
+                # the pids are only checked on this host
+                self.update_shard(health_items=[item for item in health_items
+                                                if item['hostname'] != hostname or item['pid'] not in pid_not_exists])
+
+    def update_shard(self, health_items=None):
+        """
+        Assign the shard buckets of this instance from the live instances of the agent in the Health table.
+        """
+        hostname, pid, thread_id, thread_name = get_process_thread_info()
+        if health_items is None:
+            health_items = self.get_health_items()
+        members = [get_member_id(item['hostname'], item['pid']) for item in health_items if item['agent'] == self.get_name()]
+        shard_buckets = get_shard_buckets(get_member_id(hostname, pid), members, num_buckets=self.num_shard_buckets)
+        if shard_buckets != self.shard_buckets:
+            self.logger.info("shard changed: members %s, buckets %s" % (sorted(set(members)), shard_buckets))
+        self.shard_buckets = shard_buckets
+
+    def get_shard(self):
+        """
+        :returns: (number of shard buckets, buckets of this instance), None if sharding is disabled.
+        """
+        if not self.enable_sharding:
+            return None
+        if self.shard_buckets is None:
+            self.update_shard()
+        return (self.num_shard_buckets, self.shard_buckets)
+
+    def get_scheduler(self, name):
+        """
+        Get the scheduling policy of a poll function. Every poll function has its own policy,
+        which keeps its round-robin state between the polls.
+
+        :param name: name of the poll function.
+        :returns: the policy, None for first in first out.
+        """
+        if not self.scheduling_policy:
+            return None
+        if name not in self.schedulers:
+            attrs = {}
+            for key in self.__dict__:
+                if key.startswith('fair_share_'):
+                    value = getattr(self, key)
+                    if key.endswith('_weights') and isinstance(value, str):
+                        value = json_loads(value)
+                    attrs[key[len('fair_share_'):]] = value
+            self.schedulers[name] = get_scheduling_policy(self.scheduling_policy, **attrs)
+        return self.schedulers[name]
+
     def get_health_items(self):
         try:
             hostname, pid, thread_id, thread_name = get_process_thread_info()
@@ -386,6 +507,17 @@ class BaseAgent(TimerScheduler, PluginBase):
                                 priority=1)
         self.add_task(task)
 
+        if metrics.is_metrics_enabled():
+            task = self.create_task(task_func=self.log_metrics_summary, task_output_queue=None,
+                                    task_args=tuple(), task_kwargs={}, delay_time=metrics.get_metrics_log_period(),
+                                    priority=1)
+            self.add_task(task)
+
+    def log_metrics_summary(self):
+        summary = metrics.get_summary(prefix='idds_db_')
+        if summary:
+            self.logger.info("%s database metrics summary:\n%s" % (self.get_name(), '\n'.join(summary)))
+
     def generate_health_messages(self):
         core_health.clean_health(older_than=self.heartbeat_delay * 3)
         items = core_health.retrieve_health_items()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Per site counters of the active requests, transforms, processings and contents, used by the throttlers.
+
+The counters of every kind are kept in one redis hash (field '<site>|<bucket>').
+
+With [cache] throttler_counters = True, they are incremented with HINCRBY by the core functions which
+change the status of a request, a transform, a processing or a content (see idds.core.counters), and
+they are reconciled periodically with the database, which corrects the drift. Otherwise (the default)
+they are a snapshot of the database, recomputed when it's older than cache_expire_seconds.
+"""
+
+import logging
+import time
+import traceback
+
+from idds.common.config import config_has_option, config_get_bool
+from idds.common.constants import (Sections, RequestStatus, TransformStatus, ProcessingStatus,
+                                   ContentStatus, ContentRelationType)
+from idds.core import (requests as core_requests,
+                       transforms as core_transforms,
+                       processings as core_processings,
+                       catalog as core_catalog)
+
+from .redis import get_redis_cache
+
+
+def is_throttler_counters_enabled():
+    """
+    Whether the core functions maintain the counters incrementally ([cache] throttler_counters, default False).
+    Every status change then costs a query of the old status, in all agents.
+    """
+    if config_has_option(Sections.Cache, 'throttler_counters'):
+        return config_get_bool(Sections.Cache, 'throttler_counters')
+    return False
+
+
+COUNTER_BUCKETS = {
+    'requests': {RequestStatus.New: 'new',
+                 RequestStatus.Ready: 'new',
+                 RequestStatus.Throttling: 'new',
+                 RequestStatus.Transforming: 'processing',
+                 RequestStatus.Terminating: 'processing'},
+    'transforms': {TransformStatus.New: 'new',
+                   TransformStatus.Ready: 'new',
+                   TransformStatus.Transforming: 'processing',
+                   TransformStatus.Terminating: 'processing'},
+    'processings': {ProcessingStatus.New: 'new',
+                    ProcessingStatus.Submitting: 'processing',
+                    ProcessingStatus.Submitted: 'processing',
+                    ProcessingStatus.Running: 'processing',
+                    ProcessingStatus.Terminating: 'processing',
+                    ProcessingStatus.ToTrigger: 'processing',
+                    ProcessingStatus.Triggering: 'processing'}
+}
+
+# the contents which are neither new nor activated are counted as processed
+CONTENT_BUCKETS = {ContentStatus.New: 'new',
+                   ContentStatus.Activated: 'activated'}
+
+CONTENT_KINDS = ['input_contents', 'output_contents']
+
+DEFAULT_COUNTERS = {
+    'requests': {'new': 0, 'processing': 0},
+    'transforms': {'new': 0, 'processing': 0},
+    'processings': {'new': 0, 'processing': 0},
+    'input_contents': {'new': 0, 'activated': 0, 'processed': 0},
+    'output_contents': {'new': 0, 'activated': 0, 'processed': 0}
+}
+
+
+class Counters(object):
+    def __init__(self, reconcile_period=600, cache_expire_seconds=300, incremental=None, prefix='idds_counters', logger=None):
+        """
+        :param reconcile_period: seconds between the reconciliations of the incremental counters.
+        :param cache_expire_seconds: seconds before the snapshot counters are recomputed.
+        :param incremental: whether the counters are maintained by the core functions, None to read the configuration.
+        """
+        self.reconcile_period = int(reconcile_period)
+        self.cache_expire_seconds = int(cache_expire_seconds)
+        self.incremental = is_throttler_counters_enabled() if incremental is None else incremental
+        self.prefix = prefix
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.cache = get_redis_cache()
+
+    def get_key(self, kind):
+        return '%s:%s' % (self.prefix, kind)
+
+    def get_site(self, site):
+        return site if site else 'Default'
+
+    def get_bucket(self, kind, status):
+        if status is None:
+            return None
+        if kind in CONTENT_KINDS:
+            return CONTENT_BUCKETS.get(status, 'processed')
+        return COUNTER_BUCKETS.get(kind, {}).get(status, None)
+
+    def record_transitions(self, kind, transitions):
+        """
+        Move items of kind from the buckets of their old status to the buckets of their new status.
+
+        :param kind: transforms, processings, input_contents or output_contents.
+        :param transitions: {(site, old_status, new_status): number of items}, old_status is None for new items.
+        """
+        deltas = {}
+        for (site, old_status, new_status), num in transitions.items():
+            if new_status is None or not num:
+                continue
+            old_bucket, new_bucket = self.get_bucket(kind, old_status), self.get_bucket(kind, new_status)
+            if old_bucket == new_bucket:
+                continue
+            site = self.get_site(site)
+            if old_bucket:
+                field = '%s|%s' % (site, old_bucket)
+                deltas[field] = deltas.get(field, 0) - num
+            if new_bucket:
+                field = '%s|%s' % (site, new_bucket)
+                deltas[field] = deltas.get(field, 0) + num
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        try:
+            self.cache.hincrby_many(self.get_key(kind), deltas)
+        except Exception as ex:
+            # the drift is corrected by the next reconciliation
+            self.logger.warn("Failed to update the %s counters: %s" % (kind, ex))
+
+    def is_reconciled(self):
+        return self.cache.get(self.get_key('reconciled_at'), default=None) is not None
+
+    def acquire_reconcile_lock(self):
+        """
+        Only one agent reconciles the counters in every reconcile period, or rebuilds them when they are missing.
+        """
+        return self.cache.add(self.get_key('reconcile_lock'), 1, expire_seconds=self.get_reconcile_period())
+
+    def get_reconcile_period(self):
+        return self.reconcile_period if self.incremental else self.cache_expire_seconds
+
+    def set_counters(self, counters, reconciled_at):
+        """
+        :param counters: {kind: {site: {bucket: value}}}
+        """
+        for kind, values in counters.items():
+            mapping = {}
+            for site, buckets in values.items():
+                for bucket, value in buckets.items():
+                    mapping['%s|%s' % (site, bucket)] = value
+            self.cache.replace_hash(self.get_key(kind), mapping)
+        # the counters are recomputed by whoever reads them if the reconciliation stops,
+        # the snapshot counters when they expire
+        expire_seconds = self.reconcile_period * 3 if self.incremental else self.cache_expire_seconds
+        self.cache.set(self.get_key('reconciled_at'), reconciled_at, expire_seconds=expire_seconds)
+
+    def get_counters(self, kind, site):
+        """
+        :returns: {bucket: value} of the site.
+        """
+        if not self.is_reconciled():
+            # the missing counters are rebuilt by the caller which gets the reconcile lock,
+            # the others use the current counters in the meantime.
+            self.reconcile()
+        buckets = list(DEFAULT_COUNTERS[kind].keys())
+        values = self.cache.hmget(self.get_key(kind), ['%s|%s' % (site, bucket) for bucket in buckets])
+        return {bucket: int(value) if value is not None else 0 for bucket, value in zip(buckets, values)}
+
+    def load_num_active_items(self, kind, rets):
+        num_items = {}
+        for status, site, count in rets:
+            bucket = self.get_bucket(kind, status)
+            if bucket:
+                site = self.get_site(site)
+                num_items.setdefault(site, dict(DEFAULT_COUNTERS[kind]))
+                num_items[site][bucket] += count
+        return num_items
+
+    def load_num_active_requests(self):
+        rets = core_requests.get_num_active_requests(list(COUNTER_BUCKETS['requests'].keys()), use_replica=True)
+        return self.load_num_active_items('requests', rets)
+
+    def load_num_active_transforms(self):
+        rets = core_transforms.get_num_active_transforms(list(COUNTER_BUCKETS['transforms'].keys()), use_replica=True)
+        return self.load_num_active_items('transforms', rets)
+
+    def load_num_active_processings(self):
+        """
+        :returns: (counters, {site: active transform ids})
+        """
+        rets, active_transforms = [], {}
+        for req_id, trf_id, pr_id, site, status in core_processings.get_active_processings(list(COUNTER_BUCKETS['processings'].keys()), use_replica=True):
+            rets.append((status, site, 1))
+            active_transforms.setdefault(self.get_site(site), []).append(trf_id)
+        return self.load_num_active_items('processings', rets), active_transforms
+
+    def load_num_active_contents(self, active_transforms):
+        tf_id_site_map = {}
+        for site in active_transforms:
+            for tf_id in active_transforms[site]:
+                tf_id_site_map[tf_id] = site
+
+        rets = {'input_contents': [], 'output_contents': []}
+        if tf_id_site_map:
+            for status, relation_type, transform_id, count in core_catalog.get_content_status_statistics_by_relation_type(list(tf_id_site_map.keys()), use_replica=True):
+                if relation_type == ContentRelationType.Input:
+                    rets['input_contents'].append((status, tf_id_site_map[transform_id], count))
+                elif relation_type == ContentRelationType.Output:
+                    rets['output_contents'].append((status, tf_id_site_map[transform_id], count))
+        return self.load_num_active_items('input_contents', rets['input_contents']), self.load_num_active_items('output_contents', rets['output_contents'])
+
+    def reconcile(self, force=False):
+        """
+        Recompute the counters from the database, to correct the drift of the incremental updates
+        or to refresh the snapshot. Only one agent reconciles them in every reconcile period.
+        The counts are read from the read replicas if they are configured.
+        """
+        try:
+            if not force and not self.acquire_reconcile_lock():
+                return
+            reconciled_at = time.time()
+            num_processings, active_transforms = self.load_num_active_processings()
+            num_input_contents, num_output_contents = self.load_num_active_contents(active_transforms)
+            self.set_counters({'requests': self.load_num_active_requests(),
+                               'transforms': self.load_num_active_transforms(),
+                               'processings': num_processings,
+                               'input_contents': num_input_contents,
+                               'output_contents': num_output_contents},
+                              reconciled_at=reconciled_at)
+            self.logger.info("reconcile counters: took %.3f seconds" % (time.time() - reconciled_at))
+        except Exception as ex:
+            self.logger.error("reconcile counters: %s" % str(ex))
+            self.logger.error(traceback.format_exc())
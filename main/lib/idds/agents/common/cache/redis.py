@@ -102,6 +102,45 @@ class RedisCache(Singleton):
             return default
         return value
 
+    def hincrby(self, key, field, value=1):
+        return self.cache.hincrby(key, field, value)
+
+    def hincrby_many(self, key, mapping):
+        """
+        Increment several fields of a hash in one round trip.
+
+        :param mapping: {field: increment}
+        """
+        pipe = self.cache.pipeline(transaction=False)
+        for field, value in mapping.items():
+            pipe.hincrby(key, field, value)
+        pipe.execute()
+
+    def hmget(self, key, fields):
+        """
+        :returns: list of values (decoded as strings, None for missing fields).
+        """
+        values = self.cache.hmget(key, fields)
+        return [v.decode('utf-8') if v is not None else None for v in values]
+
+    def replace_hash(self, key, mapping):
+        """
+        Replace all fields of a hash atomically.
+        """
+        pipe = self.cache.pipeline(transaction=True)
+        pipe.delete(key)
+        if mapping:
+            pipe.hset(key, mapping=mapping)
+        pipe.execute()
+
+    def add(self, key, value, expire_seconds=21600):
+        """
+        Set the key only if it doesn't exist.
+
+        :returns: True if the key is set.
+        """
+        return bool(self.cache.set(key, json_dumps(value), ex=expire_seconds, nx=True))
+
 
 def get_redis_cache():
     cache = RedisCache()
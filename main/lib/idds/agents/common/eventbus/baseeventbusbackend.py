@@ -100,6 +100,12 @@ class BaseEventBusBackend(threading.Thread):
         if self.get_coordinator():
             return self.get_coordinator().send_report(event, status, start_time, end_time, source, result)
 
+    def get_queue_depth(self):
+        if self.get_coordinator():
+            return self.get_coordinator().get_queue_depth()
+        with self._lock:
+            return {event_type: len(self._events_index[event_type]) for event_type in self._events_index}
+
     def clean_event(self, event):
         pass
 
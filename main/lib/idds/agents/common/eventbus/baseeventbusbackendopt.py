@@ -15,6 +15,7 @@ import uuid
 
 from .event import StateClaimEvent, EventBusState
 from .baseeventbusbackend import BaseEventBusBackend
+from .eventbusmetrics import record_merged
 
 
 class BaseEventBusBackendOpt(BaseEventBusBackend):
@@ -80,6 +81,7 @@ class BaseEventBusBackendOpt(BaseEventBusBackend):
                         self._events[event._event_type][old_event_id] = old_event
                         self.logger.debug("New event %s is merged to old event %s" % (event, old_event))
                         merged = True
+                        record_merged(event)
             if not merged:
                 self._events_act_id_index[event._event_type][event_act_id].append(event._id)
 
@@ -17,6 +17,7 @@ from idds.common.event import StateClaimEvent, EventBusState
 from idds.core import events as core_events
 
 from .baseeventbusbackend import BaseEventBusBackend
+from .eventbusmetrics import record_merged
 
 
 class DBEventBusBackend(BaseEventBusBackend):
@@ -64,11 +65,15 @@ class DBEventBusBackend(BaseEventBusBackend):
     def send(self, event):
         ret = core_events.add_event(event)
         self.logger.info("add event: %s, ret: %s" % (event, ret))
+        if ret is None:
+            record_merged(event)
 
     def send_bulk(self, events):
-        for event in events:
-            ret = core_events.add_event(event)
-            self.logger.info("add event: %s, ret: %s" % (event, ret))
+        rets = core_events.add_events(events)
+        self.logger.info("add %s events, %s merged" % (len(events), len([r for r in rets if not r])))
+        for event, ret in zip(events, rets):
+            if not ret:
+                record_merged(event)
 
     def get(self, event_type, num_events=1, wait=0, callback=None):
         events = core_events.get_event_for_processing(event_type=event_type, num_events=num_events)
@@ -78,6 +83,9 @@ class DBEventBusBackend(BaseEventBusBackend):
 
         return events
 
+    def get_queue_depth(self):
+        return core_events.get_num_queued_events()
+
     def clean_event(self, event):
         core_events.clean_event(event, to_archive=self.to_archive)
 
@@ -15,6 +15,7 @@ from idds.common.constants import Sections
 from idds.common.config import config_has_section, config_list_options
 
 # from .localeventbusbackend import LocalEventBusBackend
+from . import eventbusmetrics as eventbus_metrics
 from .baseeventbusbackendopt import BaseEventBusBackendOpt
 from .dbeventbusbackend import DBEventBusBackend
 from .msgeventbusbackend import MsgEventBusBackend
@@ -105,11 +106,13 @@ class EventBus(Singleton):
         return attrs
 
     def publish_event(self, event):
+        eventbus_metrics.record_sent([event])
         self.backend.send(event)
 
     def get_event(self, event_type, num_events=1, wait=5, callback=None):
         # demand_event = DemandEvent(event._event_type, self._id)
         event = self.backend.get(event_type, num_events=num_events, wait=wait, callback=callback)
+        eventbus_metrics.record_received(event)
         return event
 
     def get(self, event_type, num_events=1, wait=5, callback=None):
@@ -119,11 +122,41 @@ class EventBus(Singleton):
         return self.publish_event(event)
 
     def send_bulk(self, events):
+        eventbus_metrics.record_sent(events)
         self.backend.send_bulk(events)
 
     def send_report(self, event, status, start_time, end_time, source, result):
+        eventbus_metrics.record_handled(event, status, start_time, end_time)
         return self.backend.send_report(event, status, start_time, end_time, source, result)
 
+    def get_queue_depth(self):
+        """
+        Get the number of queued events per event type, if the backend knows it.
+        """
+        queue_depth = self.backend.get_queue_depth()
+        if queue_depth:
+            eventbus_metrics.set_queue_depth(queue_depth)
+        return queue_depth
+
+    def get_metrics_summary(self, event_types=None, keys=None):
+        """
+        Get the summary of the EventBus metrics per event type.
+
+        :param event_types: list of event types to report. If None, all event types are reported.
+        :param keys: list of metrics to report. If None, all metrics are reported.
+        """
+        try:
+            self.get_queue_depth()
+        except Exception as ex:
+            self.logger.warning("Failed to get the queue depth: %s" % ex)
+        summary = eventbus_metrics.get_summary()
+        if event_types is not None:
+            names = [eventbus_metrics.get_event_type_name(event_type) for event_type in event_types]
+            summary = {k: v for k, v in summary.items() if k in names}
+        if keys is not None:
+            summary = {k: {key: v[key] for key in keys if key in v} for k, v in summary.items()}
+        return summary
+
     def clean_event(self, event):
         self.backend.clean_event(event)
 
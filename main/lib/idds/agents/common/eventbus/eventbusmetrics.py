@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Backend independent metrics of the EventBus.
+
+    idds_eventbus_events_total{event_type, action}: sent, received and merged events.
+    idds_eventbus_queue_latency_seconds{event_type}: time between the event creation and the get.
+    idds_eventbus_handler_duration_seconds{event_type, status}: handler duration from send_report.
+    idds_eventbus_queue_depth{event_type}: number of queued events, when the backend knows it.
+"""
+
+import time
+
+from idds.common import metrics
+
+
+LATENCY_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def get_event_type_name(event_type):
+    return getattr(event_type, 'name', str(event_type))
+
+
+def get_events_counter():
+    return metrics.get_counter('idds_eventbus_events_total', 'Number of events sent, received and merged',
+                               label_names=('event_type', 'action'))
+
+
+def get_latency_histogram():
+    return metrics.get_histogram('idds_eventbus_queue_latency_seconds', 'Time between the event creation and the get',
+                                 label_names=('event_type',), buckets=LATENCY_BUCKETS)
+
+
+def get_handler_histogram():
+    return metrics.get_histogram('idds_eventbus_handler_duration_seconds', 'Duration of the event handlers',
+                                 label_names=('event_type', 'status'), buckets=LATENCY_BUCKETS)
+
+
+def get_queue_depth_gauge():
+    return metrics.get_gauge('idds_eventbus_queue_depth', 'Number of queued events',
+                             label_names=('event_type',))
+
+
+def record_sent(events):
+    counter = get_events_counter()
+    for event in events:
+        counter.inc(labels={'event_type': get_event_type_name(event._event_type), 'action': 'sent'})
+
+
+def record_merged(event):
+    get_events_counter().inc(labels={'event_type': get_event_type_name(event._event_type), 'action': 'merged'})
+
+
+def record_received(events):
+    if not events:
+        return
+    now = time.time()
+    counter, histogram = get_events_counter(), get_latency_histogram()
+    for event in events:
+        event_type = get_event_type_name(event._event_type)
+        counter.inc(labels={'event_type': event_type, 'action': 'received'})
+        if event._timestamp:
+            histogram.observe(max(now - event._timestamp, 0), labels={'event_type': event_type})
+
+
+def record_handled(event, status, start_time, end_time):
+    if start_time is None or end_time is None:
+        return
+    labels = {'event_type': get_event_type_name(event._event_type), 'status': str(status)}
+    get_handler_histogram().observe(end_time - start_time, labels=labels)
+
+
+def set_queue_depth(queue_depth):
+    """
+    :param queue_depth: {event_type: number of queued events}
+    """
+    gauge = get_queue_depth_gauge()
+    for event_type, depth in queue_depth.items():
+        gauge.set(depth, labels={'event_type': get_event_type_name(event_type)})
+
+
+def get_bound(value):
+    # quantiles beyond the last bucket are infinite, which is not valid JSON
+    return value if value != float('inf') else '>%s' % LATENCY_BUCKETS[-1]
+
+
+def get_summary():
+    """
+    Summary per event type, to be reported in the health payload.
+
+    :returns: {event_type: {'sent': , 'received': , 'merged': , 'merge_rate': , 'queue_depth': ,
+                            'latency_avg': , 'latency_p95': , 'handler_avg': , 'handler_p95': }}
+    """
+    rets = {}
+    for (event_type, action), value in get_events_counter().get_values().items():
+        rets.setdefault(event_type, {})[action] = value
+    for (event_type,), value in get_queue_depth_gauge().get_values().items():
+        rets.setdefault(event_type, {})['queue_depth'] = value
+    for (event_type,), value in get_latency_histogram().get_summary().items():
+        rets.setdefault(event_type, {}).update({'latency_avg': round(value['avg'], 3), 'latency_p95': get_bound(value['p95'])})
+
+    handler_stats = {}
+    for (event_type, status), value in get_handler_histogram().get_summary().items():
+        stats = handler_stats.setdefault(event_type, {'count': 0, 'sum': 0, 'p95': 0})
+        stats['count'] += value['count']
+        stats['sum'] += value['sum']
+        stats['p95'] = max(stats['p95'], value['p95'])
+    for event_type, stats in handler_stats.items():
+        rets.setdefault(event_type, {}).update({'handler_avg': round(stats['sum'] / stats['count'], 3) if stats['count'] else 0,
+                                                'handler_p95': get_bound(stats['p95'])})
+
+    for event_type, ret in rets.items():
+        sent = ret.get('sent', 0)
+        ret['merge_rate'] = round(ret.get('merged', 0) * 1.0 / sent, 3) if sent else 0
+    return rets
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Encoding of the MsgEventBusBackend messages.
+
+json: one frame with the JSON string of the message (the original format).
+msgpack: multipart message [MAGIC, header, event, event, ...]. The header is the message
+         without its events, every event is a separate msgpack frame with a fixed schema:
+         [module, class, event_type, id, publisher_id, timestamp, counter, requeue_counter,
+          content, other attributes]
+         Values msgpack doesn't know (enums, DictClass objects, datetime) are embedded as JSON.
+
+Messages in both formats can be decoded, so agents with different encodings can talk to
+the same manager. The reply uses the encoding of the request.
+"""
+
+import importlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from idds.common.event import EventType
+from idds.common.utils import json_dumps, json_loads
+
+
+MAGIC = b'IDDSMP1'
+
+# keys of the messages which carry events
+EVENT_KEYS = ['event', 'events', 'ret']
+
+EVENT_FIELDS = ['_id', '_publisher_id', '_event_type', '_timestamp', '_counter', '_requeue_counter', '_content']
+
+JSON_EXT_TYPE = 1
+
+_CLASSES = {}
+
+
+def is_msgpack_available():
+    return msgpack is not None
+
+
+def default(obj):
+    return msgpack.ExtType(JSON_EXT_TYPE, json_dumps(obj).encode('utf-8'))
+
+
+def ext_hook(code, data):
+    if code == JSON_EXT_TYPE:
+        return json_loads(bytes(data).decode('utf-8'))
+    return msgpack.ExtType(code, data)
+
+
+def is_event(obj):
+    return hasattr(obj, '_event_type') and hasattr(obj, 'get_event_id')
+
+
+def get_class(module_name, class_name):
+    key = (module_name, class_name)
+    if key not in _CLASSES:
+        _CLASSES[key] = getattr(importlib.import_module(module_name), class_name)
+    return _CLASSES[key]
+
+
+def encode_event(event):
+    attrs = event.__dict__
+    others = {k: v for k, v in attrs.items() if k not in EVENT_FIELDS and k != 'has_changes'}
+    data = [event.__class__.__module__, event.__class__.__name__, event._event_type.value,
+            event._id, event._publisher_id, event._timestamp, event._counter,
+            attrs.get('_requeue_counter', 0), event._content, others]
+    return msgpack.packb(data, default=default, use_bin_type=True)
+
+
+def decode_event(data):
+    (module_name, class_name, event_type, event_id, publisher_id, timestamp,
+     counter, requeue_counter, content, others) = msgpack.unpackb(data, ext_hook=ext_hook, raw=False,
+                                                                  strict_map_key=False)
+    cls = get_class(module_name, class_name)
+    event = cls.__new__(cls)
+    event.__dict__.update(others)
+    event._id = event_id
+    event._publisher_id = publisher_id
+    event._event_type = EventType(event_type)
+    event._timestamp = timestamp
+    event._counter = counter
+    event._requeue_counter = requeue_counter
+    event._content = content
+    event.has_changes = False
+    return event
+
+
+def encode_message(msg, encoding='json'):
+    """
+    Encode a message.
+
+    :param msg: dict with 'type' and optionally 'event', 'events' or 'ret'.
+    :param encoding: json or msgpack.
+    :returns: list of frames.
+    """
+    if encoding != 'msgpack':
+        return [json_dumps(msg).encode('utf-8')]
+
+    header, frames = {}, [MAGIC, None]
+    for key, value in msg.items():
+        if key in EVENT_KEYS and is_event(value):
+            header[key] = {'__frames__': [len(frames), 1, False]}
+            frames.append(encode_event(value))
+        elif key in EVENT_KEYS and isinstance(value, (list, tuple)) and value and all([is_event(v) for v in value]):
+            header[key] = {'__frames__': [len(frames), len(value), True]}
+            frames.extend([encode_event(v) for v in value])
+        else:
+            header[key] = value
+    frames[1] = msgpack.packb(header, default=default, use_bin_type=True)
+    return frames
+
+
+def get_frame_buffer(frame):
+    # zmq.Frame when received with copy=False
+    return frame.buffer if hasattr(frame, 'buffer') else frame
+
+
+def decode_message(frames):
+    """
+    Decode a message in json or msgpack format.
+
+    :param frames: list of frames (bytes or zmq.Frame).
+    :returns: (message, encoding)
+    """
+    first = get_frame_buffer(frames[0])
+    if len(frames) >= 2 and bytes(first) == MAGIC:
+        if msgpack is None:
+            raise Exception("msgpack is required to decode the message")
+        header = msgpack.unpackb(get_frame_buffer(frames[1]), ext_hook=ext_hook, raw=False, strict_map_key=False)
+        msg = {}
+        for key, value in header.items():
+            if isinstance(value, dict) and '__frames__' in value:
+                start, num, is_list = value['__frames__']
+                events = [decode_event(get_frame_buffer(f)) for f in frames[start:start + num]]
+                msg[key] = events if is_list else events[0]
+            else:
+                msg[key] = value
+        return msg, 'msgpack'
+    return json_loads(bytes(first).decode('utf-8')), 'json'
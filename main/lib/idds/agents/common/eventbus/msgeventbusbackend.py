@@ -20,10 +20,10 @@ import uuid
 import zmq
 from zmq.auth.thread import ThreadAuthenticator
 
-from idds.common.utils import json_dumps, json_loads
-
 from .event import StateClaimEvent, EventBusState, TestEvent
+from . import msgcodec
 from .baseeventbusbackend import BaseEventBusBackend
+from .eventbusmetrics import record_merged
 
 
 class MsgEventBusBackendReceiver(threading.Thread):
@@ -44,7 +44,7 @@ class MsgEventBusBackendReceiver(threading.Thread):
 
         self.max_delay = 180
 
-        self._stop = threading.Event()
+        self._stop_event = threading.Event()
         self._lock = threading.RLock()
 
         self.debug = debug
@@ -53,24 +53,29 @@ class MsgEventBusBackendReceiver(threading.Thread):
         self.coordinator = coordinator
 
     def stop(self):
-        self._stop.set()
+        self._stop_event.set()
 
     def run(self):
         while not self.graceful_stop.is_set():
             try:
-                if self._stop.is_set():
+                if self._stop_event.is_set():
                     return
 
+                frames = None
                 try:
-                    req = self.coordinator_socket.recv_string()
-                    if self.debug:
-                        self.logger.debug("MsgEventBusBackendReceiver received: %s" % req)
+                    # poll with a timeout to check graceful_stop regularly
+                    if not self.coordinator_socket.poll(1000):
+                        continue
+                    frames = self.coordinator_socket.recv_multipart(copy=False)
                 except Exception as error:
                     self.logger.critical("Caught an exception: %s\n%s" % (str(error), traceback.format_exc()))
                     self.coordinator_socket.close()
 
+                encoding = 'json'
                 try:
-                    req = json_loads(req)
+                    req, encoding = msgcodec.decode_message(frames)
+                    if self.debug:
+                        self.logger.debug("MsgEventBusBackendReceiver received (%s): %s" % (encoding, req))
                     reply = {'ret': None}
                     if self.coordinator:
                         if req['type'] == 'send_event':
@@ -106,16 +111,17 @@ class MsgEventBusBackendReceiver(threading.Thread):
                     self.logger.critical("Caught an exception: %s\n%s" % (str(error), traceback.format_exc()))
                     reply = {'type': 'error', 'ret': None}
 
-                reply = json_dumps(reply)
                 try:
                     if self.debug:
                         self.logger.debug("MsgEventBusBackendReceiver reply: %s" % reply)
-                    self.coordinator_socket.send_string(reply)
+                    self.coordinator_socket.send_multipart(msgcodec.encode_message(reply, encoding=encoding), copy=False)
                 except Exception as error:
                     self.logger.critical("Caught an exception: %s\n%s" % (str(error), traceback.format_exc()))
                     self.coordinator_socket.close()
 
-                self.graceful_stop.wait(0.1)
+                # only wait when the socket is broken
+                if self.coordinator_socket.closed:
+                    self.graceful_stop.wait(0.1)
             except Exception as error:
                 self.logger.critical("Caught an exception: %s\n%s" % (str(error), traceback.format_exc()))
 
@@ -127,7 +133,8 @@ class MsgEventBusBackendReceiver(threading.Thread):
             self._events_history[event._event_type] = {}
             self._events_insert_time[event._event_type] = {}
 
-        self.logger.debug("All events: %s" % self._events)
+        if self.debug:
+            self.logger.debug("All events: %s" % self._events)
 
         merged = False
         event_act_id = event.get_event_id()
@@ -143,8 +150,10 @@ class MsgEventBusBackendReceiver(threading.Thread):
                     if event.able_to_merge(old_event):
                         old_event.merge(event)
                         self._events[event._event_type][old_event_id] = old_event
-                        self.logger.debug("New event %s is merged to old event %s" % (event, old_event))
+                        if self.debug:
+                            self.logger.debug("New event %s is merged to old event %s" % (event, old_event))
                         merged = True
+                        record_merged(event)
             if not merged:
                 self._events_act_id_index[event._event_type][event_act_id].append(event._id)
 
@@ -153,7 +162,8 @@ class MsgEventBusBackendReceiver(threading.Thread):
                 self._events[event._event_type][event._id] = event
                 self._events_index[event._event_type].insert(0, event._id)
                 self._events_insert_time[event._event_type][event._id] = time.time()
-                self.logger.debug("Insert new event: %s" % event)
+                if self.debug:
+                    self.logger.debug("Insert new event: %s" % event)
             else:
                 hist_time = self._events_history[event._event_type][event_act_id]
                 insert_loc = len(self._events_index[event._event_type])
@@ -171,7 +181,8 @@ class MsgEventBusBackendReceiver(threading.Thread):
                 self._events[event._event_type][event._id] = event
                 self._events_index[event._event_type].insert(insert_loc, event._id)
                 self._events_insert_time[event._event_type][event._id] = time.time()
-                self.logger.debug("Insert new event: %s" % event)
+                if self.debug:
+                    self.logger.debug("Insert new event: %s" % event)
 
     def clean_events(self):
         if self._events_history_clean_time + 3600 * 4 < time.time():
@@ -226,6 +237,12 @@ class MsgEventBusBackendReceiver(threading.Thread):
 
             return events
 
+    def get_queue_depth(self):
+        if self.coordinator:
+            return self.coordinator.get_queue_depth()
+        with self._lock:
+            return {event_type: len(self._events_index[event_type]) for event_type in self._events_index}
+
 
 class MsgEventBusBackend(BaseEventBusBackend):
     """
@@ -234,7 +251,8 @@ class MsgEventBusBackend(BaseEventBusBackend):
 
     def __init__(self, logger=None, coordinator_port=5556, socket_timeout=10, debug=False,
                  timeout_threshold=5, failure_threshold=5, failure_timeout=180,
-                 num_of_set_failed_at_threshold=10, connection_retries=3, **kwargs):
+                 num_of_set_failed_at_threshold=10, connection_retries=3, encoding='json',
+                 send_batch_window=0, send_batch_size=100, local_delivery=True, **kwargs):
         super(MsgEventBusBackend, self).__init__()
         self._id = str(uuid.uuid4())[:8]
         self._state_claim_wait = 60
@@ -281,6 +299,22 @@ class MsgEventBusBackend(BaseEventBusBackend):
 
         self.connection_retries = connection_retries
 
+        # json or msgpack (multipart binary frames)
+        self.encoding = encoding
+        if self.encoding == 'msgpack' and not msgcodec.is_msgpack_available():
+            self.logger.warning("msgpack is not available, use json encoding")
+            self.encoding = 'json'
+
+        # events sent within send_batch_window seconds are sent together (0 to disable)
+        self.send_batch_window = float(send_batch_window)
+        self.send_batch_size = int(send_batch_size)
+        self._send_buffer = []
+        self._send_buffer_cond = threading.Condition()
+        self._batch_sender = None
+
+        # deliver the events directly when the manager is in this process
+        self.local_delivery = local_delivery not in [False, 'false', 'False']
+
         self.init_msg_channel()
 
     def setup_logger(self, logger=None):
@@ -298,6 +332,7 @@ class MsgEventBusBackend(BaseEventBusBackend):
     def stop(self, signum=None, frame=None):
         self.logger.debug("graceful stop")
         self.graceful_stop.set()
+        self.flush_send_buffer()
         if self.auth:
             self.logger.debug("auth stop")
             self.auth.stop()
@@ -418,11 +453,38 @@ class MsgEventBusBackend(BaseEventBusBackend):
     def get_coordinator(self):
         return self.coordinator
 
+    def send_message(self, req):
+        self.manager_socket.send_multipart(msgcodec.encode_message(req, encoding=self.encoding), copy=False)
+
+    def recv_message(self):
+        reply, encoding = msgcodec.decode_message(self.manager_socket.recv_multipart(copy=False))
+        return reply
+
+    def is_local_manager(self):
+        """
+        Whether the events are queued in this process (the manager is this process).
+        """
+        if not self.local_delivery or not self.processor or not self.coordinator_con_string:
+            return False
+        manager = self.get_manager()
+        return manager is not None and manager['connect'] == self.coordinator_con_string
+
+    def get_local_queue(self):
+        if self.coordinator:
+            return self.coordinator
+        return self.processor
+
     def send(self, event):
+        if self.is_local_manager():
+            # the event object is queued as it is, without serialization
+            return self.get_local_queue().send(event)
+
+        if self.send_batch_window > 0:
+            return self.buffer_event(event)
+
         with self._lock:
             try:
                 req = {'type': 'send_event', 'event': event}
-                req = json_dumps(req)
                 # self.logger.debug("send:send %s" % req)
                 if self.debug:
                     self.logger.debug("MsgEventBusBackend send event: %s" % req)
@@ -430,13 +492,12 @@ class MsgEventBusBackend(BaseEventBusBackend):
                 if not self.manager_socket or self.manager_socket.closed:
                     self.init_msg_channel()
 
-                self.manager_socket.send_string(req)
+                self.send_message(req)
                 if self.manager_socket.poll(self.socket_timeout * 1000):
-                    reply = self.manager_socket.recv_string()
+                    reply = self.recv_message()
                     # self.logger.debug("send:recv %s" % reply)
                     if self.debug:
                         self.logger.debug("MsgEventBusBackend send event reply: %s" % reply)
-                    reply = json_loads(reply)
                     ret = reply['ret']
 
                     # refresh failures when there are successful requests
@@ -464,10 +525,12 @@ class MsgEventBusBackend(BaseEventBusBackend):
                 self.num_failures += 1
 
     def send_bulk(self, events):
+        if self.is_local_manager():
+            return self.get_local_queue().send_bulk(events)
+
         with self._lock:
             try:
                 req = {'type': 'send_bulk', 'events': events}
-                req = json_dumps(req)
                 # self.logger.debug("send:send %s" % req)
                 if self.debug:
                     self.logger.debug("MsgEventBusBackend send bulk event: %s" % req)
@@ -475,13 +538,12 @@ class MsgEventBusBackend(BaseEventBusBackend):
                 if not self.manager_socket or self.manager_socket.closed:
                     self.init_msg_channel()
 
-                self.manager_socket.send_string(req)
+                self.send_message(req)
                 if self.manager_socket.poll(self.socket_timeout * 1000):
-                    reply = self.manager_socket.recv_string()
+                    reply = self.recv_message()
                     # self.logger.debug("send:recv %s" % reply)
                     if self.debug:
                         self.logger.debug("MsgEventBusBackend send bulk event reply: %s" % reply)
-                    reply = json_loads(reply)
                     ret = reply['ret']
 
                     # refresh failures when there are successful requests
@@ -511,11 +573,17 @@ class MsgEventBusBackend(BaseEventBusBackend):
                     self.cache_events.append(event)
                 self.num_failures += 1
 
-    def get(self, event_type, num_events=1, wait=0):
+    def get(self, event_type, num_events=1, wait=0, callback=None):
+        if self.is_local_manager():
+            ret = self.get_local_queue().get(event_type, num_events=num_events, wait=wait)
+            if ret and callback:
+                for event in ret:
+                    callback(event)
+            return ret
+
         with self._lock:
             try:
                 req = {'type': 'get_event', 'event_type': event_type, 'num_events': num_events, 'wait': wait}
-                req = json_dumps(req)
                 # self.logger.debug("get:send %s" % req)
 
                 if self.debug:
@@ -524,15 +592,17 @@ class MsgEventBusBackend(BaseEventBusBackend):
                 if not self.manager_socket or self.manager_socket.closed:
                     self.init_msg_channel()
 
-                self.manager_socket.send_string(req)
+                self.send_message(req)
 
                 if self.manager_socket.poll(10 * 1000):
-                    reply = self.manager_socket.recv_string()
+                    reply = self.recv_message()
                     # self.logger.debug("send:recv %s" % reply)
                     if self.debug:
                         self.logger.debug("MsgEventBusBackend get event reply: %s" % reply)
-                    reply = json_loads(reply)
                     ret = reply['ret']
+                    if ret and callback:
+                        for event in ret:
+                            callback(event)
 
                     # refresh failures when there are successful requests
                     self.num_failures = 0
@@ -556,6 +626,38 @@ class MsgEventBusBackend(BaseEventBusBackend):
                 self.num_failures += 1
         return []
 
+    def buffer_event(self, event):
+        """
+        Buffer an event, to be sent together with the other events sent within send_batch_window.
+        """
+        with self._send_buffer_cond:
+            self._send_buffer.append(event)
+            if self._batch_sender is None or not self._batch_sender.is_alive():
+                self._batch_sender = threading.Thread(target=self.run_batch_sender, name='MsgEventBusBatchSender', daemon=True)
+                self._batch_sender.start()
+            if len(self._send_buffer) >= self.send_batch_size:
+                self._send_buffer_cond.notify()
+
+    def flush_send_buffer(self):
+        with self._send_buffer_cond:
+            events = self._send_buffer
+            self._send_buffer = []
+        for i in range(0, len(events), self.send_batch_size):
+            self.send_bulk(events[i:i + self.send_batch_size])
+
+    def run_batch_sender(self):
+        while not self.graceful_stop.is_set():
+            try:
+                with self._send_buffer_cond:
+                    if not self._send_buffer:
+                        self._send_buffer_cond.wait(1)
+                    if self._send_buffer and len(self._send_buffer) < self.send_batch_size:
+                        # wait for more events within the window
+                        self._send_buffer_cond.wait(self.send_batch_window)
+                self.flush_send_buffer()
+            except Exception as error:
+                self.logger.critical("Caught an exception: %s\n%s" % (str(error), traceback.format_exc()))
+
     def test(self):
         if self.num_failures > 0 or self.num_timeout > 0:
             event = TestEvent()
@@ -570,6 +672,14 @@ class MsgEventBusBackend(BaseEventBusBackend):
         if self.get_coordinator():
             return self.get_coordinator().send_report(event, status, start_time, end_time, source, result)
 
+    def get_queue_depth(self):
+        # the events are queued in the manager process
+        if self.get_coordinator():
+            return self.get_coordinator().get_queue_depth()
+        if self.processor:
+            return self.processor.get_queue_depth()
+        return {}
+
     def clean_event(self, event):
         pass
 
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Scheduling policies to select the items (requests, transforms, processings) polled by the agents.
+
+The database returns the candidates, at most per_flow_candidates oldest items of every flow
+(requester, campaign) and bulk_size * candidate_factor items in total, the oldest items of all
+flows first. The policy selects bulk_size items from them.
+
+FairSharePolicy is a deficit round-robin between the flows. Every visit of a flow adds
+quantum * weight of the flow * (1 + priority / priority_scale) to its deficit, where priority is
+the priority of the next item of the flow, and every selected item costs 1. In a flow the items
+are ordered by priority / priority_scale + waiting time / aging_period, so the aging prevents
+that an item is starved by newer items with higher priority. The round-robin position is kept
+between the polls, so with F active flows of the same weight and priority
+(F <= bulk_size * candidate_factor) every flow gets at least one item in every ceil(F / bulk_size) polls.
+"""
+
+import datetime
+import importlib
+import threading
+
+
+class SchedulingPolicy(object):
+    """
+    Base policy, which selects the candidates in the order from the database.
+    """
+    def __init__(self, candidate_factor=1, per_flow_candidates=None, **kwargs):
+        self.candidate_factor = int(candidate_factor)
+        self.per_flow_candidates = int(per_flow_candidates) if per_flow_candidates else None
+
+    def get_num_candidates(self, num):
+        return num * self.candidate_factor
+
+    def get_per_flow_candidates(self, num):
+        return self.per_flow_candidates if self.per_flow_candidates else self.get_num_candidates(num)
+
+    def select(self, candidates, num, now=None):
+        """
+        Select items from the candidates.
+
+        :param candidates: list of {'item': , 'flow': (requester, campaign), 'priority': , 'updated_at': },
+                           ordered by the rank in the flow and updated_at.
+        :param num: number of items to select.
+        :returns: list of the selected items.
+        """
+        return [candidate['item'] for candidate in candidates[:num]]
+
+
+class FairSharePolicy(SchedulingPolicy):
+    """
+    Deficit round-robin with aging between the flows (requester, campaign).
+
+    :param quantum: deficit added to a flow of weight 1 in every visit.
+    :param requester_weights: {requester: weight}, the default weight is 1.
+    :param campaign_weights: {campaign: weight}, the default weight is 1.
+    :param priority_scale: priority which doubles the quantum of a flow.
+    :param aging_period: waiting seconds which add priority_scale to the priority of an item in its flow.
+    :param max_aging: max aging, in units of priority_scale.
+    """
+    def __init__(self, quantum=1, requester_weights=None, campaign_weights=None, priority_scale=1000, aging_period=600,
+                 max_aging=10, candidate_factor=4, per_flow_candidates=None, **kwargs):
+        super(FairSharePolicy, self).__init__(candidate_factor=candidate_factor, per_flow_candidates=per_flow_candidates)
+        self.quantum = float(quantum)
+        self.requester_weights = requester_weights if requester_weights else {}
+        self.campaign_weights = campaign_weights if campaign_weights else {}
+        self.priority_scale = float(priority_scale)
+        self.aging_period = float(aging_period)
+        self.max_aging = float(max_aging)
+
+        self.deficits = {}
+        self.last_flow = None
+        self.lock = threading.Lock()
+
+    def get_flow_weight(self, flow):
+        requester, campaign = flow
+        return float(self.requester_weights.get(requester, 1)) * float(self.campaign_weights.get(campaign, 1))
+
+    def get_priority_factor(self, candidate):
+        priority = candidate.get('priority', None)
+        if priority and priority > 0:
+            return 1.0 + priority / self.priority_scale
+        return 1.0
+
+    def get_effective_priority(self, candidate, now):
+        effective_priority = self.get_priority_factor(candidate)
+        updated_at = candidate.get('updated_at', None)
+        if updated_at and self.aging_period > 0:
+            waiting_time = (now - updated_at).total_seconds()
+            if waiting_time > 0:
+                effective_priority += min(waiting_time / self.aging_period, self.max_aging)
+        return effective_priority
+
+    def get_flow_order(self, flows):
+        """
+        The flows in a fixed order, starting from the flow after the last visited flow.
+        """
+        flows = sorted(flows, key=lambda flow: (str(flow[0]), str(flow[1])))
+        if self.last_flow is not None:
+            pos = 0
+            for i, flow in enumerate(flows):
+                if (str(flow[0]), str(flow[1])) > (str(self.last_flow[0]), str(self.last_flow[1])):
+                    pos = i
+                    break
+            flows = flows[pos:] + flows[:pos]
+        return flows
+
+    def select(self, candidates, num, now=None):
+        if now is None:
+            now = datetime.datetime.utcnow()
+
+        queues = {}
+        for candidate in candidates:
+            flow = candidate['flow']
+            if flow not in queues:
+                queues[flow] = []
+            queues[flow].append((-self.get_effective_priority(candidate, now), candidate['updated_at'] or now, len(queues[flow]), candidate))
+        for flow in queues:
+            queues[flow].sort(key=lambda item: item[:3])
+
+        selected = []
+        with self.lock:
+            # the deficit of a flow without candidates is reset
+            self.deficits = {flow: self.deficits[flow] for flow in self.deficits if flow in queues}
+            # a flow with weight 0 is never selected
+            flows = self.get_flow_order([flow for flow in queues if self.get_flow_weight(flow) > 0])
+            while len(selected) < num and flows:
+                for flow in flows:
+                    if len(selected) >= num:
+                        break
+                    self.last_flow = flow
+                    queue = queues[flow]
+                    deficit = self.deficits.get(flow, 0)
+                    deficit += self.quantum * self.get_flow_weight(flow) * self.get_priority_factor(queue[0][3])
+                    while queue and len(selected) < num and deficit >= 1:
+                        candidate = queue.pop(0)[3]
+                        deficit -= 1
+                        selected.append(candidate['item'])
+                    self.deficits[flow] = deficit if queue else 0
+                flows = [flow for flow in flows if queues[flow]]
+        return selected
+
+
+def get_scheduling_policy(policy=None, **kwargs):
+    """
+    Get the scheduling policy.
+
+    :param policy: None or 'fifo' for first in first out, 'fair_share' for FairSharePolicy,
+                   or the full name of a SchedulingPolicy class (module.Class).
+    :returns: the policy, None for first in first out.
+    """
+    if not policy or policy == 'fifo':
+        return None
+    if policy == 'fair_share':
+        return FairSharePolicy(**kwargs)
+    module_name, class_name = policy.rsplit('.', 1)
+    policy_class = getattr(importlib.import_module(module_name), class_name)
+    return policy_class(**kwargs)
@@ -10,6 +10,7 @@
 
 
 import logging
+import queue
 import random
 import socket
 import threading
@@ -17,6 +18,7 @@ import time
 import traceback
 import stomp
 
+from idds.common import metrics
 from idds.common.plugin.plugin_base import PluginBase
 from idds.common.utils import setup_logging, get_logger, json_dumps, json_loads
 
@@ -25,6 +27,41 @@ setup_logging(__name__)
 logging.getLogger("stomp").setLevel(logging.CRITICAL)
 
 
+BATCH_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+
+def get_messages_counter():
+    return metrics.get_counter('idds_messaging_messages_total', 'Number of messages sent, discarded and requeued by the sender',
+                               label_names=('channel', 'status'))
+
+
+def get_batch_histogram():
+    return metrics.get_histogram('idds_messaging_batch_duration_seconds', 'Duration to send a batch and get its receipt',
+                                 label_names=('channel',), buckets=BATCH_BUCKETS)
+
+
+def get_reconnects_counter():
+    return metrics.get_counter('idds_messaging_reconnects_total', 'Number of failed batches and reconnections',
+                               label_names=('channel',))
+
+
+def get_backlog_gauge():
+    return metrics.get_gauge('idds_messaging_backlog', 'Number of messages waiting to be sent')
+
+
+def record_messages(channel, status, num):
+    get_messages_counter().inc(num, labels={'channel': channel, 'status': status})
+
+
+def record_batch(channel, num, duration):
+    record_messages(channel, 'sent', num)
+    get_batch_histogram().observe(duration, labels={'channel': channel})
+
+
+def record_reconnect(channel):
+    get_reconnects_counter().inc(labels={'channel': channel})
+
+
 class MessagingListener(stomp.ConnectionListener):
     '''
     Messaging Listener
@@ -119,43 +156,51 @@ class MessagingSender(PluginBase, threading.Thread):
     def set_response_queue(self, response_queue):
         self.response_queue = response_queue
 
+    def resolve_broker_addresses(self, name, brokers):
+        if type(brokers) in [list, tuple]:
+            pass
+        else:
+            brokers = brokers.split(",")
+
+        broker_addresses = []
+        for b in brokers:
+            try:
+                b, port = b.split(":")
+
+                addrinfos = socket.getaddrinfo(b, 0, socket.AF_INET, 0, socket.IPPROTO_TCP)
+                for addrinfo in addrinfos:
+                    b_addr = addrinfo[4][0]
+                    broker_addresses.append((b_addr, port))
+            except socket.gaierror as error:
+                self.logger.error('Cannot resolve hostname %s: %s' % (b, str(error)))
+
+        self.logger.info("Resolved broker addresses for channel %s: %s" % (name, broker_addresses))
+        return broker_addresses
+
+    def create_connection(self, broker, port, timeout):
+        conn = stomp.Connection12(host_and_ports=[(broker, port)],
+                                  keepalive=True,
+                                  heartbeats=(30000, 30000),     # half minute = num / 1000
+                                  timeout=timeout)
+        return conn
+
     def connect_to_messaging_brokers(self, sender=True):
         channel_conns = {}
         for name in self.channels:
             channel = self.channels[name]
             if channel and 'brokers' in channel:
-                brokers = channel['brokers']
-                if type(brokers) in [list, tuple]:
-                    pass
-                else:
-                    brokers = brokers.split(",")
                 # destination = channel['destination']
                 # username = channel['username']
                 # password = channel['password']
                 broker_timeout = channel['broker_timeout']
 
-                broker_addresses = []
-                for b in brokers:
-                    try:
-                        b, port = b.split(":")
-
-                        addrinfos = socket.getaddrinfo(b, 0, socket.AF_INET, 0, socket.IPPROTO_TCP)
-                        for addrinfo in addrinfos:
-                            b_addr = addrinfo[4][0]
-                            broker_addresses.append((b_addr, port))
-                    except socket.gaierror as error:
-                        self.logger.error('Cannot resolve hostname %s: %s' % (b, str(error)))
-
-                self.logger.info("Resolved broker addresses for channel %s: %s" % (name, broker_addresses))
+                broker_addresses = self.resolve_broker_addresses(name, channel['brokers'])
 
                 timeout = broker_timeout
 
                 conns = []
                 for broker, port in broker_addresses:
-                    conn = stomp.Connection12(host_and_ports=[(broker, port)],
-                                              keepalive=True,
-                                              heartbeats=(30000, 30000),     # half minute = num / 1000
-                                              timeout=timeout)
+                    conn = self.create_connection(broker, port, timeout)
                     conns.append(conn)
                 channel_conns[name] = conns
             else:
@@ -207,34 +252,37 @@ class MessagingSender(PluginBase, threading.Thread):
         except Exception as error:
             self.logger.error("Failed to connect to message broker(will re-resolve brokers): %s" % str(error))
 
-    def send_message(self, msg):
-        destination = msg['destination'] if 'destination' in msg else 'default'
-        conn, queue_dest, destination = self.get_connection(destination)
-
+    def get_message_frame(self, msg):
+        """
+        :returns: (body, headers) of the STOMP frame of the message.
+        """
         from_idds = 'false'
         if 'from_idds' in msg and msg['from_idds']:
             from_idds = 'true'
 
+        if type(msg['msg_content']) in [dict] and 'headers' in msg['msg_content'] and 'body' in msg['msg_content']:
+            msg['msg_content']['headers']['from_idds'] = from_idds
+            return json_dumps(msg['msg_content']['body']), msg['msg_content']['headers']
+        headers = {'persistent': 'true',
+                   'ttl': self.timetolive,
+                   'vo': 'atlas',
+                   'from_idds': from_idds,
+                   'msg_type': str(msg['msg_type']).lower()}
+        return json_dumps(msg['msg_content']), headers
+
+    def send_message(self, msg):
+        destination = msg['destination'] if 'destination' in msg else 'default'
+        conn, queue_dest, destination = self.get_connection(destination)
+
         if conn:
             self.logger.info("Sending message to message broker(%s): %s" % (destination, msg['msg_id']))
             self.logger.debug("Sending message to message broker(%s): %s" % (destination, json_dumps(msg['msg_content'])))
-            if type(msg['msg_content']) in [dict] and 'headers' in msg['msg_content'] and 'body' in msg['msg_content']:
-                msg['msg_content']['headers']['from_idds'] = from_idds
-                conn.send(body=json_dumps(msg['msg_content']['body']),
-                          headers=msg['msg_content']['headers'],
-                          destination=queue_dest,
-                          id='atlas-idds-messaging',
-                          ack='auto')
-            else:
-                conn.send(body=json_dumps(msg['msg_content']),
-                          destination=queue_dest,
-                          id='atlas-idds-messaging',
-                          ack='auto',
-                          headers={'persistent': 'true',
-                                   'ttl': self.timetolive,
-                                   'vo': 'atlas',
-                                   'from_idds': from_idds,
-                                   'msg_type': str(msg['msg_type']).lower()})
+            body, headers = self.get_message_frame(msg)
+            conn.send(body=body,
+                      headers=headers,
+                      destination=queue_dest,
+                      id='atlas-idds-messaging',
+                      ack='auto')
         else:
             self.logger.info("No brokers defined, discard(%s): %s" % (destination, msg['msg_id']))
 
@@ -266,6 +314,263 @@ class MessagingSender(PluginBase, threading.Thread):
         self.run()
 
 
+class ReceiptListener(stomp.ConnectionListener):
+    '''
+    Listener to wait for the receipts of the frames sent by a connection.
+    '''
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.receipts = set()
+        self.error = None
+        self.disconnected = False
+
+    def reset(self):
+        with self.cond:
+            self.receipts = set()
+            self.error = None
+            self.disconnected = False
+
+    def on_receipt(self, frame):
+        with self.cond:
+            self.receipts.add(frame.headers.get('receipt-id', None))
+            self.cond.notify_all()
+
+    def on_error(self, frame):
+        with self.cond:
+            self.error = frame.body
+            self.cond.notify_all()
+
+    def on_disconnected(self):
+        with self.cond:
+            self.disconnected = True
+            self.cond.notify_all()
+
+    def wait_receipt(self, receipt, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: receipt in self.receipts or self.error is not None or self.disconnected, timeout=timeout)
+            if receipt in self.receipts:
+                self.receipts.discard(receipt)
+                return
+            if self.error is not None:
+                raise Exception("Broker returns error: %s" % self.error)
+            if self.disconnected:
+                raise Exception("Broker connection is lost")
+            raise Exception("Timeout to wait for the receipt %s" % receipt)
+
+
+class BrokerConnection(object):
+    '''
+    Persistent connection to one broker of a channel, used by one sender worker.
+    '''
+    def __init__(self, conn, broker, username, password, name):
+        self.conn = conn
+        self.broker = broker
+        self.username = username
+        self.password = password
+        self.name = name
+        self.num_batches = 0
+        self.listener = ReceiptListener()
+        self.conn.set_listener('receipt-listener', self.listener)
+
+    def connect(self):
+        if not self.conn.is_connected():
+            self.listener.reset()
+            self.conn.connect(self.username, self.password, wait=True)
+
+    def disconnect(self):
+        try:
+            if self.conn.is_connected():
+                self.conn.disconnect()
+        except Exception:
+            pass
+
+    def send_batch(self, destination, frames, timeout):
+        """
+        Send the frames without waiting, then wait for the receipt of the last frame.
+        The broker processes the frames of a connection in order, so the receipt confirms the whole batch.
+
+        :param frames: list of (body, headers).
+        """
+        self.connect()
+        self.num_batches += 1
+        receipt = '%s-%s' % (self.name, self.num_batches)
+        for i, (body, headers) in enumerate(frames):
+            if i == len(frames) - 1:
+                headers = dict(headers)
+                headers['receipt'] = receipt
+            self.conn.send(body=body,
+                           headers=headers,
+                           destination=destination,
+                           id='atlas-idds-messaging',
+                           ack='auto')
+        self.listener.wait_receipt(receipt, timeout)
+
+
+class BatchMessagingSender(MessagingSender):
+    '''
+    Messaging sender with multiple workers. Every worker keeps persistent connections to the
+    brokers of every channel and sends the messages in batches, waiting for the broker receipt
+    of a batch before sending the next one. A failed batch is resent after reconnecting (to the
+    next broker of the channel) with an exponential backoff, so messages are not dropped.
+
+    Options (plugin.notifier.<option>):
+        num_workers: number of sender workers (default 4).
+        batch_size: max number of messages in one batch (default 100).
+        receipt_timeout: seconds to wait for the receipt of a batch (default 60).
+        reconnect_delay, max_reconnect_delay: backoff between the retries (default 1 and 120 seconds).
+
+    The messages are not sent in the order of the request_queue.
+    '''
+    def __init__(self, name="BatchMessagingSender", logger=None, **kwargs):
+        super(BatchMessagingSender, self).__init__(name=name, logger=logger, **kwargs)
+
+        self.num_workers = int(getattr(self, 'num_workers', 4))
+        self.batch_size = int(getattr(self, 'batch_size', 100))
+        self.receipt_timeout = float(getattr(self, 'receipt_timeout', 60))
+        self.reconnect_delay = float(getattr(self, 'reconnect_delay', 1))
+        self.max_reconnect_delay = float(getattr(self, 'max_reconnect_delay', 120))
+        self.log_period = 600
+
+        self.workers = []
+        self.num_sent = 0
+        self.num_sent_lock = threading.Lock()
+
+    def get_channel_name(self, msg):
+        destination = msg['destination'] if 'destination' in msg else 'default'
+        if destination not in self.channels:
+            destination = 'default'
+        return destination
+
+    def get_batch(self):
+        msgs = []
+        try:
+            msg = self.request_queue.get(timeout=1)
+            if msg:
+                msgs.append(msg)
+            while len(msgs) < self.batch_size:
+                msg = self.request_queue.get_nowait()
+                if msg:
+                    msgs.append(msg)
+        except queue.Empty:
+            pass
+        return msgs
+
+    def get_broker_connections(self, worker_conns, name, worker_id):
+        """
+        :returns: the connections of the worker to the brokers of the channel, None if the channel has no brokers.
+        """
+        if name not in worker_conns:
+            channel = self.channels[name]
+            if channel and 'brokers' in channel:
+                broker_addresses = self.resolve_broker_addresses(name, channel['brokers'])
+                conns = []
+                for broker, port in broker_addresses:
+                    conn = self.create_connection(broker, port, channel['broker_timeout'])
+                    conns.append(BrokerConnection(conn, '%s:%s' % (broker, port), channel['username'], channel['password'],
+                                                  name='%s-%s-%s-%s' % (self.name, worker_id, name, len(conns))))
+                # spread the workers over the brokers
+                if conns:
+                    pos = worker_id % len(conns)
+                    conns = conns[pos:] + conns[:pos]
+                worker_conns[name] = conns
+            else:
+                worker_conns[name] = None
+        return worker_conns[name]
+
+    def disconnect_broker_connections(self, worker_conns):
+        for name in worker_conns:
+            for conn in worker_conns[name] or []:
+                conn.disconnect()
+
+    def send_batch(self, worker_conns, name, worker_id, msgs):
+        """
+        Send the messages of one channel, retrying until they are confirmed by a broker.
+
+        :returns: True if the messages are sent or discarded, False if they are put back to the request_queue.
+        """
+        retries = 0
+        while True:
+            conns = self.get_broker_connections(worker_conns, name, worker_id)
+            if not conns:
+                self.logger.info("No brokers defined, discard %s messages(%s)" % (len(msgs), name))
+                record_messages(name, 'discarded', len(msgs))
+                return True
+
+            conn = conns[0]
+            try:
+                start_time = time.time()
+                conn.send_batch(self.channels[name]['destination'], [self.get_message_frame(msg) for msg in msgs],
+                                timeout=self.receipt_timeout)
+                record_batch(name, len(msgs), time.time() - start_time)
+                with self.num_sent_lock:
+                    self.num_sent += len(msgs)
+                self.logger.debug("Sent %s messages to message broker(%s, %s)" % (len(msgs), name, conn.broker))
+                return True
+            except Exception as error:
+                retries += 1
+                record_reconnect(name)
+                self.logger.warn("Failed to send %s messages to message broker(%s, %s, retries %s): %s" % (len(msgs), name, conn.broker,
+                                                                                                           retries, error))
+                conn.disconnect()
+                # try the next broker, re-resolve the brokers after all of them failed
+                conns.append(conns.pop(0))
+                if retries % len(conns) == 0:
+                    self.disconnect_broker_connections({name: conns})
+                    del worker_conns[name]
+
+            if self.graceful_stop.is_set():
+                for msg in msgs:
+                    self.request_queue.put(msg)
+                record_messages(name, 'requeued', len(msgs))
+                return False
+            self.graceful_stop.wait(min(self.reconnect_delay * 2 ** (retries - 1), self.max_reconnect_delay))
+
+    def execute_send_worker(self, worker_id):
+        worker_conns = {}
+        while not self.graceful_stop.is_set():
+            try:
+                msgs = self.get_batch()
+                channel_msgs = {}
+                for msg in msgs:
+                    channel_msgs.setdefault(self.get_channel_name(msg), []).append(msg)
+                for name in channel_msgs:
+                    if self.send_batch(worker_conns, name, worker_id, channel_msgs[name]):
+                        for msg in channel_msgs[name]:
+                            self.response_queue.put(msg)
+            except Exception as error:
+                self.logger.error("Messaging sender worker throws an exception: %s, %s" % (error, traceback.format_exc()))
+        self.disconnect_broker_connections(worker_conns)
+
+    def get_backlog(self):
+        try:
+            return self.request_queue.qsize()
+        except NotImplementedError:
+            return None
+
+    def execute_send(self):
+        self.workers = []
+        for worker_id in range(self.num_workers):
+            worker = threading.Thread(target=self.execute_send_worker, args=(worker_id,), name='%s-%s' % (self.name, worker_id))
+            worker.start()
+            self.workers.append(worker)
+
+        log_time, log_num_sent = time.time(), 0
+        while not self.graceful_stop.is_set():
+            backlog = self.get_backlog()
+            if backlog is not None:
+                get_backlog_gauge().set(backlog)
+            if time.time() - log_time >= self.log_period:
+                with self.num_sent_lock:
+                    num_sent = self.num_sent
+                rate = (num_sent - log_num_sent) / (time.time() - log_time)
+                self.logger.info("Sent %s messages (%.1f messages/s), backlog: %s" % (num_sent - log_num_sent, rate, backlog))
+                log_time, log_num_sent = time.time(), num_sent
+            self.graceful_stop.wait(1)
+
+        for worker in self.workers:
+            worker.join()
+
+
 class MessagingReceiver(MessagingSender):
     def __init__(self, name="MessagingReceiver", logger=None, **kwargs):
         super(MessagingReceiver, self).__init__(name=name, logger=logger, **kwargs)
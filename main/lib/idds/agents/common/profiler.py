@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+On-demand profiler for the agents.
+
+Two modes are supported:
+    sampling: a background thread samples the stacks of all threads every `interval` seconds.
+              The stacks are aggregated per event type (the event handled by the thread) and
+              dumped as flamegraph compatible collapsed stacks ("frame1;frame2;... count").
+    cprofile: the event handlers (optionally only some event types) are run under cProfile
+              and the statistics are aggregated per event type and dumped as pstats files.
+
+The profiler is process wide. It can be toggled with SIGUSR2 or with a command stored in
+the meta table (see send_profiler_command), and it stops itself after `duration` seconds.
+The sampling thread adjusts its interval to keep its own cost under `max_overhead`.
+"""
+
+import cProfile
+import datetime
+import logging
+import os
+import pstats
+import socket
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+
+from idds.common.config import config_has_section, config_has_option, config_get
+from idds.common.constants import Sections
+from idds.common.utils import get_log_dir
+
+
+PROFILER_COMMAND_NAME = 'agent_profiler'
+
+# thread ident -> event type name of the event being handled by the thread
+_THREAD_EVENTS = {}
+
+_PROFILER = None
+_PROFILER_LOCK = threading.Lock()
+
+
+def get_profiler_config():
+    """
+    Default profiler parameters, which can be set in the [profiler] section.
+    """
+    ret = {'mode': 'sampling', 'duration': 60, 'interval': 0.01, 'max_overhead': 0.02,
+           'max_depth': 64, 'max_stacks': 100000, 'event_types': None, 'profile_dir': None}
+    if config_has_section(Sections.Profiler):
+        for key in ['mode', 'profile_dir']:
+            if config_has_option(Sections.Profiler, key):
+                ret[key] = config_get(Sections.Profiler, key)
+        for key in ['duration', 'interval', 'max_overhead']:
+            if config_has_option(Sections.Profiler, key):
+                ret[key] = float(config_get(Sections.Profiler, key))
+        for key in ['max_depth', 'max_stacks']:
+            if config_has_option(Sections.Profiler, key):
+                ret[key] = int(config_get(Sections.Profiler, key))
+        if config_has_option(Sections.Profiler, 'event_types'):
+            event_types = config_get(Sections.Profiler, 'event_types')
+            ret['event_types'] = [e.strip() for e in event_types.split(',') if e.strip()]
+    if not ret['profile_dir']:
+        ret['profile_dir'] = os.path.join(get_log_dir(), 'profiles')
+    return ret
+
+
+@contextmanager
+def event_context(event_type):
+    """
+    Mark the current thread as handling an event of event_type.
+    """
+    ident = threading.get_ident()
+    _THREAD_EVENTS[ident] = event_type
+    try:
+        yield
+    finally:
+        _THREAD_EVENTS.pop(ident, None)
+
+
+def get_frame_name(frame):
+    code = frame.f_code
+    return '%s:%s' % (os.path.basename(code.co_filename), code.co_name)
+
+
+class Profiler(object):
+    def __init__(self, mode='sampling', duration=60, interval=0.01, max_overhead=0.02, max_depth=64,
+                 max_stacks=100000, event_types=None, profile_dir=None, logger=None):
+        if mode not in ['sampling', 'cprofile']:
+            raise ValueError("Profiler mode %s is not supported" % mode)
+        self.mode = mode
+        self.duration = float(duration)
+        self.interval = float(interval)
+        self.max_overhead = float(max_overhead)
+        self.max_depth = int(max_depth)
+        self.max_stacks = int(max_stacks)
+        self.event_types = set(event_types) if event_types else None
+        self.profile_dir = profile_dir or os.path.join(get_log_dir(), 'profiles')
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+
+        self.stacks = {}
+        self.samples = 0
+        self.sampling_time = 0
+        self.stats = {}
+        self.start_time = None
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def is_running(self):
+        return self.start_time is not None and not self._stop_event.is_set()
+
+    def start(self):
+        self.start_time = time.time()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name='IDDSProfiler', daemon=True)
+        self._thread.start()
+        self.logger.info("Profiler started: mode %s, duration %s, interval %s, event_types %s" % (self.mode, self.duration, self.interval, self.event_types))
+
+    def stop(self):
+        if self._stop_event.is_set():
+            return []
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        return self.dump()
+
+    def run(self):
+        deadline = self.start_time + self.duration
+        interval = self.interval
+        while not self._stop_event.is_set() and time.time() < deadline:
+            if self.mode == 'sampling':
+                t0 = time.time()
+                self.sample()
+                cost = time.time() - t0
+                self.sampling_time += cost
+                # keep the sampling cost under max_overhead of the wall time
+                if cost > interval * self.max_overhead:
+                    interval = min(cost / self.max_overhead, 1.0)
+            self._stop_event.wait(interval if self.mode == 'sampling' else 1)
+        if not self._stop_event.is_set():
+            self.logger.info("Profiler reached its duration %s seconds" % self.duration)
+            self.stop()
+
+    def sample(self):
+        current = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == current:
+                continue
+            frames = []
+            while frame is not None and len(frames) < self.max_depth:
+                frames.append(get_frame_name(frame))
+                frame = frame.f_back
+            frames.reverse()
+            event_type = _THREAD_EVENTS.get(ident, 'NoEvent')
+            stack = ';'.join([event_type, names.get(ident, str(ident))] + frames)
+            if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                stack = '%s;[truncated]' % event_type
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+
+    def is_profiled_event(self, event_type):
+        return self.mode == 'cprofile' and self.is_running() and (not self.event_types or event_type in self.event_types)
+
+    def run_profiled(self, event_type, func, *args, **kwargs):
+        """
+        Run func under cProfile and merge the statistics into the ones of event_type.
+        Only one handler is profiled at a time (cProfile can't run in several threads
+        concurrently), the other handlers run without profiling.
+        """
+        if not self._profile_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._profile_lock.release()
+            with self._lock:
+                if event_type in self.stats:
+                    self.stats[event_type].add(profile)
+                else:
+                    self.stats[event_type] = pstats.Stats(profile)
+
+    def get_file_prefix(self):
+        timestamp = datetime.datetime.utcfromtimestamp(self.start_time).strftime('%Y%m%d_%H%M%S')
+        return os.path.join(self.profile_dir, '%s_%s_%s' % (socket.gethostname(), os.getpid(), timestamp))
+
+    def dump(self):
+        """
+        Dump the profiles to the profile directory.
+
+        :returns: list of file paths.
+        """
+        os.makedirs(self.profile_dir, exist_ok=True)
+        prefix = self.get_file_prefix()
+        paths = []
+        if self.mode == 'sampling':
+            path = prefix + '.collapsed'
+            per_event = {}
+            with open(path, 'w') as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write('%s %s\n' % (stack, count))
+                    event_type = stack.split(';', 1)[0]
+                    per_event[event_type] = per_event.get(event_type, 0) + count
+            paths.append(path)
+            elapsed = time.time() - self.start_time
+            self.logger.info("Profiler: %s samples in %.1f seconds, sampling overhead %.2f%%, samples per event type: %s" % (self.samples, elapsed, 100.0 * self.sampling_time / max(elapsed, 1e-6), per_event))
+        else:
+            with self._lock:
+                stats = dict(self.stats)
+            for event_type, stat in stats.items():
+                path = '%s_%s.prof' % (prefix, event_type)
+                stat.dump_stats(path)
+                paths.append(path)
+        self.logger.info("Profiler dumped profiles to %s" % paths)
+        return paths
+
+
+def get_profiler():
+    return _PROFILER
+
+
+def start_profiler(logger=None, **kwargs):
+    """
+    Start the process wide profiler. Parameters not given are taken from get_profiler_config.
+    """
+    global _PROFILER
+    with _PROFILER_LOCK:
+        if _PROFILER is not None and _PROFILER.is_running():
+            return _PROFILER
+        params = get_profiler_config()
+        params.update({k: v for k, v in kwargs.items() if v is not None})
+        _PROFILER = Profiler(logger=logger, **params)
+        _PROFILER.start()
+        return _PROFILER
+
+
+def stop_profiler():
+    """
+    Stop the profiler and dump the profiles.
+
+    :returns: list of file paths.
+    """
+    with _PROFILER_LOCK:
+        if _PROFILER is None:
+            return []
+        return _PROFILER.stop()
+
+
+def toggle_profiler(signum=None, frame=None):
+    """
+    Signal handler to start or stop the profiler.
+    """
+    if _PROFILER is not None and _PROFILER.is_running():
+        stop_profiler()
+    else:
+        start_profiler()
+
+
+def run_event_handler(event_type, func, *args, **kwargs):
+    """
+    Run an event handler, recording the event type for the sampling profiler
+    and profiling it with cProfile when it's enabled for this event type.
+    """
+    with event_context(event_type):
+        profiler = _PROFILER
+        if profiler is not None and profiler.is_profiled_event(event_type):
+            return profiler.run_profiled(event_type, func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+
+def send_profiler_command(command='start', hostname=None, **kwargs):
+    """
+    Store a profiler command in the meta table. Agent processes on hostname
+    (or on all hosts if hostname is None) will pick it up.
+
+    :param command: 'start' or 'stop'.
+    :param hostname: The hostname of the agents.
+    :param kwargs: profiler parameters, for example mode, duration, interval and event_types.
+    """
+    from idds.core import meta as core_meta
+
+    meta_info = {'command': command, 'hostname': hostname, 'command_id': '%s' % time.time(), 'parameters': kwargs}
+    core_meta.add_meta_item(name=PROFILER_COMMAND_NAME, status=None, meta_info=meta_info)
+
+
+_LAST_COMMAND_ID = None
+_PROCESS_START_TIME = time.time()
+
+
+def check_profiler_command(logger=None):
+    """
+    Execute the profiler command in the meta table, if there is a new one for this host.
+    """
+    global _LAST_COMMAND_ID
+    from idds.core import meta as core_meta
+
+    item = core_meta.get_meta_item(name=PROFILER_COMMAND_NAME)
+    if not item or not item.get('meta_info'):
+        return
+    meta_info = item['meta_info']
+    command_id = meta_info.get('command_id', None)
+    # do not execute the commands which were sent before this process started
+    if not command_id or command_id == _LAST_COMMAND_ID or float(command_id) < _PROCESS_START_TIME:
+        return
+    _LAST_COMMAND_ID = command_id
+    if meta_info.get('hostname', None) and meta_info['hostname'] != socket.gethostname():
+        return
+
+    if meta_info.get('command', None) == 'stop':
+        stop_profiler()
+    else:
+        start_profiler(logger=logger, **meta_info.get('parameters', {}))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Sharding of the agent work between the live instances of an agent.
+
+The requests are split into num_buckets buckets by request_id % num_buckets. Every bucket
+is owned by the live instance with the highest hash of (instance, bucket) (rendezvous
+hashing), so when an instance joins or leaves only the buckets it gains or owned move.
+The live instances are the instances of the agent in the Health table.
+"""
+
+import hashlib
+
+
+def get_member_id(hostname, pid):
+    return '%s:%s' % (hostname, pid)
+
+
+def get_bucket_weight(member_id, bucket):
+    return hashlib.md5(('%s|%s' % (member_id, bucket)).encode('utf-8')).hexdigest()
+
+
+def get_bucket_owner(bucket, members):
+    return max(members, key=lambda member_id: get_bucket_weight(member_id, bucket))
+
+
+def get_shard_buckets(member_id, members, num_buckets=64):
+    """
+    Get the buckets owned by a member.
+
+    :param member_id: id of the member, from get_member_id.
+    :param members: ids of all live members (including member_id).
+    :param num_buckets: number of buckets.
+    :returns: sorted list of buckets.
+    """
+    members = sorted(set(list(members) + [member_id]))
+    return [bucket for bucket in range(num_buckets) if get_bucket_owner(bucket, members) == member_id]
@@ -13,12 +13,15 @@ import time
 import threading
 import traceback
 
+from collections import OrderedDict
+
 from idds.common.constants import (Sections)
 from idds.common.exceptions import IDDSException
 from idds.common.event import EventPriority
 from idds.common.utils import setup_logging, get_logger, json_loads
 from idds.core import health as core_health
 from idds.agents.common.baseagent import BaseAgent
+from idds.agents.common.eventbus.eventbusmetrics import record_merged
 
 
 setup_logging(__name__)
@@ -34,7 +37,7 @@ class Coordinator(BaseAgent):
                  max_total_files_for_small_task=1000,
                  interval_delay_for_big_task=60,
                  max_boost_interval_delay=3,
-                 show_queued_events_time_interval=300, **kwargs):
+                 show_queued_events_time_interval=300, report_ttl=3600, max_report_size=100000, **kwargs):
         super(Coordinator, self).__init__(num_threads=num_threads, name='Coordinator', **kwargs)
         self.config_section = Sections.Coordinator
 
@@ -49,7 +52,11 @@ class Coordinator(BaseAgent):
         self.events = {}
         self.events_index = {}
         self.events_ids = {}
-        self.report = {}
+        # the last reports per event id, ordered by the report time. They are only used to schedule
+        # the next events of the same id, so they are kept for report_ttl seconds and at most max_report_size ids.
+        self.report = OrderedDict()
+        self.report_ttl = int(report_ttl)
+        self.max_report_size = int(max_report_size)
         self.accounts = {}
 
         self.interval_delay = interval_delay
@@ -201,6 +208,7 @@ class Coordinator(BaseAgent):
                     self.events_index[old_event._event_type][old_event.scheduled_priority].insert(insert_pos, old_event._id)
                 merge = True
                 self.logger.debug("New event %s is merged to old event %s" % (event.to_json(strip=True), old_event.to_json(strip=True)))
+                record_merged(event)
                 break
         if not merge:
             if event._event_type not in self.events_index:
@@ -279,6 +287,10 @@ class Coordinator(BaseAgent):
 
             return events
 
+    def get_queue_depth(self):
+        with self._lock:
+            return {event_type: self.accounts[event_type]['total_queued_events'] for event_type in self.accounts}
+
     def send_report(self, event, status, start_time, end_time, source, result):
         try:
             event_id = event.get_event_id()
@@ -286,17 +298,22 @@ class Coordinator(BaseAgent):
             event_name = event._event_type.name
             if not event_ret_status and result:
                 event_ret_status = result.get("status", None)
-            if event_id not in self.report:
-                self.report[event_id] = {"status": event_ret_status,
-                                         "total_files": None,
-                                         "processed_files": None,
-                                         "event_types": {}}
-            self.report[event_id]['status'] = event_ret_status
-            self.report[event_id]['event_types'][event_name] = {'start_time': start_time,
-                                                                'end_time': end_time,
-                                                                'source': source,
-                                                                'status': event_ret_status,
-                                                                'result': result}
+            with self._lock:
+                if event_id not in self.report:
+                    self.report[event_id] = {"status": event_ret_status,
+                                             "total_files": None,
+                                             "processed_files": None,
+                                             "event_types": {}}
+                else:
+                    self.report.move_to_end(event_id)
+                self.report[event_id]['status'] = event_ret_status
+                self.report[event_id]['event_types'][event_name] = {'start_time': start_time,
+                                                                    'end_time': end_time,
+                                                                    'source': source,
+                                                                    'status': event_ret_status,
+                                                                    'result': result}
+                while len(self.report) > self.max_report_size:
+                    self.report.popitem(last=False)
         except Exception as ex:
             self.logger.error(f"Failed to send event: {ex}")
             self.logger.error(traceback.format_exc())
@@ -309,15 +326,18 @@ class Coordinator(BaseAgent):
                     if not self.events_ids[event_id]:
                         del self.events_ids[event_id]
 
-                event_ids = list(self.report.keys())
-                for event_id in event_ids:
+                # the reports are ordered by the report time, the old ones are at the beginning
+                expired_time = time.time() - self.report_ttl
+                while self.report:
+                    event_id = next(iter(self.report))
                     event_types = list(self.report[event_id]['event_types'].keys())
                     for event_type in event_types:
                         end_time = self.report[event_id]['event_types'][event_type].get('end_time', None)
-                        if not end_time or end_time < time.time() - 86400 * 10:
+                        if not end_time or end_time < expired_time:
                             del self.report[event_id]['event_types'][event_type]
-                    if not self.report[event_id]['event_types']:
-                        del self.report[event_id]
+                    if self.report[event_id]['event_types']:
+                        break
+                    del self.report[event_id]
             except Exception as ex:
                 self.logger.error(f"Failed to send event: {ex}")
                 self.logger.error(traceback.format_exc())
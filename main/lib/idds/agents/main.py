@@ -19,9 +19,11 @@ import signal
 import time
 import traceback
 
+from idds.common import metrics
 from idds.common.constants import Sections
 from idds.common.config import config_has_section, config_has_option, config_list_options, config_get
 from idds.common.utils import setup_logging, report_availability
+from idds.agents.common.profiler import toggle_profiler, check_profiler_command, stop_profiler
 
 
 setup_logging('idds.log')
@@ -110,7 +112,19 @@ def run_agents():
     for agent in RUNNING_AGENTS:
         agent.start()
 
-    current = None
+    metrics_port = metrics.get_agent_metrics_port()
+    if metrics.is_metrics_enabled() and metrics_port:
+        try:
+            metrics.start_http_server(metrics_port)
+            logging.info("Serving metrics on port %s" % metrics_port)
+        except Exception as error:
+            logging.error("Failed to serve metrics on port %s: %s" % (metrics_port, error))
+
+    profiler_poll_period = 60
+    if config_has_section(Sections.Profiler) and config_has_option(Sections.Profiler, 'poll_period'):
+        profiler_poll_period = int(config_get(Sections.Profiler, 'poll_period'))
+
+    current, profiler_checked = None, time.time()
     while len(RUNNING_AGENTS):
         [thr.join(timeout=3.14) for thr in RUNNING_AGENTS if thr and thr.is_alive()]
         RUNNING_AGENTS = [thr for thr in RUNNING_AGENTS if thr and thr.is_alive()]
@@ -128,11 +142,19 @@ def run_agents():
 
             current = time.time()
 
+        if time.time() - profiler_checked > profiler_poll_period:
+            try:
+                check_profiler_command()
+            except Exception as error:
+                logging.error("Failed to check profiler command: %s" % error)
+            profiler_checked = time.time()
+
 
 def stop(signum=None, frame=None):
     global RUNNING_AGENTS
 
     logging.info("Stopping ......")
+    stop_profiler()
     logging.info("Stopping running agents: %s" % RUNNING_AGENTS)
     [thr.stop() for thr in RUNNING_AGENTS if thr and thr.is_alive()]
     stop_time = time.time()
@@ -157,6 +179,8 @@ if __name__ == '__main__':
     signal.signal(signal.SIGTERM, stop)
     signal.signal(signal.SIGQUIT, stop)
     signal.signal(signal.SIGINT, stop)
+    # start/stop the profiler
+    signal.signal(signal.SIGUSR2, toggle_profiler)
 
     try:
         run_agents()
@@ -19,7 +19,6 @@ from idds.common.constants import (Sections, ReturnCode, TransformType,
                                    TransformStatus, TransformLocking,
                                    CollectionType, CollectionStatus,
                                    CollectionRelationType,
-                                   ContentStatus, ContentRelationType,
                                    CommandType, ProcessingStatus, WorkflowType,
                                    ConditionStatus,
                                    get_processing_type_from_transform_type,
@@ -27,7 +26,6 @@ from idds.common.constants import (Sections, ReturnCode, TransformType,
 from idds.common.utils import setup_logging, truncate_string
 from idds.core import (transforms as core_transforms,
                        processings as core_processings,
-                       catalog as core_catalog,
                        throttlers as core_throttlers,
                        conditions as core_conditions)
 from idds.agents.common.baseagent import BaseAgent
@@ -41,6 +39,7 @@ from idds.agents.common.eventbus.event import (EventType,
                                                UpdateProcessingEvent)
 
 from idds.agents.common.cache.redis import get_redis_cache
+from idds.agents.common.cache.counters import Counters
 
 setup_logging(__name__)
 
@@ -107,6 +106,13 @@ class Transformer(BaseAgent):
         else:
             self.cache_expire_seconds = 300
 
+        if hasattr(self, 'counters_reconcile_period'):
+            self.counters_reconcile_period = int(self.counters_reconcile_period)
+        else:
+            self.counters_reconcile_period = 600
+        self.counters = Counters(reconcile_period=self.counters_reconcile_period, cache_expire_seconds=self.cache_expire_seconds,
+                                 logger=self.logger)
+
         if hasattr(self, 'clean_locks_time_period'):
             self.clean_locks_time_period = int(self.clean_locks_time_period)
         else:
@@ -146,100 +152,24 @@ class Transformer(BaseAgent):
             cache.set("throttlers", throttlers, expire_seconds=self.cache_expire_seconds)
         return throttlers
 
+    def reconcile_counters(self, force=False):
+        """
+        Recompute the throttler counters from the database, to correct the drift of the
+        incremental updates. Only one agent reconciles them in every reconcile period.
+        """
+        self.counters.reconcile(force=force)
+
+    def get_counters(self, kind, site_name):
+        return self.counters.get_counters(kind, site_name)
+
     def get_num_active_transforms(self, site_name):
-        cache = get_redis_cache()
-        num_transforms = cache.get("num_transforms", default=None)
-        if num_transforms is None:
-            num_transforms = {}
-            active_status = [TransformStatus.New, TransformStatus.Ready]
-            active_status1 = [TransformStatus.Transforming, TransformStatus.Terminating]
-            rets = core_transforms.get_num_active_transforms(active_status + active_status1)
-            for ret in rets:
-                status, site, count = ret
-                if site is None:
-                    site = 'Default'
-                if site not in num_transforms:
-                    num_transforms[site] = {'new': 0, 'processing': 0}
-                if status in active_status:
-                    num_transforms[site]['new'] += count
-                elif status in active_status1:
-                    num_transforms[site]['processing'] += count
-            cache.set("num_transforms", num_transforms, expire_seconds=self.cache_expire_seconds)
-        default_value = {'new': 0, 'processing': 0}
-        return num_transforms.get(site_name, default_value)
+        return self.get_counters('transforms', site_name)
 
     def get_num_active_processings(self, site_name):
-        cache = get_redis_cache()
-        num_processings = cache.get("num_processings", default=None)
-        active_transforms = cache.get("active_transforms", default={})
-        if num_processings is None:
-            num_processings = {}
-            active_transforms = {}
-            active_status = [ProcessingStatus.New]
-            active_status1 = [ProcessingStatus.Submitting, ProcessingStatus.Submitted,
-                              ProcessingStatus.Running, ProcessingStatus.Terminating, ProcessingStatus.ToTrigger,
-                              ProcessingStatus.Triggering]
-            rets = core_processings.get_active_processings(active_status + active_status1)
-            for ret in rets:
-                req_id, trf_id, pr_id, site, status = ret
-                if site is None:
-                    site = 'Default'
-                if site not in num_processings:
-                    num_processings[site] = {'new': 0, 'processing': 0}
-                    active_transforms[site] = []
-                if status in active_status:
-                    num_processings[site]['new'] += 1
-                elif status in active_status1:
-                    num_processings[site]['processing'] += 1
-                active_transforms[site].append(trf_id)
-            cache.set("num_processings", num_processings, expire_seconds=self.cache_expire_seconds)
-            cache.set("active_transforms", active_transforms, expire_seconds=self.cache_expire_seconds)
-        default_value = {'new': 0, 'processing': 0}
-        return num_processings.get(site_name, default_value), active_transforms
-
-    def get_num_active_contents(self, site_name, active_transform_ids):
-        cache = get_redis_cache()
-        # 1. input contents not terminated
-        # 2. output contents not terminated
-        tf_id_site_map = {}
-        all_tf_ids = []
-        for site in active_transform_ids:
-            all_tf_ids += active_transform_ids[site]
-            for tf_id in active_transform_ids[site]:
-                tf_id_site_map[tf_id] = site
-
-        num_input_contents = cache.get("num_input_contents", default=None)
-        num_output_contents = cache.get("num_output_contents", default=None)
-        if num_input_contents is None or num_output_contents is None:
-            num_input_contents, num_output_contents = {}, {}
-            if all_tf_ids:
-                ret = core_catalog.get_content_status_statistics_by_relation_type(all_tf_ids)
-                for item in ret:
-                    status, relation_type, transform_id, count = item
-                    site = tf_id_site_map[transform_id]
-                    if site not in num_input_contents:
-                        num_input_contents[site] = {'new': 0, 'activated': 0, 'processed': 0}
-                        num_output_contents[site] = {'new': 0, 'activated': 0, 'processed': 0}
-                    if status in [ContentStatus.New]:
-                        if relation_type == ContentRelationType.Input:
-                            num_input_contents[site]['new'] += count
-                        elif relation_type == ContentRelationType.Output:
-                            num_output_contents[site]['new'] += count
-                    if status in [ContentStatus.Activated]:
-                        if relation_type == ContentRelationType.Input:
-                            num_input_contents[site]['activated'] += count
-                        elif relation_type == ContentRelationType.Output:
-                            num_output_contents[site]['activated'] += count
-                    else:
-                        if relation_type == ContentRelationType.Input:
-                            num_input_contents[site]['processed'] += count
-                        elif relation_type == ContentRelationType.Output:
-                            num_output_contents[site]['processed'] += count
+        return self.get_counters('processings', site_name)
 
-            cache.set("num_input_contents", num_input_contents, expire_seconds=self.cache_expire_seconds)
-            cache.set("num_output_contents", num_output_contents, expire_seconds=self.cache_expire_seconds)
-        default_value = {'new': 0, 'activated': 0, 'processed': 0}
-        return num_input_contents.get(site_name, default_value), num_output_contents.get(site_name, default_value)
+    def get_num_active_contents(self, site_name):
+        return self.get_counters('input_contents', site_name), self.get_counters('output_contents', site_name)
 
     def get_closest_site(self, task_site, throttler_sites):
         try:
@@ -277,8 +207,8 @@ class Transformer(BaseAgent):
             self.logger.info(f"throttler closest site for {transform['site']} is {site}")
 
             num_transforms = self.get_num_active_transforms(site)
-            num_processings, active_transforms = self.get_num_active_processings(site)
-            num_input_contents, num_output_contents = self.get_num_active_contents(site, active_transforms)
+            num_processings = self.get_num_active_processings(site)
+            num_input_contents, num_output_contents = self.get_num_active_contents(site)
             self.logger.info("throttler(site: %s): transforms(%s), processings(%s)" % (site, num_transforms, num_processings))
             self.logger.info("throttler(site: %s): active input contents(%s), output contents(%s)" % (site, num_input_contents, num_output_contents))
 
@@ -336,7 +266,9 @@ class Transformer(BaseAgent):
             transforms_q = core_transforms.get_transforms_by_status(status=transform_status, locking=True,
                                                                     not_lock=False, order_by_fifo=True,
                                                                     new_poll=True,
-                                                                    min_request_id=BaseAgent.min_request_id)
+                                                                    min_request_id=BaseAgent.min_request_id,
+                                                                    shard=self.get_shard(),
+                                                                    scheduler=self.get_scheduler('get_queue_transforms'))
 
             # self.logger.debug("Main thread get %s New+Ready+Extend transforms to process" % len(transforms_new))
             if transforms_q:
@@ -406,7 +338,9 @@ class Transformer(BaseAgent):
                                                                       not_lock=True, order_by_fifo=True,
                                                                       new_poll=True,
                                                                       min_request_id=BaseAgent.min_request_id,
-                                                                      bulk_size=self.get_bulk_size())
+                                                                      bulk_size=self.get_bulk_size(),
+                                                                      shard=self.get_shard(),
+                                                                      scheduler=self.get_scheduler('get_new_transforms'))
 
             # self.logger.debug("Main thread get %s New+Ready+Extend transforms to process" % len(transforms_new))
             if transforms_new:
@@ -451,7 +385,9 @@ class Transformer(BaseAgent):
                                                                   not_lock=True,
                                                                   min_request_id=BaseAgent.min_request_id,
                                                                   update_poll=True,
-                                                                  bulk_size=self.get_bulk_size())
+                                                                  bulk_size=self.get_bulk_size(),
+                                                                  shard=self.get_shard(),
+                                                                  scheduler=self.get_scheduler('get_running_transforms'))
 
             # self.logger.debug("Main thread get %s transforming transforms to process" % len(transforms))
             if transforms:
@@ -1605,6 +1541,9 @@ class Transformer(BaseAgent):
             self.add_task(task)
             task = self.create_task(task_func=self.load_min_request_id, task_output_queue=None, task_args=tuple(), task_kwargs={}, delay_time=600, priority=1)
             self.add_task(task)
+            if self.counters.incremental:
+                task = self.create_task(task_func=self.reconcile_counters, task_output_queue=None, task_args=tuple(), task_kwargs={}, delay_time=self.counters_reconcile_period, priority=1)
+                self.add_task(task)
 
             self.execute()
         except KeyboardInterrupt:
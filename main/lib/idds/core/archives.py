@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+operations related to archiving finished requests.
+"""
+
+from idds.orm.base.session import read_session, transactional_session
+from idds.orm import archives as orm_archives
+
+
+ARCHIVE_TABLES = orm_archives.ARCHIVE_TABLES
+
+
+def get_primary_key(table_name):
+    """
+    Get the name of the primary key of a table, or None for composite primary keys.
+    """
+    table = orm_archives.get_table(table_name)
+    pk = orm_archives.get_primary_key(table)
+    if pk is None:
+        return None
+    return pk.name
+
+
+@read_session
+def has_archive_table(table_name, session=None):
+    """
+    Check whether the archive table <table_name>_archive exists.
+    """
+    return orm_archives.get_archive_table(table_name, session=session) is not None
+
+
+@read_session
+def get_requests_to_archive(status, older_than, min_request_id=None, bulk_size=100, session=None):
+    """
+    Get ids of requests which can be archived, in ascending order.
+
+    :param status: list of terminated request status.
+    :param older_than: days since the last update.
+    :param min_request_id: only return requests after this request_id.
+    :param bulk_size: max number of request ids to return.
+
+    :returns: list of request_id.
+    """
+    return orm_archives.get_requests_to_archive(status=status, older_than=older_than,
+                                                min_request_id=min_request_id,
+                                                bulk_size=bulk_size, session=session)
+
+
+@read_session
+def get_partitions(table_name, session=None):
+    """
+    Get the range partitions of a table.
+
+    :returns: list of partition indexes, empty if the table is not partitioned in the database.
+    """
+    return orm_archives.get_partitions(table_name=table_name, session=session)
+
+
+@read_session
+def get_archivable_partitions(table_name, status, older_than, session=None):
+    """
+    Get the range partitions whose requests can all be archived.
+
+    :returns: list of partition indexes.
+    """
+    return orm_archives.get_archivable_partitions(table_name=table_name, status=status,
+                                                  older_than=older_than, session=session)
+
+
+@read_session
+def get_partition_request_ids(table_name, index, session=None):
+    """
+    Get the request ids with rows in a range partition.
+    """
+    return orm_archives.get_partition_request_ids(table_name=table_name, index=index, session=session)
+
+
+@read_session
+def get_archive_batch(table_name, request_id, batch_size=1000, with_rows=False, after_id=None, session=None):
+    """
+    Get a batch of rows of a request.
+
+    :returns: (list of primary keys, list of rows)
+    """
+    return orm_archives.get_archive_batch(table_name=table_name, request_id=request_id,
+                                          batch_size=batch_size, with_rows=with_rows,
+                                          after_id=after_id, session=session)
+
+
+@read_session
+def get_request_rows(table_name, request_id, session=None):
+    """
+    Get all rows of a request. Used for small tables.
+    """
+    return orm_archives.get_request_rows(table_name=table_name, request_id=request_id, session=session)
+
+
+@transactional_session
+def archive_batch(table_name, pks, to_archive_table=True, session=None):
+    """
+    Move a batch of rows to the archive table (optionally) and delete them in one transaction.
+
+    :returns: number of deleted rows.
+    """
+    return orm_archives.archive_batch(table_name=table_name, pks=pks,
+                                      to_archive_table=to_archive_table, session=session)
+
+
+@transactional_session
+def archive_request_rows(table_name, request_id, to_archive_table=True, session=None):
+    """
+    Move all rows of a request to the archive table (optionally) and delete them in one transaction.
+
+    :returns: number of deleted rows.
+    """
+    return orm_archives.archive_request_rows(table_name=table_name, request_id=request_id,
+                                             to_archive_table=to_archive_table, session=session)
+
+
+@transactional_session
+def archive_partition(table_name, index, to_archive_table=True, detach=False, session=None):
+    """
+    Move the rows of a range partition to the archive table (optionally) and drop or detach the partition.
+    """
+    return orm_archives.archive_partition(table_name=table_name, index=index, to_archive_table=to_archive_table,
+                                          detach=detach, session=session)
+
+
+@transactional_session
+def create_partitions(session=None):
+    """
+    Create the range partitions of the partitioned tables ahead of the new requests.
+
+    :returns: {table_name: list of the created partition indexes}
+    """
+    max_request_id = orm_archives.get_last_request_id(session=session)
+    return orm_archives.create_partitions(max_request_id=max_request_id, session=session)
@@ -9,8 +9,13 @@
 # - Wen Guan, <wen.guan@@cern.ch>, 2024
 
 import base64
+import copy
+import hashlib
 import json
 import jwt
+import logging
+import threading
+import time
 import traceback
 
 # from cryptography import x509
@@ -21,6 +26,9 @@ from cryptography.hazmat.primitives import serialization
 from idds.common import authentication
 
 
+logger = logging.getLogger(__name__)
+
+
 def decode_value(val):
     if isinstance(val, str):
         val = val.encode()
@@ -32,32 +40,75 @@ class OIDCAuthentication(authentication.OIDCAuthentication):
     def __init__(self, timeout=None):
         super(OIDCAuthentication, self).__init__(timeout=timeout)
 
+        if not hasattr(self, 'jwks_refresh_time'):
+            # public keys are cached by (jwks_uri, kid) and refreshed in background
+            # before they expire, so that requests don't wait for the jwks endpoint.
+            self.jwks_refresh_time = 3600
+            self.jwks_refreshing = set()
+            self.jwks_lock = threading.Lock()
+        if self.config and self.config.has_section('common'):
+            if self.config.has_option('common', 'jwks_refresh_time'):
+                self.jwks_refresh_time = self.config.getint('common', 'jwks_refresh_time')
+
+    def get_token_cache_key(self, vo, token):
+        return 'token_%s_%s' % (vo, hashlib.sha256(token.encode()).hexdigest())
+
+    def get_public_key_cache_key(self, jwks_uri, kid):
+        return 'jwk_%s_%s' % (jwks_uri, kid)
+
+    def load_public_keys(self, jwks_uri, no_verify=False):
+        jwks_content = self.get_http_content(jwks_uri, no_verify=no_verify)
+        jwks = json.loads(jwks_content)
+
+        pems = {}
+        for jwk in jwks.get('keys', []):
+            if 'kid' not in jwk or 'n' not in jwk or 'e' not in jwk:
+                continue
+            public_num = RSAPublicNumbers(n=decode_value(jwk['n']), e=decode_value(jwk['e']))
+            public_key = public_num.public_key(default_backend())
+            pem = public_key.public_bytes(encoding=serialization.Encoding.PEM, format=serialization.PublicFormat.SubjectPublicKeyInfo)
+            pems[jwk['kid']] = pem
+            self.set_cache_value(self.get_public_key_cache_key(jwks_uri, jwk['kid']), pem,
+                                 expire_at=time.time() + self.jwks_refresh_time * 2)
+        self.set_cache_value(jwks_uri, jwks, expire_at=time.time() + self.jwks_refresh_time)
+        return pems
+
+    def refresh_public_keys(self, jwks_uri, no_verify=False):
+        try:
+            self.load_public_keys(jwks_uri, no_verify=no_verify)
+        except Exception as error:
+            logger.warning("Failed to refresh public keys from %s: %s" % (jwks_uri, str(error)))
+        finally:
+            with self.jwks_lock:
+                self.jwks_refreshing.discard(jwks_uri)
+
+    def refresh_public_keys_background(self, jwks_uri, no_verify=False):
+        with self.jwks_lock:
+            if jwks_uri in self.jwks_refreshing:
+                return
+            self.jwks_refreshing.add(jwks_uri)
+        thread = threading.Thread(target=self.refresh_public_keys, args=(jwks_uri, no_verify),
+                                  name='JWKSRefresh', daemon=True)
+        thread.start()
+
     def get_public_key(self, token, jwks_uri, no_verify=False, with_cache=True):
         headers = jwt.get_unverified_header(token)
         if headers is None or 'kid' not in headers:
             raise jwt.exceptions.InvalidTokenError('cannot extract kid from headers')
         kid = headers['kid']
 
+        pem = None
         if with_cache:
-            jwks = self.get_cache_value(jwks_uri)
-        else:
-            jwks = None
-
-        if not jwks:
-            jwks_content = self.get_http_content(jwks_uri, no_verify=no_verify)
-            jwks = json.loads(jwks_content)
-            self.set_cache_value(jwks_uri, jwks)
-
-        jwk = None
-        for j in jwks.get('keys', []):
-            if j.get('kid') == kid:
-                jwk = j
-        if jwk is None:
-            raise jwt.exceptions.InvalidTokenError('JWK not found for kid={0}: {1}'.format(kid, str(jwks)))
-
-        public_num = RSAPublicNumbers(n=decode_value(jwk['n']), e=decode_value(jwk['e']))
-        public_key = public_num.public_key(default_backend())
-        pem = public_key.public_bytes(encoding=serialization.Encoding.PEM, format=serialization.PublicFormat.SubjectPublicKeyInfo)
+            pem = self.get_cache_value(self.get_public_key_cache_key(jwks_uri, kid))
+            if pem is not None and self.get_cache_value(jwks_uri) is None:
+                # the key set is getting old, refresh it without blocking this request
+                self.refresh_public_keys_background(jwks_uri, no_verify=no_verify)
+
+        if pem is None:
+            pems = self.load_public_keys(jwks_uri, no_verify=no_verify)
+            pem = pems.get(kid, None)
+        if pem is None:
+            raise jwt.exceptions.InvalidTokenError('JWK not found for kid={0}: {1}'.format(kid, str(self.get_cache_value(jwks_uri))))
         return pem
 
     def verify_id_token_cache(self, vo, token, with_cache=True):
@@ -93,10 +144,22 @@ class OIDCAuthentication(authentication.OIDCAuthentication):
             return False, 'Failed to verify oidc token: ' + str(error), None
 
     def verify_id_token(self, vo, token):
+        if not token:
+            return False, 'Failed to verify oidc token: token is empty', None
+
+        token_key = self.get_token_cache_key(vo, token)
+        cached = self.get_cache_value(token_key)
+        if cached is not None:
+            decoded, username = cached
+            return True, copy.deepcopy(decoded), username
+
         status, data, username = self.verify_id_token_cache(vo, token, with_cache=True)
-        if status:
-            return status, data, username
-        return self.verify_id_token_cache(vo, token, with_cache=False)
+        if not status:
+            status, data, username = self.verify_id_token_cache(vo, token, with_cache=False)
+        if status and data.get('exp', None):
+            # a verified token is valid until it expires
+            self.set_cache_value(token_key, (copy.deepcopy(data), username), expire_at=data['exp'])
+        return status, data, username
 
 
 class OIDCAuthenticationUtils(authentication.OIDCAuthenticationUtils):
@@ -118,9 +181,7 @@ def get_user_name_from_dn2(dn):
 
 
 def get_user_name_from_dn(dn):
-    dn = get_user_name_from_dn1(dn)
-    dn = get_user_name_from_dn2(dn)
-    return dn
+    return authentication.get_user_name_from_dn(dn)
 
 
 def authenticate_x509(vo, dn, client_cert):
@@ -17,11 +17,12 @@ operations related to Catalog(Collections and Contents).
 from idds.common import exceptions
 from idds.common.constants import (CollectionType, CollectionStatus, CollectionLocking,
                                    CollectionRelationType, ContentStatus, ContentRelationType)
-from idds.orm.base.session import read_session, transactional_session
+from idds.orm.base.session import read_session, stream_session, transactional_session
 from idds.orm import (transforms as orm_transforms,
                       collections as orm_collections,
                       contents as orm_contents,
                       messages as orm_messages)
+from idds.core import counters as core_counters
 
 
 @transactional_session
@@ -188,6 +189,7 @@ def add_contents(contents, bulk_size=1000, session=None):
 
     :returns: content id.
     """
+    core_counters.record_new_contents(contents, session=session)
     return orm_contents.add_contents(contents=contents, bulk_size=bulk_size,
                                      session=session)
 
@@ -272,6 +274,7 @@ def update_contents(parameters, request_id=None, transform_id=None, use_bulk_upd
     :raises DatabaseException: If there is a database error.
 
     """
+    core_counters.record_contents_update(parameters, request_id=request_id, session=session)
     return orm_contents.update_contents(parameters, request_id=request_id, transform_id=transform_id,
                                         use_bulk_update_mappings=use_bulk_update_mappings, session=session)
 
@@ -289,6 +292,7 @@ def update_content(content_id, parameters, session=None):
     :raises DatabaseException: If there is a database error.
 
     """
+    core_counters.record_contents_update([dict(parameters, content_id=content_id)], session=session)
     return orm_contents.update_content(content_id, parameters, session=session)
 
 
@@ -354,6 +358,27 @@ def get_contents_by_request_transform(request_id=None, workload_id=None, transfo
     return ret
 
 
+@stream_session
+def iter_contents_by_request_transform(request_id=None, workload_id=None, transform_id=None, status=None, map_id=None,
+                                       status_updated=False, with_deps=True, columns=None, session=None):
+    """
+    Iterate contents with request id, workload id and transform id, in constant memory.
+
+    :param request_id: the request id.
+    :param workload_id: The workload_id of the request.
+    :param transform_id: The transform id related to this collection.
+    :param columns: list of column names, None for all columns.
+    :param session: The database session in use.
+
+    :returns: generator of named tuples with the columns as attributes.
+    """
+    for content in orm_contents.iter_contents_by_request_transform(request_id=request_id, transform_id=transform_id,
+                                                                   workload_id=workload_id, status=status, map_id=map_id,
+                                                                   status_updated=status_updated, with_deps=with_deps,
+                                                                   columns=columns, session=session):
+        yield content
+
+
 @read_session
 def get_contents_by_content_ids(content_ids, request_id=None, session=None):
     """
@@ -444,6 +469,7 @@ def register_output_contents(coll_scope, coll_name, contents, request_id=None, w
                 del content[key]
         content['content_id'] = ex_content['content_id']
 
+    core_counters.record_contents_update(contents, session=session)
     orm_contents.update_contents(contents, session=session)
 
 
@@ -776,6 +802,32 @@ def delete_contents_update(request_id=None, transform_id=None, contents=[], fetc
     return orm_contents.delete_contents_update(request_id=request_id, transform_id=transform_id, contents=contents, fetch=fetch, session=session)
 
 
+@transactional_session
+def apply_contents_update(request_id, transform_id, substatus=None, limit=None, session=None):
+    """
+    Apply the staged updates in contents_update of a transform to the contents and delete them, in one transaction.
+
+    The staged rows are marked as fetching first, so the rows added by the Receiver in the meantime
+    are kept for the next round.
+
+    :param request_id: The request id.
+    :param transform_id: The transform id.
+    :param substatus: If set, only the staged updates with these substatus are applied. The others are only deleted.
+    :param limit: If set, apply at most this number of staged updates, to bound the transaction.
+    :param session: The database session in use.
+
+    :returns: (number of staged updates, number of updated contents)
+    """
+    num_staged = orm_contents.set_fetching_contents_update(request_id=request_id, transform_id=transform_id, fetch=True,
+                                                           limit=limit, session=session)
+    if not num_staged:
+        return 0, 0
+    core_counters.record_staged_contents_update(request_id, transform_id, substatus=substatus, session=session)
+    num_updated = orm_contents.merge_contents_update(request_id=request_id, transform_id=transform_id, substatus=substatus, session=session)
+    orm_contents.delete_contents_update(request_id=request_id, transform_id=transform_id, fetch=True, session=session)
+    return num_staged, num_updated
+
+
 def get_contents_ext_maps():
     return orm_contents.get_contents_ext_maps()
 
@@ -831,6 +883,24 @@ def get_contents_ext(request_id=None, transform_id=None, workload_id=None, coll_
                                          coll_id=coll_id, status=status, session=session)
 
 
+@stream_session
+def iter_contents_ext(request_id=None, transform_id=None, workload_id=None, coll_id=None, status=None, columns=None, session=None):
+    """
+    Iterate contents ext in constant memory.
+
+    :param request_id: request id.
+    :param transform_id: transform id.
+    :param workload_id: workload id.
+    :param columns: list of column names, None for all columns.
+    :param session: The database session in use.
+
+    :returns: generator of named tuples with the columns as attributes.
+    """
+    for content in orm_contents.iter_contents_ext(request_id=request_id, transform_id=transform_id, workload_id=workload_id,
+                                                  coll_id=coll_id, status=status, columns=columns, session=session):
+        yield content
+
+
 @read_session
 def get_contents_ext_ids(request_id=None, transform_id=None, workload_id=None, coll_id=None, status=None, session=None):
     """
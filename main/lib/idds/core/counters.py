@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+The throttler counters of the active requests, transforms, processings and contents, maintained by the core functions.
+
+With [cache] throttler_counters = True, the agents register a recorder (idds.agents.common.cache.counters.Counters),
+which keeps the counters in redis. The core functions which add requests, transforms, processings or contents or change
+their status report the status transitions to it. Without a recorder nothing is recorded and nothing is read, for
+example in the rest service or when the counters are disabled.
+
+The transitions are recorded before the transaction is committed. The drift of a transaction which is rolled
+back afterwards is corrected by the periodic reconciliation of the counters.
+"""
+
+from idds.common.constants import ContentRelationType, ContentStatus
+from idds.orm import (contents as orm_contents,
+                      processings as orm_processings,
+                      requests as orm_requests,
+                      transforms as orm_transforms)
+
+
+CONTENT_KINDS = {ContentRelationType.Input: 'input_contents',
+                 ContentRelationType.Output: 'output_contents'}
+
+_RECORDER = None
+
+
+def set_counters_recorder(recorder):
+    """
+    :param recorder: object with record_transitions(kind, {(site, old_status, new_status): number of items}),
+                     None to stop recording.
+    """
+    global _RECORDER
+    _RECORDER = recorder
+
+
+def is_recording():
+    return _RECORDER is not None
+
+
+def add_transition(transitions, kind, site, old_status, new_status, num=1):
+    key = (site, old_status, new_status)
+    transitions.setdefault(kind, {})
+    transitions[kind][key] = transitions[kind].get(key, 0) + num
+
+
+def record_transitions(transitions):
+    """
+    :param transitions: {kind: {(site, old_status, new_status): number of items}}
+    """
+    if _RECORDER is None:
+        return
+    for kind in transitions:
+        if transitions[kind]:
+            _RECORDER.record_transitions(kind, transitions[kind])
+
+
+def record_new_item(kind, site, status):
+    """
+    :param kind: requests, transforms or processings.
+    """
+    if _RECORDER is None:
+        return
+    _RECORDER.record_transitions(kind, {(site, None, status): 1})
+
+
+def record_request_update(request_id, parameters, session=None):
+    """
+    Record the status change of a request, before it's updated.
+    """
+    if _RECORDER is None or not parameters or parameters.get('status', None) is None:
+        return
+    ret = orm_requests.get_requests_status_site([request_id], session=session)
+    if request_id in ret:
+        status, site = ret[request_id]
+        _RECORDER.record_transitions('requests', {(site, status, parameters['status']): 1})
+
+
+def record_transform_update(transform_id, parameters, session=None):
+    """
+    Record the status change of a transform, before it's updated.
+    """
+    if _RECORDER is None or not parameters or parameters.get('status', None) is None:
+        return
+    ret = orm_transforms.get_transforms_status_site([transform_id], session=session)
+    if transform_id in ret:
+        status, site = ret[transform_id]
+        _RECORDER.record_transitions('transforms', {(site, status, parameters['status']): 1})
+
+
+def record_processing_update(processing_id, parameters, session=None):
+    """
+    Record the status change of a processing, before it's updated.
+    """
+    if _RECORDER is None or not parameters or parameters.get('status', None) is None:
+        return
+    ret = orm_processings.get_processings_status_site([processing_id], session=session)
+    if processing_id in ret:
+        status, site = ret[processing_id]
+        _RECORDER.record_transitions('processings', {(site, status, parameters['status']): 1})
+
+
+def record_new_contents(contents, session=None):
+    """
+    Record the new input and output contents.
+    """
+    if _RECORDER is None or not contents:
+        return
+    items = {}
+    for content in contents:
+        kind = CONTENT_KINDS.get(content.get('content_relation_type', ContentRelationType.Input), None)
+        if kind:
+            key = (kind, content.get('transform_id', None), content.get('status', None) or ContentStatus.New)
+            items[key] = items.get(key, 0) + 1
+    if not items:
+        return
+
+    sites = orm_processings.get_processings_site_by_transform(list(set([key[1] for key in items])), session=session)
+    transitions = {}
+    for (kind, transform_id, status), num in items.items():
+        add_transition(transitions, kind, sites.get(transform_id, None), None, status, num)
+    record_transitions(transitions)
+
+
+def record_contents_update(parameters, request_id=None, session=None):
+    """
+    Record the status changes of contents, before they are updated.
+
+    :param parameters: list of dictionary of parameters with content_id.
+    """
+    if _RECORDER is None or not parameters:
+        return
+    new_status = {}
+    for parameter in parameters:
+        if parameter.get('status', None) is not None and 'content_id' in parameter:
+            new_status[parameter['content_id']] = parameter['status']
+    if not new_status:
+        return
+
+    rows = orm_contents.get_contents_status(list(new_status.keys()), request_id=request_id, session=session)
+    sites = orm_processings.get_processings_site_by_transform(list(set([row[1] for row in rows])), session=session)
+    transitions = {}
+    for content_id, transform_id, relation_type, status in rows:
+        kind = CONTENT_KINDS.get(relation_type, None)
+        if kind:
+            add_transition(transitions, kind, sites.get(transform_id, None), status, new_status[content_id])
+    record_transitions(transitions)
+
+
+def record_staged_contents_update(request_id, transform_id, substatus=None, session=None):
+    """
+    Record the status changes of contents by the fetching staged updates of a transform, before they are applied.
+    """
+    if _RECORDER is None:
+        return
+    rows = orm_contents.get_contents_update_transitions(request_id, transform_id, substatus=substatus, session=session)
+    site = orm_processings.get_processings_site_by_transform([transform_id], session=session).get(transform_id, None)
+    transitions = {}
+    for relation_type, status, new_status, num in rows:
+        kind = CONTENT_KINDS.get(relation_type, None)
+        if kind:
+            add_transition(transitions, kind, site, status, new_status, num)
+    record_transitions(transitions)
@@ -28,6 +28,17 @@ def add_event(event, session=None):
     return orm_events.add_event(event=event, session=session)
 
 
+@transactional_session
+def add_events(events, session=None):
+    """
+    Add events in bulk, merging them into the existing new events when possible.
+
+    :param events: list of Event objects.
+    :returns: list of booleans, False if the event was merged and True if it was inserted.
+    """
+    return orm_events.add_events(events=events, session=session)
+
+
 @read_session
 def get_events(event_type, event_actual_id, status=None, session=None):
     """
@@ -52,6 +63,17 @@ def get_event_priority(event_type, event_actual_id, session=None):
     return orm_events.get_event_priority(event_type=event_type, event_actual_id=event_actual_id, session=session)
 
 
+@read_session
+def get_event_priorities(keys, session=None):
+    """
+    Get the priorities of a list of (event_type, event_actual_id).
+
+    :param keys: list of (event_type, event_actual_id).
+    :returns: {(event_type, event_actual_id): priority}
+    """
+    return orm_events.get_event_priorities(keys=keys, session=session)
+
+
 @transactional_session
 def update_event(event_id, status, session=None):
     """
@@ -73,6 +95,16 @@ def get_event_for_processing(event_type, num_events=1, session=None):
     return orm_events.get_event_for_processing(event_type=event_type, num_events=num_events, session=session)
 
 
+@read_session
+def get_num_queued_events(session=None):
+    """
+    Get the number of new events per event type.
+
+    :returns: {event_type: number of events}
+    """
+    return orm_events.get_num_queued_events(session=session)
+
+
 @transactional_session
 def delete_event(event_id, session=None):
     """
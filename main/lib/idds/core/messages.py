@@ -47,6 +47,22 @@ def add_messages(messages, bulk_size=1000, session=None):
     return orm_messages.add_messages(messages, bulk_size=bulk_size, session=session)
 
 
+@read_session
+def get_message_internal_ids(internal_ids, transform_id=None, created_after=None, session=None):
+    """
+    Get the internal_ids which are already stored in the messages table.
+
+    :param internal_ids: list of internal ids.
+    :param transform_id: The transform id.
+    :param created_after: Only check the messages created after this time.
+    :param session: The database session.
+
+    :returns: set of the stored internal ids.
+    """
+    return orm_messages.get_message_internal_ids(internal_ids, transform_id=transform_id,
+                                                 created_after=created_after, session=session)
+
+
 @transactional_session
 def retrieve_messages(bulk_size=None, msg_type=None, status=None, destination=None,
                       source=None, request_id=None, workload_id=None, transform_id=None,
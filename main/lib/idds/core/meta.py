@@ -43,7 +43,7 @@ def get_meta_item(name, session=None):
 
     :returns metainfo: dictionary of meta info
     """
-    orm_meta.get_meta_item(name=name, session=session)
+    return orm_meta.get_meta_item(name=name, session=session)
 
 
 @read_session
@@ -55,4 +55,4 @@ def get_meta_items(session=None):
 
     :returns metainfo: List of dictionaries
     """
-    orm_meta.get_meta_items(session=session)
+    return orm_meta.get_meta_items(session=session)
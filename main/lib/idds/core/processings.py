@@ -21,6 +21,7 @@ from idds.orm import (processings as orm_processings,
                       contents as orm_contents,
                       messages as orm_messages,
                       transforms as orm_transforms)
+from idds.core import counters as core_counters
 
 
 @transactional_session
@@ -51,6 +52,7 @@ def add_processing(request_id, workload_id, transform_id, status, submitter=None
 
     :returns: processing id.
     """
+    core_counters.record_new_item('processings', None, status)
     return orm_processings.add_processing(request_id=request_id, workload_id=workload_id, transform_id=transform_id,
                                           status=status, substatus=substatus, submitter=submitter,
                                           granularity=granularity, granularity_type=granularity_type,
@@ -150,7 +152,8 @@ def get_processing_by_id_status(processing_id, status=None, exclude_status=None,
 @transactional_session
 def get_processings_by_status(status, time_period=None, locking=False, bulk_size=None, to_json=False, by_substatus=False,
                               not_lock=False, next_poll_at=None, for_poller=False, only_return_id=False,
-                              min_request_id=None, locking_for_update=False, new_poll=False, update_poll=False, session=None):
+                              min_request_id=None, locking_for_update=False, new_poll=False, update_poll=False,
+                              shard=None, scheduler=None, session=None):
     """
     Get processing or raise a NoObject exception.
 
@@ -158,6 +161,8 @@ def get_processings_by_status(status, time_period=None, locking=False, bulk_size
     :param time_period: Time period in seconds.
     :param locking: Whether to retrieve only unlocked items and lock them.
     :param to_json: return json format.
+    :param shard: (number of shard buckets, shard buckets of the agent instance).
+    :param scheduler: scheduling policy of the agent, None for first in first out.
     :param session: The database session in use.
 
     :raises NoObject: If no processing is founded.
@@ -170,7 +175,8 @@ def get_processings_by_status(status, time_period=None, locking=False, bulk_size
                                                             new_poll=new_poll, update_poll=update_poll,
                                                             only_return_id=only_return_id,
                                                             min_request_id=min_request_id, not_lock=not_lock,
-                                                            by_substatus=by_substatus, for_poller=for_poller, session=session)
+                                                            by_substatus=by_substatus, for_poller=for_poller,
+                                                            shard=shard, scheduler=scheduler, session=session)
 
     return processings
 
@@ -188,6 +194,7 @@ def update_processing(processing_id, parameters, session=None):
     :raises DatabaseException: If there is a database error.
 
     """
+    core_counters.record_processing_update(processing_id, parameters, session=session)
     return orm_processings.update_processing(processing_id=processing_id, parameters=parameters, session=session)
 
 
@@ -237,8 +244,10 @@ def update_processing_with_collection_contents(updated_processing, new_processin
     :param file_msg_content: message with files info.
     """
     if updated_files:
+        core_counters.record_contents_update(updated_files, session=session)
         orm_contents.update_contents(updated_files, session=session)
     if new_files:
+        core_counters.record_new_contents(new_files, session=session)
         orm_contents.add_contents(contents=new_files, session=session)
     if file_msg_content:
         if not type(file_msg_content) in [list, tuple]:
@@ -265,12 +274,15 @@ def update_processing_with_collection_contents(updated_processing, new_processin
                                  msg_content=coll_msg_content['msg_content'],
                                  session=session)
     if updated_processing:
+        core_counters.record_processing_update(updated_processing['processing_id'], updated_processing['parameters'], session=session)
         orm_processings.update_processing(processing_id=updated_processing['processing_id'],
                                           parameters=updated_processing['parameters'],
                                           session=session)
     if new_processing:
         orm_processings.add_processing(**new_processing, session=session)
+        core_counters.record_new_item('processings', None, new_processing.get('status', ProcessingStatus.New))
     if transform_updates:
+        core_counters.record_transform_update(transform_updates['transform_id'], transform_updates['parameters'], session=session)
         orm_transforms.update_transform(transform_id=transform_updates['transform_id'],
                                         parameters=transform_updates['parameters'],
                                         session=session)
@@ -312,12 +324,13 @@ def update_processing_contents(update_processing, update_contents=None, update_m
                                new_update_contents=None, new_input_dependency_contents=None,
                                new_contents_ext=None, update_contents_ext=None,
                                request_id=None, transform_id=None, use_bulk_update_mappings=True,
-                               message_bulk_size=2000, session=None):
+                               message_bulk_size=2000, collection_deltas=None, session=None):
     """
     Update processing with contents.
 
     :param update_processing: dict with processing id and parameters.
     :param update_contents: list of content files.
+    :param collection_deltas: changes of the collection file statistics caused by the content updates.
     """
     # new_update_contents, new_contents_ext, new_input_dependency_contents and then new_contents
     # make sure new_contents the last one: when a process is killed, the session may break consistency.
@@ -330,6 +343,7 @@ def update_processing_contents(update_processing, update_contents=None, update_m
         new_input_dependency_contents = resolve_input_dependency_id(new_input_dependency_contents, request_id=request_id, session=session)
         chunks = get_list_chunks(new_input_dependency_contents)
         for chunk in chunks:
+            core_counters.record_new_contents(chunk, session=session)
             orm_contents.add_contents(chunk, session=session)
     if new_update_contents:
         # first add and then delete, to trigger the trigger 'update_content_dep_status'.
@@ -346,6 +360,7 @@ def update_processing_contents(update_processing, update_contents=None, update_m
     if new_contents:
         chunks = get_list_chunks(new_contents)
         for chunk in chunks:
+            core_counters.record_new_contents(chunk, session=session)
             orm_contents.add_contents(chunk, session=session)
 
     # update contents, keep the order
@@ -366,10 +381,13 @@ def update_processing_contents(update_processing, update_contents=None, update_m
     if update_contents:
         chunks = get_list_chunks(update_contents)
         for chunk in chunks:
+            core_counters.record_contents_update(chunk, request_id=request_id, session=session)
             orm_contents.update_contents(chunk, request_id=request_id, transform_id=transform_id,
                                          use_bulk_update_mappings=use_bulk_update_mappings, session=session)
     if update_collections:
         orm_collections.update_collections(update_collections, session=session)
+    if collection_deltas:
+        orm_collections.update_collections_statistics(collection_deltas, session=session)
 
     if update_messages:
         chunks = get_list_chunks(update_messages)
@@ -378,6 +396,7 @@ def update_processing_contents(update_processing, update_contents=None, update_m
                                          use_bulk_update_mappings=use_bulk_update_mappings, session=session)
 
     if update_processing:
+        core_counters.record_processing_update(update_processing['processing_id'], update_processing['parameters'], session=session)
         orm_processings.update_processing(processing_id=update_processing['processing_id'],
                                           parameters=update_processing['parameters'],
                                           session=session)
@@ -17,7 +17,7 @@ import copy
 
 from idds.common.constants import (RequestStatus, RequestLocking, WorkStatus,
                                    CollectionType, CollectionStatus, CollectionRelationType,
-                                   MessageStatus, MetaStatus, CommandType)
+                                   MessageStatus, MetaStatus, CommandType, TransformStatus)
 from idds.orm.base.session import read_session, transactional_session
 from idds.orm import requests_group as orm_requests_group
 from idds.orm import requests as orm_requests
@@ -28,6 +28,7 @@ from idds.orm import conditions as orm_conditions
 from idds.orm import messages as orm_messages
 from idds.orm import meta as orm_meta
 from idds.core import messages as core_messages
+from idds.core import counters as core_counters
 
 
 def create_request(scope=None, name=None, requester=None, request_type=None,
@@ -146,7 +147,9 @@ def add_request(scope=None, name=None, requester=None, request_type=None,
               'additional_data_storage': additional_data_storage,
               'request_metadata': request_metadata, 'processing_metadata': processing_metadata,
               'session': session}
-    return orm_requests.add_request(**kwargs)
+    request_id = orm_requests.add_request(**kwargs)
+    core_counters.record_new_item('requests', site, status)
+    return request_id
 
 
 @read_session
@@ -256,6 +259,7 @@ def update_request(request_id, parameters, update_request_metadata=False, sessio
     :param request_id: the request id.
     :param parameters: A dictionary of parameters.
     """
+    core_counters.record_request_update(request_id, parameters, session=session)
     return orm_requests.update_request(request_id, parameters, update_request_metadata=update_request_metadata, session=session)
 
 
@@ -340,6 +344,7 @@ def update_request_with_transforms(request_id, parameters,
             ret_tf = orm_transforms.get_transform_by_name(request_id=request_id, name=tf['name'], session=session)
             if ret_tf is None:
                 tf_id = orm_transforms.add_transform(**tf_copy, session=session)
+                core_counters.record_new_item('transforms', tf_copy.get('site', None), tf_copy.get('status', TransformStatus.New))
             else:
                 tf_id = ret_tf['transform_id']
             tf['transform_id'] = tf_id
@@ -373,6 +378,7 @@ def update_request_with_transforms(request_id, parameters,
             new_tf_ids.append(tf_id)
     if update_transforms:
         for tr_id in update_transforms:
+            core_counters.record_transform_update(tr_id, update_transforms[tr_id], session=session)
             orm_transforms.update_transform(transform_id=tr_id, parameters=update_transforms[tr_id], session=session)
             update_tf_ids.append(tf_id)
 
@@ -384,6 +390,7 @@ def update_request_with_transforms(request_id, parameters,
     if new_conditions:
         orm_conditions.add_conditions(new_conditions, session=session)
 
+    core_counters.record_request_update(request_id, parameters, session=session)
     return orm_requests.update_request(request_id, parameters, origin_status=origin_status, session=session), new_tf_ids, update_tf_ids
 
 
@@ -401,6 +408,7 @@ def update_request_with_workprogresses(request_id, parameters, new_workprogresse
     if update_workprogresses:
         for workprogress_id in update_workprogresses:
             orm_workprogresses.update_workprogress(workprogress_id, update_workprogresses[workprogress_id], session=session)
+    core_counters.record_request_update(request_id, parameters, session=session)
     return orm_requests.update_request(request_id, parameters, session=session)
 
 
@@ -420,7 +428,7 @@ def get_operation_request_msgs(locking=False, bulk_size=None, session=None):
 @transactional_session
 def get_requests_by_status_type(status, request_type=None, time_period=None, locking=False, bulk_size=None, to_json=False,
                                 by_substatus=False, not_lock=False, next_poll_at=None, new_poll=False, update_poll=False,
-                                min_request_id=None, only_return_id=False, session=None):
+                                min_request_id=None, only_return_id=False, shard=None, scheduler=None, session=None):
     """
     Get requests by status and type
 
@@ -430,6 +438,8 @@ def get_requests_by_status_type(status, request_type=None, time_period=None, loc
     :param locking: Wheter to lock requests to avoid others get the same request.
     :param bulk_size: Size limitation per retrieve.
     :param to_json: return json format.
+    :param shard: (number of shard buckets, shard buckets of the agent instance).
+    :param scheduler: scheduling policy of the agent, None for first in first out.
 
     :returns: list of Request.
     """
@@ -441,7 +451,8 @@ def get_requests_by_status_type(status, request_type=None, time_period=None, loc
     reqs = orm_requests.get_requests_by_status_type(status, request_type, time_period, locking=locking, locking_for_update=False,
                                                     bulk_size=bulk_size, min_request_id=min_request_id, not_lock=not_lock,
                                                     new_poll=new_poll, update_poll=update_poll, only_return_id=only_return_id,
-                                                    to_json=to_json, by_substatus=by_substatus, session=session)
+                                                    to_json=to_json, by_substatus=by_substatus, shard=shard, scheduler=scheduler,
+                                                    session=session)
 
     return reqs
 
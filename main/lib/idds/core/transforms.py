@@ -17,7 +17,7 @@ import logging
 
 # from idds.common import exceptions
 
-from idds.common.constants import (TransformStatus, ContentRelationType, ContentStatus,
+from idds.common.constants import (TransformStatus, ContentRelationType, ContentStatus, ProcessingStatus,
                                    TransformLocking, CollectionRelationType, CommandType)
 from idds.orm.base.session import read_session, transactional_session
 from idds.orm import (transforms as orm_transforms,
@@ -25,6 +25,7 @@ from idds.orm import (transforms as orm_transforms,
                       contents as orm_contents,
                       messages as orm_messages,
                       processings as orm_processings)
+from idds.core import counters as core_counters
 
 
 @transactional_session
@@ -79,6 +80,7 @@ def add_transform(request_id, workload_id, transform_type, transform_tag=None, p
                                                 triggered_conditions=triggered_conditions,
                                                 untriggered_conditions=untriggered_conditions,
                                                 workprogress_id=workprogress_id, session=session)
+    core_counters.record_new_item('transforms', site, status)
     return transform_id
 
 
@@ -164,7 +166,8 @@ def get_transforms(request_id=None, workload_id=None, transform_id=None, loop_in
 @transactional_session
 def get_transforms_by_status(status, period=None, locking=False, bulk_size=None, to_json=False, by_substatus=False,
                              new_poll=False, update_poll=False, only_return_id=False, min_request_id=None,
-                             order_by_fifo=False, not_lock=False, next_poll_at=None, session=None):
+                             order_by_fifo=False, not_lock=False, next_poll_at=None, shard=None, scheduler=None,
+                             session=None):
     """
     Get transforms or raise a NoObject exception.
 
@@ -172,6 +175,8 @@ def get_transforms_by_status(status, period=None, locking=False, bulk_size=None,
     :param session: The database session in use.
     :param locking: Whether to lock retrieved items.
     :param to_json: return json format.
+    :param shard: (number of shard buckets, shard buckets of the agent instance).
+    :param scheduler: scheduling policy of the agent, None for first in first out.
 
     :raises NoObject: If no transform is founded.
 
@@ -183,7 +188,8 @@ def get_transforms_by_status(status, period=None, locking=False, bulk_size=None,
                                                          new_poll=new_poll, update_poll=update_poll,
                                                          only_return_id=only_return_id,
                                                          min_request_id=min_request_id, not_lock=not_lock,
-                                                         by_substatus=by_substatus, session=session)
+                                                         by_substatus=by_substatus, shard=shard, scheduler=scheduler,
+                                                         session=session)
 
     return transforms
 
@@ -201,6 +207,7 @@ def update_transform(transform_id, parameters, session=None):
     :raises DatabaseException: If there is a database error.
 
     """
+    core_counters.record_transform_update(transform_id, parameters, session=session)
     orm_transforms.update_transform(transform_id=transform_id, parameters=parameters, session=session)
 
 
@@ -274,18 +281,22 @@ def add_transform_outputs(transform, transform_parameters, input_collections=Non
         orm_collections.update_collections(update_log_colls, session=session)
 
     if new_contents:
+        core_counters.record_new_contents(new_contents, session=session)
         orm_contents.add_contents(new_contents, session=session)
     if update_contents:
+        core_counters.record_contents_update(update_contents, session=session)
         orm_contents.update_contents(update_contents, session=session)
 
     processing_id = None
     if new_processing:
         # print(new_processing)
         processing_id = orm_processings.add_processing(**new_processing, session=session)
+        core_counters.record_new_item('processings', None, new_processing.get('status', ProcessingStatus.New))
         new_pr_ids.append(processing_id)
         transform_parameters['current_processing_id'] = processing_id
     if update_processing:
         for proc_id in update_processing:
+            core_counters.record_processing_update(proc_id, update_processing[proc_id], session=session)
             orm_processings.update_processing(processing_id=proc_id, parameters=update_processing[proc_id], session=session)
             update_pr_ids.append(proc_id)
 
@@ -315,6 +326,7 @@ def add_transform_outputs(transform, transform_parameters, input_collections=Non
                 work.set_processing_id(new_processing['processing_metadata']['processing'], processing_id)
         if hasattr(work, 'refresh_work'):
             work.refresh_work()
+        core_counters.record_transform_update(transform['transform_id'], transform_parameters, session=session)
         orm_transforms.update_transform(transform_id=transform['transform_id'],
                                         parameters=transform_parameters,
                                         session=session)
@@ -372,13 +384,15 @@ def clean_next_poll_at(status, session=None):
 
 
 @read_session
-def get_transform_input_output_maps(transform_id, input_coll_ids, output_coll_ids, log_coll_ids=[], with_sub_map_id=False, is_es=False, with_deps=True, session=None):
+def get_transform_input_output_maps(transform_id, input_coll_ids, output_coll_ids, log_coll_ids=[], with_sub_map_id=False, is_es=False, with_deps=True,
+                                    request_id=None, session=None):
     """
     Get transform input output maps.
 
     :param transform_id: transform id.
+    :param request_id: request id, to select only the partition of the request when the contents are partitioned.
     """
-    contents = orm_contents.get_contents_by_request_transform(transform_id=transform_id, with_deps=with_deps, session=session)
+    contents = orm_contents.get_contents_by_request_transform(request_id=request_id, transform_id=transform_id, with_deps=with_deps, session=session)
     ret = {}
     for content in contents:
         map_id = content['map_id']
@@ -14,9 +14,10 @@ core operations related to workflow model.
 """
 
 # from idds.common import exceptions
-from idds.common.constants import WorkprogressStatus, WorkprogressLocking
+from idds.common.constants import WorkprogressStatus, WorkprogressLocking, TransformStatus
 from idds.orm.base.session import read_session, transactional_session
 from idds.orm import workprogress as orm_workprogress, transforms as orm_transforms
+from idds.core import counters as core_counters
 from idds.workflowv2.work import WorkStatus
 
 
@@ -169,11 +170,13 @@ def update_workprogress(workprogress_id, parameters, new_transforms=None, update
             orginal_work = tf['transform_metadata']['orginal_work']
             del tf['transform_metadata']['orginal_work']
             tf_id = orm_transforms.add_transform(**tf, session=session)
+            core_counters.record_new_item('transforms', tf.get('site', None), tf.get('status', TransformStatus.New))
             # work = tf['transform_metadata']['work']
             orginal_work.set_work_id(tf_id, transforming=True)
             orginal_work.set_status(WorkStatus.New)
     if update_transforms:
         for tr_id in update_transforms:
+            core_counters.record_transform_update(tr_id, update_transforms[tr_id], session=session)
             orm_transforms.update_transform(transform_id=tr_id, parameters=update_transforms[tr_id], session=session)
     return orm_workprogress.update_workprogress(workprogress_id=workprogress_id, parameters=parameters, session=session)
 
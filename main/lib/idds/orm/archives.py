@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+operations related to archiving finished requests.
+
+All statements are built with SQLAlchemy core, so they work on every supported
+database backend (Oracle, PostgreSQL, MySQL and SQLite).
+"""
+
+import datetime
+
+from sqlalchemy import MetaData, Table, and_, func, or_, select
+from sqlalchemy.exc import DatabaseError, NoSuchTableError
+
+from idds.common import exceptions
+from idds.orm.base import models
+from idds.orm.base.session import read_session, transactional_session, BASE, DEFAULT_SCHEMA_NAME
+from idds.orm.base import partitions
+
+
+# Tables are archived in this order, so that children are removed before their parents.
+ARCHIVE_TABLES = ['contents_ext', 'contents_update', 'contents', 'collections', 'processings',
+                  'messages', 'commands', 'conditions', 'wp2transforms', 'workprogresses',
+                  'transforms', 'requests']
+
+_ARCHIVE_TABLES = {}
+
+
+def get_table(table_name):
+    """
+    Get the sqlalchemy table for a table name.
+
+    :param table_name: The table name.
+    :returns: sqlalchemy Table.
+    """
+    for table in BASE.metadata.sorted_tables:
+        if table.name == table_name:
+            return table
+    raise exceptions.DatabaseException("Table %s is not defined" % table_name)
+
+
+def get_primary_key(table):
+    # the partition key request_id is a part of the primary key of the partitioned tables
+    pks = [col for col in table.primary_key if not (col.name == 'request_id' and partitions.is_partitioned_table(table.name))]
+    if len(pks) == 1:
+        return pks[0]
+    return None
+
+
+def get_request_filter(table, request_id):
+    """
+    Get the where clause to select the rows of a request.
+    """
+    if 'request_id' in table.c:
+        return table.c.request_id == request_id
+    if table.name == 'wp2transforms':
+        transform_ids = select(models.Transform.transform_id).where(models.Transform.request_id == request_id)
+        return table.c.transform_id.in_(transform_ids)
+    raise exceptions.DatabaseException("Table %s cannot be archived by request_id" % table.name)
+
+
+@read_session
+def get_archive_table(table_name, session=None):
+    """
+    Get the archive table (<table_name>_archive) by reflection.
+
+    :param table_name: The table name.
+    :returns: sqlalchemy Table or None if the archive table doesn't exist.
+    """
+    if table_name not in _ARCHIVE_TABLES:
+        try:
+            metadata = MetaData(schema=DEFAULT_SCHEMA_NAME)
+            archive_table = Table(table_name + '_archive', metadata, autoload_with=session.connection())
+        except NoSuchTableError:
+            # not cached, the archive table can be created later (e.g. by the alembic migration)
+            return None
+        _ARCHIVE_TABLES[table_name] = archive_table
+    return _ARCHIVE_TABLES[table_name]
+
+
+@read_session
+def get_requests_to_archive(status, older_than, min_request_id=None, bulk_size=100, session=None):
+    """
+    Get ids of requests which can be archived, in ascending order.
+
+    :param status: list of terminated request status.
+    :param older_than: days since the last update.
+    :param min_request_id: only return requests after this request_id.
+    :param bulk_size: max number of request ids to return.
+
+    :returns: list of request_id.
+    """
+    if not isinstance(status, (list, tuple)):
+        status = [status]
+    if len(status) == 1:
+        status = [status[0], status[0]]
+
+    query = session.query(models.Request.request_id)
+    query = query.filter(models.Request.status.in_(status))
+    query = query.filter(models.Request.updated_at <= datetime.datetime.utcnow() - datetime.timedelta(days=older_than))
+    if min_request_id:
+        query = query.filter(models.Request.request_id > min_request_id)
+    query = query.order_by(models.Request.request_id.asc())
+    query = query.limit(bulk_size)
+    tmp = query.all()
+    return [t[0] for t in tmp]
+
+
+@read_session
+def get_last_request_id(session=None):
+    return session.query(func.max(models.Request.request_id)).scalar()
+
+
+@read_session
+def get_partitions(table_name, session=None):
+    """
+    Get the range partitions of a table.
+
+    :param table_name: The table name.
+
+    :returns: list of partition indexes, empty if the table is not partitioned in the database.
+    """
+    return partitions.get_partitions(table_name, session=session)
+
+
+@read_session
+def get_archivable_partitions(table_name, status, older_than, session=None):
+    """
+    Get the range partitions whose requests can all be archived. The request ids of such a partition are
+    all allocated and none of its requests is active or updated recently. A request which cannot be
+    archived only blocks its own partition.
+
+    :param table_name: The table name.
+    :param status: list of terminated request status.
+    :param older_than: days since the last update.
+
+    :returns: list of partition indexes.
+    """
+    if not isinstance(status, (list, tuple)):
+        status = [status]
+    if len(status) == 1:
+        status = [status[0], status[0]]
+
+    indexes = partitions.get_partitions(table_name, session=session)
+    last_request_id = get_last_request_id(session=session)
+    if not indexes or last_request_id is None:
+        return []
+
+    ret = []
+    for index in indexes:
+        lower, upper = partitions.get_partition_range(index)
+        if upper > last_request_id + 1:
+            # new requests can still be created in this partition
+            break
+        query = session.query(models.Request.request_id)
+        query = query.filter(and_(models.Request.request_id >= lower, models.Request.request_id < upper))
+        query = query.filter(or_(models.Request.status.notin_(status),
+                                 models.Request.updated_at > datetime.datetime.utcnow() - datetime.timedelta(days=older_than)))
+        if query.first() is None:
+            ret.append(index)
+    return ret
+
+
+@read_session
+def get_partition_request_ids(table_name, index, session=None):
+    """
+    Get the request ids with rows in a range partition.
+    """
+    table = get_table(table_name)
+    lower, upper = partitions.get_partition_range(index)
+    stmt = select(table.c.request_id).where(and_(table.c.request_id >= lower, table.c.request_id < upper)).distinct()
+    return sorted([row[0] for row in session.execute(stmt)])
+
+
+@read_session
+def get_archive_batch(table_name, request_id, batch_size=1000, with_rows=False, after_id=None, session=None):
+    """
+    Get a batch of rows of a request.
+
+    :param table_name: The table name.
+    :param request_id: The request id.
+    :param batch_size: Max number of rows.
+    :param with_rows: If True, return the rows as dicts. Otherwise only the primary keys.
+    :param after_id: only return rows after this primary key, to read the rows without deleting them.
+
+    :returns: (list of primary keys, list of rows)
+    """
+    table = get_table(table_name)
+    pk = get_primary_key(table)
+    if pk is None:
+        raise exceptions.DatabaseException("Table %s doesn't have a single column primary key" % table_name)
+
+    if with_rows:
+        stmt = select(table)
+    else:
+        stmt = select(pk)
+    stmt = stmt.where(get_request_filter(table, request_id))
+    if after_id is not None:
+        stmt = stmt.where(pk > after_id)
+    stmt = stmt.order_by(pk.asc()).limit(batch_size)
+    result = session.execute(stmt)
+
+    pks, rows = [], []
+    for row in result:
+        if with_rows:
+            row = dict(row._mapping)
+            pks.append(row[pk.name])
+            rows.append(row)
+        else:
+            pks.append(row[0])
+    return pks, rows
+
+
+@read_session
+def get_request_rows(table_name, request_id, session=None):
+    """
+    Get all rows of a request. Used for small tables.
+
+    :param table_name: The table name.
+    :param request_id: The request id.
+
+    :returns: list of rows as dicts.
+    """
+    table = get_table(table_name)
+    result = session.execute(select(table).where(get_request_filter(table, request_id)))
+    return [dict(row._mapping) for row in result]
+
+
+def copy_to_archive_table(table, where_clause, session=None):
+    archive_table = get_archive_table(table.name, session=session)
+    if archive_table is None:
+        raise exceptions.DatabaseException("Archive table %s_archive doesn't exist" % table.name)
+
+    columns = [col.name for col in table.c if col.name in archive_table.c]
+    stmt = archive_table.insert().from_select(columns, select(*[table.c[col] for col in columns]).where(where_clause))
+    session.execute(stmt)
+
+
+@transactional_session
+def archive_batch(table_name, pks, to_archive_table=True, session=None):
+    """
+    Move a batch of rows to the archive table (optionally) and delete them.
+    It's one transaction, which is the commit checkpoint of the archiver.
+
+    :param table_name: The table name.
+    :param pks: list of primary keys.
+    :param to_archive_table: Whether to copy the rows to <table_name>_archive.
+
+    :returns: number of deleted rows.
+    """
+    if not pks:
+        return 0
+
+    try:
+        table = get_table(table_name)
+        pk = get_primary_key(table)
+        where_clause = pk.in_(pks)
+        if to_archive_table:
+            copy_to_archive_table(table, where_clause, session=session)
+        ret = session.execute(table.delete().where(where_clause))
+        return ret.rowcount
+    except DatabaseError as error:
+        raise exceptions.DatabaseException('Failed to archive %s: %s' % (table_name, str(error)))
+
+
+@transactional_session
+def archive_request_rows(table_name, request_id, to_archive_table=True, session=None):
+    """
+    Move all rows of a request to the archive table (optionally) and delete them.
+    Used for small tables, for example tables without a single column primary key.
+
+    :param table_name: The table name.
+    :param request_id: The request id.
+    :param to_archive_table: Whether to copy the rows to <table_name>_archive.
+
+    :returns: number of deleted rows.
+    """
+    try:
+        table = get_table(table_name)
+        where_clause = get_request_filter(table, request_id)
+        if to_archive_table:
+            copy_to_archive_table(table, where_clause, session=session)
+        ret = session.execute(table.delete().where(where_clause))
+        return ret.rowcount
+    except DatabaseError as error:
+        raise exceptions.DatabaseException('Failed to archive %s: %s' % (table_name, str(error)))
+
+
+@transactional_session
+def archive_partition(table_name, index, to_archive_table=True, detach=False, session=None):
+    """
+    Move the rows of a range partition to the archive table (optionally) and drop or detach the partition,
+    instead of deleting the rows one by one.
+
+    :param table_name: The table name.
+    :param index: The partition index.
+    :param to_archive_table: Whether to copy the rows to <table_name>_archive.
+    :param detach: Whether to detach the partition instead of dropping it.
+    """
+    try:
+        table = get_table(table_name)
+        lower, upper = partitions.get_partition_range(index)
+        if to_archive_table:
+            copy_to_archive_table(table, and_(table.c.request_id >= lower, table.c.request_id < upper), session=session)
+        partitions.retire_partition(table_name, index, detach=detach, session=session)
+    except DatabaseError as error:
+        raise exceptions.DatabaseException('Failed to archive partition %s of %s: %s' % (index, table_name, str(error)))
+
+
+@transactional_session
+def create_partitions(max_request_id, session=None):
+    """
+    Create the range partitions of the partitioned tables ahead of the new requests.
+
+    :param max_request_id: The last request id.
+
+    :returns: {table_name: list of the created partition indexes}
+    """
+    ret = {}
+    for table_name in partitions.PARTITIONED_TABLES:
+        ret[table_name] = partitions.create_partitions(table_name, max_request_id, session=session)
+    return ret
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+"""partition contents by request_id
+
+Only applied when partition_by_request_id is enabled in the [database] section.
+
+Revision ID: d5b22609d400
+Revises: 2553ccb45260
+Create Date: 2026-10-19 09:12:31.524107+00:00
+
+"""
+from alembic import op
+from alembic import context
+import sqlalchemy as sa
+
+from idds.orm.base import models
+from idds.orm.base.partitions import (PARTITIONED_TABLES, PARTITIONS_AHEAD, is_partitioned_table, get_partition_index,
+                                      get_oracle_partition_clause, get_postgresql_partition_ddl,
+                                      get_postgresql_default_partition_ddl)
+
+# revision identifiers, used by Alembic.
+revision = 'd5b22609d400'
+down_revision = '2553ccb45260'
+branch_labels = None
+depends_on = None
+
+
+def get_full_name(schema, name):
+    if schema:
+        return '%s.%s' % (schema, name)
+    return name
+
+
+def convert_postgresql_table(table, schema):
+    """
+    Recreate the table as a partitioned table and copy the rows.
+    """
+    bind = op.get_bind()
+    full_name = get_full_name(schema, table.name)
+    old_name = table.name + '_unpartitioned'
+    old_full_name = get_full_name(schema, old_name)
+
+    triggers = bind.execute(sa.text("SELECT tgname FROM pg_trigger WHERE tgrelid = CAST(:table AS regclass) AND NOT tgisinternal"),
+                            {'table': full_name}).fetchall()
+    triggers = [row[0] for row in triggers]
+
+    # the names of the constraints and the indexes are unique in the schema, release them for the new table
+    op.execute("ALTER TABLE %s RENAME TO %s" % (full_name, old_name))
+    constraints = bind.execute(sa.text("SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table AS regclass) AND contype IN ('p', 'u', 'f')"),
+                               {'table': old_full_name}).fetchall()
+    for row in constraints:
+        op.execute('ALTER TABLE %s DROP CONSTRAINT "%s"' % (old_full_name, row[0]))
+    indexes = bind.execute(sa.text("SELECT indexname FROM pg_indexes WHERE tablename = :table AND schemaname = COALESCE(:schema, current_schema())"),
+                           {'table': old_name, 'schema': schema if schema else None}).fetchall()
+    for row in indexes:
+        op.execute('DROP INDEX %s' % get_full_name(schema, '"%s"' % row[0]))
+
+    table.create(bind=bind, checkfirst=True)
+    max_request_id = bind.execute(sa.text("SELECT MAX(request_id) FROM %s" % old_full_name)).scalar()
+    for index in range(0, get_partition_index(max_request_id or 0) + PARTITIONS_AHEAD + 1):
+        op.execute(get_postgresql_partition_ddl(table.name, index))
+    op.execute(get_postgresql_default_partition_ddl(table.name))
+
+    columns = ', '.join([column.name for column in table.columns])
+    op.execute("INSERT INTO %s (%s) SELECT %s FROM %s" % (full_name, columns, columns, old_full_name))
+    op.execute("DROP TABLE %s" % old_full_name)
+
+    if 'update_content_dep_status' in triggers:
+        op.execute("""CREATE TRIGGER update_content_dep_status BEFORE DELETE ON %s
+                      for each row EXECUTE PROCEDURE update_dep_contents_status()""" % full_name)
+
+
+def upgrade() -> None:
+    if not is_partitioned_table('contents'):
+        return
+
+    tables = {'contents': models.Content, 'contents_ext': models.Content_ext, 'contents_update': models.Content_update}
+    if context.get_context().dialect.name in ['postgresql']:
+        schema = context.get_context().version_table_schema if context.get_context().version_table_schema else ''
+
+        for table_name in PARTITIONED_TABLES:
+            convert_postgresql_table(tables[table_name].__table__, schema)
+    elif context.get_context().dialect.name in ['oracle']:
+        schema = context.get_context().version_table_schema if context.get_context().version_table_schema else ''
+
+        for table_name in PARTITIONED_TABLES:
+            op.execute("ALTER TABLE %s MODIFY %s ONLINE UPDATE INDEXES" % (get_full_name(schema, table_name), get_oracle_partition_clause()))
+
+
+def downgrade() -> None:
+    # the partitioned tables work with the non partitioned models, they are kept.
+    pass
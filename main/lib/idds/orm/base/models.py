@@ -21,7 +21,7 @@ from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, String, F
 from sqlalchemy.ext.compiler import compiles
 # from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import object_mapper
-from sqlalchemy.schema import CheckConstraint, UniqueConstraint, Index, PrimaryKeyConstraint, ForeignKeyConstraint, Sequence, Table
+from sqlalchemy.schema import CheckConstraint, UniqueConstraint, Index, PrimaryKeyConstraint, ForeignKeyConstraint, Sequence, Table, CreateTable
 
 from idds.common.constants import (RequestGroupType, RequestGroupStatus, RequestGroupLocking,
                                    RequestType, RequestStatus, RequestLocking,
@@ -40,6 +40,8 @@ from idds.common.utils import date_to_str
 from idds.orm.base.enum import EnumSymbol
 from idds.orm.base.types import JSON, JSONString, EnumWithValue
 from idds.orm.base.session import BASE, DEFAULT_SCHEMA_NAME
+from idds.orm.base.partitions import (PARTITIONED_TABLES, is_partitioned_table, get_partition_key, get_partition_table_kwargs,
+                                      get_oracle_partition_clause, get_postgresql_default_partition_ddl)
 from idds.common.constants import (SCOPE_LENGTH, NAME_LENGTH, LONG_NAME_LENGTH)
 
 
@@ -48,6 +50,14 @@ def compile_binary_oracle(type_, compiler, **kw):
     return "NUMBER(1)"
 
 
+@compiles(CreateTable, "oracle")
+def compile_create_table_oracle(element, compiler, **kw):
+    ddl = compiler.visit_create_table(element, **kw)
+    if is_partitioned_table(element.element.name, "oracle"):
+        ddl = ddl.rstrip() + " " + get_oracle_partition_clause() + "\n\n"
+    return ddl
+
+
 @event.listens_for(Table, "after_create")
 def _psql_autoincrement(target, connection, **kw):
     if connection.dialect.name == 'mysql' and target.name == 'ess_coll':
@@ -640,7 +650,7 @@ class Content(BASE, ModelBase):
     content_id = Column(BigInteger().with_variant(Integer, "sqlite"), Sequence('CONTENT_ID_SEQ', schema=DEFAULT_SCHEMA_NAME), primary_key=True)
     transform_id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
     coll_id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
-    request_id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
+    request_id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False, primary_key=is_partitioned_table('contents'))
     workload_id = Column(Integer())
     map_id = Column(BigInteger().with_variant(Integer, "sqlite"), default=0, nullable=False)
     sub_map_id = Column(BigInteger().with_variant(Integer, "sqlite"), default=0)
@@ -674,12 +684,13 @@ class Content(BASE, ModelBase):
     expired_at = Column("expired_at", DateTime)
     content_metadata = Column(JSONString(1000))
 
-    __table_args__ = (PrimaryKeyConstraint('content_id', name='CONTENTS_PK'),
+    __mapper_args__ = {'primary_key': [content_id]}
+    __table_args__ = (PrimaryKeyConstraint(*get_partition_key('contents', 'content_id'), name='CONTENTS_PK'),
                       # UniqueConstraint('name', 'scope', 'coll_id', 'content_type', 'min_id', 'max_id', name='CONTENT_SCOPE_NAME_UQ'),
                       # UniqueConstraint('name', 'scope', 'coll_id', 'min_id', 'max_id', name='CONTENT_SCOPE_NAME_UQ'),
                       # UniqueConstraint('content_id', 'coll_id', name='CONTENTS_UQ'),
                       # UniqueConstraint('transform_id', 'coll_id', 'map_id', 'name', 'min_id', 'max_id', name='CONTENT_ID_UQ'),
-                      UniqueConstraint('transform_id', 'coll_id', 'map_id', 'sub_map_id', 'dep_sub_map_id', 'content_relation_type', 'name_md5', 'scope_name_md5', 'min_id', 'max_id', name='CONTENT_ID_UQ'),
+                      UniqueConstraint(*get_partition_key('contents', 'transform_id', 'coll_id', 'map_id', 'sub_map_id', 'dep_sub_map_id', 'content_relation_type', 'name_md5', 'scope_name_md5', 'min_id', 'max_id'), name='CONTENT_ID_UQ'),
                       ForeignKeyConstraint(['transform_id'], ['transforms.transform_id'], name='CONTENTS_TRANSFORM_ID_FK'),
                       ForeignKeyConstraint(['coll_id'], ['collections.coll_id'], name='CONTENTS_COLL_ID_FK'),
                       CheckConstraint('status IS NOT NULL', name='CONTENTS_STATUS_ID_NN'),
@@ -690,7 +701,8 @@ class Content(BASE, ModelBase):
                       Index('CONTENTS_REL_IDX', 'request_id', 'content_relation_type', 'transform_id', 'substatus'),
                       Index('CONTENTS_TF_IDX', 'transform_id', 'request_id', 'coll_id', 'map_id', 'content_relation_type'),
                       Index('CONTENTS_REQ_TF_COLL_IDX', 'request_id', 'transform_id', 'workload_id', 'coll_id', 'content_relation_type', 'status', 'substatus'),
-                      Index('CONTENTS_REQ_TF_DEP_ID', 'content_dep_id', 'request_id', 'transform_id'))
+                      Index('CONTENTS_REQ_TF_DEP_ID', 'content_dep_id', 'request_id', 'transform_id'),
+                      get_partition_table_kwargs('contents'))
 
 
 class Content_update(BASE, ModelBase):
@@ -698,13 +710,17 @@ class Content_update(BASE, ModelBase):
     __tablename__ = 'contents_update'
     content_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     substatus = Column(EnumWithValue(ContentStatus))
-    request_id = Column(BigInteger().with_variant(Integer, "sqlite"))
+    request_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=is_partitioned_table('contents_update'))
     transform_id = Column(BigInteger().with_variant(Integer, "sqlite"))
     workload_id = Column(Integer())
     fetch_status = Column(EnumWithValue(ContentFetchStatus), default=0, nullable=False)
     coll_id = Column(BigInteger().with_variant(Integer, "sqlite"))
     content_metadata = Column(JSONString(100))
 
+    __mapper_args__ = {'primary_key': [content_id]}
+    __table_args__ = (PrimaryKeyConstraint(*get_partition_key('contents_update', 'content_id')),
+                      get_partition_table_kwargs('contents_update'))
+
 
 class Content_ext(BASE, ModelBase):
     """Represents a content extension"""
@@ -712,7 +728,7 @@ class Content_ext(BASE, ModelBase):
     content_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     transform_id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
     coll_id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
-    request_id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
+    request_id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False, primary_key=is_partitioned_table('contents_ext'))
     workload_id = Column(Integer())
     map_id = Column(BigInteger().with_variant(Integer, "sqlite"), default=0, nullable=False)
     status = Column(EnumWithValue(ContentStatus), nullable=False)
@@ -788,10 +804,12 @@ class Content_ext(BASE, ModelBase):
     memory_leak_x2 = Column(String(10))
     job_label = Column(String(20))
 
-    __table_args__ = (PrimaryKeyConstraint('content_id', name='CONTENTS_EXT_PK'),
+    __mapper_args__ = {'primary_key': [content_id]}
+    __table_args__ = (PrimaryKeyConstraint(*get_partition_key('contents_ext', 'content_id'), name='CONTENTS_EXT_PK'),
                       Index('CONTENTS_EXT_RTF_IDX', 'request_id', 'transform_id', 'workload_id', 'coll_id', 'content_id', 'panda_id', 'status'),
                       Index('CONTENTS_EXT_RTW_IDX', 'request_id', 'transform_id', 'workload_id'),
-                      Index('CONTENTS_EXT_RTM_IDX', 'request_id', 'transform_id', 'map_id'))
+                      Index('CONTENTS_EXT_RTM_IDX', 'request_id', 'transform_id', 'map_id'),
+                      get_partition_table_kwargs('contents_ext'))
 
 
 class Health(BASE, ModelBase):
@@ -1200,6 +1218,17 @@ def drop_proc_to_update_contents():
     event.listen(Content.__table__, "before_drop", func.execute_if(dialect="postgresql"))
 
 
+def create_default_partitions():
+    """
+    Create the default partitions of the PostgreSQL partitioned tables, for the rows without a range partition.
+    """
+    tables = {'contents': Content, 'contents_ext': Content_ext, 'contents_update': Content_update}
+    for table_name in PARTITIONED_TABLES:
+        if is_partitioned_table(table_name):
+            ddl = DDL(get_postgresql_default_partition_ddl(table_name))
+            event.listen(tables[table_name].__table__, "after_create", ddl.execute_if(dialect="postgresql"))
+
+
 def get_request_sequence():
     seq = Sequence('REQUEST_ID_SEQ', schema=DEFAULT_SCHEMA_NAME, metadata=Request.metadata)
     # return seq.next_value().scalar()
@@ -1216,6 +1245,7 @@ def register_models(engine):
     models = (Request, Transform, Processing, Collection, Content, Content_update, Content_ext, Health, Message, Command, Throttler, MetaInfo, Condition)
 
     create_proc_to_update_contents()
+    create_default_partitions()
 
     for model in models:
         # if not engine.has_table(model.__tablename__, model.metadata.schema):
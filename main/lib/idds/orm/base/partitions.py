@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Range partitioning of the contents tables by request_id, for PostgreSQL and Oracle.
+
+It's enabled with partition_by_request_id in the [database] section. Partition k holds the rows with
+k * partition_size <= request_id < (k + 1) * partition_size.
+
+PostgreSQL: the tables are created with PARTITION BY RANGE (request_id) and a default partition.
+The range partitions <table>_p<k> are created ahead of the new requests by create_partitions.
+Rows of a request without a range partition go to the default partition.
+
+Oracle: the tables are interval partitioned, so Oracle creates the partitions itself.
+
+Old partitions are retired (dropped or detached) by the archiver, instead of deleting the rows one by one.
+"""
+
+import re
+
+from sqlalchemy import text
+
+from idds.common.config import config_get, config_has_option
+from idds.orm.base.session import read_session, transactional_session, DATABASE_SECTION, DEFAULT_SCHEMA_NAME
+
+
+PARTITIONED_TABLES = ['contents', 'contents_ext', 'contents_update']
+
+PARTITION_DIALECTS = ['postgresql', 'oracle']
+
+
+def get_partition_config():
+    """ Read the partitioning options in the [database] section.
+
+        partition_by_request_id: partition the contents tables by request_id, ignored if the database
+                                 is not PostgreSQL or Oracle.
+        partition_size: number of request ids in a partition.
+        partitions_ahead: number of PostgreSQL partitions created after the partition of the last request.
+    """
+    enabled, partition_size, partitions_ahead = False, 100000, 5
+    if config_has_option(DATABASE_SECTION, 'partition_by_request_id'):
+        enabled = str(config_get(DATABASE_SECTION, 'partition_by_request_id')).lower() in ['true', '1']
+        if enabled and config_has_option(DATABASE_SECTION, 'default'):
+            dialect_name = str(config_get(DATABASE_SECTION, 'default')).split(':')[0].split('+')[0]
+            enabled = dialect_name in PARTITION_DIALECTS
+    if config_has_option(DATABASE_SECTION, 'partition_size'):
+        partition_size = int(config_get(DATABASE_SECTION, 'partition_size'))
+    if config_has_option(DATABASE_SECTION, 'partitions_ahead'):
+        partitions_ahead = int(config_get(DATABASE_SECTION, 'partitions_ahead'))
+    return enabled, partition_size, partitions_ahead
+
+
+PARTITION_BY_REQUEST_ID, PARTITION_SIZE, PARTITIONS_AHEAD = get_partition_config()
+
+
+def is_partitioned_table(table_name, dialect_name=None):
+    """
+    :param dialect_name: dialect of the database, None to only check the configuration.
+    """
+    if not PARTITION_BY_REQUEST_ID or table_name not in PARTITIONED_TABLES:
+        return False
+    if dialect_name is not None and dialect_name not in PARTITION_DIALECTS:
+        return False
+    return True
+
+
+def get_partition_key(table_name, *columns):
+    """
+    The primary key and the unique constraints of a partitioned table include the partition key request_id.
+    """
+    if is_partitioned_table(table_name):
+        return columns + ('request_id',)
+    return columns
+
+
+def get_partition_table_kwargs(table_name):
+    if is_partitioned_table(table_name):
+        return {'postgresql_partition_by': 'RANGE (request_id)'}
+    return {}
+
+
+def get_partition_index(request_id, partition_size=None):
+    return int(request_id) // (partition_size or PARTITION_SIZE)
+
+
+def get_partition_range(index, partition_size=None):
+    """
+    :returns: (lower bound, upper bound) of the request ids, the upper bound is excluded.
+    """
+    partition_size = partition_size or PARTITION_SIZE
+    return index * partition_size, (index + 1) * partition_size
+
+
+def get_partition_name(table_name, index):
+    return '%s_p%s' % (table_name, index)
+
+
+def get_full_name(name):
+    if DEFAULT_SCHEMA_NAME:
+        return '%s.%s' % (DEFAULT_SCHEMA_NAME, name)
+    return name
+
+
+def get_oracle_partition_clause(partition_size=None):
+    partition_size = partition_size or PARTITION_SIZE
+    return "PARTITION BY RANGE (request_id) INTERVAL (%s) (PARTITION p0 VALUES LESS THAN (%s))" % (partition_size, partition_size)
+
+
+def get_postgresql_partition_ddl(table_name, index):
+    lower, upper = get_partition_range(index)
+    partition_name = get_full_name(get_partition_name(table_name, index))
+    return "CREATE TABLE IF NOT EXISTS %s PARTITION OF %s FOR VALUES FROM (%s) TO (%s)" % (partition_name, get_full_name(table_name), lower, upper)
+
+
+def get_postgresql_default_partition_ddl(table_name):
+    partition_name = get_full_name(table_name + '_pdefault')
+    return "CREATE TABLE IF NOT EXISTS %s PARTITION OF %s DEFAULT" % (partition_name, get_full_name(table_name))
+
+
+@read_session
+def get_partitions(table_name, session=None):
+    """
+    Get the range partitions of a table.
+
+    :param table_name: The table name.
+    :param session: The database session in use.
+
+    :returns: sorted list of partition indexes.
+    """
+    dialect_name = session.bind.dialect.name
+    if not is_partitioned_table(table_name, dialect_name):
+        return []
+
+    indexes = []
+    if dialect_name == 'postgresql':
+        sql = """SELECT c.relname FROM pg_inherits i
+                 JOIN pg_class c ON c.oid = i.inhrelid
+                 JOIN pg_class p ON p.oid = i.inhparent
+                 JOIN pg_namespace n ON n.oid = p.relnamespace
+                 WHERE p.relname = :table_name"""
+        params = {'table_name': table_name}
+        if DEFAULT_SCHEMA_NAME:
+            sql += " AND n.nspname = :schema"
+            params['schema'] = DEFAULT_SCHEMA_NAME
+        pattern = re.compile(r'^%s_p(\d+)$' % table_name)
+        for row in session.execute(text(sql), params):
+            match = pattern.match(row[0])
+            if match:
+                indexes.append(int(match.group(1)))
+    else:
+        # the high value is a LONG column with the upper bound of the partition
+        sql = "SELECT high_value FROM all_tab_partitions WHERE table_name = :table_name"
+        params = {'table_name': table_name.upper()}
+        if DEFAULT_SCHEMA_NAME:
+            sql += " AND table_owner = :schema"
+            params['schema'] = DEFAULT_SCHEMA_NAME.upper()
+        for row in session.execute(text(sql), params):
+            high_value = str(row[0]).strip()
+            if high_value.isdigit():
+                indexes.append(get_partition_index(int(high_value) - 1))
+    return sorted(indexes)
+
+
+@transactional_session
+def create_partitions(table_name, max_request_id, session=None):
+    """
+    Create the PostgreSQL range partitions up to partitions_ahead partitions after the partition of max_request_id.
+    Oracle creates the interval partitions itself.
+
+    :param table_name: The table name.
+    :param max_request_id: The last request id.
+    :param session: The database session in use.
+
+    :returns: list of the created partition indexes.
+    """
+    dialect_name = session.bind.dialect.name
+    if dialect_name != 'postgresql' or not is_partitioned_table(table_name, dialect_name):
+        return []
+
+    existing = get_partitions(table_name, session=session)
+    first_index = existing[-1] + 1 if existing else 0
+    last_index = get_partition_index(max_request_id or 0) + PARTITIONS_AHEAD
+    created = []
+    for index in range(first_index, last_index + 1):
+        session.execute(text(get_postgresql_partition_ddl(table_name, index)))
+        created.append(index)
+    return created
+
+
+@transactional_session
+def retire_partition(table_name, index, detach=False, session=None):
+    """
+    Drop or detach a range partition. A detached partition is kept as the table <table>_p<index>.
+
+    :param table_name: The table name.
+    :param index: The partition index.
+    :param detach: Whether to detach the partition instead of dropping it.
+    :param session: The database session in use.
+    """
+    dialect_name = session.bind.dialect.name
+    if not is_partitioned_table(table_name, dialect_name):
+        return
+
+    lower, _ = get_partition_range(index)
+    partition_name = get_full_name(get_partition_name(table_name, index))
+    full_name = get_full_name(table_name)
+    if dialect_name == 'postgresql':
+        if detach:
+            session.execute(text("ALTER TABLE %s DETACH PARTITION %s" % (full_name, partition_name)))
+        else:
+            session.execute(text("DROP TABLE IF EXISTS %s" % partition_name))
+    else:
+        # moves the interval partitions to the range section, so that the lowest partition can be dropped
+        session.execute(text("ALTER TABLE %s SET INTERVAL (%s)" % (full_name, PARTITION_SIZE)))
+        if detach:
+            session.execute(text("CREATE TABLE %s FOR EXCHANGE WITH TABLE %s" % (partition_name, full_name)))
+            session.execute(text("ALTER TABLE %s EXCHANGE PARTITION FOR (%s) WITH TABLE %s UPDATE GLOBAL INDEXES"
+                                 % (full_name, lower, partition_name)))
+        session.execute(text("ALTER TABLE %s DROP PARTITION FOR (%s) UPDATE GLOBAL INDEXES" % (full_name, lower)))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Candidates of the scheduling policies of the agents.
+"""
+
+from sqlalchemy import func
+from sqlalchemy.sql.expression import asc
+
+from idds.orm.base import models
+
+
+def get_scheduling_candidates(query, model, id_column, bulk_size, scheduler, session):
+    """
+    Get the candidates to be selected by a scheduling policy.
+    The candidates are the oldest scheduler.get_per_flow_candidates(bulk_size) items of every flow
+    (requester, campaign of the request), with at most scheduler.get_num_candidates(bulk_size) items.
+    They are ordered by the rank in the flow, so the oldest item of every flow is a candidate before
+    the second oldest item of any flow.
+
+    :param query: query of the items with the filters, without ordering and limit.
+    :param model: model of the items (Request, Transform or Processing).
+    :param id_column: primary key of the items.
+    :param bulk_size: number of items to be selected.
+    :param scheduler: scheduling policy.
+    :param session: The database session in use.
+
+    :returns: list of {'item': , 'flow': (requester, campaign), 'priority': , 'updated_at': }.
+    """
+    if model is not models.Request:
+        query = query.join(models.Request, models.Request.request_id == model.request_id)
+    flow_rank = func.row_number().over(partition_by=(models.Request.requester, models.Request.campaign),
+                                       order_by=(asc(model.updated_at), asc(id_column)))
+    items = query.with_entities(id_column.label('item_id'),
+                                models.Request.requester.label('requester'),
+                                models.Request.campaign.label('campaign'),
+                                models.Request.priority.label('request_priority'),
+                                flow_rank.label('flow_rank')).subquery()
+
+    candidate_query = session.query(model, items.c.requester, items.c.campaign, items.c.request_priority)\
+                             .join(items, id_column == items.c.item_id)\
+                             .filter(items.c.flow_rank <= scheduler.get_per_flow_candidates(bulk_size))\
+                             .order_by(asc(items.c.flow_rank), asc(model.updated_at))\
+                             .limit(scheduler.get_num_candidates(bulk_size))
+
+    candidates = []
+    for item, requester, campaign, request_priority in candidate_query.all():
+        priority = getattr(item, 'priority', None)
+        if priority is None:
+            priority = request_priority
+        candidates.append({'item': item, 'flow': (requester, campaign), 'priority': priority, 'updated_at': item.updated_at})
+    return candidates
@@ -15,8 +15,12 @@ Borrowed from:
 https://github.com/rucio/rucio/blob/master/lib/rucio/db/sqla/session.py
 """
 
+import logging
 import sys
+import threading
+import time
 
+from contextlib import contextmanager
 from functools import wraps
 from inspect import isgeneratorfunction
 from retrying import retry
@@ -27,7 +31,9 @@ from sqlalchemy import create_engine, event, inspect, select
 from sqlalchemy.exc import DatabaseError, DisconnectionError, OperationalError, TimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 
+from idds.common import metrics
 from idds.common.config import config_get, config_has_option
 from idds.common.exceptions import IDDSException, DatabaseException
 
@@ -44,6 +50,21 @@ if config_has_option(DATABASE_SECTION, 'schema'):
 
 _MAKER, _ENGINE, _LOCK = None, None, Lock()
 
+# read replicas: list of {'url': , 'engine': , 'maker': , 'session': , 'down_until': }
+_REPLICAS, _REPLICA_INDEX = None, 0
+# read-your-writes guard. It's kept per thread: a write in one thread doesn't send the reads
+# of other threads to the primary, even for the same request.
+_THREAD_LOCAL = threading.local()
+
+logger = logging.getLogger(__name__)
+
+# threads which may use the database at the same time, declared by the agents: {name: number of threads}
+_POOL_CONCURRENCY, _POOL_LOCK = {}, Lock()
+
+# Metrics are collected only when [metrics] enable = True. Otherwise the decorators
+# are not wrapped at all, so there is no overhead.
+DB_METRICS_ENABLED = metrics.is_metrics_enabled()
+
 
 def _fk_pragma_on_connect(dbapi_con, con_record):
     # Hack for previous versions of sqlite3
@@ -125,6 +146,188 @@ def my_on_connect(dbapi_con, connection_record):
     dbapi_con.action = caller
 
 
+def declare_pool_concurrency(name, num_threads):
+    """ Declare the number of threads of a thread pool which may use the database at the same time.
+        The pools of the engines are sized from the declared concurrency when pool_auto_size is set.
+        If the engine is already created, a warning is logged when its pool is too small.
+        :param name: name of the thread pool, for example the executor name of an agent.
+        :param num_threads: number of threads.
+        :returns: True if the pool of the engine can serve all declared threads.
+    """
+    with _POOL_LOCK:
+        _POOL_CONCURRENCY[name] = int(num_threads)
+    if DB_METRICS_ENABLED:
+        metrics.get_gauge('idds_db_pool_declared_concurrency',
+                          'Threads declared to use the database at the same time').set(get_declared_pool_concurrency())
+    if _ENGINE:
+        return check_pool_capacity(_ENGINE)
+    return True
+
+
+def get_declared_pool_concurrency():
+    with _POOL_LOCK:
+        return sum(_POOL_CONCURRENCY.values())
+
+
+def get_pool_config():
+    """ Read the pool auto sizing options in the [database] section.
+
+        pool_auto_size: size the pool to the declared concurrency of the agents.
+        pool_size_margin: connections added to the declared concurrency.
+        max_pool_size: max size of an auto sized pool.
+    """
+    auto_size, margin, max_pool_size = False, 2, None
+    if config_has_option(DATABASE_SECTION, 'pool_auto_size'):
+        auto_size = str(config_get(DATABASE_SECTION, 'pool_auto_size')).lower() in ['true', '1']
+    if config_has_option(DATABASE_SECTION, 'pool_size_margin'):
+        margin = int(config_get(DATABASE_SECTION, 'pool_size_margin'))
+    if config_has_option(DATABASE_SECTION, 'max_pool_size'):
+        max_pool_size = int(config_get(DATABASE_SECTION, 'max_pool_size'))
+    return auto_size, margin, max_pool_size
+
+
+def get_auto_pool_size(pool_size=None, margin=2, max_pool_size=None):
+    """ The pool size for the declared concurrency, at least the configured pool_size.
+        :returns: pool size, or None if no concurrency is declared.
+    """
+    concurrency = get_declared_pool_concurrency()
+    if not concurrency:
+        return pool_size
+    auto_pool_size = concurrency + margin
+    if pool_size:
+        auto_pool_size = max(auto_pool_size, pool_size)
+    if max_pool_size:
+        auto_pool_size = min(auto_pool_size, max_pool_size)
+    return auto_pool_size
+
+
+def get_pool_capacity(engine):
+    """ Max number of connections of the pool, None if it is not limited. """
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return None
+    max_overflow = getattr(pool, '_max_overflow', 0)
+    if max_overflow < 0:
+        return None
+    return pool.size() + max_overflow
+
+
+def check_pool_capacity(engine):
+    """ Log a warning if the declared concurrency is more than the capacity of the pool.
+        The threads above the capacity wait for connections and fail after pool_timeout.
+        :returns: True if the pool can serve all declared threads.
+    """
+    capacity = get_pool_capacity(engine)
+    concurrency = get_declared_pool_concurrency()
+    if capacity is not None and concurrency > capacity:
+        with _POOL_LOCK:
+            declared = dict(_POOL_CONCURRENCY)
+        logger.warning("Database pool oversubscribed: %s threads declared (%s) but the pool has at most %s connections. "
+                       "Increase pool_size/max_overflow or set pool_auto_size in the [database] section."
+                       % (concurrency, declared, capacity))
+        return False
+    return True
+
+
+def _on_pool_checkout(dbapi_con, connection_record, connection_proxy):
+    connection_record.info['checkout_time'] = time.time()
+    engine_type = connection_record.info.get('engine_type', 'primary')
+    metrics.get_gauge('idds_db_pool_connections_in_use', 'Connections checked out from the pool',
+                      label_names=('engine',)).inc(labels={'engine': engine_type})
+
+
+def _on_pool_checkin(dbapi_con, connection_record):
+    checkout_time = connection_record.info.pop('checkout_time', None)
+    if checkout_time is None:
+        return
+    engine_type = connection_record.info.get('engine_type', 'primary')
+    metrics.get_gauge('idds_db_pool_connections_in_use', 'Connections checked out from the pool',
+                      label_names=('engine',)).dec(labels={'engine': engine_type})
+    metrics.get_histogram('idds_db_pool_hold_seconds', 'Time a connection is checked out from the pool',
+                          label_names=('engine',)).observe(time.time() - checkout_time, labels={'engine': engine_type})
+
+
+class MeteredQueuePool(QueuePool):
+    """ QueuePool which records how long the checkouts wait for a connection.
+        Only the sessions which really use a connection check one out, so nothing is recorded for the others.
+    """
+    engine_type = 'primary'
+
+    def connect(self):
+        start_time = time.time()
+        try:
+            connection = super(MeteredQueuePool, self).connect()
+        except TimeoutError:
+            metrics.get_counter('idds_db_pool_timeouts_total', 'Number of timeouts to check out a connection from the pool',
+                                label_names=('engine',)).inc(labels={'engine': self.engine_type})
+            raise
+        metrics.get_histogram('idds_db_pool_wait_seconds', 'Time to check out a connection from the pool',
+                              label_names=('engine',)).observe(time.time() - start_time, labels={'engine': self.engine_type})
+        return connection
+
+    def recreate(self):
+        pool = super(MeteredQueuePool, self).recreate()
+        pool.engine_type = self.engine_type
+        return pool
+
+
+def create_engine_from_url(sql_connection, engine_type='primary'):
+    """ Creates a engine to a database url with the configured pool parameters.
+        :param engine_type: primary or replica, used in the metrics.
+        :returns: engine
+    """
+    config_params = [('pool_size', int), ('max_overflow', int), ('pool_timeout', int),
+                     ('pool_recycle', int), ('echo', int), ('echo_pool', str),
+                     ('pool_reset_on_return', str), ('use_threadlocal', int)]
+    # params = {'max_identifier_length': 128}
+    params = {}
+    for param, param_type in config_params:
+        try:
+            params[param] = param_type(config_get(DATABASE_SECTION, param))
+        except:  # noqa: B901
+            pass
+    params['execution_options'] = {'schema_translate_map': {None: DEFAULT_SCHEMA_NAME}}
+    auto_size, margin, max_pool_size = get_pool_config()
+    if auto_size and 'sqlite' not in sql_connection:
+        pool_size = get_auto_pool_size(params.get('pool_size', None), margin=margin, max_pool_size=max_pool_size)
+        if pool_size:
+            params['pool_size'] = pool_size
+    if 'oracledb' in sql_connection:
+        params['thick_mode'] = True
+    if DB_METRICS_ENABLED and 'sqlite' not in sql_connection:
+        params['poolclass'] = MeteredQueuePool
+    engine = create_engine(sql_connection, **params)
+    if isinstance(engine.pool, MeteredQueuePool):
+        engine.pool.engine_type = engine_type
+
+    if 'mysql' in sql_connection:
+        event.listen(engine, 'checkout', mysql_ping_listener)
+        event.listen(engine, 'connect', mysql_convert_decimal_to_float)
+    elif 'postgresql' in sql_connection:
+        event.listen(engine, 'connect', psql_convert_decimal_to_float)
+    elif 'sqlite' in sql_connection:
+        event.listen(engine, 'connect', _fk_pragma_on_connect)
+    elif 'oracle' in sql_connection:
+        event.listen(engine, 'connect', my_on_connect)
+
+    if DB_METRICS_ENABLED:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+        def set_engine_type(dbapi_con, connection_record):
+            connection_record.info['engine_type'] = engine_type
+
+        event.listen(engine, 'connect', set_engine_type)
+        event.listen(engine, 'checkout', _on_pool_checkout)
+        event.listen(engine, 'checkin', _on_pool_checkin)
+        capacity = get_pool_capacity(engine)
+        if capacity is not None:
+            metrics.get_gauge('idds_db_pool_capacity', 'Max number of connections of the pool',
+                              label_names=('engine',)).set(capacity, labels={'engine': engine_type})
+    check_pool_capacity(engine)
+    return engine
+
+
 def get_engine(echo=True):
     """ Creates a engine to a specific database.
         :returns: engine
@@ -132,30 +335,7 @@ def get_engine(echo=True):
     global _ENGINE
     if not _ENGINE:
         sql_connection = config_get(DATABASE_SECTION, 'default')
-        config_params = [('pool_size', int), ('max_overflow', int), ('pool_timeout', int),
-                         ('pool_recycle', int), ('echo', int), ('echo_pool', str),
-                         ('pool_reset_on_return', str), ('use_threadlocal', int)]
-        # params = {'max_identifier_length': 128}
-        params = {}
-        for param, param_type in config_params:
-            try:
-                params[param] = param_type(config_get(DATABASE_SECTION, param))
-            except:  # noqa: B901
-                pass
-        params['execution_options'] = {'schema_translate_map': {None: DEFAULT_SCHEMA_NAME}}
-        if 'oracledb' in sql_connection:
-            params['thick_mode'] = True
-        _ENGINE = create_engine(sql_connection, **params)
-
-        if 'mysql' in sql_connection:
-            event.listen(_ENGINE, 'checkout', mysql_ping_listener)
-            event.listen(_ENGINE, 'connect', mysql_convert_decimal_to_float)
-        elif 'postgresql' in sql_connection:
-            event.listen(_ENGINE, 'connect', psql_convert_decimal_to_float)
-        elif 'sqlite' in sql_connection:
-            event.listen(_ENGINE, 'connect', _fk_pragma_on_connect)
-        elif 'oracle' in sql_connection:
-            event.listen(_ENGINE, 'connect', my_on_connect)
+        _ENGINE = create_engine_from_url(sql_connection)
     assert _ENGINE
     return _ENGINE
 
@@ -216,6 +396,112 @@ def get_session():
     return session
 
 
+def get_replica_config():
+    """ Read replica options in the [database] section.
+
+        read_replicas: comma separated database urls of read replicas, used by the read_session calls with use_replica=True.
+        replica_max_lag: seconds after a write in the same thread during which reads go to the primary.
+                         Writes in other threads are not seen by the guard.
+        replica_retry_delay: seconds to wait before retrying a replica which failed.
+    """
+    urls, max_lag, retry_delay = [], 10, 60
+    if config_has_option(DATABASE_SECTION, 'read_replicas'):
+        urls = [u.strip() for u in config_get(DATABASE_SECTION, 'read_replicas').split(',') if u.strip()]
+    if config_has_option(DATABASE_SECTION, 'replica_max_lag'):
+        max_lag = int(config_get(DATABASE_SECTION, 'replica_max_lag'))
+    if config_has_option(DATABASE_SECTION, 'replica_retry_delay'):
+        retry_delay = int(config_get(DATABASE_SECTION, 'replica_retry_delay'))
+    return urls, max_lag, retry_delay
+
+
+def set_read_replicas(urls, max_lag=None, retry_delay=None):
+    """ (Re)configure the read replicas. An empty list disables the replica routing.
+        :param urls: list of database urls.
+    """
+    global _REPLICAS, _REPLICA_INDEX
+    _, config_max_lag, config_retry_delay = get_replica_config()
+    replicas = []
+    for url in urls or []:
+        engine = create_engine_from_url(url, engine_type='replica')
+        maker = sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=True)
+        replicas.append({'url': url, 'engine': engine, 'maker': maker, 'session': scoped_session(maker), 'down_until': 0,
+                         'max_lag': max_lag if max_lag is not None else config_max_lag,
+                         'retry_delay': retry_delay if retry_delay is not None else config_retry_delay})
+    with _LOCK:
+        _REPLICAS, _REPLICA_INDEX = replicas, 0
+
+
+def get_replicas():
+    if _REPLICAS is None:
+        urls, max_lag, retry_delay = get_replica_config()
+        set_read_replicas(urls, max_lag=max_lag, retry_delay=retry_delay)
+    return _REPLICAS
+
+
+def mark_write():
+    """ Record a write in this thread, used by the read-your-writes guard.
+
+        Only the reads of this thread go to the primary afterwards. A thread which reads what another
+        thread wrote, e.g. an agent thread picking up a request updated by another agent thread,
+        should use read_from_primary() or use_replica=False.
+    """
+    _THREAD_LOCAL.last_write_at = time.time()
+
+
+def is_primary_required(max_lag):
+    if getattr(_THREAD_LOCAL, 'primary_only', 0) > 0:
+        return True
+    last_write_at = getattr(_THREAD_LOCAL, 'last_write_at', None)
+    if last_write_at and last_write_at + max_lag > time.time():
+        return True
+    return False
+
+
+@contextmanager
+def read_from_primary():
+    """ Context manager to send all read_session calls of this thread to the primary.
+
+        with read_from_primary():
+            processing = get_processing(processing_id)
+    """
+    _THREAD_LOCAL.primary_only = getattr(_THREAD_LOCAL, 'primary_only', 0) + 1
+    try:
+        yield
+    finally:
+        _THREAD_LOCAL.primary_only -= 1
+
+
+def select_replica():
+    """ Select a healthy replica in round robin, or None if reads should go to the primary. """
+    global _REPLICA_INDEX
+    replicas = get_replicas()
+    if not replicas:
+        return None
+    if is_primary_required(replicas[0]['max_lag']):
+        return None
+
+    now = time.time()
+    with _LOCK:
+        for i in range(len(replicas)):
+            replica = replicas[(_REPLICA_INDEX + i) % len(replicas)]
+            if replica['down_until'] <= now:
+                _REPLICA_INDEX = (_REPLICA_INDEX + i + 1) % len(replicas)
+                return replica
+    return None
+
+
+def mark_replica_down(replica, error=None):
+    """ Failover: stop using a replica for a while after a connection failure. """
+    replica['down_until'] = time.time() + replica['retry_delay']
+    logger.warning("Read replica %s failed, using the primary for %s seconds: %s" % (replica['engine'].url, replica['retry_delay'], error))
+
+
+def get_replica_session(replica):
+    session = replica['session']
+    session.schema = DEFAULT_SCHEMA_NAME
+    return session
+
+
 def retry_if_db_connection_error(exception):
     """Return True if error in connecting to db."""
     # print(exception)
@@ -239,6 +525,98 @@ def retry_if_db_connection_error(exception):
     return False
 
 
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('query_start_time', None)
+    if not start_times:
+        return
+    duration = time.time() - start_times.pop()
+    statement_type = statement.lstrip().split(' ', 1)[0].lower() if statement else 'unknown'
+    metrics.get_histogram('idds_db_statement_duration_seconds', 'Duration of SQL statements',
+                          label_names=('statement',)).observe(duration, labels={'statement': statement_type})
+
+
+def get_function_name(function):
+    return '%s.%s' % (function.__module__.replace('idds.', ''), function.__name__)
+
+
+def get_num_rows(result):
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple, set)):
+        return len(result)
+    return 1
+
+
+def record_db_call(function_name, session_type, start_time, status='ok', num_rows=0):
+    labels = {'function': function_name, 'type': session_type}
+    metrics.get_counter('idds_db_calls_total', 'Number of calls of session decorated functions',
+                        label_names=('function', 'type', 'status')).inc(labels={'function': function_name,
+                                                                                'type': session_type,
+                                                                                'status': status})
+    metrics.get_histogram('idds_db_call_duration_seconds', 'Duration of session decorated functions',
+                          label_names=('function', 'type')).observe(time.time() - start_time, labels=labels)
+    if num_rows:
+        metrics.get_counter('idds_db_rows_total', 'Number of rows returned by session decorated functions',
+                            label_names=('function', 'type')).inc(num_rows, labels=labels)
+
+
+def get_retry_predicate(function):
+    """ retry_if_db_connection_error, counting the retries per function when metrics are enabled. """
+    if not DB_METRICS_ENABLED:
+        return retry_if_db_connection_error
+
+    function_name = get_function_name(function)
+
+    def retry_predicate(exception):
+        ret = retry_if_db_connection_error(exception)
+        if ret:
+            metrics.get_counter('idds_db_retries_total', 'Number of retries after database connection errors',
+                                label_names=('function',)).inc(labels={'function': function_name})
+        return ret
+    return retry_predicate
+
+
+def instrument_session_function(new_funct, function, session_type):
+    """ Wrap a session decorated function to record calls, latency and rows. """
+    if not DB_METRICS_ENABLED:
+        return new_funct
+
+    function_name = get_function_name(function)
+
+    if isgeneratorfunction(function):
+        @wraps(function)
+        def instrumented_gen(*args, **kwargs):
+            start_time, num_rows, status = time.time(), 0, 'ok'
+            try:
+                for row in new_funct(*args, **kwargs):
+                    num_rows += 1
+                    yield row
+            except:  # noqa: B901
+                status = 'error'
+                raise
+            finally:
+                record_db_call(function_name, session_type, start_time, status=status, num_rows=num_rows)
+        instrumented_gen.__doc__ = function.__doc__
+        return instrumented_gen
+
+    @wraps(function)
+    def instrumented(*args, **kwargs):
+        start_time = time.time()
+        try:
+            result = new_funct(*args, **kwargs)
+        except:  # noqa: B901
+            record_db_call(function_name, session_type, start_time, status='error')
+            raise
+        record_db_call(function_name, session_type, start_time, num_rows=get_num_rows(result))
+        return result
+    instrumented.__doc__ = function.__doc__
+    return instrumented
+
+
 def read_session(function):
     '''
     decorator that set the session variable to use inside a function.
@@ -246,8 +624,14 @@ def read_session(function):
     session is a sqlalchemy session, and you can get one calling get_session().
     This is useful if only SELECTs and the like are being done; anything involving
     INSERTs, UPDATEs etc should use transactional_session.
+    If read replicas are configured and use_replica=True is passed, the new session is created
+    on a replica, unless the thread wrote recently (read-your-writes) or the call is inside
+    read_from_primary(). If the replica fails, the call is retried on the primary.
+    Replicas are opt-in per call, for reads which tolerate lagged data (monitor, REST catalog,
+    throttler counts). The agents read the state written by other threads and agents, so their
+    reads stay on the primary; the read-your-writes guard only sees the writes of the calling thread.
     '''
-    @retry(retry_on_exception=retry_if_db_connection_error,
+    @retry(retry_on_exception=get_retry_predicate(function),
            wait_fixed=0.5,
            stop_max_attempt_number=2,
            wrap_exception=False)
@@ -257,6 +641,27 @@ def read_session(function):
         if isgeneratorfunction(function):
             raise IDDSException('read_session decorator should not be used with generator. Use stream_session instead.')
 
+        use_replica = kwargs.pop('use_replica', False)
+        if not kwargs.get('session') and use_replica:
+            replica = select_replica()
+            if replica is not None:
+                session = get_replica_session(replica)
+                try:
+                    kwargs['session'] = session
+                    return function(*args, **kwargs)
+                except (OperationalError, DisconnectionError, TimeoutError) as error:
+                    session.rollback()  # pylint: disable=maybe-no-member
+                    mark_replica_down(replica, error)
+                    kwargs['session'] = None
+                except DatabaseError as error:
+                    session.rollback()  # pylint: disable=maybe-no-member
+                    raise DatabaseException(str(error))
+                except:  # noqa: B901
+                    session.rollback()  # pylint: disable=maybe-no-member
+                    raise
+                finally:
+                    session.remove()
+
         if not kwargs.get('session'):
             session = get_session()
             try:
@@ -280,7 +685,7 @@ def read_session(function):
         except:  # noqa: B901
             raise
     new_funct.__doc__ = function.__doc__
-    return new_funct
+    return instrument_session_function(new_funct, function, 'read')
 
 
 def stream_session(function):
@@ -291,7 +696,7 @@ def stream_session(function):
     This is useful if only SELECTs and the like are being done; anything involving
     INSERTs, UPDATEs etc should use transactional_session.
     '''
-    @retry(retry_on_exception=retry_if_db_connection_error,
+    @retry(retry_on_exception=get_retry_predicate(function),
            wait_fixed=0.5,
            stop_max_attempt_number=2,
            wrap_exception=False)
@@ -327,7 +732,7 @@ def stream_session(function):
             except:  # noqa: B901
                 raise
     new_funct.__doc__ = function.__doc__
-    return new_funct
+    return instrument_session_function(new_funct, function, 'stream')
 
 
 def transactional_session(function):
@@ -336,7 +741,7 @@ def transactional_session(function):
     With that decorator it's possible to use the session variable like if a global variable session is declared.
     session is a sqlalchemy session, and you can get one calling get_session().
     '''
-    @retry(retry_on_exception=retry_if_db_connection_error,
+    @retry(retry_on_exception=get_retry_predicate(function),
            wait_fixed=0.5,
            stop_max_attempt_number=2,
            wrap_exception=False)
@@ -348,6 +753,7 @@ def transactional_session(function):
                 kwargs['session'] = session
                 result = function(*args, **kwargs)
                 session.commit()  # pylint: disable=maybe-no-member
+                mark_write()
             except TimeoutError as error:
                 print(error)
                 session.rollback()  # pylint: disable=maybe-no-member
@@ -365,7 +771,7 @@ def transactional_session(function):
             result = function(*args, **kwargs)
         return result
     new_funct.__doc__ = function.__doc__
-    return new_funct
+    return instrument_session_function(new_funct, function, 'transactional')
 
 
 def safe_bulk_update_mappings(session, model, mappings):
@@ -18,6 +18,7 @@ import datetime
 import sqlalchemy
 from sqlalchemy.exc import DatabaseError, IntegrityError
 from sqlalchemy.sql.expression import asc
+from sqlalchemy import func
 
 from idds.common import exceptions
 from idds.common.constants import CollectionType, CollectionStatus, CollectionLocking, CollectionRelationType
@@ -394,6 +395,28 @@ def update_collections(parameters, session=None):
         raise exceptions.NoObject('Collection cannot be found: %s' % (error))
 
 
+@transactional_session
+def update_collections_statistics(deltas, session=None):
+    """
+    Add the changes to the file statistics of collections, atomically in the database
+    (the concurrent updates of the same collection are not lost).
+
+    :param deltas: {coll_id: {'processed_files': 2, 'new_files': -2, 'bytes': 1000, ...}}
+    :param session: The database session in use.
+    """
+    # the same order in all sessions, to avoid deadlocks
+    for coll_id in sorted(deltas.keys()):
+        values = {}
+        for key, value in deltas[coll_id].items():
+            if value:
+                column = getattr(models.Collection, key)
+                values[column] = func.coalesce(column, 0) + value
+        if values:
+            values[models.Collection.updated_at] = datetime.datetime.utcnow()
+            session.query(models.Collection).filter_by(coll_id=coll_id)\
+                   .update(values, synchronize_session=False)
+
+
 @transactional_session
 def delete_collection(coll_id=None, session=None):
     """
@@ -24,6 +24,7 @@ from collections import defaultdict
 import sqlalchemy
 from sqlalchemy import and_
 from sqlalchemy import func
+from sqlalchemy import text
 from sqlalchemy.exc import DatabaseError, IntegrityError
 # from sqlalchemy.orm import aliased
 from sqlalchemy.sql import exists, select, expression, update
@@ -34,10 +35,14 @@ from idds.common.constants import (ContentType, ContentStatus, ContentLocking,
                                    ContentFetchStatus, ContentRelationType)
 from idds.common.utils import group_list
 from idds.common.utils import json_dumps
-from idds.orm.base.session import read_session, transactional_session
+from idds.orm.base.session import read_session, stream_session, transactional_session
 from idds.orm.base import models
 
 
+# number of rows fetched from a server side cursor in every round trip of the iter_* functions
+STREAM_YIELD_PER = 2000
+
+
 def create_content(request_id, workload_id, transform_id, coll_id, map_id, scope, name,
                    min_id, max_id, content_type=ContentType.File,
                    status=ContentStatus.New, content_relation_type=ContentRelationType.Input,
@@ -306,37 +311,9 @@ def get_contents(scope=None, name=None, request_id=None, transform_id=None, work
     """
 
     try:
-        if status is not None:
-            if not isinstance(status, (tuple, list)):
-                status = [status]
-            if len(status) == 1:
-                status = [status[0], status[0]]
-        if coll_id is not None:
-            if not isinstance(coll_id, (tuple, list)):
-                coll_id = [coll_id]
-            if len(coll_id) == 1:
-                coll_id = [coll_id[0], coll_id[0]]
-
         query = session.query(models.Content)
-
-        if request_id:
-            query = query.filter(models.Content.request_id == request_id)
-        if transform_id:
-            query = query.filter(models.Content.transform_id == transform_id)
-        if workload_id:
-            query = query.filter(models.Content.workload_id == workload_id)
-        if coll_id:
-            query = query.filter(models.Content.coll_id.in_(coll_id))
-        if scope:
-            query = query.filter(models.Content.scope == scope)
-        if name:
-            query = query.filter(models.Content.name.like(name.replace('*', '%')))
-        if status is not None:
-            query = query.filter(models.Content.status.in_(status))
-        if relation_type:
-            query = query.filter(models.Content.content_relation_type == relation_type)
-
-        query = query.order_by(asc(models.Content.map_id))
+        query = filter_contents(query, scope=scope, name=name, request_id=request_id, transform_id=transform_id,
+                                workload_id=workload_id, coll_id=coll_id, status=status, relation_type=relation_type)
 
         tmp = query.all()
         rets = []
@@ -354,6 +331,73 @@ def get_contents(scope=None, name=None, request_id=None, transform_id=None, work
         raise error
 
 
+def get_stream_columns(model, columns=None):
+    """
+    Get the columns of a stream query.
+
+    :param model: The model of the table.
+    :param columns: list of column names, None for all columns.
+
+    :returns: list of columns.
+    """
+    if not columns:
+        return list(model.__table__.columns)
+    return [model.__table__.columns[column] for column in columns]
+
+
+def filter_contents(query, scope=None, name=None, request_id=None, transform_id=None, workload_id=None, coll_id=None,
+                    status=None, relation_type=None):
+    if status is not None:
+        if not isinstance(status, (tuple, list)):
+            status = [status]
+        if len(status) == 1:
+            status = [status[0], status[0]]
+    if coll_id is not None:
+        if not isinstance(coll_id, (tuple, list)):
+            coll_id = [coll_id]
+        if len(coll_id) == 1:
+            coll_id = [coll_id[0], coll_id[0]]
+
+    if request_id:
+        query = query.filter(models.Content.request_id == request_id)
+    if transform_id:
+        query = query.filter(models.Content.transform_id == transform_id)
+    if workload_id:
+        query = query.filter(models.Content.workload_id == workload_id)
+    if coll_id:
+        query = query.filter(models.Content.coll_id.in_(coll_id))
+    if scope:
+        query = query.filter(models.Content.scope == scope)
+    if name:
+        query = query.filter(models.Content.name.like(name.replace('*', '%')))
+    if status is not None:
+        query = query.filter(models.Content.status.in_(status))
+    if relation_type:
+        query = query.filter(models.Content.content_relation_type == relation_type)
+
+    query = query.order_by(asc(models.Content.map_id))
+    return query
+
+
+@stream_session
+def iter_contents(scope=None, name=None, request_id=None, transform_id=None, workload_id=None, coll_id=None, status=None,
+                  relation_type=None, columns=None, yield_per=STREAM_YIELD_PER, session=None):
+    """
+    Iterate the contents with a server side cursor, like get_contents but in constant memory.
+
+    :param columns: list of column names, None for all columns.
+    :param yield_per: number of rows fetched from the cursor in every round trip.
+    :param session: The database session in use.
+
+    :returns: generator of named tuples with the columns as attributes.
+    """
+    query = session.query(*get_stream_columns(models.Content, columns))
+    query = filter_contents(query, scope=scope, name=name, request_id=request_id, transform_id=transform_id,
+                            workload_id=workload_id, coll_id=coll_id, status=status, relation_type=relation_type)
+    for row in query.yield_per(yield_per):
+        yield row
+
+
 @read_session
 def get_contents_by_request_transform(request_id=None, transform_id=None, workload_id=None, status=None, map_id=None, status_updated=False, with_deps=True, session=None):
     """
@@ -371,27 +415,10 @@ def get_contents_by_request_transform(request_id=None, transform_id=None, worklo
     """
 
     try:
-        if status is not None:
-            if not isinstance(status, (tuple, list)):
-                status = [status]
-
         query = session.query(models.Content)
-        if request_id:
-            query = query.filter(models.Content.request_id == request_id)
-        if transform_id:
-            query = query.filter(models.Content.transform_id == transform_id)
-        if workload_id:
-            query = query.filter(models.Content.workload_id == workload_id)
-        if status is not None:
-            query = query.filter(models.Content.substatus.in_(status))
-        if map_id:
-            query = query.filter(models.Content.map_id == map_id)
-        if status_updated:
-            query = query.filter(models.Content.status != models.Content.substatus)
-        if not with_deps:
-            query = query.filter(models.Content.content_relation_type != 3)
-
-        query = query.order_by(asc(models.Content.request_id), asc(models.Content.transform_id), asc(models.Content.map_id))
+        query = filter_contents_by_request_transform(query, request_id=request_id, transform_id=transform_id,
+                                                     workload_id=workload_id, status=status, map_id=map_id,
+                                                     status_updated=status_updated, with_deps=with_deps)
 
         tmp = query.all()
         rets = []
@@ -406,6 +433,54 @@ def get_contents_by_request_transform(request_id=None, transform_id=None, worklo
         raise error
 
 
+def filter_contents_by_request_transform(query, request_id=None, transform_id=None, workload_id=None, status=None, map_id=None,
+                                         status_updated=False, with_deps=True):
+    if status is not None:
+        if not isinstance(status, (tuple, list)):
+            status = [status]
+
+    if request_id:
+        query = query.filter(models.Content.request_id == request_id)
+    if transform_id:
+        query = query.filter(models.Content.transform_id == transform_id)
+    if workload_id:
+        query = query.filter(models.Content.workload_id == workload_id)
+    if status is not None:
+        query = query.filter(models.Content.substatus.in_(status))
+    if map_id:
+        query = query.filter(models.Content.map_id == map_id)
+    if status_updated:
+        query = query.filter(models.Content.status != models.Content.substatus)
+    if not with_deps:
+        query = query.filter(models.Content.content_relation_type != 3)
+
+    query = query.order_by(asc(models.Content.request_id), asc(models.Content.transform_id), asc(models.Content.map_id))
+    return query
+
+
+@stream_session
+def iter_contents_by_request_transform(request_id=None, transform_id=None, workload_id=None, status=None, map_id=None,
+                                       status_updated=False, with_deps=True, columns=None, yield_per=STREAM_YIELD_PER,
+                                       session=None):
+    """
+    Iterate the contents with a server side cursor, like get_contents_by_request_transform but in constant memory.
+
+    :param request_id: request id.
+    :param transform_id: transform id.
+    :param columns: list of column names, None for all columns.
+    :param yield_per: number of rows fetched from the cursor in every round trip.
+    :param session: The database session in use.
+
+    :returns: generator of named tuples with the columns as attributes.
+    """
+    query = session.query(*get_stream_columns(models.Content, columns))
+    query = filter_contents_by_request_transform(query, request_id=request_id, transform_id=transform_id,
+                                                 workload_id=workload_id, status=status, map_id=map_id,
+                                                 status_updated=status_updated, with_deps=with_deps)
+    for row in query.yield_per(yield_per):
+        yield row
+
+
 @read_session
 def get_content_status_statistics(coll_id=None, transform_ids=None, session=None):
     """
@@ -466,6 +541,31 @@ def get_content_status_statistics_by_relation_type(transform_ids=None, session=N
         raise error
 
 
+@read_session
+def get_contents_status(content_ids, request_id=None, session=None):
+    """
+    Get the status of contents, for the throttler counters.
+
+    :param content_ids: list of content ids.
+    :param request_id: The request id, to select only the partition of the request when the contents are partitioned.
+    :param session: The database session in use.
+
+    :returns: list of (content_id, transform_id, content_relation_type, status).
+    """
+    if not content_ids:
+        return []
+    content_ids = list(content_ids)
+    if len(content_ids) == 1:
+        content_ids = [content_ids[0], content_ids[0]]
+
+    query = session.query(models.Content.content_id, models.Content.transform_id,
+                          models.Content.content_relation_type, models.Content.status)
+    if request_id:
+        query = query.filter(models.Content.request_id == request_id)
+    query = query.filter(models.Content.content_id.in_(content_ids))
+    return query.all()
+
+
 @transactional_session
 def update_content(content_id, parameters, session=None):
     """
@@ -1350,11 +1450,14 @@ def add_contents_update(contents, bulk_size=10000, session=None):
 
 
 @transactional_session
-def set_fetching_contents_update(request_id=None, transform_id=None, fetch=True, session=None):
+def set_fetching_contents_update(request_id=None, transform_id=None, fetch=True, limit=None, session=None):
     """
     Set fetching contents update.
 
+    :param limit: If set, mark at most this number of staged updates.
     :param session: session.
+
+    :returns: number of marked staged updates.
     """
     try:
         if fetch:
@@ -1363,7 +1466,13 @@ def set_fetching_contents_update(request_id=None, transform_id=None, fetch=True,
                 query = query.filter(models.Content_update.request_id == request_id)
             if transform_id:
                 query = query.filter(models.Content_update.transform_id == transform_id)
-            query.update({'fetch_status': ContentFetchStatus.Fetching})
+            if limit:
+                # the ids are selected first, because MySQL doesn't support LIMIT in an IN subquery
+                content_ids = [row[0] for row in query.with_entities(models.Content_update.content_id).limit(limit)]
+                if not content_ids:
+                    return 0
+                query = query.filter(models.Content_update.content_id.in_(content_ids))
+            return query.update({'fetch_status': ContentFetchStatus.Fetching}, synchronize_session=False)
     except sqlalchemy.orm.exc.NoResultFound as error:
         raise exceptions.NoObject('No record can be found with (transform_id=%s): %s' %
                                   (transform_id, error))
@@ -1451,6 +1560,122 @@ def delete_contents_update(request_id=None, transform_id=None, contents=[], bulk
         raise exceptions.NoObject('Content_update deletion error: %s' % (error))
 
 
+def get_contents_update_filter(request_id, transform_id, substatus=None):
+    """
+    Get the where clause of the fetching staged updates of a transform.
+    """
+    table = models.Content_update.__table__
+    where_clause = and_(table.c.request_id == request_id,
+                        table.c.transform_id == transform_id,
+                        table.c.fetch_status == ContentFetchStatus.Fetching)
+    if substatus:
+        where_clause = and_(where_clause, table.c.substatus.in_(substatus))
+    return where_clause
+
+
+def get_merge_contents_update_stmt(request_id, transform_id, substatus=None):
+    """
+    Get the UPDATE ... FROM statement which applies the staged updates of a transform to the contents.
+    """
+    table = models.Content.__table__
+    update_table = models.Content_update.__table__
+    stmt = table.update().where(and_(table.c.request_id == request_id,
+                                     table.c.request_id == update_table.c.request_id,
+                                     table.c.content_id == update_table.c.content_id,
+                                     get_contents_update_filter(request_id, transform_id, substatus)))
+    stmt = stmt.values(status=update_table.c.substatus,
+                       substatus=update_table.c.substatus,
+                       content_metadata=func.coalesce(update_table.c.content_metadata, table.c.content_metadata),
+                       updated_at=datetime.datetime.utcnow())
+    return stmt
+
+
+def merge_contents_update_oracle(request_id, transform_id, substatus=None, session=None):
+    params = {'request_id': request_id, 'transform_id': transform_id,
+              'fetch_status': ContentFetchStatus.Fetching.value, 'updated_at': datetime.datetime.utcnow()}
+    substatus_clause = ''
+    if substatus:
+        names = []
+        for i, status in enumerate(substatus):
+            params['substatus_%s' % i] = status.value
+            names.append(':substatus_%s' % i)
+        substatus_clause = ' AND substatus IN (%s)' % ', '.join(names)
+
+    sql = """MERGE INTO %s c
+             USING (SELECT content_id, request_id, substatus, content_metadata FROM %s
+                    WHERE request_id = :request_id AND transform_id = :transform_id AND fetch_status = :fetch_status%s) u
+             ON (c.request_id = :request_id AND c.request_id = u.request_id AND c.content_id = u.content_id)
+             WHEN MATCHED THEN UPDATE SET c.status = u.substatus, c.substatus = u.substatus,
+                                          c.content_metadata = NVL(u.content_metadata, c.content_metadata),
+                                          c.updated_at = :updated_at"""
+    sql = sql % (models.Content.__table__.fullname, models.Content_update.__table__.fullname, substatus_clause)
+    return session.execute(text(sql), params).rowcount
+
+
+@read_session
+def get_contents_update_transitions(request_id, transform_id, substatus=None, session=None):
+    """
+    Get the status transitions of the contents by the fetching staged updates of a transform, for the throttler counters.
+
+    :returns: list of (content_relation_type, status, new status, number of contents).
+    """
+    update_table = models.Content_update.__table__
+    query = session.query(models.Content.content_relation_type, models.Content.status,
+                          update_table.c.substatus, func.count(models.Content.content_id))
+    query = query.filter(and_(models.Content.request_id == request_id,
+                              models.Content.request_id == update_table.c.request_id,
+                              models.Content.content_id == update_table.c.content_id,
+                              get_contents_update_filter(request_id, transform_id, substatus)))
+    query = query.group_by(models.Content.content_relation_type, models.Content.status, update_table.c.substatus)
+    return query.all()
+
+
+@transactional_session
+def merge_contents_update(request_id, transform_id, substatus=None, bulk_size=10000, session=None):
+    """
+    Apply the fetching staged updates in contents_update of a transform to the contents.
+
+    The updates are applied by one set-based statement: UPDATE ... FROM on PostgreSQL and MySQL,
+    MERGE on Oracle. On other databases (SQLite) they are applied in Python.
+
+    :param request_id: The request id.
+    :param transform_id: The transform id.
+    :param substatus: If set, only the staged updates with these substatus are applied.
+    :param bulk_size: Number of contents updated per bulk update by the Python fallback.
+    :param session: The database session in use.
+
+    :raises DatabaseException: If there is a database error.
+
+    :returns: number of updated contents.
+    """
+    try:
+        dialect_name = session.bind.dialect.name
+        if dialect_name in ['postgresql', 'mysql']:
+            stmt = get_merge_contents_update_stmt(request_id, transform_id, substatus=substatus)
+            return session.execute(stmt).rowcount
+        elif dialect_name == 'oracle':
+            return merge_contents_update_oracle(request_id, transform_id, substatus=substatus, session=session)
+
+        query = session.query(models.Content_update.content_id,
+                              models.Content_update.request_id,
+                              models.Content_update.substatus,
+                              models.Content_update.content_metadata)
+        query = query.filter(get_contents_update_filter(request_id, transform_id, substatus))
+        parameters = []
+        updated_at = datetime.datetime.utcnow()
+        for con in query:
+            parameter = {'content_id': con.content_id, 'substatus': con.substatus, 'status': con.substatus,
+                         'updated_at': updated_at}
+            if con.content_metadata:
+                parameter['content_metadata'] = con.content_metadata
+            parameters.append(parameter)
+        for i in range(0, len(parameters), bulk_size):
+            session.bulk_update_mappings(models.Content, parameters[i:i + bulk_size])
+        return len(parameters)
+    except DatabaseError as error:
+        raise exceptions.DatabaseException('Failed to apply contents update: %s' % (error))
+
+
 @transactional_session
 def add_contents_ext(contents, bulk_size=10000, session=None):
     """
@@ -1536,22 +1761,9 @@ def get_contents_ext(request_id=None, transform_id=None, workload_id=None, coll_
     """
 
     try:
-        if status is not None:
-            if not isinstance(status, (tuple, list)):
-                status = [status]
-
         query = session.query(models.Content_ext)
-        if request_id:
-            query = query.filter(models.Content_ext.request_id == request_id)
-        if transform_id:
-            query = query.filter(models.Content_ext.transform_id == transform_id)
-        if workload_id:
-            query = query.filter(models.Content_ext.workload_id == workload_id)
-        if coll_id:
-            query = query.filter(models.Content_ext.coll_id == coll_id)
-        if status is not None:
-            query = query.filter(models.Content_ext.status.in_(status))
-        query = query.order_by(asc(models.Content_ext.request_id), asc(models.Content_ext.transform_id), asc(models.Content_ext.map_id))
+        query = filter_contents_ext(query, request_id=request_id, transform_id=transform_id, workload_id=workload_id,
+                                    coll_id=coll_id, status=status)
 
         tmp = query.all()
         rets = []
@@ -1566,6 +1778,46 @@ def get_contents_ext(request_id=None, transform_id=None, workload_id=None, coll_
         raise error
 
 
+def filter_contents_ext(query, request_id=None, transform_id=None, workload_id=None, coll_id=None, status=None):
+    if status is not None:
+        if not isinstance(status, (tuple, list)):
+            status = [status]
+
+    if request_id:
+        query = query.filter(models.Content_ext.request_id == request_id)
+    if transform_id:
+        query = query.filter(models.Content_ext.transform_id == transform_id)
+    if workload_id:
+        query = query.filter(models.Content_ext.workload_id == workload_id)
+    if coll_id:
+        query = query.filter(models.Content_ext.coll_id == coll_id)
+    if status is not None:
+        query = query.filter(models.Content_ext.status.in_(status))
+    query = query.order_by(asc(models.Content_ext.request_id), asc(models.Content_ext.transform_id), asc(models.Content_ext.map_id))
+    return query
+
+
+@stream_session
+def iter_contents_ext(request_id=None, transform_id=None, workload_id=None, coll_id=None, status=None, columns=None,
+                      yield_per=STREAM_YIELD_PER, session=None):
+    """
+    Iterate the contents ext with a server side cursor, like get_contents_ext but in constant memory.
+
+    :param request_id: request id.
+    :param transform_id: transform id.
+    :param columns: list of column names, None for all columns.
+    :param yield_per: number of rows fetched from the cursor in every round trip.
+    :param session: The database session in use.
+
+    :returns: generator of named tuples with the columns as attributes.
+    """
+    query = session.query(*get_stream_columns(models.Content_ext, columns))
+    query = filter_contents_ext(query, request_id=request_id, transform_id=transform_id, workload_id=workload_id,
+                                coll_id=coll_id, status=status)
+    for row in query.yield_per(yield_per):
+        yield row
+
+
 @read_session
 def get_contents_ext_ids(request_id=None, transform_id=None, workload_id=None, coll_id=None, status=None, session=None):
     """
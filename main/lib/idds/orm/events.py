@@ -16,6 +16,8 @@ operations related to Events.
 import re
 import datetime
 
+from sqlalchemy import func, and_, or_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.exc import DatabaseError, IntegrityError, NoResultFound
 from sqlalchemy.sql.expression import asc, desc
 
@@ -70,6 +72,162 @@ def add_event(event, session=None):
     return None
 
 
+def get_key_filters(model, keys, chunk_size=500):
+    """
+    Get where clauses to select rows by (event_type, event_actual_id), in chunks.
+    """
+    keys = list(keys)
+    for i in range(0, len(keys), chunk_size):
+        chunk = keys[i:i + chunk_size]
+        event_types = set([k[0] for k in chunk])
+        clauses = []
+        for event_type in event_types:
+            actual_ids = [k[1] for k in chunk if k[0] == event_type]
+            clauses.append(and_(model.event_type == event_type, model.event_actual_id.in_(actual_ids)))
+        yield or_(*clauses)
+
+
+@read_session
+def get_event_priorities(keys, session=None):
+    """
+    Get the priorities of a list of (event_type, event_actual_id), in one query per chunk.
+    The priority is the number of seconds since the last processing.
+
+    :param keys: list of (event_type, event_actual_id).
+    :returns: {(event_type, event_actual_id): priority}
+    """
+    now = datetime.datetime.utcnow()
+    rets = {key: 3600 * 24 * 7 for key in keys}
+    for key_filter in get_key_filters(models.EventPriority, rets.keys()):
+        query = session.query(models.EventPriority.event_type, models.EventPriority.event_actual_id,
+                              models.EventPriority.last_processed_at)
+        for event_type, event_actual_id, last_processed_at in query.filter(key_filter).all():
+            if last_processed_at:
+                rets[(event_type, event_actual_id)] = (now - last_processed_at).total_seconds()
+    return rets
+
+
+@transactional_session
+def upsert_event_priorities(keys, priority=10, session=None):
+    """
+    Insert or update the priorities of a list of (event_type, event_actual_id) with
+    one upsert statement where the database supports it.
+
+    :param keys: list of (event_type, event_actual_id).
+    """
+    keys = sorted(set(keys), key=lambda k: (k[0].value if hasattr(k[0], 'value') else k[0], k[1]))
+    if not keys:
+        return
+
+    now = datetime.datetime.utcnow()
+    values = [{'event_type': event_type, 'event_actual_id': event_actual_id, 'priority': priority,
+               'last_processed_at': now, 'updated_at': now} for event_type, event_actual_id in keys]
+    update_values = {'priority': priority, 'last_processed_at': now, 'updated_at': now}
+    table = models.EventPriority.__table__
+
+    dialect = session.bind.dialect.name
+    if dialect in ['postgresql', 'sqlite']:
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table).values(values)
+        stmt = stmt.on_conflict_do_update(index_elements=['event_type', 'event_actual_id'], set_=update_values)
+        session.execute(stmt)
+    elif dialect == 'mysql':
+        stmt = mysql.insert(table).values(values)
+        stmt = stmt.on_duplicate_key_update(**update_values)
+        session.execute(stmt)
+    else:
+        # update the existing rows, then insert the missing ones
+        existing = set()
+        for key_filter in get_key_filters(models.EventPriority, keys):
+            query = session.query(models.EventPriority.event_type, models.EventPriority.event_actual_id)
+            existing.update([(t[0], t[1]) for t in query.filter(key_filter).all()])
+            session.query(models.EventPriority).filter(key_filter).update(update_values, synchronize_session=False)
+        new_values = [v for v in values if (v['event_type'], v['event_actual_id']) not in existing]
+        if new_values:
+            session.bulk_insert_mappings(models.EventPriority, new_values)
+
+
+@transactional_session
+def add_events(events, session=None):
+    """
+    Add events in bulk. An event is merged into a new event with the same (event_type, event_actual_id)
+    if they are able to merge, either already in the database or earlier in the same list.
+    Otherwise it's inserted.
+
+    Merge candidates and priorities are selected with one query per chunk of events. Merge candidates
+    which are being claimed by other sessions (locked) are skipped.
+
+    :param events: list of Event objects.
+    :returns: list of booleans, False if the event was merged and True if it was inserted.
+    """
+    if not events:
+        return []
+
+    try:
+        keys = set([(event._event_type, event.get_event_id()) for event in events])
+
+        candidates = {}
+        for key_filter in get_key_filters(models.Event, keys):
+            query = session.query(models.Event)\
+                           .filter(key_filter)\
+                           .filter(models.Event.status.in_([EventStatus.New, EventStatus.New]))\
+                           .order_by(asc(models.Event.event_id))\
+                           .with_for_update(skip_locked=True)
+            for event_db in query.all():
+                if event_db.content and event_db.content.get('event', None):
+                    key = (event_db.event_type, event_db.event_actual_id)
+                    candidates.setdefault(key, []).append({'event_id': event_db.event_id, 'event': event_db.content['event'], 'changed': False})
+
+        rets, new_events = [], []
+        for event in events:
+            key = (event._event_type, event.get_event_id())
+            merged = False
+            for candidate in candidates.get(key, []):
+                old_event = candidate['event']
+                if old_event.able_to_merge(event):
+                    old_event.merge(event)
+                    if old_event.changed():
+                        candidate['changed'] = True
+                    merged = True
+                    break
+            if not merged:
+                candidate = {'event_id': None, 'event': event, 'changed': False}
+                candidates.setdefault(key, []).append(candidate)
+                new_events.append(candidate)
+            rets.append(not merged)
+
+        updates = []
+        for key in candidates:
+            for candidate in candidates[key]:
+                if candidate['event_id'] and candidate['changed']:
+                    updates.append({'event_id': candidate['event_id'], 'content': {'event': candidate['event']}})
+        if updates:
+            session.bulk_update_mappings(models.Event, updates)
+
+        if new_events:
+            priorities = get_event_priorities([(c['event']._event_type, c['event'].get_event_id()) for c in new_events], session=session)
+            new_events_db = []
+            for candidate in new_events:
+                event = candidate['event']
+                key = (event._event_type, event.get_event_id())
+                new_events_db.append({'event_type': event._event_type,
+                                      'event_actual_id': event.get_event_id(),
+                                      'status': EventStatus.New,
+                                      'priority': priorities[key],
+                                      'created_at': datetime.datetime.utcnow(),
+                                      'content': {'event': event}})
+            session.bulk_insert_mappings(models.Event, new_events_db)
+        return rets
+    except TypeError as e:
+        raise exceptions.DatabaseException('Invalid JSON for content: %s' % str(e))
+    except DatabaseError as e:
+        if re.match('.*ORA-12899.*', e.args[0]) \
+           or re.match('.*1406.*', e.args[0]):
+            raise exceptions.DatabaseException('Could not persist event, content too large: %s' % str(e))
+        else:
+            raise exceptions.DatabaseException('Could not persist event: %s' % str(e))
+
+
 @read_session
 def get_events(event_type, event_actual_id, status=None, session=None):
     """
@@ -221,9 +379,12 @@ def update_event(event_id, status, session=None):
 @transactional_session
 def get_event_for_processing(event_type, num_events=1, session=None):
     """
-    Get event for processing
+    Claim events for processing. The events are selected with FOR UPDATE SKIP LOCKED and
+    updated in one statement, so that several agents can claim events concurrently without
+    getting the same events.
 
     :param event_type: event type.
+    :param num_events: max number of events to claim.
     """
     try:
         query = session.query(models.Event)
@@ -231,23 +392,38 @@ def get_event_for_processing(event_type, num_events=1, session=None):
             query = query.filter_by(event_type=event_type)
         status = [EventStatus.New, EventStatus.New]
         query = query.filter(models.Event.status.in_(status))
-        query = query.order_by(desc(models.Event.priority))
-        query = query.order_by(asc(models.Event.event_id))
 
-        tmp = query.all()
+        if session.bind.dialect.name == 'oracle':
+            # Oracle doesn't support FOR UPDATE with ROWNUM, select the candidates first and lock them.
+            id_query = session.query(models.Event.event_id)
+            if event_type:
+                id_query = id_query.filter_by(event_type=event_type)
+            id_query = id_query.filter(models.Event.status.in_(status))
+            id_query = id_query.order_by(desc(models.Event.priority)).order_by(asc(models.Event.event_id))
+            event_ids = [t[0] for t in id_query.limit(num_events * 2).all()]
+            if not event_ids:
+                return []
+            query = query.filter(models.Event.event_id.in_(event_ids))
+            query = query.order_by(desc(models.Event.priority)).order_by(asc(models.Event.event_id))
+            query = query.with_for_update(skip_locked=True)
+            tmp = query.all()[:num_events]
+        else:
+            query = query.order_by(desc(models.Event.priority)).order_by(asc(models.Event.event_id))
+            query = query.limit(num_events)
+            query = query.with_for_update(skip_locked=True)
+            tmp = query.all()
+
         events = []
         if tmp:
-            i = 0
             for event in tmp:
-                # event = tmp.to_dict()
-                # event = tmp
                 session.expunge(event)
-                update_event_priority(event.event_type, event.get_event_id(), session=session)
-                update_event(event.event_id, status=EventStatus.Processing, session=session)
                 events.append(event)
-                i += 1
-                if i >= num_events:
-                    break
+
+            event_ids = [event.event_id for event in events]
+            session.query(models.Event).filter(models.Event.event_id.in_(event_ids))\
+                   .update({'status': EventStatus.Processing, 'processing_at': datetime.datetime.utcnow()},
+                           synchronize_session=False)
+            upsert_event_priorities([(event.event_type, event.event_actual_id) for event in events], session=session)
         return events
     except NoResultFound as _:     # noqa F841
         return []
@@ -260,6 +436,20 @@ def get_event_for_processing(event_type, num_events=1, session=None):
     return []
 
 
+@read_session
+def get_num_queued_events(session=None):
+    """
+    Get the number of new events per event type.
+
+    :returns: {event_type: number of events}
+    """
+    query = session.query(models.Event.event_type, func.count(models.Event.event_id))
+    query = query.filter(models.Event.status.in_([EventStatus.New, EventStatus.New]))
+    query = query.group_by(models.Event.event_type)
+    tmp = query.all()
+    return {t[0]: t[1] for t in tmp}
+
+
 @transactional_session
 def delete_event(event_id, session=None):
     """
@@ -24,7 +24,7 @@ from idds.common import exceptions
 from idds.common.constants import MessageDestination
 from idds.common.utils import group_list
 from idds.orm.base import models
-from idds.orm.base.session import transactional_session
+from idds.orm.base.session import read_session, transactional_session
 
 
 @transactional_session
@@ -101,6 +101,34 @@ def add_messages(messages, bulk_size=1000, session=None):
             raise exceptions.DatabaseException('Could not persist message: %s' % str(e))
 
 
+@read_session
+def get_message_internal_ids(internal_ids, transform_id=None, created_after=None, session=None):
+    """
+    Get the internal_ids which are already stored in the messages table.
+
+    :param internal_ids: list of internal ids.
+    :param transform_id: The transform id.
+    :param created_after: Only check the messages created after this time.
+    :param session: The database session.
+
+    :returns: set of the stored internal ids.
+    """
+    try:
+        ret = set()
+        for chunk in [internal_ids[i:i + 1000] for i in range(0, len(internal_ids), 1000)]:
+            query = session.query(models.Message.internal_id)\
+                           .filter(models.Message.internal_id.in_(chunk))
+            if transform_id is not None:
+                query = query.filter(models.Message.transform_id == transform_id)
+            if created_after is not None:
+                query = query.filter(models.Message.created_at >= created_after)
+            for row in query.distinct().all():
+                ret.add(row[0])
+        return ret
+    except IntegrityError as e:
+        raise exceptions.DatabaseException(e.args)
+
+
 @transactional_session
 def update_messages(messages, bulk_size=1000, use_bulk_update_mappings=False, request_id=None, transform_id=None, min_request_id=None, session=None):
     try:
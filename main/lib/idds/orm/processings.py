@@ -25,6 +25,7 @@ from idds.common.constants import CommandType, ProcessingType, ProcessingStatus,
 from idds.common.utils import get_process_thread_info
 from idds.orm.base.session import read_session, transactional_session, safe_bulk_update_mappings
 from idds.orm.base import models
+from idds.orm.base.scheduling import get_scheduling_candidates
 
 
 def create_processing(request_id, workload_id, transform_id, status=ProcessingStatus.New, locking=ProcessingLocking.Idle, submitter=None,
@@ -308,7 +309,8 @@ def get_processings_by_transform_id(transform_id=None, to_json=False, session=No
 @transactional_session
 def get_processings_by_status(status, period=None, processing_ids=[], locking=False, locking_for_update=False,
                               bulk_size=None, submitter=None, to_json=False, by_substatus=False, only_return_id=False,
-                              not_lock=False, min_request_id=None, new_poll=False, update_poll=False, for_poller=False, session=None):
+                              not_lock=False, min_request_id=None, new_poll=False, update_poll=False, for_poller=False,
+                              shard=None, scheduler=None, session=None):
     """
     Get processing or raise a NoObject exception.
 
@@ -318,6 +320,8 @@ def get_processings_by_status(status, period=None, processing_ids=[], locking=Fa
     :param bulk_size: bulk size limitation.
     :param submitter: The submitter name.
     :param to_json: return json format.
+    :param shard: (number of shard buckets, shard buckets), to only get the items whose request_id % number of buckets is in the shard buckets.
+    :param scheduler: scheduling policy to select bulk_size items from the candidates, None for first in first out.
 
     :param session: The database session in use.
 
@@ -352,6 +356,8 @@ def get_processings_by_status(status, period=None, processing_ids=[], locking=Fa
             query = query.filter(models.Processing.processing_id.in_(processing_ids))
         if min_request_id:
             query = query.filter(models.Processing.request_id >= min_request_id)
+        if shard:
+            query = query.filter((models.Processing.request_id % shard[0]).in_(shard[1]))
         # if period:
         #     query = query.filter(models.Processing.updated_at < datetime.datetime.utcnow() - datetime.timedelta(seconds=period))
         if locking:
@@ -361,15 +367,20 @@ def get_processings_by_status(status, period=None, processing_ids=[], locking=Fa
 
         # if for_poller:
         #     query = query.order_by(asc(models.Processing.poller_updated_at))
-        if locking_for_update:
-            query = query.with_for_update(skip_locked=True)
+        if scheduler and bulk_size and not only_return_id and not locking_for_update:
+            # select the items by the scheduling policy, for example by fair share between the requesters
+            candidates = get_scheduling_candidates(query, models.Processing, models.Processing.processing_id, bulk_size, scheduler, session)
+            tmp = scheduler.select(candidates, bulk_size)
         else:
-            query = query.order_by(asc(models.Processing.updated_at))
+            if locking_for_update:
+                query = query.with_for_update(skip_locked=True)
+            else:
+                query = query.order_by(asc(models.Processing.updated_at))
 
-        if bulk_size:
-            query = query.limit(bulk_size)
+            if bulk_size:
+                query = query.limit(bulk_size)
 
-        tmp = query.all()
+            tmp = query.all()
         rets = []
         if tmp:
             for t in tmp:
@@ -591,6 +602,48 @@ def get_num_active_processings(active_status=None, session=None):
         raise error
 
 
+@read_session
+def get_processings_status_site(processing_ids, session=None):
+    """
+    Get the status and the site of processings, for the throttler counters.
+
+    :param processing_ids: list of processing ids.
+    :param session: The database session in use.
+
+    :returns: {processing_id: (status, site)}
+    """
+    if not processing_ids:
+        return {}
+    processing_ids = list(processing_ids)
+    if len(processing_ids) == 1:
+        processing_ids = [processing_ids[0], processing_ids[0]]
+
+    query = session.query(models.Processing.processing_id, models.Processing.status, models.Processing.site)
+    query = query.filter(models.Processing.processing_id.in_(processing_ids))
+    return {row[0]: (row[1], row[2]) for row in query.all()}
+
+
+@read_session
+def get_processings_site_by_transform(transform_ids, session=None):
+    """
+    Get the sites of the processings of transforms. The contents are counted at the site of their processing.
+
+    :param transform_ids: list of transform ids.
+    :param session: The database session in use.
+
+    :returns: {transform_id: site}
+    """
+    if not transform_ids:
+        return {}
+    transform_ids = list(transform_ids)
+    if len(transform_ids) == 1:
+        transform_ids = [transform_ids[0], transform_ids[0]]
+
+    query = session.query(models.Processing.transform_id, models.Processing.site)
+    query = query.filter(models.Processing.transform_id.in_(transform_ids))
+    return {row[0]: row[1] for row in query.all()}
+
+
 @read_session
 def get_active_processings(active_status=None, session=None):
     if active_status and not isinstance(active_status, (list, tuple)):
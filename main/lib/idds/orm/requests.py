@@ -26,6 +26,7 @@ from idds.common.constants import RequestType, RequestStatus, RequestLocking, Co
 from idds.common.utils import get_process_thread_info
 from idds.orm.base.session import read_session, transactional_session, safe_bulk_update_mappings
 from idds.orm.base import models
+from idds.orm.base.scheduling import get_scheduling_candidates
 
 
 def create_request(scope=None, name=None, requester=None, request_type=None,
@@ -1076,7 +1077,7 @@ def get_requests_by_requester(scope, name, requester, to_json=False, session=Non
 def get_requests_by_status_type(status, request_type=None, time_period=None, request_ids=[], locking=False,
                                 locking_for_update=False, bulk_size=None, to_json=False, by_substatus=False,
                                 min_request_id=None, new_poll=False, update_poll=False, only_return_id=False,
-                                not_lock=False, session=None):
+                                not_lock=False, shard=None, scheduler=None, session=None):
     """
     Get requests.
 
@@ -1085,6 +1086,8 @@ def get_requests_by_status_type(status, request_type=None, time_period=None, req
     :param locking: Wheter to lock requests to avoid others get the same request.
     :param bulk_size: Size limitation per retrieve.
     :param to_json: return json format.
+    :param shard: (number of shard buckets, shard buckets), to only get the items whose request_id % number of buckets is in the shard buckets.
+    :param scheduler: scheduling policy to select bulk_size items from the candidates, None for first in first out.
 
     :raises NoObject: If no request are founded.
 
@@ -1120,22 +1123,29 @@ def get_requests_by_status_type(status, request_type=None, time_period=None, req
         else:
             if min_request_id is not None:
                 query = query.filter(models.Request.request_id >= min_request_id)
+        if shard:
+            query = query.filter((models.Request.request_id % shard[0]).in_(shard[1]))
         if locking:
             query = query.filter(models.Request.locking == RequestLocking.Idle)
 
-        if locking_for_update:
-            query = query.with_for_update(skip_locked=True)
+        if scheduler and bulk_size and not only_return_id and not locking_for_update:
+            # select the items by the scheduling policy, for example by fair share between the requesters
+            candidates = get_scheduling_candidates(query, models.Request, models.Request.request_id, bulk_size, scheduler, session)
+            tmp = scheduler.select(candidates, bulk_size)
         else:
-            # query = query.order_by(asc(models.Request.updated_at))\
-            #              .order_by(desc(models.Request.priority))
-            # query = query.order_by(desc(models.Request.priority))\
-            #              .order_by(asc(models.Request.updated_at))
-            query = query.order_by(asc(models.Request.updated_at))
+            if locking_for_update:
+                query = query.with_for_update(skip_locked=True)
+            else:
+                # query = query.order_by(asc(models.Request.updated_at))\
+                #              .order_by(desc(models.Request.priority))
+                # query = query.order_by(desc(models.Request.priority))\
+                #              .order_by(asc(models.Request.updated_at))
+                query = query.order_by(asc(models.Request.updated_at))
 
-        if bulk_size:
-            query = query.limit(bulk_size)
+            if bulk_size:
+                query = query.limit(bulk_size)
 
-        tmp = query.all()
+            tmp = query.all()
         rets = []
         if tmp:
             for req in tmp:
@@ -1365,6 +1375,27 @@ def get_num_active_requests(active_status=None, session=None):
         raise error
 
 
+@read_session
+def get_requests_status_site(request_ids, session=None):
+    """
+    Get the status and the site of requests, for the throttler counters.
+
+    :param request_ids: list of request ids.
+    :param session: The database session in use.
+
+    :returns: {request_id: (status, site)}
+    """
+    if not request_ids:
+        return {}
+    request_ids = list(request_ids)
+    if len(request_ids) == 1:
+        request_ids = [request_ids[0], request_ids[0]]
+
+    query = session.query(models.Request.request_id, models.Request.status, models.Request.site)
+    query = query.filter(models.Request.request_id.in_(request_ids))
+    return {row[0]: (row[1], row[2]) for row in query.all()}
+
+
 @read_session
 def get_active_requests(active_status=None, session=None):
     if active_status and not isinstance(active_status, (list, tuple)):
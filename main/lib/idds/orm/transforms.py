@@ -25,6 +25,7 @@ from idds.common.constants import CommandType, TransformStatus, TransformLocking
 from idds.common.utils import get_process_thread_info
 from idds.orm.base.session import read_session, transactional_session, safe_bulk_update_mappings
 from idds.orm.base import models
+from idds.orm.base.scheduling import get_scheduling_candidates
 
 
 def create_transform(request_id, workload_id, transform_type, transform_tag=None,
@@ -424,7 +425,7 @@ def get_transforms(request_id=None, workload_id=None, transform_id=None, loop_in
 def get_transforms_by_status(status, period=None, transform_ids=[], locking=False, locking_for_update=False,
                              bulk_size=None, to_json=False, by_substatus=False, only_return_id=False,
                              not_lock=False, order_by_fifo=False, min_request_id=None, new_poll=False,
-                             update_poll=False, session=None):
+                             update_poll=False, shard=None, scheduler=None, session=None):
     """
     Get transforms or raise a NoObject exception.
 
@@ -432,6 +433,8 @@ def get_transforms_by_status(status, period=None, transform_ids=[], locking=Fals
     :param period: Time period in seconds.
     :param locking: Whether to retrieved unlocked items.
     :param to_json: return json format.
+    :param shard: (number of shard buckets, shard buckets), to only get the items whose request_id % number of buckets is in the shard buckets.
+    :param scheduler: scheduling policy to select bulk_size items from the candidates, None for first in first out.
 
     :param session: The database session in use.
 
@@ -465,24 +468,31 @@ def get_transforms_by_status(status, period=None, transform_ids=[], locking=Fals
             query = query.filter(models.Transform.transform_id.in_(transform_ids))
         if min_request_id:
             query = query.filter(models.Transform.request_id >= min_request_id)
+        if shard:
+            query = query.filter((models.Transform.request_id % shard[0]).in_(shard[1]))
         # if period:
         #     query = query.filter(models.Transform.updated_at < datetime.datetime.utcnow() - datetime.timedelta(seconds=period))
         if locking:
             query = query.filter(models.Transform.locking == TransformLocking.Idle)
 
-        if locking_for_update:
-            query = query.with_for_update(skip_locked=True)
+        if scheduler and bulk_size and not only_return_id and not locking_for_update:
+            # select the items by the scheduling policy, for example by fair share between the requesters
+            candidates = get_scheduling_candidates(query, models.Transform, models.Transform.transform_id, bulk_size, scheduler, session)
+            tmp = scheduler.select(candidates, bulk_size)
         else:
-            # if order_by_fifo:
-            #     query = query.order_by(desc(models.Transform.priority)).order_by(asc(models.Transform.transform_id))
-            # else:
-            #     query = query.order_by(asc(models.Transform.updated_at)).order_by(desc(models.Transform.priority))
-            query = query.order_by(asc(models.Transform.updated_at))
+            if locking_for_update:
+                query = query.with_for_update(skip_locked=True)
+            else:
+                # if order_by_fifo:
+                #     query = query.order_by(desc(models.Transform.priority)).order_by(asc(models.Transform.transform_id))
+                # else:
+                #     query = query.order_by(asc(models.Transform.updated_at)).order_by(desc(models.Transform.priority))
+                query = query.order_by(asc(models.Transform.updated_at))
 
-        if bulk_size:
-            query = query.limit(bulk_size)
+            if bulk_size:
+                query = query.limit(bulk_size)
 
-        tmp = query.all()
+            tmp = query.all()
         rets = []
         if tmp:
             for t in tmp:
@@ -698,6 +708,27 @@ def get_num_active_transforms(active_status=None, session=None):
         raise error
 
 
+@read_session
+def get_transforms_status_site(transform_ids, session=None):
+    """
+    Get the status and the site of transforms, for the throttler counters.
+
+    :param transform_ids: list of transform ids.
+    :param session: The database session in use.
+
+    :returns: {transform_id: (status, site)}
+    """
+    if not transform_ids:
+        return {}
+    transform_ids = list(transform_ids)
+    if len(transform_ids) == 1:
+        transform_ids = [transform_ids[0], transform_ids[0]]
+
+    query = session.query(models.Transform.transform_id, models.Transform.status, models.Transform.site)
+    query = query.filter(models.Transform.transform_id.in_(transform_ids))
+    return {row[0]: (row[1], row[2]) for row in query.all()}
+
+
 @read_session
 def get_active_transforms(active_status=None, session=None):
     if active_status and not isinstance(active_status, (list, tuple)):
@@ -35,6 +35,7 @@ from idds.rest.v1 import messages
 from idds.rest.v1 import ping
 from idds.rest.v1 import auth
 from idds.rest.v1 import metainfo
+from idds.rest.v1 import metrics
 
 
 class LoggingMiddleware(object):
@@ -79,6 +80,7 @@ def get_auth_blueprints():
     bps = []
     bps.append(auth.get_blueprint())
     bps.append(monitor.get_blueprint())
+    bps.append(metrics.get_blueprint())
     return bps
 
 
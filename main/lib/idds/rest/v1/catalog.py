@@ -55,7 +55,7 @@ class Collections(IDDSController):
                 relation_type = int(relation_type)
 
             rets = get_collections(request_id=request_id, transform_id=transform_id, workload_id=workload_id,
-                                   scope=scope, name=name, relation_type=relation_type, to_json=False)
+                                   scope=scope, name=name, relation_type=relation_type, to_json=False, use_replica=True)
         except exceptions.NoObject as error:
             return self.generate_http_response(HTTP_STATUS_CODE.NotFound, exc_cls=error.__class__.__name__, exc_msg=error)
         except exceptions.IDDSException as error:
@@ -108,7 +108,7 @@ class Contents(IDDSController):
                 status = int(status)
 
             rets = get_contents(request_id=request_id, transform_id=transform_id, workload_id=workload_id, coll_scope=coll_scope,
-                                coll_name=coll_name, relation_type=relation_type, status=status, to_json=False)
+                                coll_name=coll_name, relation_type=relation_type, status=status, to_json=False, use_replica=True)
         except exceptions.NoObject as error:
             return self.generate_http_response(HTTP_STATUS_CODE.NotFound, exc_cls=error.__class__.__name__, exc_msg=error)
         except exceptions.IDDSException as error:
@@ -165,8 +165,8 @@ class ContentsOutputExt(IDDSController):
 
             else:
                 contents = get_contents(request_id=request_id, workload_id=workload_id, transform_id=transform_id,
-                                        relation_type=CollectionRelationType.Output)
-                contents_ext = get_contents_ext(request_id=request_id, workload_id=workload_id, transform_id=transform_id)
+                                        relation_type=CollectionRelationType.Output, use_replica=True)
+                contents_ext = get_contents_ext(request_id=request_id, workload_id=workload_id, transform_id=transform_id, use_replica=True)
 
                 ret_contents = combine_contents_ext(contents, contents_ext, with_status_name=True)
                 rets = {}
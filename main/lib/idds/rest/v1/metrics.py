@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+from flask import Blueprint, Response
+
+from idds.common import metrics
+from idds.common.constants import HTTP_STATUS_CODE
+from idds.rest.v1.controller import IDDSController
+
+
+class Metrics(IDDSController):
+    """ Metrics of the rest service """
+
+    def get(self):
+        """ Get the metrics of this rest process in the Prometheus text format.
+        HTTP Success:
+            200 OK
+        HTTP Error:
+            404 Not Found (metrics are not enabled)
+        :returns: Prometheus text.
+        """
+        if not metrics.is_metrics_enabled():
+            return self.generate_http_response(HTTP_STATUS_CODE.NotFound, exc_cls='NotFound',
+                                               exc_msg='Metrics are not enabled')
+        return Response(response=metrics.generate_text(), status=HTTP_STATUS_CODE.OK,
+                        content_type='text/plain; version=0.0.4')
+
+
+"""----------------------
+   Web service url maps
+----------------------"""
+
+
+def get_blueprint():
+    bp = Blueprint('metrics', __name__)
+
+    view = Metrics.as_view('metrics')
+    bp.add_url_rule('/metrics', view_func=view, methods=['get'])
+    return bp
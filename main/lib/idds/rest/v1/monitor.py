@@ -34,7 +34,7 @@ class Monitor(IDDSController):
 
         if with_request:
             rets, ret_reqs = [], {}
-            reqs = get_requests(request_id=request_id, workload_id=workload_id,
+            reqs = get_requests(request_id=request_id, workload_id=workload_id, use_replica=True,
                                 with_request=False, with_transform=True, with_processing=with_processing,
                                 with_detail=False, with_metadata=False)
             for req in reqs:
@@ -82,7 +82,7 @@ class Monitor(IDDSController):
             return rets
         elif with_transform:
             rets = []
-            reqs = get_requests(request_id=request_id, workload_id=workload_id,
+            reqs = get_requests(request_id=request_id, workload_id=workload_id, use_replica=True,
                                 with_request=with_request, with_transform=with_transform, with_processing=with_processing,
                                 with_detail=False, with_metadata=False)
             for req in reqs:
@@ -111,7 +111,7 @@ class Monitor(IDDSController):
             return rets
         elif with_processing:
             rets = []
-            reqs = get_requests(request_id=request_id, workload_id=workload_id,
+            reqs = get_requests(request_id=request_id, workload_id=workload_id, use_replica=True,
                                 with_request=with_request, with_transform=with_transform, with_processing=with_processing,
                                 with_detail=False, with_metadata=False)
             for req in reqs:
@@ -127,7 +127,7 @@ class Monitor(IDDSController):
             return rets
         else:
             rets = []
-            reqs = get_requests(request_id=request_id, workload_id=workload_id, with_detail=False, with_processing=False, with_metadata=False)
+            reqs = get_requests(request_id=request_id, workload_id=workload_id, use_replica=True, with_detail=False, with_processing=False, with_metadata=False)
             for req in reqs:
                 ret = {'request_id': req['request_id'],
                        'workload_id': req['workload_id'],
@@ -480,7 +480,7 @@ class MonitorRequestRelation(Monitor):
             if workload_id == 'null':
                 workload_id = None
 
-            reqs = get_requests(request_id=request_id, workload_id=workload_id,
+            reqs = get_requests(request_id=request_id, workload_id=workload_id, use_replica=True,
                                 with_request=True, with_transform=False, with_processing=False,
                                 with_detail=False, with_metadata=True)
 
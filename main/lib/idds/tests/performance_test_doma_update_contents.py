@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+performance test of DomaPanDAWork.get_update_contents on a synthetic task.
+
+Every job of the task has one input and one output content. The PanDA job records are
+fake job infos with a mix of finished, failed, running and retried jobs.
+
+    python performance_test_doma_update_contents.py [num_jobs]
+"""
+
+import logging
+import random
+import sys
+import time
+
+from idds.common.constants import ContentStatus
+from idds.doma.workflowv2.domapandawork import DomaPanDAWork
+from idds.orm.contents import get_contents_ext_maps
+
+
+class FakeJobInfo(object):
+    # like the PanDA JobSpec, all attributes are set and the unknown values are 'NULL'
+    attributes = list(get_contents_ext_maps().values()) + ['jobSubStatus', 'eventService', 'jobsetID']
+
+    def __init__(self, **kwargs):
+        for attribute in self.attributes:
+            setattr(self, attribute, 'NULL')
+        self.__dict__.update(kwargs)
+
+
+def get_synthetic_task(num_jobs, seed=1):
+    """
+    :returns: (unterminated_jobs_status, input_output_maps, contents_ext)
+    """
+    rand = random.Random(seed)
+    unterminated_jobs_status, input_output_maps, contents_ext = {}, {}, []
+    for map_id in range(num_jobs):
+        input_name = 'job_%s' % map_id
+        content = {'request_id': 1, 'transform_id': 1, 'workload_id': 1, 'map_id': map_id, 'sub_map_id': 0}
+        input_content = dict(content, content_id=2 * map_id, coll_id=1, name=input_name, path=None,
+                             status=ContentStatus.Available, substatus=ContentStatus.Available, content_metadata={})
+        output_content = dict(content, content_id=2 * map_id + 1, coll_id=2, name='out_' + input_name, path=None,
+                              status=ContentStatus.New, substatus=ContentStatus.New, content_metadata={})
+        input_output_maps[map_id] = {'inputs': [input_content], 'outputs': [output_content], 'inputs_dependency': [], 'logs': []}
+
+        panda_id = 1000000 + map_id
+        if map_id % 10 == 0:
+            # a failed job retried in a new job
+            output_content['content_metadata']['panda_id'] = str(panda_id)
+            panda_id += num_jobs
+            contents_ext.append({'content_id': output_content['content_id'], 'status': ContentStatus.Failed, 'panda_id': panda_id - num_jobs})
+        job_status = rand.choice(['finished', 'finished', 'finished', 'failed', 'running', 'activated'])
+        job_info = FakeJobInfo(PandaID=panda_id, jobStatus=job_status, jobSubStatus=None, eventService=None, attemptNr=1, maxAttempt=3,
+                               jobsetID=panda_id, jediTaskID=1, jobName=input_name, computingSite='SITE', modificationTime='2026-01-01 00:00:00')
+        unterminated_jobs_status[input_name] = {'job_set_id': panda_id, 'jobs': [{'panda_id': panda_id, 'job_info': job_info}]}
+    return unterminated_jobs_status, input_output_maps, contents_ext
+
+
+def test(num_jobs=500000):
+    work = DomaPanDAWork(task_name='perf_update_contents', logger=logging.getLogger('DomaPanDAWork'))
+    unterminated_jobs_status, input_output_maps, contents_ext = get_synthetic_task(num_jobs)
+
+    start = time.time()
+    for input_file in unterminated_jobs_status:
+        jobs = unterminated_jobs_status[input_file]['jobs']
+        for job in jobs:
+            job['status'] = work.get_content_status_from_panda_status(job['job_info'])
+        panda_ids, status, job_info = work.get_last_job_info(jobs)
+        if status:
+            unterminated_jobs_status[input_file].update({'status': status, 'job_info': job_info, 'panda_id': panda_ids})
+    status_duration = time.time() - start
+
+    start = time.time()
+    ret = work.get_update_contents(unterminated_jobs_status, input_output_maps, contents_ext, get_contents_ext_maps())
+    update_duration = time.time() - start
+    update_contents, update_contents_full, new_contents_ext, update_contents_ext = ret
+
+    start = time.time()
+    all_jobs_ids = [job['panda_id'] for input_file in unterminated_jobs_status for job in unterminated_jobs_status[input_file]['jobs']]
+    unterminated_jobs = work.get_unterminated_jobs(all_jobs_ids, input_output_maps, new_contents_ext + update_contents_ext)
+    unterminated_duration = time.time() - start
+
+    print("%s jobs: job status in %.2f seconds, get_update_contents in %.2f seconds (%.0f jobs/s), get_unterminated_jobs in %.2f seconds" %
+          (num_jobs, status_duration, update_duration, num_jobs / update_duration, unterminated_duration))
+    print("update_contents: %s, new_contents_ext: %s, update_contents_ext: %s, unterminated_jobs: %s" %
+          (len(update_contents), len(new_contents_ext), len(update_contents_ext), len(unterminated_jobs)))
+
+
+if __name__ == '__main__':
+    test(int(sys.argv[1]) if len(sys.argv) > 1 else 500000)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+performance test of the MsgEventBusBackend over loopback.
+
+A manager process receives the events and a sender process sends them,
+with json or msgpack encoding and with or without send batching.
+
+    python performance_test_msg_eventbus.py [num_events]
+"""
+
+import multiprocessing
+import os
+import sys
+import time
+
+from idds.agents.common.eventbus.event import UpdateProcessingEvent
+from idds.agents.common.eventbus.msgeventbusbackend import MsgEventBusBackend
+
+
+def run_manager(port, queue, stop_event):
+    backend = MsgEventBusBackend(coordinator_port=port)
+    queue.put(backend.get_manager(myself=True))
+    stop_event.wait()
+    backend.stop()
+    # the receiver thread blocks in recv
+    os._exit(0)
+
+
+def run_sender(port, manager, num_events, encoding, send_batch_window, queue):
+    backend = MsgEventBusBackend(coordinator_port=port, encoding=encoding, send_batch_window=send_batch_window)
+    backend.manager_socket.close()
+    backend.manager = manager
+    backend.init_msg_channel()
+
+    events = [UpdateProcessingEvent(publisher_id='perf', processing_id=i, content={'status': 'running', 'num_files': i})
+              for i in range(num_events)]
+    start = time.time()
+    for event in events:
+        backend.send(event)
+    backend.flush_send_buffer()
+    duration = time.time() - start
+    backend.stop()
+    queue.put(duration)
+    queue.close()
+    queue.join_thread()
+    os._exit(0)
+
+
+def test_one(port, num_events, encoding, send_batch_window):
+    queue = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+    manager_proc = multiprocessing.Process(target=run_manager, args=(port, queue, stop_event))
+    manager_proc.start()
+    manager = queue.get()
+
+    proc = multiprocessing.Process(target=run_sender, args=(port + 1, manager, num_events, encoding, send_batch_window, queue))
+    proc.start()
+    duration = queue.get()
+    proc.join()
+
+    stop_event.set()
+    manager_proc.join(timeout=10)
+    if manager_proc.is_alive():
+        manager_proc.terminate()
+    return duration
+
+
+def test(num_events=10000):
+    port = 15556
+    for encoding in ['json', 'msgpack']:
+        for send_batch_window in [0, 0.01]:
+            duration = test_one(port, num_events, encoding, send_batch_window)
+            port += 2
+            print("encoding %s, send_batch_window %s: %s events in %.2f seconds, %.0f events/s" % (encoding, send_batch_window, num_events,
+                                                                                                   duration, num_events / duration))
+
+
+if __name__ == '__main__':
+    test(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the adaptive poll period of the processings.
+"""
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.agents.carrier.utils import get_adaptive_poll_period
+
+
+class TestAdaptivePollPeriod(unittest.TestCase):
+
+    def get_period(self, current, num_changes):
+        return get_adaptive_poll_period(current, 60, num_changes, min_period=10, max_period=1800,
+                                        active_changes=100, increase_rate=2, decrease_rate=2)
+
+    def test_adaptive_poll_period(self):
+        """ Poll period: active processings are polled faster and idle processings slower """
+        assert_equal(self.get_period(None, 0), 120)
+        assert_equal(self.get_period(60, 1000), 30)
+        assert_equal(self.get_period(30, 1000), 15)
+        assert_equal(self.get_period(15, 1000), 10)
+        # a few changes reset the backed off period
+        assert_equal(self.get_period(960, 5), 60)
+        assert_equal(self.get_period(15, 5), 15)
+
+        period = 60
+        for i in range(20):
+            period = self.get_period(period, 0)
+        assert_equal(period, 1800)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the chunked and resumable archiving of requests.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from sqlalchemy import Column, MetaData, Table, func, select
+
+from idds.common.constants import MessageType, MessageStatus, MessageSource, RequestStatus
+from idds.common.utils import check_database, has_config
+from idds.core import archives as core_archives
+from idds.core import messages as core_messages
+from idds.orm import archives as orm_archives
+from idds.orm.base.session import get_engine, DEFAULT_SCHEMA_NAME
+from idds.orm.requests import add_request, delete_requests
+from idds.agents.archive.archiver import Archiver
+from idds.agents.archive.exporter import ArchiveExporter
+from idds.agents.common.eventbus.eventbus import EventBus
+from idds.tests.common import get_request_properties
+
+
+def get_archive_table_definition(table_name):
+    table = orm_archives.get_table(table_name)
+    return Table(table_name + '_archive', MetaData(schema=DEFAULT_SCHEMA_NAME),
+                 *[Column(col.name, col.type) for col in table.c])
+
+
+def count_rows(table, request_id):
+    with get_engine().connect() as conn:
+        return conn.execute(select(func.count()).select_from(table).where(table.c.request_id == request_id)).scalar()
+
+
+class TestArchives(unittest.TestCase):
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.archive_table = get_archive_table_definition('messages')
+        self.archive_table.drop(bind=get_engine(), checkfirst=True)
+        orm_archives._ARCHIVE_TABLES.pop('messages', None)
+
+        req_properties = get_request_properties()
+        req_properties['status'] = RequestStatus.Finished
+        self.request_id = add_request(**req_properties)
+        # sqlite reuses the request ids, remove the messages left with the same request_id
+        core_archives.archive_request_rows('messages', self.request_id, to_archive_table=False)
+        for i in range(25):
+            core_messages.add_message(msg_type=MessageType.StageInFile, status=MessageStatus.New,
+                                      source=MessageSource.Carrier, request_id=self.request_id,
+                                      workload_id=None, transform_id=1, num_contents=1,
+                                      msg_content={'files': [{'content_id': i}]})
+        EventBus._instance = None
+        self.archiver = None
+
+    def tearDown(self):
+        if self.archiver is not None:
+            self.archiver.stop()
+            backend = self.archiver.event_bus.backend
+            if backend.is_alive():
+                backend.join(10)
+            EventBus._instance = None
+        self.archive_table.drop(bind=get_engine(), checkfirst=True)
+        orm_archives._ARCHIVE_TABLES.pop('messages', None)
+        core_archives.archive_request_rows('messages', self.request_id, to_archive_table=False)
+        delete_requests(request_id=self.request_id)
+        shutil.rmtree(self.archive_dir, ignore_errors=True)
+
+    def get_archiver(self, archive_mode):
+        self.archiver = Archiver(archive_mode=archive_mode, archive_dir=self.archive_dir, archive_batch_size=10,
+                                 archive_max_rows_per_second=0)
+        if archive_mode == 'file':
+            self.archiver.archive_exporter = ArchiveExporter(archive_dir=self.archive_dir)
+        return self.archiver
+
+    def get_exported_rows(self):
+        rows, files = [], []
+        for root, dirs, filenames in os.walk(self.archive_dir):
+            for filename in filenames:
+                files.append(filename)
+                with gzip.open(os.path.join(root, filename), 'rt') as f:
+                    rows += [json.loads(line) for line in f]
+        return sorted(files), rows
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_no_archive_table(self):
+        """ Archives: a missing archive table disables the table mode until the table is created """
+        archiver = self.get_archiver('table')
+        assert not core_archives.has_archive_table('messages')
+        assert not archiver.check_archive_tables()
+        assert 'messages' not in orm_archives._ARCHIVE_TABLES
+
+        self.archive_table.create(bind=get_engine())
+        assert core_archives.has_archive_table('messages')
+
+        num_rows, finished = archiver.archive_table_rows('messages', self.request_id, time.time(), 0)
+        assert_equal((num_rows, finished), (25, True))
+        assert_equal(count_rows(self.archive_table, self.request_id), 25)
+        assert_equal(core_archives.get_archive_batch('messages', self.request_id), ([], []))
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_chunked_archive(self):
+        """ Archives: the rows are exported and deleted in bounded batches """
+        archiver = self.get_archiver('file')
+        num_rows, finished = archiver.archive_table_rows('messages', self.request_id, time.time(), 0)
+        assert_equal((num_rows, finished), (25, True))
+
+        files, rows = self.get_exported_rows()
+        assert_equal(len(files), 3)
+        assert_equal(sorted([row['msg_content']['files'][0]['content_id'] for row in rows]), list(range(25)))
+        assert_equal(core_archives.get_archive_batch('messages', self.request_id), ([], []))
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_resume_archive(self):
+        """ Archives: an interrupted round is resumed without duplicating the archived rows """
+        archiver = self.get_archiver('file')
+
+        # a round which timed out does nothing
+        archiver.archive_max_time_per_round = -1
+        assert_equal(archiver.archive_table_rows('messages', self.request_id, time.time(), 0), (0, False))
+        archiver.archive_max_time_per_round = 3600
+
+        # a round which committed the first batch and crashed after exporting the second batch
+        pks, rows = core_archives.get_archive_batch('messages', self.request_id, batch_size=10, with_rows=True)
+        archiver.archive_exporter.export('messages', self.request_id, rows, first_id=pks[0], last_id=pks[-1])
+        assert_equal(core_archives.archive_batch('messages', pks, to_archive_table=False), 10)
+        pks, rows = core_archives.get_archive_batch('messages', self.request_id, batch_size=10, with_rows=True)
+        archiver.archive_exporter.export('messages', self.request_id, rows, first_id=pks[0], last_id=pks[-1])
+
+        # the next round exports the second batch again to the same file
+        num_rows, finished = archiver.archive_table_rows('messages', self.request_id, time.time(), 0)
+        assert_equal((num_rows, finished), (15, True))
+        files, rows = self.get_exported_rows()
+        assert_equal(len(files), 3)
+        assert_equal(sorted([row['msg_content']['files'][0]['content_id'] for row in rows]), list(range(25)))
+
+        # the archived requests are skipped by the next round
+        marker = archiver.get_archive_marker()
+        try:
+            archiver.set_archive_marker(self.request_id, num_rows)
+            assert_equal(archiver.get_archive_marker(), self.request_id)
+            assert self.request_id not in core_archives.get_requests_to_archive(status=[RequestStatus.Finished], older_than=0,
+                                                                                min_request_id=archiver.get_archive_marker())
+        finally:
+            archiver.set_archive_marker(marker)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test authentication cache.
+"""
+
+import base64
+import json
+import time
+
+import jwt
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from idds.common.authentication import get_user_name_from_dn
+from idds.common.utils import LRUCache
+from idds.core.authentication import OIDCAuthentication
+
+
+VO = 'test_vo'
+ISSUER = 'https://issuer.test/'
+JWKS_URI = 'https://issuer.test/jwks'
+
+
+def encode_value(val):
+    return base64.urlsafe_b64encode(val.to_bytes((val.bit_length() + 7) // 8, 'big')).rstrip(b'=').decode()
+
+
+def get_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    numbers = private_key.public_key().public_numbers()
+    jwk = {'kid': kid, 'kty': 'RSA', 'alg': 'RS256', 'n': encode_value(numbers.n), 'e': encode_value(numbers.e)}
+    pem = private_key.private_bytes(encoding=serialization.Encoding.PEM, format=serialization.PrivateFormat.PKCS8,
+                                    encryption_algorithm=serialization.NoEncryption())
+    return jwk, pem
+
+
+def get_token(key, name='user', exp=3600):
+    jwk, pem = key
+    claims = {'aud': 'idds', 'iss': ISSUER, 'name': name, 'exp': int(time.time()) + exp}
+    return jwt.encode(claims, pem, algorithm='RS256', headers={'kid': jwk['kid']})
+
+
+class JWKSAuthentication(OIDCAuthentication):
+    """ OIDCAuthentication which reads the key set from self.jwks instead of the jwks endpoint """
+
+    def get_http_content(self, url, no_verify=False):
+        assert_equal(url, JWKS_URI)
+        self.num_jwks_requests += 1
+        if self.jwks is None:
+            raise Exception("jwks endpoint is not available")
+        return json.dumps(self.jwks)
+
+
+class TestAuthCache(unittest.TestCase):
+
+    def test_lru_cache_eviction(self):
+        """ LRUCache: least recently used entry is evicted """
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert_equal(cache.get('a'), 1)
+        cache.set('c', 3)
+        assert_equal(cache.get('b'), None)
+        assert_equal(cache.get('a'), 1)
+        assert_equal(cache.get('c'), 3)
+        assert_equal(len(cache), 2)
+
+    def test_lru_cache_expiration(self):
+        """ LRUCache: expired entries are not returned """
+        cache = LRUCache(max_size=10, ttl=60)
+        cache.set('a', 1, expire_at=time.time() - 1)
+        cache.set('b', 2, ttl=-1)
+        cache.set('c', 3)
+        assert_equal(cache.get('a'), None)
+        assert_equal(cache.get('b'), None)
+        assert_equal(cache.get('c'), 3)
+        assert_equal(len(cache), 1)
+
+    def test_user_name_from_dn(self):
+        """ Authentication: username from dn is memoized """
+        dn = "/DC=ch/DC=cern/OU=Organic Units/OU=Users/CN=wguan/CN=667815/CN=Wen Guan/CN=1883443395"
+        assert_equal(get_user_name_from_dn(dn), 'Wen Guan')
+        assert_equal(get_user_name_from_dn(dn), 'Wen Guan')
+        assert get_user_name_from_dn.cache_info().hits >= 1
+
+
+class TestOIDCAuthCache(unittest.TestCase):
+
+    def setUp(self):
+        JWKSAuthentication._instance = None
+        self.auth = JWKSAuthentication()
+        self.auth.cache = LRUCache(max_size=100, ttl=3600)
+        self.auth.num_jwks_requests = 0
+        self.key = get_key('kid1')
+        self.auth.jwks = {'keys': [self.key[0]]}
+
+        auth_config = {'vo': VO, 'oidc_config_url': None, 'client_id': 'idds', 'client_secret': None,
+                       'audience': 'idds', 'no_verify': False}
+        self.auth.set_cache_value(VO, auth_config)
+        self.auth.set_cache_value(VO + '_endpoint_config', {'issuer': ISSUER, 'jwks_uri': JWKS_URI})
+
+    def tearDown(self):
+        JWKSAuthentication._instance = None
+
+    def verify(self, token):
+        status, data, username = self.auth.verify_id_token(VO, token)
+        assert status, data
+        return username
+
+    def test_token_cache_eviction(self):
+        """ Authentication: the least recently used token is evicted when the cache is full """
+        # vo, endpoint config, key set, public key and one token
+        self.auth.cache.max_size = 5
+        token1, token2 = get_token(self.key, name='user1'), get_token(self.key, name='user2')
+        assert_equal(self.verify(token1), 'user1')
+        assert_equal(self.verify(token2), 'user2')
+        assert_equal(self.auth.get_cache_value(self.auth.get_token_cache_key(VO, token1)), None)
+        assert self.auth.get_cache_value(self.auth.get_token_cache_key(VO, token2)) is not None
+        assert self.auth.get_cache_value(self.auth.get_public_key_cache_key(JWKS_URI, 'kid1')) is not None
+
+        assert_equal(self.verify(token1), 'user1')
+        assert_equal(self.auth.num_jwks_requests, 1)
+
+    def test_expired_entries(self):
+        """ Authentication: expired tokens and public keys are fetched again """
+        token = get_token(self.key)
+        assert_equal(self.verify(token), 'user')
+        token_key = self.auth.get_token_cache_key(VO, token)
+        self.auth.set_cache_value(token_key, ({'name': 'expired'}, 'expired'), expire_at=time.time() - 1)
+        assert_equal(self.verify(token), 'user')
+        assert_equal(self.auth.num_jwks_requests, 1)
+
+        pem_key = self.auth.get_public_key_cache_key(JWKS_URI, 'kid1')
+        self.auth.set_cache_value(pem_key, self.auth.get_cache_value(pem_key), expire_at=time.time() - 1)
+        assert_equal(self.verify(get_token(self.key, name='user2')), 'user2')
+        assert_equal(self.auth.num_jwks_requests, 2)
+
+    def test_unknown_kid(self):
+        """ Authentication: the key set is fetched again for a token signed with a new key """
+        assert_equal(self.verify(get_token(self.key)), 'user')
+        new_key = get_key('kid2')
+        self.auth.jwks = {'keys': [self.key[0], new_key[0]]}
+        assert_equal(self.verify(get_token(new_key, name='user2')), 'user2')
+        assert_equal(self.auth.num_jwks_requests, 2)
+
+    def test_failed_jwks_refresh(self):
+        """ Authentication: the cached public keys are kept when the key set cannot be refreshed """
+        assert_equal(self.verify(get_token(self.key)), 'user')
+        self.auth.jwks = None
+        self.auth.set_cache_value(JWKS_URI, self.auth.get_cache_value(JWKS_URI), expire_at=time.time() - 1)
+
+        self.auth.jwks_refreshing.add(JWKS_URI)
+        self.auth.refresh_public_keys(JWKS_URI)
+        assert_equal(self.auth.num_jwks_requests, 2)
+        assert_equal(self.auth.jwks_refreshing, set())
+        assert self.auth.get_cache_value(self.auth.get_public_key_cache_key(JWKS_URI, 'kid1')) is not None
+        assert_equal(self.verify(get_token(self.key, name='user2')), 'user2')
+
+        # a token signed with an unknown key is rejected
+        status, data, username = self.auth.verify_id_token(VO, get_token(get_key('kid2')))
+        assert not status
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test applying the staged contents updates.
+"""
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from sqlalchemy.dialects import mysql, postgresql
+
+from idds.common.constants import ContentRelationType, ContentStatus
+from idds.common.utils import check_database, has_config, setup_logging
+from idds.core import catalog as core_catalog
+from idds.orm import contents as orm_contents
+from idds.orm.requests import add_request, delete_requests
+from idds.orm.transforms import add_transform
+from idds.orm.collections import add_collection
+from idds.tests.common import get_request_properties, get_transform_properties, get_collection_properties
+
+setup_logging(__name__)
+
+
+class TestContentsUpdate(unittest.TestCase):
+
+    def test_merge_stmt(self):
+        """ ContentsUpdate: the staged updates are applied with one UPDATE ... FROM """
+        stmt = orm_contents.get_merge_contents_update_stmt(request_id=1, transform_id=2, substatus=[ContentStatus.Available])
+        sql = str(stmt.compile(dialect=postgresql.dialect())).replace('\n', ' ')
+        assert 'FROM contents_update WHERE' in sql, sql
+        assert 'contents.content_id = contents_update.content_id' in sql
+        sql = str(stmt.compile(dialect=mysql.dialect())).replace('\n', ' ')
+        assert sql.startswith('UPDATE contents, contents_update SET'), sql
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_apply_contents_update(self):
+        """ ContentsUpdate: the staged updates are applied to the contents and deleted """
+        request_id = add_request(**get_request_properties())
+        trans_properties = get_transform_properties()
+        trans_properties['request_id'] = request_id
+        trans_properties['workload_id'] = None
+        transform_id = add_transform(**trans_properties)
+        coll_properties = get_collection_properties()
+        coll_properties['transform_id'] = transform_id
+        coll_properties['request_id'] = request_id
+        coll_properties['workload_id'] = None
+        coll_id = add_collection(**coll_properties)
+
+        contents = []
+        for i in range(10):
+            contents.append({'request_id': request_id, 'transform_id': transform_id, 'workload_id': None, 'coll_id': coll_id,
+                             'map_id': i, 'scope': 'test_scope', 'name': 'test_update_%s' % i, 'status': ContentStatus.New,
+                             'substatus': ContentStatus.New, 'content_relation_type': ContentRelationType.Output})
+        orm_contents.add_contents(contents)
+        content_ids = {row.map_id: row.content_id for row in orm_contents.iter_contents(coll_id=coll_id, columns=['content_id', 'map_id'])}
+
+        updates = []
+        for i in range(6):
+            status = ContentStatus.Available if i % 2 else ContentStatus.Failed
+            updates.append({'content_id': content_ids[i], 'request_id': request_id, 'transform_id': transform_id,
+                            'workload_id': None, 'coll_id': coll_id, 'substatus': status})
+        core_catalog.add_contents_update(updates)
+
+        ret = core_catalog.apply_contents_update(request_id=request_id, transform_id=transform_id, substatus=[ContentStatus.Available])
+        assert_equal(ret, (6, 3))
+        status = {row.map_id: row.status for row in orm_contents.iter_contents(coll_id=coll_id, columns=['map_id', 'status'])}
+        assert_equal([status[i] for i in range(6)], [ContentStatus.New, ContentStatus.Available] * 3)
+        assert_equal(core_catalog.get_contents_update(request_id=request_id, transform_id=transform_id), [])
+
+        core_catalog.add_contents_update(updates[:2])
+        ret = core_catalog.apply_contents_update(request_id=request_id, transform_id=transform_id)
+        assert_equal(ret, (2, 2))
+
+        # a bounded round applies at most limit staged updates, the others are kept for the next round
+        core_catalog.add_contents_update(updates)
+        assert_equal(core_catalog.apply_contents_update(request_id=request_id, transform_id=transform_id, limit=4), (4, 4))
+        assert_equal(len(core_catalog.get_contents_update(request_id=request_id, transform_id=transform_id)), 2)
+        assert_equal(core_catalog.apply_contents_update(request_id=request_id, transform_id=transform_id, limit=4), (2, 2))
+        contents = orm_contents.get_contents_by_request_transform(request_id=request_id, transform_id=transform_id)
+        contents = {content['map_id']: content for content in contents}
+        assert_equal((contents[0]['status'], contents[0]['substatus']), (ContentStatus.Failed, ContentStatus.Failed))
+        assert_equal(core_catalog.apply_contents_update(request_id=request_id, transform_id=transform_id), (0, 0))
+
+        delete_requests(request_id=request_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the throttler counters maintained by the core functions.
+"""
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common.constants import ContentRelationType, ContentStatus, ProcessingStatus, RequestStatus, TransformStatus
+from idds.common.utils import check_database, has_config, setup_logging
+from idds.agents.common.cache.counters import Counters, is_throttler_counters_enabled
+from idds.core import (catalog as core_catalog, counters as core_counters, processings as core_processings,
+                       requests as core_requests, transforms as core_transforms)
+from idds.orm import contents as orm_contents
+from idds.orm.requests import add_request, delete_requests
+from idds.orm.collections import add_collection
+from idds.tests.common import get_request_properties, get_transform_properties, get_collection_properties
+
+setup_logging(__name__)
+
+
+class TransitionsRecorder(object):
+    def __init__(self):
+        self.transitions = {}
+
+    def record_transitions(self, kind, transitions):
+        self.transitions.setdefault(kind, {})
+        for key, num in transitions.items():
+            self.transitions[kind][key] = self.transitions[kind].get(key, 0) + num
+
+    def pop(self):
+        transitions, self.transitions = self.transitions, {}
+        return transitions
+
+
+class TestCounters(unittest.TestCase):
+
+    def test_buckets(self):
+        """ Counters: the buckets of the status """
+        counters = Counters()
+        assert_equal(counters.get_bucket('transforms', TransformStatus.Ready), 'new')
+        assert_equal(counters.get_bucket('transforms', TransformStatus.Finished), None)
+        assert_equal(counters.get_bucket('processings', ProcessingStatus.Running), 'processing')
+        assert_equal(counters.get_bucket('input_contents', ContentStatus.Activated), 'activated')
+        assert_equal(counters.get_bucket('output_contents', ContentStatus.Available), 'processed')
+        assert_equal(counters.get_bucket('requests', RequestStatus.Throttling), 'new')
+        assert_equal(counters.get_bucket('requests', RequestStatus.Finished), None)
+        assert_equal(counters.get_bucket('output_contents', None), None)
+
+    def test_load_counters(self):
+        """ Counters: the counters loaded from the database rows (status, site, count) """
+        counters = Counters(incremental=False)
+        rets = [(TransformStatus.New, None, 2), (TransformStatus.Ready, None, 1), (TransformStatus.Transforming, 'site1', 3),
+                (TransformStatus.Finished, 'site1', 10)]
+        assert_equal(counters.load_num_active_items('transforms', rets),
+                     {'Default': {'new': 3, 'processing': 0}, 'site1': {'new': 0, 'processing': 3}})
+        rets = [(ContentStatus.New, 'site1', 2), (ContentStatus.Activated, 'site1', 3), (ContentStatus.Available, 'site1', 4)]
+        assert_equal(counters.load_num_active_items('input_contents', rets),
+                     {'site1': {'new': 2, 'activated': 3, 'processed': 4}})
+
+    def test_opt_in(self):
+        """ Counters: the counters are only maintained incrementally if enabled """
+        # the test configuration doesn't enable the throttler counters
+        assert not is_throttler_counters_enabled()
+        assert not Counters().incremental
+        assert_equal(Counters(reconcile_period=600, cache_expire_seconds=300).get_reconcile_period(), 300)
+        assert_equal(Counters(reconcile_period=600, incremental=True).get_reconcile_period(), 600)
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_core_transitions(self):
+        """ Counters: the core functions record the status transitions """
+        recorder = TransitionsRecorder()
+        core_counters.set_counters_recorder(recorder)
+        try:
+            request_id = add_request(**get_request_properties())
+            core_requests.update_request(request_id, {'status': RequestStatus.Transforming})
+            assert_equal(recorder.pop(), {'requests': {(None, RequestStatus.New, RequestStatus.Transforming): 1}})
+            core_requests.update_request(request_id, {'priority': 1})
+            assert_equal(recorder.pop(), {})
+
+            trans_properties = get_transform_properties()
+            trans_properties['request_id'] = request_id
+            trans_properties['workload_id'] = None
+            trans_properties['site'] = 'test_site'
+            transform_id = core_transforms.add_transform(**trans_properties)
+            assert_equal(recorder.pop(), {'transforms': {('test_site', None, TransformStatus.New): 1}})
+
+            core_transforms.update_transform(transform_id, {'status': TransformStatus.Transforming})
+            assert_equal(recorder.pop(), {'transforms': {('test_site', TransformStatus.New, TransformStatus.Transforming): 1}})
+            core_transforms.update_transform(transform_id, {'retries': 1})
+            assert_equal(recorder.pop(), {})
+
+            processing_id = core_processings.add_processing(request_id=request_id, workload_id=None, transform_id=transform_id,
+                                                            status=ProcessingStatus.New)
+            core_processings.update_processing(processing_id, {'status': ProcessingStatus.Running})
+            assert_equal(recorder.pop(), {'processings': {(None, None, ProcessingStatus.New): 1,
+                                                          (None, ProcessingStatus.New, ProcessingStatus.Running): 1}})
+
+            coll_properties = get_collection_properties()
+            coll_properties['transform_id'] = transform_id
+            coll_properties['request_id'] = request_id
+            coll_properties['workload_id'] = None
+            coll_id = add_collection(**coll_properties)
+            contents = []
+            for i in range(4):
+                contents.append({'request_id': request_id, 'transform_id': transform_id, 'coll_id': coll_id, 'map_id': i,
+                                 'scope': 'test_scope', 'name': 'test_counters_%s' % i, 'status': ContentStatus.New,
+                                 'content_relation_type': ContentRelationType.Input if i < 3 else ContentRelationType.Output})
+            core_catalog.add_contents(contents)
+            assert_equal(recorder.pop(), {'input_contents': {(None, None, ContentStatus.New): 3},
+                                          'output_contents': {(None, None, ContentStatus.New): 1}})
+
+            content_ids = {row.map_id: row.content_id for row in orm_contents.iter_contents(coll_id=coll_id, columns=['content_id', 'map_id'])}
+            core_catalog.update_contents([{'content_id': content_ids[0], 'status': ContentStatus.Activated},
+                                          {'content_id': content_ids[1], 'substatus': ContentStatus.Activated}])
+            assert_equal(recorder.pop(), {'input_contents': {(None, ContentStatus.New, ContentStatus.Activated): 1}})
+
+            core_catalog.add_contents_update([{'content_id': content_ids[3], 'request_id': request_id, 'transform_id': transform_id,
+                                               'workload_id': None, 'coll_id': coll_id, 'substatus': ContentStatus.Available}])
+            core_catalog.apply_contents_update(request_id=request_id, transform_id=transform_id)
+            assert_equal(recorder.pop(), {'output_contents': {(None, ContentStatus.New, ContentStatus.Available): 1}})
+
+            delete_requests(request_id=request_id)
+        finally:
+            core_counters.set_counters_recorder(None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the database pool sizing from the declared agent concurrency.
+"""
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
+
+from idds.common import metrics
+from idds.orm.base import session as db_session
+
+
+class TestDBPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool_concurrency = dict(db_session._POOL_CONCURRENCY)
+        db_session._POOL_CONCURRENCY.clear()
+
+    def tearDown(self):
+        db_session._POOL_CONCURRENCY.clear()
+        db_session._POOL_CONCURRENCY.update(self.pool_concurrency)
+
+    def test_auto_pool_size(self):
+        """ DBPool: the pool size follows the declared concurrency """
+        assert_equal(db_session.get_auto_pool_size(pool_size=5), 5)
+        db_session._POOL_CONCURRENCY.update({'Clerk': 9, 'Transformer': 9, 'Poller_Extra': 8})
+        assert_equal(db_session.get_declared_pool_concurrency(), 26)
+        assert_equal(db_session.get_auto_pool_size(pool_size=5, margin=2), 28)
+        assert_equal(db_session.get_auto_pool_size(pool_size=40, margin=2), 40)
+        assert_equal(db_session.get_auto_pool_size(pool_size=5, margin=2, max_pool_size=20), 20)
+
+    def test_oversubscription(self):
+        """ DBPool: a warning when the executors would oversubscribe the pool """
+        engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=4, max_overflow=2)
+        assert_equal(db_session.get_pool_capacity(engine), 6)
+        assert_equal(db_session.get_pool_capacity(create_engine('sqlite://', poolclass=NullPool)), None)
+
+        db_session._POOL_CONCURRENCY.update({'Clerk': 3, 'Transformer': 3})
+        assert db_session.check_pool_capacity(engine)
+        db_session._POOL_CONCURRENCY.update({'Transformer_Extra': 2})
+        assert not db_session.check_pool_capacity(engine)
+
+    def test_pool_metrics(self):
+        """ DBPool: the connections in use are counted with the pool events """
+        engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=2)
+        event.listen(engine, 'checkout', db_session._on_pool_checkout)
+        event.listen(engine, 'checkin', db_session._on_pool_checkin)
+        in_use = metrics.get_gauge('idds_db_pool_connections_in_use', 'Connections checked out from the pool',
+                                   label_names=('engine',))
+        in_use.reset()
+
+        conn1, conn2 = engine.connect(), engine.connect()
+        assert_equal(in_use.get_values()[('primary',)], 2)
+        conn1.close()
+        conn2.close()
+        assert_equal(in_use.get_values()[('primary',)], 0)
+
+    def test_pool_wait_metrics(self):
+        """ DBPool: the wait is recorded when a connection is checked out, not when a session is created """
+        engine = create_engine('sqlite://', poolclass=db_session.MeteredQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1)
+        engine.pool.engine_type = 'replica'
+        wait = metrics.get_histogram('idds_db_pool_wait_seconds', 'Time to check out a connection from the pool',
+                                     label_names=('engine',))
+        timeouts = metrics.get_counter('idds_db_pool_timeouts_total', 'Number of timeouts to check out a connection from the pool',
+                                       label_names=('engine',))
+        wait.reset()
+        timeouts.reset()
+
+        session = sessionmaker(bind=engine)()
+        session.close()
+        assert_equal(wait.get_values(), {})
+
+        conn = engine.connect()
+        assert_equal(wait.get_values()[('replica',)][3], 1)
+        with self.assertRaises(TimeoutError):
+            engine.connect()
+        assert_equal(timeouts.get_values()[('replica',)], 1)
+        conn.close()
+
+        engine.dispose()
+        assert_equal(engine.pool.engine_type, 'replica')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the cached, the file-backed and the windowed dependency map of DomaPanDAWork.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.doma.workflowv2.dependencymapindex import DependencyMapIndex
+from idds.doma.workflowv2.domapandawork import DomaPanDAWork
+
+
+def get_dependency_map(num_jobs):
+    return [{'name': 'job_%s' % i,
+             'dependencies': [{'task': 'parent', 'inputname': 'parent_job_%s' % i}] if i % 2 else []}
+            for i in range(num_jobs)]
+
+
+class TestDependencyMapIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.storage)
+
+    def test_index(self):
+        """ DependencyMapIndex: jobs are read in windows and by name """
+        map_file = os.path.join(self.storage, 'dependency_map')
+        jobs = get_dependency_map(100)
+        with open(map_file, 'w') as fd:
+            json.dump(jobs, fd)
+
+        index = DependencyMapIndex(map_file)
+        assert not index.is_valid()
+        index.build(jobs)
+        assert index.is_valid()
+        assert_equal(index.count(), 100)
+        assert_equal(list(index.iter_jobs(chunk_size=7)), jobs)
+        assert_equal(list(index.iter_jobs(start=10, limit=5)), jobs[10:15])
+        assert_equal(index.get_jobs(['job_3', 'job_5', 'unknown']), {'job_3': jobs[3], 'job_5': jobs[5]})
+
+    def test_work_dependency_map(self):
+        """ DomaPanDAWork: the dependency map is cached and a file-backed map is read from its index """
+        jobs = get_dependency_map(10)
+        work = DomaPanDAWork(task_name='test_dependency_map', dependency_map=jobs, logger=logging.getLogger('DomaPanDAWork'))
+        assert work.dependency_map is work.dependency_map
+        assert_equal(work.get_unmapped_jobs(), jobs)
+
+        work.dependency_map = jobs[:5]
+        assert_equal(work.dependency_map, jobs[:5])
+        assert 'dependency_map_cache' not in json.dumps(work.to_dict()['attributes'], default=str)
+
+        work.dependency_map = jobs
+        work.convert_data_to_additional_data_storage(self.storage)
+        assert_equal(work.get_unmapped_jobs(), jobs)
+        assert os.path.exists(os.path.join(self.storage, work.get_work_name() + '.index.sqlite'))
+        assert work.has_dependency()
+        assert_equal(work.dependency_map, jobs)
+
+    def test_create_processing_from_index(self):
+        """ DomaPanDAWork: create_processing reads a file-backed map from its index without loading the map """
+        jobs = get_dependency_map(10)
+        work = DomaPanDAWork(task_name='test_dependency_map', dependency_map=jobs, executable='echo',
+                             logger=logging.getLogger('DomaPanDAWork'))
+        work.convert_data_to_additional_data_storage(self.storage)
+        assert work.get_dependency_map_index() is not None
+
+        def load_dependency_map_file(dependency_map_file):
+            raise Exception("the full dependency map is loaded")
+
+        work.load_dependency_map_file = load_dependency_map_file
+        proc = work.create_processing()
+        task_param = proc.processing_metadata['task_param']
+        assert_equal(task_param['pfnList'], [job['name'] for job in jobs])
+        assert task_param['inputPreStaging']
+        assert work.get_cached_dependency_map() is None
+
+    def test_unmapped_jobs_window(self):
+        """ DomaPanDAWork: the unmapped jobs are scanned in windows from the map cursor """
+        jobs = get_dependency_map(10)
+        work = DomaPanDAWork(task_name='test_dependency_map', dependency_map=jobs, logger=logging.getLogger('DomaPanDAWork'))
+        mapped = {1: {'outputs': [{'name': 'job_0'}]}, 2: {'outputs': [{'name': 'job_2'}]}}
+
+        unmapped_jobs, positions, scan_end = work.get_unmapped_jobs_window(mapped, max_jobs=3)
+        assert_equal([job['name'] for job in unmapped_jobs], ['job_1', 'job_3', 'job_4'])
+        assert_equal(positions, [1, 3, 4])
+        assert_equal(scan_end, 5)
+
+        work.map_cursor = 5
+        unmapped_jobs, positions, scan_end = work.get_unmapped_jobs_window(mapped, max_jobs=3)
+        assert_equal(positions, [5, 6, 7])
+
+        # a cursor at the end rescans from the beginning
+        work.map_cursor = 10
+        unmapped_jobs, positions, scan_end = work.get_unmapped_jobs_window(mapped, max_jobs=3)
+        assert_equal(positions, [1, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
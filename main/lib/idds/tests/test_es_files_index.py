@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the index of the event service files of DomaPanDAWork.
+"""
+
+import logging
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common.utils import json_dumps, json_loads
+from idds.doma.workflowv2.esfilesindex import ESFilesIndex
+from idds.doma.workflowv2.domapandawork import DomaPanDAWork
+
+
+def get_dependency_map(order_ids, groups=None):
+    return [{'name': 'job_%s' % order_id,
+             'order_id': order_id,
+             'groups': groups if groups else 'es_default',
+             'dependencies': [{'task': 'parent', 'inputname': 'parent_job_%s' % order_id}] if order_id == 12 else []}
+            for order_id in order_ids]
+
+
+class TestESFilesIndex(unittest.TestCase):
+
+    def test_build(self):
+        """ ESFilesIndex: continuous order ids are split into event service files """
+        jobs = get_dependency_map(list(range(0, 10)) + list(range(11, 14))) + get_dependency_map(range(20, 23), groups='group1')
+        index = ESFilesIndex.build(iter(jobs), 'label', max_events_per_job=4)
+        assert_equal(list(index.starts), [0, 4, 8, 11, 20])
+        assert_equal(list(index.counts), [4, 4, 2, 3, 3])
+        assert_equal(list(index.has_dependencies), [0, 0, 0, 1, 0])
+        assert_equal(index.get_es_name(3), 'label:eventservice_11^3')
+        assert_equal(index.lookup(13), (3, 2))
+        assert_equal(index.lookup(10), (None, None))
+        assert_equal(index.lookup(21), (4, 1))
+
+        index1 = ESFilesIndex.from_dict(json_loads(json_dumps(index.to_dict())))
+        assert_equal(list(index1.iter_es_files()), list(index.iter_es_files()))
+
+        assert ESFilesIndex.build(iter(get_dependency_map([1, 2, 2])), 'label', max_events_per_job=4) is None
+
+    def test_work_unmapped_es_jobs(self):
+        """ DomaPanDAWork: the unmapped event service files are mapped in windows """
+        jobs = get_dependency_map(range(10))
+        work = DomaPanDAWork(task_name='test_es', dependency_map=jobs, es=True, es_label='label', max_events_per_job=4,
+                             logger=logging.getLogger('DomaPanDAWork'))
+        index = work.get_es_files_index()
+        assert work.get_es_files_index() is index
+        assert_equal(len(index), 3)
+        assert 'es_files_index_cache' not in json_dumps(work.to_dict()['attributes'])
+
+        unmapped_jobs, has_more = work.get_unmapped_es_jobs(index, {0: {}}, max_events=4)
+        assert_equal(list(unmapped_jobs.keys()), [1])
+        assert_equal(sorted(unmapped_jobs[1].keys()), [4, 5, 6, 7])
+        assert has_more
+
+
+if __name__ == '__main__':
+    unittest.main()
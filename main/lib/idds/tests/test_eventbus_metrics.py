@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test EventBus metrics.
+"""
+
+import time
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common import metrics
+from idds.common.event import EventType, UpdateRequestEvent
+from idds.agents.common.eventbus.baseeventbusbackendopt import BaseEventBusBackendOpt
+from idds.agents.common.eventbus.eventbus import EventBus
+
+
+class TestEventBusMetrics(unittest.TestCase):
+
+    def setUp(self):
+        EventBus._instance = None
+        self.event_bus = None
+        # the test uses the local backend, not the backend in the [eventbus] section
+        self.load_attributes = EventBus.load_attributes
+        EventBus.load_attributes = lambda event_bus: {}
+
+    def tearDown(self):
+        EventBus.load_attributes = self.load_attributes
+        # the backend threads are not daemon threads, stop them so that the process can exit
+        if self.event_bus is not None:
+            for backend in set([self.event_bus._backend, self.event_bus._orig_backend]):
+                if backend is not None:
+                    backend.stop()
+                    if backend.is_alive():
+                        backend.join(10)
+        EventBus._instance = None
+
+    def test_eventbus_metrics(self):
+        """ EventBus: latency, handler duration, merges and queue depth per event type """
+        metrics.reset_metrics()
+        event_bus = self.event_bus = EventBus()
+        assert isinstance(event_bus.backend, BaseEventBusBackendOpt)
+
+        event_bus.send(UpdateRequestEvent(request_id=1))
+        event_bus.send(UpdateRequestEvent(request_id=1))
+        event_bus.send_bulk([UpdateRequestEvent(request_id=2), UpdateRequestEvent(request_id=3)])
+        assert_equal(event_bus.get_queue_depth(), {EventType.UpdateRequest: 3})
+
+        events = event_bus.get(EventType.UpdateRequest, num_events=2)
+        assert_equal(len(events), 2)
+        event_bus.send_report(events[0], 'ok', time.time() - 2, time.time(), 'test', None)
+
+        summary = event_bus.get_metrics_summary(event_types=[EventType.UpdateRequest])
+        stats = summary['UpdateRequest']
+        assert_equal(stats['sent'], 4)
+        assert_equal(stats['merged'], 1)
+        assert_equal(stats['merge_rate'], 0.25)
+        assert_equal(stats['received'], 2)
+        assert_equal(stats['queue_depth'], 1)
+        assert_equal(stats['handler_p95'], 5)
+        assert stats['latency_avg'] >= 0
+
+        assert 'idds_eventbus_queue_latency_seconds_count{event_type="UpdateRequest"} 2' in metrics.generate_text()
+
+
+if __name__ == '__main__':
+    unittest.main()
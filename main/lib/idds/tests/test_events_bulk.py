@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test bulk insert and claiming of database events.
+"""
+
+import random
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common.event import EventType, UpdateRequestEvent
+from idds.common.utils import check_database, has_config, setup_logging
+from idds.core import events as core_events
+
+
+setup_logging(__name__)
+
+
+class TestEventsBulk(unittest.TestCase):
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_add_events_and_claim(self):
+        """ Events: bulk merge-or-insert and batched claiming """
+        # drain the events from previous tests
+        while core_events.get_event_for_processing(EventType.UpdateRequest, num_events=1000):
+            pass
+
+        base_id = random.randint(1000000, 9000000)
+        events = [UpdateRequestEvent(request_id=base_id + i % 10, content={'test': True}) for i in range(30)]
+        rets = core_events.add_events(events)
+        assert_equal(len([r for r in rets if r]), 10)
+
+        rets = core_events.add_events([UpdateRequestEvent(request_id=base_id, content={'test': True}),
+                                       UpdateRequestEvent(request_id=base_id, content={'test': False})])
+        assert_equal(rets, [False, True])
+
+        claimed = core_events.get_event_for_processing(EventType.UpdateRequest, num_events=6)
+        assert_equal(len(claimed), 6)
+        claimed_again = core_events.get_event_for_processing(EventType.UpdateRequest, num_events=100)
+        assert_equal(len(claimed_again), 5)
+        assert_equal(set([e.event_id for e in claimed]) & set([e.event_id for e in claimed_again]), set())
+
+        priorities = core_events.get_event_priorities([(EventType.UpdateRequest, base_id)])
+        assert priorities[(EventType.UpdateRequest, base_id)] < 60
+
+
+if __name__ == '__main__':
+    unittest.main()
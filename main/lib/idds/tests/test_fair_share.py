@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the fair share scheduling of the agent polls with a simulated queue.
+"""
+
+import datetime
+import math
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common.constants import RequestStatus
+from idds.common.utils import check_database, has_config
+from idds.agents.common.fairshare import FairSharePolicy, get_scheduling_policy
+from idds.core import requests as core_requests
+from idds.orm import requests as orm_requests
+from idds.tests.common import get_request_properties
+
+
+class SimulatedQueue(object):
+    """
+    A queue of items like the database: the candidates are the oldest items per flow and the
+    selected items are processed and removed.
+    """
+    def __init__(self, start_time):
+        self.items = []
+        self.now = start_time
+
+    def add(self, requester, num, campaign='default', priority=0):
+        for i in range(num):
+            self.items.append({'item': '%s_%s_%s' % (requester, campaign, len(self.items)), 'flow': (requester, campaign),
+                               'priority': priority, 'updated_at': self.now})
+            self.now += datetime.timedelta(microseconds=1)
+
+    def poll(self, policy, bulk_size):
+        """
+        :param policy: scheduling policy, None for first in first out.
+        """
+        self.now += datetime.timedelta(seconds=10)
+        items = sorted(self.items, key=lambda item: item['updated_at'])
+        if policy is None:
+            selected = [item['item'] for item in items[:bulk_size]]
+            self.items = items[bulk_size:]
+            return selected
+
+        per_flow, candidates = {}, []
+        for item in items:
+            per_flow[item['flow']] = per_flow.get(item['flow'], 0) + 1
+            if per_flow[item['flow']] <= policy.get_per_flow_candidates(bulk_size):
+                candidates.append((per_flow[item['flow']], item['updated_at'], item))
+        candidates = [item for _, _, item in sorted(candidates, key=lambda c: c[:2])][:policy.get_num_candidates(bulk_size)]
+        selected = policy.select(candidates, bulk_size, now=self.now)
+        self.items = [item for item in self.items if item['item'] not in selected]
+        return selected
+
+
+def get_first_poll(queue, policy, bulk_size, requesters, max_polls=1000):
+    """
+    :returns: {requester: number of the first poll which selects an item of the requester}
+    """
+    first_poll = {}
+    for poll in range(1, max_polls + 1):
+        for item in queue.poll(policy, bulk_size):
+            requester = item.split('_')[0]
+            if requester not in first_poll:
+                first_poll[requester] = poll
+        if all([requester in first_poll for requester in requesters]):
+            break
+    return first_poll
+
+
+class TestFairShare(unittest.TestCase):
+
+    def setUp(self):
+        self.start_time = datetime.datetime(2026, 1, 1)
+
+    def test_heavy_user(self):
+        """ FairShare: one user with 5000 requests does not starve the other users """
+        light_users = ['light%s' % i for i in range(4)]
+
+        queue = SimulatedQueue(self.start_time)
+        queue.add('heavy', 5000)
+        for user in light_users:
+            queue.add(user, 5)
+        first_poll = get_first_poll(queue, None, 10, light_users)
+        # first in first out, the light users wait until the heavy user is done
+        assert min([first_poll[user] for user in light_users]) >= 500
+
+        queue = SimulatedQueue(self.start_time)
+        queue.add('heavy', 5000)
+        for user in light_users:
+            queue.add(user, 5)
+        first_poll = get_first_poll(queue, FairSharePolicy(), 10, light_users)
+        assert_equal(max([first_poll[user] for user in light_users]), 1)
+        # all the items of the light users are done in the first polls, with a fair share to the heavy user
+        selected = [queue.poll(FairSharePolicy(), 10) for i in range(3)]
+        assert len([item for items in selected for item in items if item.startswith('heavy')]) >= 10
+
+    def test_starvation_bound(self):
+        """ FairShare: with F flows and bulk_size B, every flow is selected in every ceil(F / B) polls """
+        num_flows, bulk_size = 25, 10
+        bound = int(math.ceil(num_flows * 1.0 / bulk_size))
+        queue = SimulatedQueue(self.start_time)
+        for i in range(num_flows):
+            queue.add('user%02d' % i, 100)
+        policy = FairSharePolicy()
+        last_poll = {}
+        for poll in range(1, 41):
+            for item in queue.poll(policy, bulk_size):
+                flow = item.split('_')[0]
+                assert poll - last_poll.get(flow, 0) <= bound, (flow, poll, last_poll.get(flow, 0))
+                last_poll[flow] = poll
+        assert_equal(len(last_poll), num_flows)
+
+    def test_weights_and_priority(self):
+        """ FairShare: the share of a flow follows its weight and the priority of its items """
+        queue = SimulatedQueue(self.start_time)
+        queue.add('user1', 1000)
+        queue.add('user2', 1000)
+        queue.add('user3', 1000, priority=1000)
+        policy = FairSharePolicy(requester_weights={'user1': 2}, aging_period=0)
+        num_items = {}
+        for i in range(50):
+            for item in queue.poll(policy, 12):
+                user = item.split('_')[0]
+                num_items[user] = num_items.get(user, 0) + 1
+        # weight 2 and (priority 1000 / priority_scale 1000 + 1) both double the share
+        assert_equal(sum(num_items.values()), 600)
+        for user in ['user1', 'user3']:
+            assert abs(num_items[user] - 2 * num_items['user2']) <= 2, num_items
+
+    def test_aging(self):
+        """ FairShare: an old item of a flow is selected before the new items with higher priority """
+        queue = SimulatedQueue(self.start_time)
+        queue.add('user1', 1)
+        queue.now += datetime.timedelta(seconds=3600)
+        queue.add('user1', 5, priority=500)
+        selected = queue.poll(FairSharePolicy(aging_period=600), 1)
+        assert_equal(selected, ['user1_default_0'])
+
+        queue = SimulatedQueue(self.start_time)
+        queue.add('user1', 1)
+        queue.now += datetime.timedelta(seconds=3600)
+        queue.add('user1', 5, priority=500)
+        selected = queue.poll(FairSharePolicy(aging_period=0), 1)
+        assert_equal(selected, ['user1_default_1'])
+
+    def test_get_scheduling_policy(self):
+        """ FairShare: the policy is pluggable """
+        assert get_scheduling_policy(None) is None
+        assert get_scheduling_policy('fifo') is None
+        assert isinstance(get_scheduling_policy('fair_share', quantum='2'), FairSharePolicy)
+        policy = get_scheduling_policy('idds.agents.common.fairshare.SchedulingPolicy', candidate_factor='2')
+        assert_equal(policy.get_num_candidates(10), 20)
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_get_requests_fair_share(self):
+        """ FairShare: the requests are polled by fair share between the requesters """
+        request_ids = []
+        for requester, num in [('heavy', 30), ('light1', 2), ('light2', 2)]:
+            for i in range(num):
+                req_properties = get_request_properties()
+                req_properties['requester'] = requester
+                req_properties['status'] = RequestStatus.Throttling
+                request_ids.append(orm_requests.add_request(**req_properties))
+
+        reqs = core_requests.get_requests_by_status_type(status=[RequestStatus.Throttling], min_request_id=min(request_ids),
+                                                         locking=True, bulk_size=6, scheduler=FairSharePolicy())
+        assert_equal(len(reqs), 6)
+        assert_equal(sorted([req['requester'] for req in reqs]), ['heavy', 'heavy', 'light1', 'light1', 'light2', 'light2'])
+
+        for request_id in request_ids:
+            orm_requests.delete_requests(request_id=request_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
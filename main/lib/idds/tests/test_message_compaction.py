@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the compaction of the file messages.
+"""
+
+import random
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common.config import config_has_option
+from idds.common.constants import Sections, MessageType, MessageStatus, MessageSource, MessageDestination
+from idds.common.utils import check_database, has_config, setup_logging
+from idds.core import messages as core_messages
+from idds.agents.carrier import utils as carrier_utils
+
+
+setup_logging(__name__)
+
+
+def get_file_message(transform_id, content_ids, status='Available', relation_type='output'):
+    files = [{'scope': 'test', 'name': 'file_%s' % i, 'path': None, 'map_id': i, 'content_id': i, 'status': status}
+             for i in content_ids]
+    return {'msg_type': MessageType.StageInFile,
+            'status': MessageStatus.New,
+            'source': MessageSource.Carrier,
+            'destination': MessageDestination.Outside,
+            'request_id': 1,
+            'workload_id': 1,
+            'transform_id': transform_id,
+            'num_contents': len(files),
+            'msg_content': {'msg_type': 'file_stagein', 'request_id': 1, 'transform_id': transform_id, 'workload_id': 1,
+                            'relation_type': relation_type, 'files': files}}
+
+
+class TestMessageCompaction(unittest.TestCase):
+
+    def test_compact_file_messages(self):
+        """ Messages: a file message is split into bounded batches """
+        files = [f for i in range(25) for f in get_file_message(1, range(i * 10, i * 10 + 10))['msg_content']['files']]
+        files += get_file_message(1, [3], status='Failed')['msg_content']['files']
+        msg = get_file_message(1, [])
+        msg['msg_content']['files'] = files
+
+        compacted = carrier_utils.compact_file_messages(msg, round_id='1_a', max_files=100)
+        assert_equal([m['num_contents'] for m in compacted], [100, 100, 50])
+        # the last update of a file is kept
+        outputs = [f for m in compacted for f in m['msg_content']['files']]
+        assert_equal(len(outputs), 250)
+        assert_equal(outputs[-1]['content_id'], 3)
+        assert_equal(outputs[-1]['status'], 'Failed')
+        assert_equal(len(msg['msg_content']['files']), 251)
+
+        # a retried round gets the same ids, the next round new ones
+        retried = carrier_utils.compact_file_messages(msg, round_id='1_a', max_files=100)
+        assert_equal([m['internal_id'] for m in compacted], [m['internal_id'] for m in retried])
+        next_round = carrier_utils.compact_file_messages(msg, round_id='1_b', max_files=100)
+        assert_equal(set([m['internal_id'] for m in compacted]) & set([m['internal_id'] for m in next_round]), set())
+
+        compacted = carrier_utils.compact_file_messages(msg, max_files=1000, max_payload_size=2000)
+        assert max([m['num_contents'] for m in compacted]) < 25
+        assert_equal(sum([m['num_contents'] for m in compacted]), 250)
+        assert_equal([m.get('internal_id', None) for m in compacted], [None] * len(compacted))
+
+    @unittest.skipIf(config_has_option(Sections.Carrier, 'message_compaction'), "message_compaction is configured")
+    def test_compaction_disabled(self):
+        """ Messages: the file messages are not compacted by default """
+        msg = get_file_message(1, [1, 1, 2])
+        assert_equal(carrier_utils.compact_messages(msg, round_id='1_a'), [msg])
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_retried_round(self):
+        """ Messages: the batches of a retried round are not stored twice """
+        transform_id = random.randint(1000000, 9000000)
+        msg = get_file_message(transform_id, range(50))
+        for round_id in ['1_a', '1_a', '1_b']:
+            msgs = carrier_utils.compact_file_messages(msg, round_id=round_id, max_files=20)
+            msgs = carrier_utils.filter_stored_messages(msgs, transform_id)
+            core_messages.add_messages(msgs)
+
+        # the same files with the same status in the next round (failed, retried, failed again) are a new message
+        msgs = core_messages.retrieve_messages(transform_id=transform_id)
+        assert_equal(len(msgs), 6)
+        assert_equal(sorted([m['num_contents'] for m in msgs]), [10, 10, 20, 20, 20, 20])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the BatchMessagingSender against an in-process fake STOMP broker.
+"""
+
+import logging
+import queue
+import socket
+import threading
+import time
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common import metrics
+from idds.common.utils import json_dumps, json_loads
+from idds.agents.common.plugins.messaging import BatchMessagingSender
+
+
+class FakeStompBroker(threading.Thread):
+    """
+    Minimal STOMP 1.2 broker: it accepts CONNECT/STOMP, SEND and DISCONNECT frames,
+    stores the sent messages and replies to the receipt headers.
+
+    :param drop_after: close the connection (once) after receiving this number of SEND frames.
+    """
+    def __init__(self, drop_after=None):
+        super(FakeStompBroker, self).__init__(daemon=True)
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(16)
+        self.port = self.server.getsockname()[1]
+        self.drop_after = drop_after
+        self.messages = []
+        self.num_connections = 0
+        self.lock = threading.Lock()
+
+    def run(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                break
+            with self.lock:
+                self.num_connections += 1
+            threading.Thread(target=self.handle, args=(client,), daemon=True).start()
+
+    def stop(self):
+        self.server.close()
+
+    def read_frames(self, client):
+        data = b''
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                return
+            data += chunk
+            while True:
+                data = data.lstrip(b'\r\n')
+                pos = data.find(b'\n\n')
+                if pos < 0:
+                    break
+                lines = data[:pos].decode('utf-8').split('\n')
+                headers = dict(line.split(':', 1) for line in lines[1:] if ':' in line)
+                if 'content-length' in headers:
+                    end = pos + 2 + int(headers['content-length'])
+                    if len(data) < end + 1:
+                        break
+                else:
+                    end = data.find(b'\0', pos + 2)
+                    if end < 0:
+                        break
+                body = data[pos + 2:end]
+                data = data[end + 1:]
+                yield lines[0], headers, body
+
+    def send_frame(self, client, command, headers):
+        frame = command + '\n' + ''.join('%s:%s\n' % (k, v) for k, v in headers.items()) + '\n\0'
+        client.sendall(frame.encode('utf-8'))
+
+    def handle(self, client):
+        try:
+            for command, headers, body in self.read_frames(client):
+                if command in ['CONNECT', 'STOMP']:
+                    self.send_frame(client, 'CONNECTED', {'version': '1.2', 'heart-beat': '0,0'})
+                    continue
+                if command == 'SEND':
+                    with self.lock:
+                        if self.drop_after is not None:
+                            if self.drop_after <= 0:
+                                self.drop_after = None
+                                break
+                            self.drop_after -= 1
+                        self.messages.append((headers, json_loads(body.decode('utf-8'))))
+                if 'receipt' in headers:
+                    self.send_frame(client, 'RECEIPT', {'receipt-id': headers['receipt']})
+                if command == 'DISCONNECT':
+                    break
+        except OSError:
+            pass
+        finally:
+            client.close()
+
+
+class TestMessagingSender(unittest.TestCase):
+
+    def send(self, broker, num_messages, **kwargs):
+        channels = {"default": {"brokers": ["127.0.0.1:%s" % broker.port],
+                                "destination": "/queue/idds.test",
+                                "username": "user",
+                                "password": "password",
+                                "broker_timeout": 10}}
+        sender = BatchMessagingSender(channels=json_dumps(channels), reconnect_delay=0.1,
+                                      logger=logging.getLogger('BatchMessagingSender'), **kwargs)
+        request_queue, response_queue = queue.Queue(), queue.Queue()
+        sender.set_request_queue(request_queue)
+        sender.set_response_queue(response_queue)
+        for i in range(num_messages):
+            request_queue.put({'msg_id': i, 'msg_type': 'file', 'msg_content': {'num': i}})
+        sender.start()
+
+        responses = []
+        start = time.time()
+        while len(responses) < num_messages and time.time() - start < 60:
+            try:
+                responses.append(response_queue.get(timeout=1))
+            except queue.Empty:
+                pass
+        sender.stop()
+        sender.join()
+        return responses
+
+    def test_batch_send(self):
+        """ BatchMessagingSender: messages are sent in batches by multiple workers """
+        metrics.reset_metrics()
+        broker = FakeStompBroker()
+        broker.start()
+        responses = self.send(broker, 1000, num_workers=4, batch_size=50)
+        broker.stop()
+
+        assert_equal(len(responses), 1000)
+        assert_equal(sorted(body['num'] for headers, body in broker.messages), list(range(1000)))
+        assert_equal(broker.messages[0][0]['destination'], '/queue/idds.test')
+        assert_equal(broker.messages[0][0]['msg_type'], 'file')
+        assert broker.num_connections <= 4
+        assert 'idds_messaging_messages_total{channel="default",status="sent"} 1000' in metrics.generate_text()
+
+    def test_reconnect(self):
+        """ BatchMessagingSender: a lost connection is reconnected and the batch is resent """
+        metrics.reset_metrics()
+        broker = FakeStompBroker(drop_after=30)
+        broker.start()
+        responses = self.send(broker, 200, num_workers=1, batch_size=50)
+        broker.stop()
+
+        assert_equal(len(responses), 200)
+        # the first 30 messages of the dropped batch are received twice
+        assert_equal(sorted(set(body['num'] for headers, body in broker.messages)), list(range(200)))
+        assert_equal(len(broker.messages), 230)
+        assert_equal(broker.num_connections, 2)
+        assert 'idds_messaging_reconnects_total{channel="default"} 1' in metrics.generate_text()
+
+
+if __name__ == '__main__':
+    unittest.main()
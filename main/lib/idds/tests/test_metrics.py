@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test metrics.
+"""
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common import metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram(self):
+        """ Metrics: histogram summary and Prometheus text """
+        histogram = metrics.Histogram('test_duration_seconds', 'test', label_names=('function',), buckets=(0.1, 1))
+        for value in [0.05, 0.05, 0.5, 2]:
+            histogram.observe(value, labels={'function': 'f'})
+        summary = histogram.get_summary()[('f',)]
+        assert_equal(summary['count'], 4)
+        assert_equal(summary['p50'], 0.1)
+        assert_equal(summary['p95'], float('inf'))
+
+        text = histogram.generate_text()
+        assert 'test_duration_seconds_bucket{function="f",le="0.1"} 2' in text
+        assert 'test_duration_seconds_bucket{function="f",le="1"} 3' in text
+        assert 'test_duration_seconds_bucket{function="f",le="+Inf"} 4' in text
+        assert 'test_duration_seconds_count{function="f"} 4' in text
+
+    def test_counter(self):
+        """ Metrics: counters are registered once """
+        counter = metrics.get_counter('test_calls_total', 'test', label_names=('function',))
+        counter.inc(labels={'function': 'f'})
+        metrics.get_counter('test_calls_total').inc(2, labels={'function': 'f'})
+        assert_equal(counter.get_values()[('f',)], 3)
+        assert 'test_calls_total{function="f"} 3' in metrics.generate_text()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the in-process delivery and the encodings of the MsgEventBusBackend.
+"""
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.agents.common.eventbus import msgcodec
+from idds.agents.common.eventbus.event import EventType, UpdateProcessingEvent
+from idds.agents.common.eventbus.msgeventbusbackend import MsgEventBusBackend
+from idds.common.utils import setup_logging
+
+
+setup_logging(__name__)
+
+
+class TestMsgEventBusLocal(unittest.TestCase):
+
+    def tearDown(self):
+        for backend in getattr(self, 'backends', []):
+            backend.stop()
+            backend.processor.join(timeout=5)
+
+    def get_backend(self, port, **kwargs):
+        backend = MsgEventBusBackend(coordinator_port=port, **kwargs)
+        self.backends = getattr(self, 'backends', []) + [backend]
+        return backend
+
+    def test_local_delivery(self):
+        """ MsgEventBusBackend: events are delivered in process without serialization """
+        backend = self.get_backend(15856)
+        assert backend.is_local_manager()
+
+        event = UpdateProcessingEvent(publisher_id='test', processing_id=1, content={'num': 1})
+        backend.send(event)
+        events = backend.get(EventType.UpdateProcessing, num_events=2)
+        assert_equal(len(events), 1)
+        assert events[0] is event
+
+    def test_remote_delivery(self):
+        """ MsgEventBusBackend: events are sent to the manager of another backend """
+        manager = self.get_backend(15866)
+        for encoding in ['json', 'msgpack'] if msgcodec.is_msgpack_available() else ['json']:
+            backend = self.get_backend(15876 if encoding == 'json' else 15886, encoding=encoding)
+            backend.manager_socket.close()
+            backend.manager = manager.get_manager(myself=True)
+            backend.init_msg_channel()
+            assert not backend.is_local_manager()
+
+            event = UpdateProcessingEvent(publisher_id='test', processing_id=2, content={'num': 2})
+            backend.send(event)
+            events = backend.get(EventType.UpdateProcessing)
+            assert_equal(len(events), 1)
+            assert events[0] is not event
+            assert_equal(events[0]._id, event._id)
+            assert_equal(events[0]._content, event._content)
+
+
+if __name__ == '__main__':
+    unittest.main()
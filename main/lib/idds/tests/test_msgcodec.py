@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the encoding of the MsgEventBusBackend messages.
+"""
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common.constants import RequestStatus
+from idds.common.event import EventType, NewRequestEvent, UpdateRequestEvent
+from idds.common.utils import json_dumps
+from idds.agents.common.eventbus import msgcodec
+
+
+class Frame(object):
+    """ A received zmq.Frame (copy=False) """
+    def __init__(self, data):
+        self.buffer = memoryview(data)
+
+
+def get_message():
+    event = NewRequestEvent(publisher_id='publisher', request_id=1, content={'status': RequestStatus.New})
+    events = [UpdateRequestEvent(publisher_id='publisher', request_id=i, content={'num': i}, counter=i) for i in range(3)]
+    return {'type': 'send_bulk', 'event': event, 'events': events, 'ret': None, 'num': 3}
+
+
+def assert_event_equal(event, expected):
+    assert_equal(type(event), type(expected))
+    for key in ['_id', '_publisher_id', '_event_type', '_timestamp', '_counter', '_requeue_counter', '_content', '_request_id']:
+        assert_equal(getattr(event, key), getattr(expected, key))
+
+
+class TestMsgCodec(unittest.TestCase):
+
+    def check_round_trip(self, encoding):
+        msg = get_message()
+        frames = msgcodec.encode_message(msg, encoding=encoding)
+        for received in [frames, [Frame(f) for f in frames]]:
+            ret, ret_encoding = msgcodec.decode_message(received)
+            assert_equal(ret_encoding, encoding)
+            assert_equal(sorted(ret.keys()), sorted(msg.keys()))
+            assert_equal((ret['type'], ret['ret'], ret['num']), ('send_bulk', None, 3))
+            assert_event_equal(ret['event'], msg['event'])
+            assert_equal(len(ret['events']), 3)
+            for event, expected in zip(ret['events'], msg['events']):
+                assert_event_equal(event, expected)
+        return frames
+
+    def test_json(self):
+        """ MsgCodec: json messages are one frame """
+        frames = self.check_round_trip('json')
+        assert_equal(len(frames), 1)
+
+    @unittest.skipIf(not msgcodec.is_msgpack_available(), "msgpack is not installed")
+    def test_msgpack(self):
+        """ MsgCodec: msgpack messages have a header frame and one frame per event """
+        frames = self.check_round_trip('msgpack')
+        assert_equal(frames[0], msgcodec.MAGIC)
+        assert_equal(len(frames), 2 + 1 + 3)
+
+        # a list which is not a list of events stays in the header
+        msg = {'type': 'get', 'ret': [], 'event_type': EventType.UpdateRequest}
+        frames = msgcodec.encode_message(msg, encoding='msgpack')
+        assert_equal(len(frames), 2)
+        assert_equal(msgcodec.decode_message(frames), (msg, 'msgpack'))
+
+    def test_legacy_json(self):
+        """ MsgCodec: the single frame JSON messages of the agents without the codec are decoded """
+        msg = get_message()
+        frames = [json_dumps(msg).encode('utf-8')]
+        ret, encoding = msgcodec.decode_message(frames)
+        assert_equal(encoding, 'json')
+        assert_event_equal(ret['event'], msg['event'])
+        for event, expected in zip(ret['events'], msg['events']):
+            assert_event_equal(event, expected)
+
+        ret, encoding = msgcodec.decode_message([Frame(json_dumps({'type': 'stop'}).encode('utf-8'))])
+        assert_equal((ret, encoding), ({'type': 'stop'}, 'json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test skipping the job polls of PanDA tasks which are not changed since the last poll.
+"""
+
+import datetime
+import logging
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common.constants import ProcessingStatus
+from idds.doma.workflowv2.domapandawork import DomaPanDAWork
+from idds.workflowv2.work import Processing
+
+
+def get_task_info(status='running', panda_ids=[1, 2, 3]):
+    return {'status': status, 'modificationTime': '2026-01-01 00:00:00',
+            'statistics': 'finished:1', 'PandaID': list(panda_ids)}
+
+
+class TestPanDATaskFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        self.work = DomaPanDAWork(task_name='test_fingerprint', logger=logging.getLogger('DomaPanDAWork'))
+        self.work.task_fingerprint_max_age = 3600
+        self.input_output_maps = {1: {}, 2: {}, 3: {}}
+        self.fingerprint = self.work.get_panda_task_fingerprint(get_task_info(), self.input_output_maps, [2, 3])
+        self.proc = Processing(processing_metadata={})
+        self.proc.task_fingerprint = {'fingerprint': self.fingerprint, 'polled_at': datetime.datetime.utcnow()}
+
+    def test_unchanged(self):
+        """ PanDATaskFingerprint: the jobs of an unchanged task are not polled """
+        fingerprint = self.work.get_panda_task_fingerprint(get_task_info(), dict(self.input_output_maps), [2, 3])
+        assert_equal(fingerprint, self.fingerprint)
+        assert self.work.is_panda_task_unchanged(self.proc, ProcessingStatus.Running, fingerprint)
+
+    def test_changed(self):
+        """ PanDATaskFingerprint: the jobs are polled if the task status or the number of files changes """
+        fingerprints = [self.work.get_panda_task_fingerprint(get_task_info(status='finished'), self.input_output_maps, [2, 3]),
+                        self.work.get_panda_task_fingerprint(get_task_info(panda_ids=[1, 2, 3, 4]), self.input_output_maps, [2, 3]),
+                        self.work.get_panda_task_fingerprint(get_task_info(), {1: {}, 2: {}, 3: {}, 4: {}}, [2, 3]),
+                        self.work.get_panda_task_fingerprint(get_task_info(), self.input_output_maps, [3])]
+        for fingerprint in fingerprints:
+            assert fingerprint != self.fingerprint
+            assert not self.work.is_panda_task_unchanged(self.proc, ProcessingStatus.Running, fingerprint)
+
+        # terminated tasks and tasks which were not polled for task_fingerprint_max_age are always polled
+        assert not self.work.is_panda_task_unchanged(self.proc, ProcessingStatus.Finished, self.fingerprint)
+        self.proc.task_fingerprint = {'fingerprint': self.fingerprint,
+                                      'polled_at': datetime.datetime.utcnow() - datetime.timedelta(seconds=7200)}
+        assert not self.work.is_panda_task_unchanged(self.proc, ProcessingStatus.Running, self.fingerprint)
+
+    def test_missing_fingerprint(self):
+        """ PanDATaskFingerprint: the jobs are polled if the task was never polled """
+        proc = Processing(processing_metadata={})
+        assert_equal(proc.task_fingerprint, None)
+        assert not self.work.is_panda_task_unchanged(proc, ProcessingStatus.Running, self.fingerprint)
+
+        proc.task_fingerprint = {'fingerprint': self.fingerprint}
+        assert not self.work.is_panda_task_unchanged(proc, ProcessingStatus.Running, self.fingerprint)
+
+
+if __name__ == '__main__':
+    unittest.main()
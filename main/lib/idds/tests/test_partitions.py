@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the partitioning of the contents tables by request_id.
+"""
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from sqlalchemy import BigInteger, Column, Integer, MetaData, Table
+from sqlalchemy.dialects import oracle, postgresql
+from sqlalchemy.schema import CreateTable, PrimaryKeyConstraint
+
+from idds.common.constants import RequestStatus
+from idds.common.utils import check_database, has_config
+from idds.orm import archives as orm_archives
+from idds.orm.base import partitions
+from idds.orm.base import models  # noqa F401, registers the oracle create table compiler
+from idds.orm.requests import add_request, delete_requests, update_request
+from idds.tests.common import get_request_properties
+
+
+class TestPartitions(unittest.TestCase):
+
+    def setUp(self):
+        self.partition_config = partitions.PARTITION_BY_REQUEST_ID, partitions.PARTITION_SIZE, partitions.get_partitions
+        partitions.PARTITION_BY_REQUEST_ID, partitions.PARTITION_SIZE = True, 1000
+
+    def tearDown(self):
+        partitions.PARTITION_BY_REQUEST_ID, partitions.PARTITION_SIZE, partitions.get_partitions = self.partition_config
+
+    def test_partition_ranges(self):
+        """ Partitions: the partition of a request """
+        assert_equal(partitions.get_partition_index(999), 0)
+        assert_equal(partitions.get_partition_index(1000), 1)
+        assert_equal(partitions.get_partition_range(3), (3000, 4000))
+        assert_equal(partitions.get_partition_name('contents', 3), 'contents_p3')
+        assert_equal(partitions.get_partition_key('contents', 'content_id'), ('content_id', 'request_id'))
+        assert_equal(partitions.get_partition_key('messages', 'msg_id'), ('msg_id',))
+        assert partitions.is_partitioned_table('contents_ext', 'postgresql')
+        assert not partitions.is_partitioned_table('contents', 'sqlite')
+
+        partitions.PARTITION_BY_REQUEST_ID = False
+        assert_equal(partitions.get_partition_key('contents', 'content_id'), ('content_id',))
+        assert_equal(partitions.get_partition_table_kwargs('contents'), {})
+
+    def test_partition_ddl(self):
+        """ Partitions: the tables are created as partitioned tables """
+        table = Table('contents_update', MetaData(),
+                      Column('content_id', BigInteger(), primary_key=True),
+                      Column('request_id', BigInteger(), primary_key=True),
+                      Column('substatus', Integer()),
+                      PrimaryKeyConstraint(*partitions.get_partition_key('contents_update', 'content_id')),
+                      **partitions.get_partition_table_kwargs('contents_update'))
+
+        ddl = str(CreateTable(table).compile(dialect=postgresql.dialect()))
+        assert 'PRIMARY KEY (content_id, request_id)' in ddl
+        assert ddl.strip().endswith('PARTITION BY RANGE (request_id)')
+        ddl = str(CreateTable(table).compile(dialect=oracle.dialect()))
+        assert ddl.strip().endswith('PARTITION BY RANGE (request_id) INTERVAL (1000) (PARTITION p0 VALUES LESS THAN (1000))')
+
+        assert_equal(partitions.get_postgresql_partition_ddl('contents', 2),
+                     'CREATE TABLE IF NOT EXISTS %s PARTITION OF %s FOR VALUES FROM (2000) TO (3000)'
+                     % (partitions.get_full_name('contents_p2'), partitions.get_full_name('contents')))
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_archivable_partitions(self):
+        """ Partitions: a request which cannot be archived only blocks its own partition """
+        partitions.PARTITION_SIZE = 10
+        request_ids = []
+        for i in range(30):
+            req_properties = get_request_properties()
+            req_properties['status'] = RequestStatus.Finished
+            request_ids.append(add_request(**req_properties))
+        # the first two partitions which are full of the new requests, and the partition of the last requests
+        index = partitions.get_partition_index(request_ids[0]) + 1
+        partitions.get_partitions = lambda table_name, session=None: [index, index + 1, index + 2]
+        update_request(partitions.get_partition_range(index + 1)[0], parameters={'status': RequestStatus.Transforming})
+
+        ret = orm_archives.get_archivable_partitions('contents', status=[RequestStatus.Finished], older_than=0)
+        assert_equal(ret, [index])
+
+        for request_id in request_ids:
+            delete_requests(request_id=request_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test agent profiler.
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.agents.common import profiler
+
+
+def busy_handler(seconds):
+    end = time.time() + seconds
+    ret = 0
+    while time.time() < end:
+        ret += sum(range(100))
+    return ret
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_sampling_profiler(self):
+        """ Profiler: sampled stacks are aggregated per event type """
+        profile_dir = tempfile.mkdtemp()
+        profiler.start_profiler(mode='sampling', duration=30, interval=0.005, profile_dir=profile_dir)
+        thread = threading.Thread(target=profiler.run_event_handler, args=('NewRequest', busy_handler, 0.5))
+        thread.start()
+        thread.join()
+        paths = profiler.stop_profiler()
+
+        assert_equal(len(paths), 1)
+        assert paths[0].startswith(profile_dir)
+        with open(paths[0]) as f:
+            lines = f.readlines()
+        assert [line for line in lines if line.startswith('NewRequest;') and 'busy_handler' in line]
+        stack, count = lines[0].rsplit(' ', 1)
+        assert int(count) > 0
+
+    def test_cprofile_profiler(self):
+        """ Profiler: selected event handlers are profiled with cProfile """
+        profile_dir = tempfile.mkdtemp()
+        profiler.start_profiler(mode='cprofile', duration=30, event_types=['UpdateRequest'], profile_dir=profile_dir)
+        assert profiler.run_event_handler('UpdateRequest', busy_handler, 0.1) > 0
+        assert profiler.run_event_handler('NewRequest', busy_handler, 0.1) > 0
+        paths = profiler.stop_profiler()
+
+        assert_equal(len(paths), 1)
+        assert paths[0].endswith('_UpdateRequest.prof')
+        assert os.path.exists(paths[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
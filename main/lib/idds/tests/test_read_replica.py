@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test read replica routing of read_session.
+"""
+
+import os
+import tempfile
+import uuid
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common.utils import check_database, has_config, setup_logging
+from idds.orm.base import models, session as db_session
+from idds.orm.meta import add_meta_item, get_meta_item
+
+
+setup_logging(__name__)
+
+
+class TestReadReplica(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.replica_url = 'sqlite:///' + os.path.join(self.tmp_dir, 'replica.db')
+        db_session.set_read_replicas([self.replica_url], max_lag=0, retry_delay=60)
+
+        replica = db_session.get_replicas()[0]
+        models.MetaInfo.__table__.create(replica['engine'], checkfirst=True)
+        self.name = 'replica_%s' % str(uuid.uuid4())[:8]
+        replica_session = db_session.get_replica_session(replica)
+        add_meta_item(name=self.name, meta_info={'db': 'replica'}, session=replica_session)
+        replica_session.commit()
+        replica_session.remove()
+
+    def tearDown(self):
+        db_session.set_read_replicas([])
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_read_replica_routing(self):
+        """ Session: read_session is routed to the replica only if the call opts in """
+        item = get_meta_item(name=self.name, use_replica=True)
+        assert_equal(item['meta_info'], {'db': 'replica'})
+
+        item = get_meta_item(name=self.name)
+        assert_equal(item, None)
+
+        with db_session.read_from_primary():
+            item = get_meta_item(name=self.name, use_replica=True)
+        assert_equal(item, None)
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_read_your_writes(self):
+        """ Session: reads go to the primary right after a write """
+        db_session.get_replicas()[0]['max_lag'] = 60
+        add_meta_item(name=self.name + '_primary', meta_info={'db': 'primary'})
+        item = get_meta_item(name=self.name + '_primary', use_replica=True)
+        assert_equal(item['meta_info'], {'db': 'primary'})
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_replica_failover(self):
+        """ Session: failed replica falls back to the primary """
+        db_session.set_read_replicas(['sqlite:////nonexistent/dir/replica.db'], max_lag=0, retry_delay=60)
+        item = get_meta_item(name=self.name, use_replica=True)
+        assert_equal(item, None)
+        assert db_session.get_replicas()[0]['down_until'] > 0
+        assert_equal(db_session.select_replica(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test the sharding of the agent work.
+"""
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.agents.common.sharding import get_member_id, get_shard_buckets
+
+
+class TestSharding(unittest.TestCase):
+
+    def test_shard_buckets(self):
+        """ Sharding: the buckets are split between the members and only move to or from a joining or leaving member """
+        members = [get_member_id('host%s' % i, 100 + i) for i in range(4)]
+        shards = dict([(m, get_shard_buckets(m, members, num_buckets=64)) for m in members])
+        assert_equal(sorted([b for m in members for b in shards[m]]), list(range(64)))
+        for m in members:
+            assert len(shards[m]) > 0
+
+        new_member = get_member_id('host4', 104)
+        new_shards = dict([(m, get_shard_buckets(m, members + [new_member], num_buckets=64)) for m in members + [new_member]])
+        assert_equal(sorted([b for m in new_shards for b in new_shards[m]]), list(range(64)))
+        for m in members:
+            # the existing members only lose buckets to the new member
+            assert set(new_shards[m]) <= set(shards[m])
+
+        # a member always owns buckets, even before it is registered in the Health table
+        assert_equal(get_shard_buckets(new_member, members, num_buckets=64), new_shards[new_member])
+        assert_equal(get_shard_buckets(new_member, [], num_buckets=8), list(range(8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
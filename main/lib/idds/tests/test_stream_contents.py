@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0OA
+#
+# Authors:
+# - Wen Guan, <wen.guan@cern.ch>, 2026
+
+
+"""
+Test streaming the contents with server side cursors.
+"""
+
+import unittest2 as unittest
+from nose.tools import assert_equal
+
+from idds.common.constants import ContentRelationType, ContentStatus
+from idds.common.utils import check_database, has_config, setup_logging
+from idds.core import catalog as core_catalog
+from idds.orm import contents as orm_contents
+from idds.orm.requests import add_request, delete_requests
+from idds.orm.transforms import add_transform
+from idds.orm.collections import add_collection
+from idds.tests.common import get_request_properties, get_transform_properties, get_collection_properties
+
+setup_logging(__name__)
+
+
+class TestStreamContents(unittest.TestCase):
+
+    @unittest.skipIf(not has_config(), "No config file")
+    @unittest.skipIf(not check_database(), "Database is not defined")
+    def test_iter_contents(self):
+        """ Contents: the iter functions return the same contents as the get functions """
+        request_id = add_request(**get_request_properties())
+        trans_properties = get_transform_properties()
+        trans_properties['request_id'] = request_id
+        trans_properties['workload_id'] = None
+        transform_id = add_transform(**trans_properties)
+        coll_properties = get_collection_properties()
+        coll_properties['transform_id'] = transform_id
+        coll_properties['request_id'] = request_id
+        coll_properties['workload_id'] = None
+        coll_id = add_collection(**coll_properties)
+
+        contents = []
+        for i in range(25):
+            status = ContentStatus.Available if i % 2 else ContentStatus.New
+            contents.append({'request_id': request_id, 'transform_id': transform_id, 'workload_id': None, 'coll_id': coll_id,
+                             'map_id': i, 'scope': 'test_scope', 'name': 'test_stream_%s' % i, 'status': status,
+                             'substatus': status, 'content_relation_type': ContentRelationType.Output})
+        orm_contents.add_contents(contents)
+
+        ret = orm_contents.get_contents_by_request_transform(request_id=request_id, transform_id=transform_id)
+        rows = list(orm_contents.iter_contents_by_request_transform(request_id=request_id, transform_id=transform_id, yield_per=4))
+        assert_equal(len(rows), 25)
+        assert_equal([row._asdict() for row in rows], ret)
+
+        rows = list(core_catalog.iter_contents_by_request_transform(request_id=request_id, transform_id=transform_id,
+                                                                    status=[ContentStatus.Available],
+                                                                    columns=['content_id', 'name', 'status']))
+        assert_equal(len(rows), 12)
+        assert_equal(rows[0]._fields, ('content_id', 'name', 'status'))
+        assert_equal(rows[0].status, ContentStatus.Available)
+
+        rows = list(orm_contents.iter_contents(coll_id=coll_id, status=ContentStatus.New, columns=['content_id', 'map_id', 'status']))
+        assert_equal([row.map_id for row in rows], list(range(0, 25, 2)))
+
+        # the session of a generator closed before the end is released
+        for row in orm_contents.iter_contents(coll_id=coll_id, yield_per=2):
+            break
+
+        contents_ext = [{'content_id': row.content_id, 'request_id': request_id, 'transform_id': transform_id, 'coll_id': coll_id,
+                         'map_id': row.map_id, 'status': row.status} for row in rows]
+        orm_contents.add_contents_ext(contents_ext)
+        rows = list(core_catalog.iter_contents_ext(request_id=request_id, transform_id=transform_id, columns=['coll_id', 'status']))
+        assert_equal(len(rows), 13)
+        assert_equal(set([(row.coll_id, row.status) for row in rows]), set([(coll_id, ContentStatus.New)]))
+
+        delete_requests(request_id=request_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -408,6 +408,22 @@ class Processing(Base):
     def task_name(self, value):
         self.add_metadata_item('task_name', value)
 
+    @property
+    def task_fingerprint(self):
+        return self.get_metadata_item('task_fingerprint', None)
+
+    @task_fingerprint.setter
+    def task_fingerprint(self, value):
+        self.add_metadata_item('task_fingerprint', value)
+
+    @property
+    def map_cursor(self):
+        return self.get_metadata_item('map_cursor', 0)
+
+    @map_cursor.setter
+    def map_cursor(self, value):
+        self.add_metadata_item('map_cursor', value)
+
     @property
     def processing(self):
         return self._processing